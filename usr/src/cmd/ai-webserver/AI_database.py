@@ -31,7 +31,6 @@ import threading
 import sys
 
 from osol_install.auto_install.installadm_common import _
-from sqlite3 import dbapi2 as sqlite
 
 MANIFESTS_TABLE = 'manifests'  # DB table name for manifests
 PROFILES_TABLE = 'profiles'    # DB table name for profiles
@@ -120,6 +119,12 @@ class DBrequest(object):
         ''' Use getSql() to access the SQL query string. '''
         return(self._sql)
 
+    def getStatements(self):
+        ''' Use getStatements() to access the list of SQL statements to
+        execute for this request.
+        '''
+        return([self._sql])
+
     def setResponse(self, resp):
         ''' Use setResponse() to set the DB response and update the event flag.
         (Will throw a RuntimeError if already set.)
@@ -155,6 +160,25 @@ class DBrequest(object):
         self._e.wait(15)
 
 
+class DBtransaction(DBrequest):
+    ''' Class to hold a list of SQL statements which are executed and
+    committed as a single transaction: either all of them take effect or,
+    should any of them fail, none do.
+    '''
+
+    def __init__(self, queries):
+        ''' Set the private list of SQL statements; a transaction always
+        needs to be committed.
+        '''
+        self._statements = [str(query) for query in queries]
+        super(DBtransaction, self).__init__("; ".join(self._statements),
+                                            commit=True)
+
+    def getStatements(self):
+        ''' Use getStatements() to access the list of SQL statements. '''
+        return(list(self._statements))
+
+
 class DBthread(threading.Thread):
     '''Class to interface with SQLite as the provider is single threaded'''
 
@@ -178,6 +202,9 @@ class DBthread(threading.Thread):
         '''Here we simply iterate over the request queue executing queries
         and reporting responses. Errors are set as strings for that DBrequest.
         '''
+        # sqlite is only loaded once a database is actually opened
+        from sqlite3 import dbapi2 as sqlite
+
         try:
             if self._committable:
                 # use SQLite IMMEDIATE isolation to prevent any writers
@@ -212,9 +239,12 @@ class DBthread(threading.Thread):
                 # query and commit it
                 if request.needsCommit() and self._committable:
                     try:
-                        self._cursor.execute(request.getSql())
+                        for statement in request.getStatements():
+                            self._cursor.execute(statement)
                         self._con.commit()
                     except StandardError as ex:
+                        # do not leave part of a transaction applied
+                        self._con.rollback()
                         # save error string for caller to trigger
                         request.setResponse(_("Database failure with "
                                               "SQL: %s") % request.getSql() +
@@ -429,6 +459,41 @@ def getSpecificCriteria(queue, criteria, criteria2=None,
     return []
 
 
+def getAllTableCriteria(queue, table=MANIFESTS_TABLE, excludeNames=None):
+    ''' Returns the name, instance (manifests only) and all criteria columns
+    of every row of table in a single query, with HEX() used for mac
+    columns as for humanOutput in getTableCriteria().  The excludeNames
+    argument filters out the rows with the names given in that list; they
+    are filtered here rather than in the query, as SQLite limits the depth
+    of an expression.
+    Raises SystemExit if the query fails.
+    '''
+    if table == MANIFESTS_TABLE:
+        query_str = "SELECT name, instance"
+    else:
+        query_str = "SELECT name"
+    for crit in getCriteria(queue, table=table, onlyUsed=False, strip=False):
+        if str(crit).endswith('mac'):
+            query_str += ", HEX(" + str(crit) + ") AS " + str(crit)
+        else:
+            query_str += ", " + str(crit)
+    query_str += " FROM " + table
+
+    query = DBrequest(query_str)
+    queue.put(query)
+    query.waitAns()
+    rsp = query.getResponse()
+    if rsp is None:
+        # the error has been printed by getResponse()
+        raise SystemExit(_("Error:\tUnable to read the criteria of the "
+                           "%s table") % table)
+
+    if excludeNames:
+        exclude = set(sanitizeSQL(name) for name in excludeNames)
+        return [row for row in rsp if row['name'] not in exclude]
+    return rsp
+
+
 def getCriteria(queue, table=MANIFESTS_TABLE, onlyUsed=True, strip=True):
     ''' Provides a list of criteria which are used in the DB (i.e. what
     needs to be queried on the client). If strip is False, return
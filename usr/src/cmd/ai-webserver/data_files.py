@@ -45,6 +45,7 @@ import osol_install.auto_install.verifyXML as verifyXML
 from osol_install.auto_install.installadm_common import _
 
 from solaris_install import IMG_AI_MANIFEST_PATH, IMG_AI_MANIFEST_DTD
+from solaris_install.manifest import schema_registry
 
 IMG_AI_MANIFEST_SCHEMA = "auto_install/ai_manifest.rng"
 
@@ -195,10 +196,6 @@ def insert_SQL(files):
     Args: None
     Returns: None
     """
-    query = "INSERT INTO manifests VALUES("
-
-    # add the manifest name to the query string
-    query += "'" + AIdb.sanitizeSQL(files.manifest_name) + "',"
     # check to see if manifest name is already in database (affects instance
     # number)
     if AIdb.sanitizeSQL(files.manifest_name) in \
@@ -211,13 +208,39 @@ def insert_SQL(files):
     else:
         instance = 0
 
+    query = insert_SQL_query(files, instance,
+                             AIdb.getCriteria(files.database.getQueue(),
+                                              onlyUsed=False, strip=False))
+
+    # update the database
+    query = AIdb.DBrequest(query, commit=True)
+    files.database.getQueue().put(query)
+    query.waitAns()
+    # in case there's an error call the response function (which will print the
+    # error)
+    query.getResponse()
+
+
+def insert_SQL_query(files, instance, columns):
+    """
+    Build the INSERT statement adding a manifest to the database
+    Args: files - DataFiles object holding the manifest's name and criteria
+          instance - instance number of the manifest
+          columns - the criteria column names of the manifests table, as
+                    returned by AIdb.getCriteria(onlyUsed=False, strip=False)
+    Returns: the SQL statement as a string
+    """
+    query = "INSERT INTO manifests VALUES("
+
+    # add the manifest name to the query string
+    query += "'" + AIdb.sanitizeSQL(files.manifest_name) + "',"
+
     # actually add the instance to the query string
     query += str(instance) + ","
 
     # we need to fill in the criteria or NULLs for each criteria the database
     # supports (so iterate over each criteria)
-    for crit in AIdb.getCriteria(files.database.getQueue(),
-                                 onlyUsed=False, strip=False):
+    for crit in columns:
         # for range values trigger on the MAX criteria (skip the MIN's
         # arbitrary as we handle rows in one pass)
         if crit.startswith('MIN'):
@@ -260,13 +283,7 @@ def insert_SQL(files):
     # strip trailing comma and close parentheses
     query = query[:-1] + ")"
 
-    # update the database
-    query = AIdb.DBrequest(query, commit=True)
-    files.database.getQueue().put(query)
-    query.waitAns()
-    # in case there's an error call the response function (which will print the
-    # error)
-    query.getResponse()
+    return query
 
 
 def place_manifest(files, manifest_path):
@@ -497,11 +514,14 @@ class DataFiles(object):
                  database_path=None, manifest_file=None,
                  criteria_dict=None, criteria_file=None,
                  manifest_name=None, service_name=None,
-                 set_as_default=False):
+                 set_as_default=False, database=None):
 
         """
         Initialize DataFiles instance. All parameters optional, however, proper
         setup order asurred, if all data provided upon instantiation.
+        An already open AI_database.DB object may be passed as database
+        instead of database_path, so that many DataFiles objects (e.g. for
+        a batch of manifests) can share one database connection.
         """
 
         #
@@ -569,7 +589,9 @@ class DataFiles(object):
 
         # Holds database object for criteria database
         self._db = None
-        if database_path:
+        if database is not None:
+            self._db = database
+        elif database_path:
             # Set Database Path and Open SQLite3 Object
             self.database = database_path
             # verify the database's table/column structure (or exit if errors)
@@ -582,13 +604,13 @@ class DataFiles(object):
             # Determine if we are operating with the newer AI DTD,
             # or with the older AI rng schema
             try:
-                lxml.etree.DTD(self.AI_schema)
+                schema_registry.get_dtd(self.AI_schema)
                 self.is_dtd = True
-            except lxml.etree.DTDParseError:
+            except (IOError, lxml.etree.DTDParseError):
                 try:
-                    lxml.etree.RelaxNG(file=self.AI_schema)
+                    schema_registry.get_relaxng(self.AI_schema)
                     self.is_dtd = False
-                except lxml.etree.RelaxNGParseError:
+                except (IOError, lxml.etree.RelaxNGParseError):
                     raise ValueError(_("Error: Unable to determine AI "
                                        "manifest validation type.\n"))
 
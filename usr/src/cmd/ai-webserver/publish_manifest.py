@@ -19,13 +19,15 @@
 #
 # CDDL HEADER END
 #
-# Copyright (c) 2008, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2008, 2012, Oracle and/or its affiliates. All rights reserved.
 """
 AI publish_manifest
 """
 import gettext
+import heapq
 import logging
 import os
+import shlex
 
 import lxml.etree
 
@@ -53,7 +55,8 @@ def get_create_usage():
              '\t\t[-m|--manifest <manifest/script name>]\n'
              '\t\t[-c|--criteria <criteria=value|range> ... | \n'
              '\t\t -C|--criteria-file <criteria.xml>]  \n'
-             '\t\t[-d|--default]')
+             '\t\t[-d|--default] |\n'
+             '\t\t-b|--batch-file <batch file>')
 
 
 def get_update_usage():
@@ -63,13 +66,128 @@ def get_update_usage():
              '\t\t[-m|--manifest <manifest/script name>]')
 
 
+def _add_manifest_options(parser, do_create):
+    """
+    Add the options describing a single manifest to parser
+    Args: - parser, OptionParser to add options to
+          - do_create (True) or do_update (False)
+    """
+    if do_create:
+        parser.add_option("-c", "--criteria", dest="criteria_c",
+                          action="append", default=list(), help=_("Criteria: "
+                          "<-c criteria=value|range> ..."), metavar="CRITERIA")
+        parser.add_option("-C", "--criteria-file", dest="criteria_file",
+                          default=None, help=_("Path to criteria XML file."))
+        parser.add_option("-d", "--default", dest="set_as_default",
+                          default=False, action='store_true',
+                          help=_("Set manifest as default "))
+    parser.add_option("-f", "--file", dest="manifest_path",
+                      default=None, help=_("Path to manifest file "))
+    parser.add_option("-m", "--manifest", dest="manifest_name",
+                      default=None, help=_("Name of manifest"))
+
+
+def _get_criteria_dict(parser, options):
+    """
+    Check the -c and -C options of a manifest
+    Args: - parser, OptionParser used to report errors
+          - options, as parsed by parser
+    Returns: dictionary of criteria from -c, or None
+    """
+    criteria_dict = None
+    # check that we aren't mixing -c and -C
+    # Note: -c and -C will be accepted for create, not for update.
+    if options.criteria_c and options.criteria_file:
+        parser.error(_("Options used are mutually exclusive."))
+
+    # if we have criteria from cmd line, convert into dictionary
+    if options.criteria_c:
+        try:
+            criteria_dict = criteria_to_dict(options.criteria_c)
+        except ValueError as err:
+            parser.error(err)
+
+    elif options.criteria_file:
+        if not os.path.exists(options.criteria_file):
+            parser.error(_("Unable to find criteria file: %s") %
+                         options.criteria_file)
+    return criteria_dict
+
+
+def parse_batch_file(batch_file, get_parser, check_options):
+    """
+    Parse a batch file, each line of which holds the options for one
+    manifest, quoted as they would be on the command line.  Blank lines and
+    comments starting with '#' are ignored.
+    Args: batch_file - path to the batch file
+          get_parser - function returning an OptionParser for one line
+          check_options - function called with the parser and the options
+                          parsed from each line, returning the entry for
+                          that line.  Errors are reported with parser.error()
+    Returns: a list of the entries returned by check_options, one for each
+             manifest
+    Raises: SystemExit if the file can not be read or a line is malformed
+    """
+    try:
+        with open(batch_file) as batch:
+            lines = batch.readlines()
+    except IOError as err:
+        raise SystemExit(_("Error:\tUnable to read batch file: %s") % err)
+
+    entries = list()
+    for lineno, line in enumerate(lines, 1):
+        try:
+            line_args = shlex.split(line, comments=True)
+        except ValueError as err:
+            raise SystemExit(_("Error:\t%s, line %d: %s") %
+                             (batch_file, lineno, err))
+        if not line_args:
+            continue
+
+        parser = get_parser()
+        # report errors against the line of the batch file
+        parser.error = lambda msg: parser.exit(2, _("Error:\t%s, line %d: "
+            "%s\n") % (batch_file, lineno, msg))
+
+        options, args = parser.parse_args(line_args)
+        if len(args):
+            parser.error(_("Unexpected argument(s): %s" % args))
+        entries.append(check_options(parser, options))
+
+    if not entries:
+        raise SystemExit(_("Error:\tNo manifests found in batch file: %s") %
+                         batch_file)
+    return entries
+
+
+def _get_batch_parser():
+    """
+    Returns: an OptionParser for a line of a create-manifest batch file,
+             which holds the -f, -m, -c, -C and -d options for one manifest
+    """
+    parser = OptionParser(usage='\n' + get_create_usage())
+    _add_manifest_options(parser, DO_CREATE)
+    return parser
+
+
+def _check_batch_options(parser, options):
+    """
+    Check the options from a line of a create-manifest batch file
+    Returns: a tuple of the options and their dictionary of criteria
+    """
+    if options.manifest_path is None:
+        parser.error(_("Missing one or more required options."))
+    return (options, _get_criteria_dict(parser, options))
+
+
 def parse_options(do_create, cmd_options=None):
     """
     Parse and validate options
     Args: - do_create (True) or do_update (False)
           - Optional cmd_options, used for unit testing. Otherwise, cmd line
             options handled by OptionParser
-    Returns: the DataFiles object populated and initialized
+    Returns: a list of the DataFiles objects populated and initialized, one
+             for each manifest (several only when a batch file is given)
     Raises: The DataFiles initialization of manifest(s) A/I, SC, SMF looks for
             many error conditions and, when caught, are flagged to the user
             via raising SystemExit exceptions.
@@ -80,19 +198,11 @@ def parse_options(do_create, cmd_options=None):
     else:
         usage = '\n' + get_update_usage()
     parser = OptionParser(usage=usage)
+    _add_manifest_options(parser, do_create)
     if do_create:
-        parser.add_option("-c", "--criteria", dest="criteria_c",
-                          action="append", default=list(), help=_("Criteria: "
-                          "<-c criteria=value|range> ..."), metavar="CRITERIA")
-        parser.add_option("-C", "--criteria-file", dest="criteria_file",
-                          default=None, help=_("Path to criteria XML file."))
-        parser.add_option("-d", "--default", dest="set_as_default",
-                          default=False, action='store_true',
-                          help=_("Set manifest as default "))
-    parser.add_option("-f", "--file", dest="manifest_path",
-                      default=None, help=_("Path to manifest file "))
-    parser.add_option("-m", "--manifest", dest="manifest_name",
-                      default=None, help=_("Name of manifest"))
+        parser.add_option("-b", "--batch-file", dest="batch_file",
+                          default=None, help=_("Path to file listing the "
+                          "manifests to create"))
     parser.add_option("-n", "--service", dest="service_name",
                       default=None, help=_("Name of install service."))
 
@@ -107,8 +217,10 @@ def parse_options(do_create, cmd_options=None):
         options.criteria_file = None
         options.criteria_c = None
         options.set_as_default = False
+        options.batch_file = None
 
     # options are:
+    #    -b  file listing manifests to create (create only)
     #    -c  criteria=<value/range> ...       (create only)
     #    -C  XML file with criteria specified (create only)
     #    -d  set manifest as default          (create only)
@@ -116,30 +228,31 @@ def parse_options(do_create, cmd_options=None):
     #    -f  path to manifest file
     #    -m  manifest name
 
-    # check that we got the install service's name and an AI manifest.
-    if options.manifest_path is None or options.service_name is None:
-        parser.error(_("Missing one or more required options."))
-
     logging.debug("options = %s", options)
 
-    criteria_dict = None
-    if do_create:
-        # check that we aren't mixing -c and -C
-        # Note: -c and -C will be accepted for create, not for update.
-        if options.criteria_c and options.criteria_file:
+    if options.batch_file:
+        # the manifests are all described by the batch file
+        if options.manifest_path or options.manifest_name or \
+            options.criteria_c or options.criteria_file or \
+            options.set_as_default:
             parser.error(_("Options used are mutually exclusive."))
+        if options.service_name is None:
+            parser.error(_("Missing one or more required options."))
+        if not os.path.exists(options.batch_file):
+            parser.error(_("Unable to find batch file: %s") %
+                         options.batch_file)
+        entries = parse_batch_file(options.batch_file, _get_batch_parser,
+                                   _check_batch_options)
 
-        # if we have criteria from cmd line, convert into dictionary
-        if options.criteria_c:
-            try:
-                criteria_dict = criteria_to_dict(options.criteria_c)
-            except ValueError as err:
-                parser.error(err)
+    else:
+        # check that we got the install service's name and an AI manifest.
+        if options.manifest_path is None or options.service_name is None:
+            parser.error(_("Missing one or more required options."))
 
-        elif options.criteria_file:
-            if not os.path.exists(options.criteria_file):
-                parser.error(_("Unable to find criteria file: %s") %
-                             options.criteria_file)
+        criteria_dict = None
+        if do_create:
+            criteria_dict = _get_criteria_dict(parser, options)
+        entries = [(options, criteria_dict)]
 
     if not config.is_service(options.service_name):
         raise SystemExit(_("Failed to find service %s") % options.service_name)
@@ -156,21 +269,35 @@ def parse_options(do_create, cmd_options=None):
     service_dir = service.config_dir
     dbname = service.database_path
 
-    try:
-        files = df.DataFiles(service_dir=service_dir, image_path=image_path,
-                             database_path=dbname,
-                             manifest_file=options.manifest_path,
-                             manifest_name=options.manifest_name,
-                             criteria_dict=criteria_dict,
-                             criteria_file=options.criteria_file,
-                             service_name=options.service_name,
-                             set_as_default=options.set_as_default)
-    except (AssertionError, IOError, ValueError) as err:
-        raise SystemExit(err)
-    except (lxml.etree.LxmlError) as err:
-        raise SystemExit(_("Error:\tmanifest error: %s") % err)
-
-    return(files)
+    # all manifests of a batch share one database connection
+    database = None
+    if options.batch_file:
+        if not os.path.exists(dbname):
+            raise SystemExit(_("Error:\tFile %s is not a valid database "
+                               "file") % dbname)
+        database = AIdb.DB(dbname, commit=True)
+        database.verifyDBStructure()
+
+    files_list = list()
+    for (entry, criteria_dict) in entries:
+        try:
+            files = df.DataFiles(service_dir=service_dir,
+                                 image_path=image_path,
+                                 database_path=dbname,
+                                 manifest_file=entry.manifest_path,
+                                 manifest_name=entry.manifest_name,
+                                 criteria_dict=criteria_dict,
+                                 criteria_file=entry.criteria_file,
+                                 service_name=options.service_name,
+                                 set_as_default=entry.set_as_default,
+                                 database=database)
+        except (AssertionError, IOError, ValueError) as err:
+            raise SystemExit(err)
+        except (lxml.etree.LxmlError) as err:
+            raise SystemExit(_("Error:\tmanifest error: %s") % err)
+        files_list.append(files)
+
+    return(files_list)
 
 
 def criteria_to_dict(criteria):
@@ -208,6 +335,302 @@ def criteria_to_dict(criteria):
     return cri_dict
 
 
+def _range_criterion(crit, man_criterion):
+    """
+    Convert the bounds of a range criterion from a manifest to numbers and
+    check that they form a valid range.
+    Returns: A two item list of longs, the minimum and maximum of the range
+             with "unbounded" converted to 0 and INFINITY respectively
+    Args:    crit - name of the range criterion
+             man_criterion - the two item list of (string) bounds from the
+                             manifest
+    Raises:  SystemExit if: value is not valid for type (integer and
+                            hexadecimal checks)
+                            range is improper
+    """
+    # Clean-up NULL's and change "unbounded"s to 0 and
+    # really large numbers in case this Python does
+    # not support IEEE754.  Note "unbounded"s are already
+    # converted to lower case during manifest processing.
+    bounds = list(man_criterion)
+    if bounds[0] == "unbounded":
+        bounds[0] = "0"
+    if bounds[1] == "unbounded":
+        bounds[1] = INFINITY
+    if crit == "mac":
+        # convert hex mac address (w/o colons) to a number
+        try:
+            bounds = [long(str(bounds[0]).upper(), 16),
+                      long(str(bounds[1]).upper(), 16)]
+        except ValueError:
+            raise SystemExit(_("Error:\tCriteria %s "
+                               "is not a valid hexadecimal value") %
+                             crit)
+    else:
+        # this is a decimal value
+        try:
+            bounds = [long(str(bounds[0]).upper()),
+                      long(str(bounds[1]).upper())]
+        except ValueError:
+            raise SystemExit(_("Error:\tCriteria %s "
+                               "is not a valid integer value") % crit)
+
+    # Check for a properly ordered range (with unbounded being 0 or
+    # Inf.) but ensure both are not unbounded.
+    # Check for:
+    #       a range of zero to inf -- not a valid range
+    #  and
+    #       min > max -- range order reversed
+    #
+    if (bounds[0] == 0 and bounds[1] == long(INFINITY)):
+        raise SystemExit(_("Error:\tCriteria %s is not a valid range, "
+                           "MIN and MAX unbounded.") % crit)
+
+    if ((bounds[0] != 0 and bounds[1] != long(INFINITY)) and
+        (long(bounds[0]) > long(bounds[1]))):
+        raise SystemExit(_("Error:\tCriteria %s is not a valid range, "
+                           "MIN > MAX.") % crit)
+    return bounds
+
+
+class CriteriaIndex(object):
+    """
+    In-memory index of the criteria of the manifests published to an
+    install service, used to find criteria collisions for one or a whole
+    batch of new criteria sets.
+
+    All published criteria are read from the database with a single query.
+    Value criteria are then matched through dictionaries keyed by value and
+    range criteria by a sweep over all ranges sorted by their minimum, so
+    checking a batch costs roughly the size of the batch and database
+    plus the number of collisions, rather than a query and a pass over the
+    database for each criterion of each new manifest.  New criteria sets
+    are checked against the database and against each other.
+    """
+
+    def __init__(self, db, exclude_manifests=None):
+        """
+        Args: db - AI_database object for the install service.
+              exclude_manifests - A list of manifest names from DB to ignore,
+                                  e.g. manifests whose criteria are being
+                                  replaced.
+        """
+        queue = db.getQueue()
+
+        # exact DB column names of all criteria (e.g. MINmem, MAXmem, arch)
+        self.columns = [str(col) for col in
+                        AIdb.getCriteria(queue, onlyUsed=False, strip=False)]
+        self._range_crits = set(col.replace('MIN', '', 1)
+                                for col in self.columns
+                                if col.startswith('MIN'))
+
+        # criteria of each published manifest keyed by (name, instance)
+        self.rows = dict()
+        for row in AIdb.getAllTableCriteria(queue,
+                                            excludeNames=exclude_manifests):
+            self.rows[row['name'], row['instance']] = \
+                dict((col, row[col]) for col in self.columns)
+
+        # value criteria: criteria name -> value -> keys of manifests
+        self._values = dict()
+        # range criteria: criteria name -> list of (MIN, MAX, key)
+        self._ranges = dict()
+        for key, row in self.rows.iteritems():
+            for col in self.columns:
+                if col.startswith('MAX'):
+                    continue
+                elif col.startswith('MIN'):
+                    crit = col.replace('MIN', '', 1)
+                    bounds = self._db_range(crit, row[col],
+                                            row['MAX' + crit])
+                    if bounds is not None:
+                        self._ranges.setdefault(crit, list()).append(
+                            (bounds[0], bounds[1], key))
+                elif row[col]:
+                    values = self._values.setdefault(col, dict())
+                    for value in str(row[col]).split():
+                        values.setdefault(self._value_key(col, value),
+                                          set()).add(key)
+
+        # new criteria sets to check, as a list of (key, criteria, ranges)
+        self._pending = list()
+
+    @staticmethod
+    def _value_key(crit, value):
+        """
+        Returns: the form in which value is compared for criteria crit,
+                 following AIdb.is_in_list()
+        """
+        if crit.lower() in AIdb.CRIT_LIST_CASE_SENSITIVE:
+            return value
+        return value.lower()
+
+    @staticmethod
+    def _db_range(crit, db_min, db_max):
+        """
+        Returns: the range in the database for criteria crit as a list of
+                 longs, or None if neither MIN nor MAX is set
+        """
+        if not db_min and not db_max:
+            return None
+        # arbitrarily large number in case this Python does
+        # not support IEEE754
+        db_criterion = ["0", INFINITY]
+
+        # now populate in valid database values (i.e. non-NULL values)
+        if db_min:
+            db_criterion[0] = db_min
+        if db_max:
+            db_criterion[1] = db_max
+        if crit == "mac":
+            # use a hexadecimal conversion
+            return [long(str(db_criterion[0]), 16),
+                    long(str(db_criterion[1]), 16)]
+        # these are decimal numbers
+        return [long(str(db_criterion[0])), long(str(db_criterion[1]))]
+
+    def num_instances(self, name):
+        """
+        Returns: the number of instances of manifest name in the index
+        """
+        return len([key for key in self.rows if key[0] == name])
+
+    def add(self, key, criteria):
+        """
+        Add a new set of criteria to be checked for collisions.
+        Args:    key - (manifest name, instance) the criteria are for
+                 criteria - Criteria object (or dictionary) holding the
+                            criteria that is to be added/set for a manifest.
+        Raises:  SystemExit if: criteria is not found in database
+                                value is not valid for type (integer and
+                                hexadecimal checks)
+                                range is improper
+        """
+        ranges = dict()
+        for crit in criteria:
+            man_criterion = criteria[crit]
+            if man_criterion is None:
+                continue
+            if crit not in self._range_crits:
+                # only check criteria in use in the DB
+                if crit not in self.columns:
+                    raise SystemExit(_("Error:\tCriteria %s is not a " +
+                                       "valid criteria!") % crit)
+            else:
+                ranges[crit] = _range_criterion(crit, man_criterion)
+        self._pending.append((key, criteria, ranges))
+
+    def find_collisions(self):
+        """
+        Returns: A dictionary keyed by the key of each added criteria set
+                 which collides with anything.  Its value is a dictionary
+                 with keys being the manifest name and instance tuples it
+                 collides with and values being a comma-terminated string
+                 of the DB column names which collided, as returned by
+                 find_colliding_criteria().  Collisions between two added
+                 criteria sets are reported for the one added later.
+        """
+        collisions = dict()
+
+        def record(key, other, cols):
+            """ Note that cols of key collide with other """
+            others = collisions.setdefault(key, dict())
+            others[other] = others.get(other, "") + cols
+
+        # value criteria: look each value up in the database's values and
+        # in the values of the criteria sets added before
+        pending_values = dict()
+        for key, criteria, ranges in self._pending:
+            for crit in criteria:
+                if crit in ranges or criteria[crit] is None:
+                    continue
+                db_values = self._values.get(crit, dict())
+                new_values = pending_values.setdefault(crit, dict())
+                for value in criteria[crit]:
+                    value = self._value_key(crit, value)
+                    for other in db_values.get(value, ()):
+                        record(key, other, crit + ",")
+                    for other in new_values.get(value, ()):
+                        record(key, other, crit + ",")
+                for value in criteria[crit]:
+                    new_values.setdefault(self._value_key(crit, value),
+                                          list()).append(key)
+
+        # range criteria: sweep over the ranges in order of their minimum,
+        # keeping the ranges which may still overlap in heaps ordered by
+        # their maximum.  Database ranges need not be compared against each
+        # other, so they are kept apart from the added ranges.
+        range_crits = set()
+        for key, criteria, ranges in self._pending:
+            range_crits.update(ranges)
+        for crit in range_crits:
+            cols = "MIN" + crit + "," + "MAX" + crit + ","
+            events = [(low, high, False, None, other)
+                      for (low, high, other) in self._ranges.get(crit, ())]
+            for seq, (key, criteria, ranges) in enumerate(self._pending):
+                if crit in ranges:
+                    events.append((ranges[crit][0], ranges[crit][1],
+                                   True, seq, key))
+            events.sort(key=lambda event: event[0])
+
+            active_db = list()
+            active_new = list()
+            for (low, high, is_new, seq, key) in events:
+                for active in (active_db, active_new):
+                    while active and active[0][0] < low:
+                        heapq.heappop(active)
+                if is_new:
+                    for (_high, _seq, other) in active_db:
+                        record(key, other, cols)
+                    for (_high, other_seq, other) in active_new:
+                        if other_seq < seq:
+                            record(key, other, cols)
+                        else:
+                            record(other, key, cols)
+                    heapq.heappush(active_new, (high, seq, key))
+                else:
+                    for (_high, _seq, other) in active_new:
+                        record(other, key, cols)
+                    heapq.heappush(active_db, (high, None, key))
+        return collisions
+
+    def _pending_row(self, criteria):
+        """
+        Returns: a dictionary of criteria column names to values in the
+                 form read from the database, for a set of added criteria
+        """
+        row = dict()
+        for col in self.columns:
+            values = criteria[col.replace('MIN', '', 1).replace('MAX', '', 1)]
+            if values is None:
+                row[col] = None
+            elif col.startswith('MIN') or col.startswith('MAX'):
+                value = values[0] if col.startswith('MIN') else values[1]
+                row[col] = None if value == "unbounded" else value
+            else:
+                row[col] = " ".join(values)
+        return row
+
+    def check(self):
+        """
+        Check all added criteria sets for collisions with the database and
+        with each other.
+        Raises:  SystemExit if a range collides, or if a set of criteria is
+                 the same as that of a manifest already in the database or
+                 of another added set (see find_colliding_manifests())
+        """
+        pending = dict((key, criteria)
+                       for key, criteria, ranges in self._pending)
+        for key, others in self.find_collisions().iteritems():
+            for man_inst, cols in others.iteritems():
+                if man_inst in self.rows:
+                    db_criteria = self.rows[man_inst]
+                else:
+                    db_criteria = self._pending_row(pending[man_inst])
+                _check_colliding_manifest(pending[key], self.columns,
+                                          man_inst, db_criteria, cols)
+
+
 def find_colliding_criteria(criteria, db, exclude_manifests=None):
     """
     Returns: A dictionary of colliding criteria with keys being manifest name
@@ -225,163 +648,110 @@ def find_colliding_criteria(criteria, db, exclude_manifests=None):
                             hexadecimal checks)
                             range is improper
     """
-    class Fields(object):
-        """
-        Define convenience indexes
-        """
-        # manifest name is row index 0
-        MANNAME = 0
-        # manifest instance is row index 1
-        MANINST = 1
-        # criteria is row index 2 (when a single valued criteria)
-        CRIT = 2
-        # minimum criteria is row index 2 (when a range valued criteria)
-        MINCRIT = 2
-        # maximum criteria is row index 3 (when a range valued criteria)
-        MAXCRIT = 3
-
-    # collisions is a dictionary to hold keys of the form (manifest name,
-    # instance) which will point to a comma-separated string of colliding
-    # criteria
-    collisions = dict()
-
-    # verify each range criteria in the manifest is well formed and collect
-    # collisions with database entries
-    for crit in criteria:
-        # gather this criteria's values from the manifest
-        man_criterion = criteria[crit]
-
-        # Determine if this crit is a range criteria or not.
-        is_range_crit = AIdb.isRangeCriteria(db.getQueue(), crit,
-            AIdb.MANIFESTS_TABLE)
-
-        # Process "value" criteria here (check if the criteria exists in
-        # DB, and then find collisions)
-        if not is_range_crit:
-            # only check criteria in use in the DB
-            if crit not in AIdb.getCriteria(db.getQueue(),
-                                            onlyUsed=False, strip=False):
-                raise SystemExit(_("Error:\tCriteria %s is not a " +
-                                   "valid criteria!") % crit)
-
-            # get all values in the database for this criteria (and
-            # manifest/instance pairs for each value)
-            db_criteria = AIdb.getSpecificCriteria(
-                db.getQueue(), crit,
-                provideManNameAndInstance=True,
-                excludeManifests=exclude_manifests)
-
-            # will iterate over a list of the form [manName, manInst, crit,
-            # None]
-            for row in db_criteria:
-                # check if a value in the list of values to be added is equal
-                # to a value in the list of values for this criteria for this
-                # row
-                for value in man_criterion:
-                    if AIdb.is_in_list(crit, value, str(row[Fields.CRIT]),
-                        None):
-                        # record manifest name, instance and criteria name
-                        try:
-                            collisions[row[Fields.MANNAME],
-                                       row[Fields.MANINST]] += crit + ","
-                        except KeyError:
-                            collisions[row[Fields.MANNAME],
-                                       row[Fields.MANINST]] = crit + ","
-
-        # This is a range criteria.  (Check that ranges are valid, that
-        # "unbounded" gets set to 0/+inf, ensure the criteria exists
-        # in the DB, then look for collisions.)
+    index = CriteriaIndex(db, exclude_manifests=exclude_manifests)
+    index.add(None, criteria)
+    return index.find_collisions().get(None, dict())
+
+
+def _check_colliding_manifest(criteria, columns, man_inst, db_criteria,
+                              collided, published_criteria=None):
+    """
+    Check that the criteria of a manifest/instance pair reported by
+    find_colliding_criteria() diverge from criteria (i.e. are not exactly the
+    same) and that their ranges do not collide.
+    Raises if: a range collides, or if the manifest has the same criteria as
+    criteria (SystemExit raised)
+    Args: criteria - Criteria object holding the criteria that is to be
+                     added/set for a manifest.
+          columns - all criteria column names in the database
+          man_inst - manifest name and instance tuple which collided
+          db_criteria - the criteria of man_inst, by column name
+          collided - comma-terminated string of the columns which collided
+          published_criteria - criteria already published for the manifest
+                               criteria is being appended to, or None
+    """
+    # iterate over every criteria in the database
+    for crit in columns:
+
+        # Get the criteria name (i.e. no MIN or MAX)
+        crit_name = crit.replace('MIN', '', 1).replace('MAX', '', 1)
+        # Set man_criterion to the key of the DB criteria or None
+        man_criterion = criteria[crit_name]
+
+        if man_criterion and crit.startswith('MIN'):
+            man_criterion = man_criterion[0]
+        elif man_criterion and crit.startswith('MAX'):
+            man_criterion = man_criterion[1]
+
+        # If man_criterion is still None, and if we're appending criteria
+        # to an already published manifest, look for criteria in the
+        # published set of criteria for the manifest we're appending to
+        # as well, because existing criteria might cause a collision,
+        # which we need to compare for.
+        if man_criterion is None and published_criteria is not None:
+            man_criterion = published_criteria[str(crit)]
+            # replace database NULL's with Python None
+            if man_criterion == '':
+                man_criterion = None
+
+        # set the database criteria
+        if db_criteria[str(crit)] == '':
+            # replace database NULL's with a Python None
+            db_criterion = None
         else:
-            # Clean-up NULL's and change "unbounded"s to 0 and
-            # really large numbers in case this Python does
-            # not support IEEE754.  Note "unbounded"s are already
-            # converted to lower case during manifest processing.
-            if man_criterion[0] == "unbounded":
-                man_criterion[0] = "0"
-            if man_criterion[1] == "unbounded":
-                man_criterion[1] = INFINITY
-            if crit == "mac":
-                # convert hex mac address (w/o colons) to a number
-                try:
-                    man_criterion[0] = long(str(man_criterion[0]).upper(), 16)
-                    man_criterion[1] = long(str(man_criterion[1]).upper(), 16)
-                except ValueError:
-                    raise SystemExit(_("Error:\tCriteria %s "
-                                       "is not a valid hexadecimal value") %
-                                     crit)
-            else:
-                # this is a decimal value
-                try:
-                    man_criterion = [long(str(man_criterion[0]).upper()),
-                                     long(str(man_criterion[1]).upper())]
-                except ValueError:
-                    raise SystemExit(_("Error:\tCriteria %s "
-                                       "is not a valid integer value") % crit)
-
-            # Check for a properly ordered range (with unbounded being 0 or
-            # Inf.) but ensure both are not unbounded.
-            # Check for:
-            #       a range of zero to inf -- not a valid range
-            #  and
-            #       min > max -- range order reversed
-            #
-            if (man_criterion[0] == 0 and man_criterion[1] == long(INFINITY)):
-                raise SystemExit(_("Error:\tCriteria %s is not a valid range, "
-                                   "MIN and MAX unbounded.") % crit)
-
-            if ((man_criterion[0] != 0 and
-                 man_criterion[1] != long(INFINITY)) and
-                (long(man_criterion[0]) > long(man_criterion[1]))):
-                raise SystemExit(_("Error:\tCriteria %s is not a valid range, "
-                                   "MIN > MAX.") % crit)
-            # check to see that this criteria exists in the database columns
-            man_crit = AIdb.getCriteria(db.getQueue(), onlyUsed=False,
-                                        strip=False)
-            if 'MIN' + crit not in man_crit and 'MAX' + crit not in man_crit:
-                raise SystemExit(_("Error:\tCriteria %s is not a "
-                                   "valid criteria!") % crit)
-            db_criteria = AIdb.getSpecificCriteria(
-                db.getQueue(), 'MIN' + crit, 'MAX' + crit,
-                provideManNameAndInstance=True,
-                excludeManifests=exclude_manifests)
-
-            # will iterate over a list of the form [manName, manInst, mincrit,
-            # maxcrit]
-            for row in db_criteria:
-                # arbitrarily large number in case this Python does
-                # not support IEEE754
-                db_criterion = ["0", INFINITY]
-
-                # now populate in valid database values (i.e. non-NULL values)
-                if row[Fields.MINCRIT]:
-                    db_criterion[0] = row[Fields.MINCRIT]
-                if row[Fields.MAXCRIT]:
-                    db_criterion[1] = row[Fields.MAXCRIT]
-                if crit == "mac":
-                    # use a hexadecimal conversion
-                    db_criterion = [long(str(db_criterion[0]), 16),
-                                    long(str(db_criterion[1]), 16)]
-                else:
-                    # these are decimal numbers
-                    db_criterion = [long(str(db_criterion[0])),
-                                    long(str(db_criterion[1]))]
-
-                # these three criteria can determine if there's a range overlap
-                if((man_criterion[1] >= db_criterion[0] and
-                   db_criterion[1] >= man_criterion[0]) or
-                   man_criterion[0] == db_criterion[1]):
-                    # range overlap so record the collision
-                    try:
-                        collisions[row[Fields.MANNAME],
-                                   row[Fields.MANINST]] += "MIN" + crit + ","
-                        collisions[row[Fields.MANNAME],
-                                   row[Fields.MANINST]] += "MAX" + crit + ","
-                    except KeyError:
-                        collisions[row[Fields.MANNAME],
-                                   row[Fields.MANINST]] = "MIN" + crit + ","
-                        collisions[row[Fields.MANNAME],
-                                   row[Fields.MANINST]] += "MAX" + crit + ","
-    return collisions
+            db_criterion = db_criteria[str(crit)]
+
+        # Replace unbounded's in the criteria (i.e. 0/+inf)
+        # with a Python None.
+        if isinstance(man_criterion, basestring) and \
+           man_criterion == "unbounded":
+            man_criterion = None
+
+        # check to determine if this is a range collision by using
+        # collisions and if not are the manifests divergent
+
+        if((crit.startswith('MIN') and
+            collided.find(crit + ",") != -1) or
+           (crit.startswith('MAX') and
+            collided.find(crit + ",") != -1)
+          ):
+            if str(db_criterion).lower() != str(man_criterion).lower():
+                raise SystemExit(_("Error:\tManifest has a range "
+                                   "collision with manifest:%s/%i"
+                                   "\n\tin criteria: %s!") %
+                                 (man_inst[0], man_inst[1],
+                                  crit.replace('MIN', '', 1).
+                                  replace('MAX', '', 1)))
+
+        # Either the range did not collide or this is not a range
+        # criteria.  (If the value of this criteria in the db does
+        # not equal the value of this criteria for the set of criteria
+        # to check, we can break out knowing we diverge for this
+        # manifest/instance)
+        elif not db_criterion and not man_criterion:
+            # Neither the value for this criteria in the db nor
+            # the value for for this criteria in the given set of
+            # criteria to check are populated.  Loop around to
+            # check the next criteria.
+            continue
+        elif not db_criterion or not man_criterion:
+            # One of the two are not populated, we can break knowing
+            # they're different.
+            break
+        else:
+            # Both are populated.  If none of values in the list for
+            # this criteria to be added are equal to any of the values
+            # in the list for this criteria from the db, there will be
+            # no collision.  We can break out.
+            if not [value for value in man_criterion if \
+                AIdb.is_in_list(crit, value, str(db_criterion), None)]:
+                break
+
+    # end of for loop and we never broke out (collision)
+    else:
+        raise SystemExit(_("Error:\tManifest has same criteria as " +
+                           "manifest: %s/%i!") %
+                         (man_inst[0], man_inst[1]))
 
 
 def find_colliding_manifests(criteria, db, collisions, append_manifest=None):
@@ -406,12 +776,15 @@ def find_colliding_manifests(criteria, db, collisions, append_manifest=None):
 
     # If we're appending criteria to an already published manifest, get a
     # dictionary of the criteria that's already published for that manifest.
+    published_criteria = None
     if append_manifest is not None:
         published_criteria = AIdb.getManifestCriteria(append_manifest, 0,
                                                       db.getQueue(),
                                                       humanOutput=True,
                                                       onlyUsed=False)
 
+    columns = AIdb.getCriteria(db.getQueue(), onlyUsed=False, strip=False)
+
     # check every manifest in collisions to see if manifest collides (either
     # identical criteria, or overlaping ranges)
     for man_inst in collisions:
@@ -421,90 +794,67 @@ def find_colliding_manifests(criteria, db, collisions, append_manifest=None):
                                                db.getQueue(),
                                                humanOutput=True,
                                                onlyUsed=False)
+        _check_colliding_manifest(criteria, columns, man_inst, db_criteria,
+                                  collisions[man_inst], published_criteria)
 
-        # iterate over every criteria in the database
-        for crit in AIdb.getCriteria(db.getQueue(),
-                                     onlyUsed=False, strip=False):
-
-            # Get the criteria name (i.e. no MIN or MAX)
-            crit_name = crit.replace('MIN', '', 1).replace('MAX', '', 1)
-            # Set man_criterion to the key of the DB criteria or None
-            man_criterion = criteria[crit_name]
-
-            if man_criterion and crit.startswith('MIN'):
-                man_criterion = man_criterion[0]
-            elif man_criterion and crit.startswith('MAX'):
-                man_criterion = man_criterion[1]
-
-            # If man_criterion is still None, and if we're appending criteria
-            # to an already published manifest, look for criteria in the
-            # published set of criteria for the manifest we're appending to
-            # as well, because existing criteria might cause a collision,
-            # which we need to compare for.
-            if man_criterion is None and append_manifest is not None:
-                man_criterion = published_criteria[str(crit)]
-                # replace database NULL's with Python None
-                if man_criterion == '':
-                    man_criterion = None
-
-            # set the database criteria
-            if db_criteria[str(crit)] == '':
-                # replace database NULL's with a Python None
-                db_criterion = None
-            else:
-                db_criterion = db_criteria[str(crit)]
 
-            # Replace unbounded's in the criteria (i.e. 0/+inf)
-            # with a Python None.
-            if isinstance(man_criterion, basestring) and \
-               man_criterion == "unbounded":
-                man_criterion = None
+def publish_manifests(service, files_list):
+    '''
+    Publish manifests, associating them with an install service.  The
+    criteria of all the manifests are checked for collisions, with the
+    manifests already published and with each other, before any of them is
+    added.  They are then added to the database in a single transaction.
+    Args: service - AIService object for the install service
+          files_list - list of DataFiles objects, one for each manifest,
+                       which share the service's database
+    Raises: SystemExit on a name or criteria collision, or a database error
 
-            # check to determine if this is a range collision by using
-            # collisions and if not are the manifests divergent
-
-            if((crit.startswith('MIN') and
-                collisions[man_inst].find(crit + ",") != -1) or
-               (crit.startswith('MAX') and
-                collisions[man_inst].find(crit + ",") != -1)
-              ):
-                if str(db_criterion).lower() != str(man_criterion).lower():
-                    raise SystemExit(_("Error:\tManifest has a range "
-                                       "collision with manifest:%s/%i"
-                                       "\n\tin criteria: %s!") %
-                                     (man_inst[0], man_inst[1],
-                                      crit.replace('MIN', '', 1).
-                                      replace('MAX', '', 1)))
-
-            # Either the range did not collide or this is not a range
-            # criteria.  (If the value of this criteria in the db does
-            # not equal the value of this criteria for the set of criteria
-            # to check, we can break out knowing we diverge for this
-            # manifest/instance)
-            elif not db_criterion and not man_criterion:
-                # Neither the value for this criteria in the db nor
-                # the value for for this criteria in the given set of
-                # criteria to check are populated.  Loop around to
-                # check the next criteria.
-                continue
-            elif not db_criterion or not man_criterion:
-                # One of the two are not populated, we can break knowing
-                # they're different.
-                break
-            else:
-                # Both are populated.  If none of values in the list for
-                # this criteria to be added are equal to any of the values
-                # in the list for this criteria from the db, there will be
-                # no collision.  We can break out.
-                if not [value for value in man_criterion if \
-                    AIdb.is_in_list(crit, value, str(db_criterion), None)]:
-                    break
-
-        # end of for loop and we never broke out (collision)
-        else:
-            raise SystemExit(_("Error:\tManifest has same criteria as " +
-                               "manifest: %s/%i!") %
-                             (man_inst[0], man_inst[1]))
+    '''
+    names = set()
+    for data in files_list:
+        # Disallow multiple manifests or scripts with the same mname.
+        manifest_path = os.path.join(service.manifest_dir, data.manifest_name)
+        if os.path.exists(manifest_path) or data.manifest_name in names:
+            raise SystemExit(_("Error:\tName %s is already registered with "
+                               "this service.") % data.manifest_name)
+        names.add(data.manifest_name)
+
+    defaults = [data for data in files_list if data.set_as_default]
+    if len(defaults) > 1:
+        raise SystemExit(_("Error:\tOnly one manifest may be set as "
+                           "default."))
+
+    database = files_list[0].database
+    index = CriteriaIndex(database)
+    instances = dict()
+    for data in files_list:
+        name = AIdb.sanitizeSQL(data.manifest_name)
+        instances[data] = index.num_instances(name)
+        # if criteria are provided, make sure they are a unique set.
+        if data.criteria:
+            index.add((name, instances[data]), data.criteria)
+    index.check()
+
+    # Add all manifests to the database, whether default or not, and whether
+    # they have criteria or not.
+    query = AIdb.DBtransaction([df.insert_SQL_query(data, instances[data],
+                                                    index.columns)
+                                for data in files_list])
+    database.getQueue().put(query)
+    query.waitAns()
+    # in case there's an error call the response function (which will print
+    # the error)
+    if query.getResponse() is None:
+        raise SystemExit(1)
+
+    for data in files_list:
+        # move the manifest into place
+        df.place_manifest(data, os.path.join(service.manifest_dir,
+                                             data.manifest_name))
+
+    # if we have a default manifest do default manifest handling
+    for data in defaults:
+        service.set_default_manifest(data.manifest_name)
 
 
 def do_publish_manifest(cmd_options=None):
@@ -518,30 +868,10 @@ def do_publish_manifest(cmd_options=None):
                            "this command."))
 
     # load in all the options and file data.  Validate proper manifests.
-    data = parse_options(DO_CREATE, cmd_options)
-
-    service = AIService(data.service_name)
-    # Disallow multiple manifests or scripts with the same mname.
-    manifest_path = os.path.join(service.manifest_dir, data.manifest_name)
-    if os.path.exists(manifest_path):
-        raise SystemExit(_("Error:\tName %s is already registered with "
-                           "this service.") % data.manifest_name)
-
-    # if criteria are provided, make sure they are a unique set.
-    if data.criteria:
-        find_colliding_manifests(data.criteria, data.database,
-            find_colliding_criteria(data.criteria, data.database))
+    files_list = parse_options(DO_CREATE, cmd_options)
 
-    # Add all manifests to the database, whether default or not, and whether
-    # they have criteria or not.
-    df.insert_SQL(data)
-
-    # move the manifest into place
-    df.place_manifest(data, manifest_path)
-
-    # if we have a default manifest do default manifest handling
-    if data.set_as_default:
-        service.set_default_manifest(data.manifest_name)
+    service = AIService(files_list[0].service_name)
+    publish_manifests(service, files_list)
 
 
 def do_update_manifest(cmd_options=None):
@@ -555,7 +885,7 @@ def do_update_manifest(cmd_options=None):
                            "this command."))
 
     # load in all the options and file data.  Validate proper manifests.
-    data = parse_options(DO_UPDATE, cmd_options)
+    data = parse_options(DO_UPDATE, cmd_options)[0]
 
     service = AIService(data.service_name)
     manifest_path = os.path.join(service.manifest_dir, data.manifest_name)
@@ -19,7 +19,7 @@
 #
 # CDDL HEADER END
 #
-# Copyright (c) 2010, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 """
 AI set-criteria
 """
@@ -28,6 +28,8 @@ import logging
 import os
 import sys
 
+from collections import Counter
+
 import lxml.etree
 
 import osol_install.auto_install.AI_database as AIdb
@@ -50,7 +52,8 @@ def get_usage():
              '\t\t-n|--service <svcname>\n'
              '\t\t-c|--criteria <criteria=value|range> ... |\n'
              '\t\t-C|--criteria-file <criteria.xml> |\n'
-             '\t\t-a|--append-criteria <criteria=value|range> ... ')
+             '\t\t-a|--append-criteria <criteria=value|range> ... |\n'
+             '\t\t-b|--batch-file <batch file>')
 
 
 def parse_options(cmd_options=None):
@@ -67,21 +70,10 @@ def parse_options(cmd_options=None):
     usage = '\n' + get_usage()
 
     parser = OptionParser(usage=usage)
-    parser.add_option("-a", "--append-criteria", dest="criteria_a",
-                      action="append", default=list(),
-                      help=_("Specify criteria to append: "
-                      "<-a criteria=value|range> ..."),
-                      metavar="CRITERIA")
-    parser.add_option("-c", "--criteria", dest="criteria_c", action="append",
-                      default=list(), help=_("Specify criteria: "
-                      "<-c criteria=value|range> ..."),
-                      metavar="CRITERIA")
-    parser.add_option("-C", "--criteria-file", dest="criteria_file",
-                      default=None, help=_("Specify name of criteria "
-                      "XML file."))
-    parser.add_option("-m", "--manifest", dest="manifest_name",
-                      default=None, help=_("Specify name of manifest "
-                      "to set criteria for."))
+    _add_criteria_options(parser)
+    parser.add_option("-b", "--batch-file", dest="batch_file",
+                      default=None, help=_("Specify name of file listing "
+                      "the manifests to set criteria for."))
     parser.add_option("-n", "--service", dest="service_name",
                       default=None, help=_("Specify name of install "
                       "service."))
@@ -99,12 +91,21 @@ def parse_options(cmd_options=None):
     # an AI manifest name
     if options.service_name is None:
         parser.error(_("A service name is required."))
-    # Either criteria for a manifest or profile is being set
-    if not options.profile_name and options.manifest_name is None:
-        parser.error(_("Must supply a manifest name and/or profile names."))
-    # check for one of -a, -c, and -C
-    if not (options.criteria_a or options.criteria_c or options.criteria_file):
-        parser.error(_("Must specify either -a, -c or -C."))
+
+    if options.batch_file:
+        # the manifests and their criteria are all given by the batch file
+        if options.profile_name or options.manifest_name or \
+            options.criteria_a or options.criteria_c or options.criteria_file:
+            parser.error(_("Options used are mutually exclusive."))
+        if not os.path.exists(options.batch_file):
+            parser.error(_("Unable to find batch file: %s") %
+                         options.batch_file)
+    else:
+        # Either criteria for a manifest or profile is being set
+        if not options.profile_name and options.manifest_name is None:
+            parser.error(_("Must supply a manifest name and/or profile "
+                           "names."))
+        _check_criteria_options(parser, options)
 
     # validate service name
     try:
@@ -114,16 +115,69 @@ def parse_options(cmd_options=None):
 
     logging.debug("options = %s", options)
 
+    return options
+
+
+def _add_criteria_options(parser):
+    """
+    Add the options giving a manifest and its criteria to parser
+    """
+    parser.add_option("-a", "--append-criteria", dest="criteria_a",
+                      action="append", default=list(),
+                      help=_("Specify criteria to append: "
+                      "<-a criteria=value|range> ..."),
+                      metavar="CRITERIA")
+    parser.add_option("-c", "--criteria", dest="criteria_c", action="append",
+                      default=list(), help=_("Specify criteria: "
+                      "<-c criteria=value|range> ..."),
+                      metavar="CRITERIA")
+    parser.add_option("-C", "--criteria-file", dest="criteria_file",
+                      default=None, help=_("Specify name of criteria "
+                      "XML file."))
+    parser.add_option("-m", "--manifest", dest="manifest_name",
+                      default=None, help=_("Specify name of manifest "
+                      "to set criteria for."))
+
+
+def _check_criteria_options(parser, options):
+    """
+    Check that exactly one of the -a, -c and -C options was given
+    """
+    # check for one of -a, -c, and -C
+    if not (options.criteria_a or options.criteria_c or options.criteria_file):
+        parser.error(_("Must specify either -a, -c or -C."))
+
     # check that we aren't mixing -a, -c, and -C
     if (options.criteria_a and options.criteria_c) or \
         (options.criteria_a and options.criteria_file) or \
         (options.criteria_c and options.criteria_file):
         parser.error(_("Options used are mutually exclusive."))
 
+
+def _get_batch_parser():
+    """
+    Returns: an OptionParser for a line of a set-criteria batch file, which
+             holds the -m option and one of the -a, -c or -C options for one
+             manifest
+    """
+    parser = OptionParser(usage='\n' + get_usage())
+    _add_criteria_options(parser)
+    return parser
+
+
+def _check_batch_options(parser, options):
+    """
+    Check the options from a line of a set-criteria batch file
+    Returns: the options
+    """
+    if options.manifest_name is None:
+        parser.error(_("A manifest name is required."))
+    _check_criteria_options(parser, options)
     return options
 
 
-def check_published_manifest(service, dbn, manifest_name):
+def check_published_manifest(service, dbn, manifest_name,
+                             manifest_names=None):
     """
     Used for checking that a manifest is already published in the
     install service specified.  Checks to make sure manifest
@@ -133,13 +187,18 @@ def check_published_manifest(service, dbn, manifest_name):
           service - service object for service
           dbn - dbn object of install service to check against.
           manifest_name - name of manifest to check.
+          manifest_names - names of all manifests in the DB, if already
+                           known (e.g. when checking many manifests).
     Postconditions: None
     Returns: True if manifest exists in install service
              False if manifest does not exist.
     """
 
+    if manifest_names is None:
+        manifest_names = AIdb.getManNames(dbn.getQueue())
+
     # Check if manifest exists in the service's criteria DB.
-    if AIdb.sanitizeSQL(manifest_name) not in AIdb.getManNames(dbn.getQueue()):
+    if AIdb.sanitizeSQL(manifest_name) not in manifest_names:
         print(_("Error: install service does not contain the specified "
                 "manifest: %s") % manifest_name)
         return False
@@ -164,17 +223,46 @@ def set_criteria(criteria, iname, dbn, table, append=False):
     if append is False -- completely remove all criteria already
     set for the manifest, and use only the criteria specified.
     """
+    query = set_criteria_query(criteria, iname, dbn, table, append)
+
+    # update the DB
+    query = AIdb.DBrequest(query, commit=True)
+    dbn.getQueue().put(query)
+    query.waitAns()
+    # in case there's an error call the response function (which
+    # will print the error)
+    query.getResponse()
+
+
+def set_criteria_query(criteria, iname, dbn, table, append=False,
+                       columns=None):
+    """
+    Build the UPDATE statement setting a manifest's or profile's record in
+    the criteria database to the criteria provided (see set_criteria()).
+    Args: columns - the criteria column names of table, as returned by
+                    AIdb.getCriteria(onlyUsed=False, strip=False).  Looked
+                    up in the database if not given.
+    Returns: the SQL statement as a string
+    """
+    if columns is None:
+        columns = AIdb.getCriteria(dbn.getQueue(), table=table,
+                                   onlyUsed=False, strip=False)
+    range_crits = set(col.replace('MIN', '', 1) for col in columns
+                      if col.startswith('MIN'))
 
     # Build a list of criteria nvpairs to update
     nvpairs = list()
 
     # we need to fill in the criteria or NULLs for each criteria the database
     # supports (so iterate over each criteria)
-    for crit in AIdb.getCriteria(dbn.getQueue(), table=table, onlyUsed=False,
-                                 strip=True):
+    for col in columns:
+        # for range criteria trigger on the MIN column
+        if col.startswith('MAX'):
+            continue
+        crit = col.replace('MIN', '', 1)
 
         # Determine if this crit is a range criteria or not.
-        is_range_crit = AIdb.isRangeCriteria(dbn.getQueue(), crit)
+        is_range_crit = crit in range_crits
 
         # Get the value from the manifest
         values = criteria[crit]
@@ -214,13 +302,135 @@ def set_criteria(criteria, iname, dbn, table, append=False):
     query = "UPDATE " + table + " SET " + ",".join(nvpairs) + \
             " WHERE name='" + iname + "'"
 
-    # update the DB
-    query = AIdb.DBrequest(query, commit=True)
+    return query
+
+
+def _appended_criteria(criteria, published, columns):
+    """
+    Returns: a dictionary of the criteria a manifest will have once criteria
+             are appended to its published criteria, as
+             {criteria name: list of values or [MIN, MAX], or None}
+    Args: criteria - Criteria object holding the criteria to append
+          published - the manifest's published criteria by column name, as
+                      returned by AIdb.getManifestCriteria()
+          columns - all criteria column names in the database
+    """
+    merged = dict()
+    for col in columns:
+        if col.startswith('MAX'):
+            continue
+        crit = col.replace('MIN', '', 1)
+        if criteria[crit] is not None:
+            merged[crit] = criteria[crit]
+        elif published is None:
+            merged[crit] = None
+        elif col.startswith('MIN'):
+            bounds = [published[col], published['MAX' + crit]]
+            if bounds[0] in (None, '') and bounds[1] in (None, ''):
+                merged[crit] = None
+            else:
+                # database NULL's are unbounded
+                merged[crit] = [str(bound) if bound not in (None, '')
+                                else "unbounded" for bound in bounds]
+        elif published[col]:
+            merged[crit] = str(published[col]).split()
+        else:
+            merged[crit] = None
+    return merged
+
+
+def set_criteria_batch(dbn, entries):
+    """
+    Set the criteria of several manifests at once.  The new criteria of all
+    the manifests are checked for collisions, with the other manifests of
+    the service and with each other, before the database is updated in a
+    single transaction.
+    Args: dbn - database object of the install service
+          entries - list of (manifest name, Criteria object, append) tuples
+    Raises: SystemExit on a criteria collision or database error
+    """
+    names = [name for (name, criteria, append) in entries]
+    counts = Counter(names)
+    for name in names:
+        if counts[name] > 1:
+            raise SystemExit(_("Error:\tManifest %s is listed more than "
+                               "once.") % name)
+
+    # the manifests' own published criteria are being replaced so
+    # must not be counted as collisions
+    index = pub_man.CriteriaIndex(dbn, exclude_manifests=names)
+    for (name, criteria, append) in entries:
+        if append:
+            published = AIdb.getManifestCriteria(name, 0, dbn.getQueue(),
+                                                 humanOutput=True,
+                                                 onlyUsed=False)
+            criteria = _appended_criteria(criteria, published, index.columns)
+        index.add((name, 0), criteria)
+    index.check()
+
+    query = AIdb.DBtransaction([set_criteria_query(new_criteria, name, dbn,
+                                                   AIdb.MANIFESTS_TABLE,
+                                                   append, index.columns)
+                                for (name, new_criteria, append) in entries])
     dbn.getQueue().put(query)
     query.waitAns()
     # in case there's an error call the response function (which
     # will print the error)
-    query.getResponse()
+    if query.getResponse() is None:
+        raise SystemExit(1)
+
+
+def _get_criteria_root(options, dbn):
+    """
+    Process and validate criteria from -a, -c, or -C
+    Returns: the XML DOM of the criteria
+    Raises: SystemExit if the criteria are not valid
+    """
+    try:
+        if options.criteria_file:
+            root = df.verifyCriteria(df.DataFiles.criteriaSchema,
+                    options.criteria_file, dbn, AIdb.MANIFESTS_TABLE)
+        elif options.criteria_a:
+            criteria_dict = pub_man.criteria_to_dict(options.criteria_a)
+            root = df.verifyCriteriaDict(df.DataFiles.criteriaSchema,
+                    criteria_dict, dbn, AIdb.MANIFESTS_TABLE)
+        elif options.criteria_c:
+            criteria_dict = pub_man.criteria_to_dict(options.criteria_c)
+            root = df.verifyCriteriaDict(df.DataFiles.criteriaSchema,
+                    criteria_dict, dbn, AIdb.MANIFESTS_TABLE)
+        else:
+            raise SystemExit("Error: Missing required criteria.")
+
+    except (AssertionError, IOError, ValueError) as err:
+        raise SystemExit(err)
+    except (lxml.etree.LxmlError) as err:
+        raise SystemExit(_("Error:\tmanifest error: %s") % err)
+    return root
+
+
+def _do_set_criteria_batch(service, dbn, batch_file):
+    """
+    Modify the criteria associated with the manifests listed in batch_file.
+    """
+    entries = pub_man.parse_batch_file(batch_file, _get_batch_parser,
+                                       _check_batch_options)
+
+    # Check to make sure that the manifests whose criteria we're
+    # updating exist in the install service.
+    manifest_names = set(AIdb.getManNames(dbn.getQueue()))
+    batch = list()
+    for options in entries:
+        if not check_published_manifest(service, dbn, options.manifest_name,
+                                        manifest_names):
+            raise SystemExit(1)
+        batch.append((options.manifest_name,
+                      df.Criteria(_get_criteria_root(options, dbn)),
+                      bool(options.criteria_a)))
+
+    set_criteria_batch(dbn, batch)
+    for options in entries:
+        print >> sys.stderr, _("Criteria updated for manifest %s.") % \
+                options.manifest_name
 
 
 def do_set_criteria(cmd_options=None):
@@ -251,27 +461,13 @@ def do_set_criteria(cmd_options=None):
         check_published_manifest(service, dbn, options.manifest_name)):
         raise SystemExit(1)
 
+    if options.batch_file:
+        _do_set_criteria_batch(service, dbn, options.batch_file)
+        return
+
     # Process and validate criteria from -a, -c, or -C, and store
     # store the criteria in a Criteria object.
-    try:
-        if options.criteria_file:
-            root = df.verifyCriteria(df.DataFiles.criteriaSchema,
-                    options.criteria_file, dbn, AIdb.MANIFESTS_TABLE)
-        elif options.criteria_a:
-            criteria_dict = pub_man.criteria_to_dict(options.criteria_a)
-            root = df.verifyCriteriaDict(df.DataFiles.criteriaSchema,
-                    criteria_dict, dbn, AIdb.MANIFESTS_TABLE)
-        elif options.criteria_c:
-            criteria_dict = pub_man.criteria_to_dict(options.criteria_c)
-            root = df.verifyCriteriaDict(df.DataFiles.criteriaSchema,
-                    criteria_dict, dbn, AIdb.MANIFESTS_TABLE)
-        else:
-            raise SystemExit("Error: Missing required criteria.")
-
-    except (AssertionError, IOError, ValueError) as err:
-        raise SystemExit(err)
-    except (lxml.etree.LxmlError) as err:
-        raise SystemExit(_("Error:\tmanifest error: %s") % err)
+    root = _get_criteria_root(options, dbn)
 
     # Instantiate a Criteria object with the XML DOM of the criteria.
     criteria = df.Criteria(root)
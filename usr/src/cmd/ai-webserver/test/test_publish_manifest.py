@@ -19,7 +19,7 @@
 #
 # CDDL HEADER END
 #
-# Copyright (c) 2010, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 '''
@@ -35,6 +35,8 @@ import os
 import tempfile
 import unittest
 
+from sqlite3 import dbapi2 as sqlite3
+
 import osol_install.auto_install.AI_database as AIdb
 import osol_install.auto_install.publish_manifest as publish_manifest
 import osol_install.libaiscf as smf
@@ -53,6 +55,14 @@ def do_nothing(*args, **kwargs):
     pass
 
 
+def criteria(values):
+    '''Returns a dictionary of values for every criteria, None if unset'''
+    crits = dict.fromkeys(["arch", "hostname", "mac", "ipv4", "cpu",
+                           "platform", "network", "mem", "zonename"])
+    crits.update(values)
+    return crits
+
+
 class MockGetCriteria(object):
     '''Class for mock getCriteria '''
     def __init__(self):
@@ -405,5 +415,155 @@ class FindCollidingCriteria(unittest.TestCase):
                           criteria, self.files.database)
 
 
+
+class CriteriaIndexTest(unittest.TestCase):
+    '''Tests for CriteriaIndex'''
+
+    @classmethod
+    def setUpClass(cls):
+        '''unit test set up'''
+        dbname = tempfile.NamedTemporaryFile(dir="/tmp", delete=False)
+        cls.dbname = dbname.name
+        cls.db = sqlite3.connect(dbname.name, isolation_level=None)
+
+        # create db
+        cls.db.execute("CREATE TABLE manifests("
+                    "name TEXT, instance INTEGER, arch TEXT,"
+                    "MINmac INTEGER, MAXmac INTEGER, MINipv4 INTEGER,"
+                    "MAXipv4 INTEGER, cpu TEXT, platform TEXT, "
+                    "MINnetwork INTEGER, MAXnetwork INTEGER,"
+                    "MINmem INTEGER, MAXmem INTEGER, zonename TEXT)")
+
+        #  add manifests to db
+        cls.db.execute("INSERT INTO manifests VALUES"
+                   "('mac_man',0,NULL,x'AABBCCDDEE00',x'AABBCCDDEEFF',"
+                   "NULL,NULL,NULL,NULL,NULL,NULL,NULL,NULL,NULL)")
+        cls.db.execute("INSERT INTO manifests VALUES"
+                   "('arch_man',0,'i86pc sparc',NULL,NULL,"
+                   "NULL,NULL,NULL,NULL,NULL,NULL,NULL,NULL,NULL)")
+        cls.db.execute("INSERT INTO manifests VALUES"
+                   "('mem_man',0,NULL,NULL,NULL,"
+                   "NULL,NULL,NULL,NULL,NULL,NULL,1024,NULL,NULL)")
+        cls.db.execute("INSERT INTO manifests VALUES"
+                   "('zone_man',0,NULL,NULL,NULL,"
+                   "NULL,NULL,NULL,NULL,NULL,NULL,NULL,NULL,'Zone1')")
+        cls.db.execute("INSERT INTO manifests VALUES"
+                   "('default',0,NULL,NULL,NULL,"
+                   "NULL,NULL,NULL,NULL,NULL,NULL,NULL,NULL,NULL)")
+        cls.aidb = AIdb.DB(cls.dbname, commit=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        '''Class-level variable teardown'''
+        cls.db.close()
+        os.remove(cls.dbname)
+
+    def test_range_collision(self):
+        '''Ensure overlapping mac range collides'''
+        index = publish_manifest.CriteriaIndex(self.aidb)
+        index.add(('new', 0),
+                  criteria({'mac': ['AABBCCDDEE10', 'AABBCCDDEE20']}))
+        self.assertEqual(index.find_collisions(),
+                         {('new', 0): {('mac_man', 0): 'MINmac,MAXmac,'}})
+        self.assertRaises(SystemExit, index.check)
+
+    def test_range_no_collision(self):
+        '''Ensure disjoint ranges and unbounded ranges are handled'''
+        index = publish_manifest.CriteriaIndex(self.aidb)
+        index.add(('new', 0),
+                  criteria({'mac': ['AABBCCDDEF00', 'unbounded']}))
+        index.add(('new2', 0), criteria({'mem': ['unbounded', '1023']}))
+        self.assertEqual(index.find_collisions(), {})
+        index.check()
+
+    def test_unbounded_collision(self):
+        '''Ensure range unbounded in the database collides'''
+        index = publish_manifest.CriteriaIndex(self.aidb)
+        index.add(('new', 0), criteria({'mem': ['4096', '8192']}))
+        self.assertEqual(index.find_collisions(),
+                         {('new', 0): {('mem_man', 0): 'MINmem,MAXmem,'}})
+        self.assertRaises(SystemExit, index.check)
+
+    def test_value_collision(self):
+        '''Ensure same value criteria collide, ignoring case'''
+        index = publish_manifest.CriteriaIndex(self.aidb)
+        index.add(('new', 0), criteria({'arch': ['SPARC']}))
+        self.assertEqual(index.find_collisions(),
+                         {('new', 0): {('arch_man', 0): 'arch,'}})
+        self.assertRaises(SystemExit, index.check)
+
+    def test_value_divergent(self):
+        '''Ensure colliding value with other criteria set is allowed'''
+        index = publish_manifest.CriteriaIndex(self.aidb)
+        index.add(('new', 0),
+                  criteria({'arch': ['sparc'], 'cpu': ['sparc']}))
+        self.assertTrue(('new', 0) in index.find_collisions())
+        index.check()
+
+    def test_case_sensitive_value(self):
+        '''Ensure zonename values are compared case sensitively'''
+        index = publish_manifest.CriteriaIndex(self.aidb)
+        index.add(('new', 0), criteria({'zonename': ['zone1']}))
+        self.assertEqual(index.find_collisions(), {})
+        index.add(('new2', 0), criteria({'zonename': ['Zone1']}))
+        self.assertRaises(SystemExit, index.check)
+
+    def test_batch_collisions(self):
+        '''Ensure criteria sets of a batch are checked against each other'''
+        index = publish_manifest.CriteriaIndex(self.aidb)
+        index.add(('new1', 0), criteria({'mem': ['100', '200']}))
+        index.add(('new2', 0), criteria({'mem': ['512', '1023'],
+                                            'cpu': ['i386']}))
+        index.add(('new3', 0), criteria({'mem': ['150', '300']}))
+        self.assertEqual(index.find_collisions(),
+                         {('new3', 0): {('new1', 0): 'MINmem,MAXmem,'}})
+        self.assertRaises(SystemExit, index.check)
+
+        index = publish_manifest.CriteriaIndex(self.aidb)
+        index.add(('new1', 0), criteria({'cpu': ['i386', 'sparc']}))
+        index.add(('new2', 0), criteria({'cpu': ['SPARC']}))
+        self.assertEqual(index.find_collisions(),
+                         {('new2', 0): {('new1', 0): 'cpu,'}})
+        self.assertRaises(SystemExit, index.check)
+
+    def test_exclude_manifests(self):
+        '''Ensure excluded manifests are ignored'''
+        index = publish_manifest.CriteriaIndex(self.aidb,
+                                               exclude_manifests=['mac_man'])
+        index.add(('mac_man', 0),
+                  criteria({'mac': ['AABBCCDDEE10', 'AABBCCDDEE20']}))
+        self.assertEqual(index.find_collisions(), {})
+        self.assertEqual(index.num_instances('mac_man'), 0)
+        self.assertEqual(index.num_instances('arch_man'), 1)
+
+    def test_invalid_criteria(self):
+        '''Ensure unknown criteria and bad ranges are caught'''
+        index = publish_manifest.CriteriaIndex(self.aidb)
+        self.assertRaises(SystemExit, index.add, ('new', 0),
+                          criteria({'nosuchcrit': ['x']}))
+        self.assertRaises(SystemExit, index.add, ('new', 0),
+                          criteria({'mem': ['2048', '1024']}))
+        self.assertRaises(SystemExit, index.add, ('new', 0),
+                          criteria({'mem': ['unbounded', 'unbounded']}))
+
+    def test_find_colliding_criteria(self):
+        '''Ensure find_colliding_criteria reports database collisions'''
+        collisions = publish_manifest.find_colliding_criteria(
+            criteria({'mac': ['AABBCCDDEEFF', 'AABBCCDDEEFF'],
+                      'arch': ['i86pc']}), self.aidb)
+        self.assertEqual(collisions, {('mac_man', 0): 'MINmac,MAXmac,',
+                                      ('arch_man', 0): 'arch,'})
+
+    def test_transaction_rollback(self):
+        '''Ensure a failing transaction adds none of its rows'''
+        query = AIdb.DBtransaction([
+            "INSERT INTO manifests (name, instance) VALUES ('txn', 0)",
+            "INSERT INTO nosuchtable VALUES ('txn', 0)"])
+        self.aidb.getQueue().put(query)
+        query.waitAns()
+        self.assertEqual(query.getResponse(), None)
+        self.assertEqual(AIdb.numInstances('txn', self.aidb.getQueue()), 0)
+
+
 if __name__ == '__main__':
     unittest.main()
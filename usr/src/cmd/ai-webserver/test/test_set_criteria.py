@@ -19,7 +19,7 @@
 #
 # CDDL HEADER END
 #
-# Copyright (c) 2010, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 '''
@@ -30,8 +30,12 @@ must be rebuilt for these tests to pick up any changes in the tested code.
 '''
 
 import gettext
+import os
 import tempfile
 import unittest
+
+from sqlite3 import dbapi2 as sqlite3
+
 import osol_install.auto_install.AI_database as AIdb
 import osol_install.auto_install.set_criteria as set_criteria
 
@@ -73,8 +77,9 @@ class MockGetCriteria(object):
     '''Class for mock getCriteria '''
     def __init__(self):
         self.crit_stripped = ["arch", "mem", "ipv4", "mac"]
-        self.crit_unstripped = ["MINmem", "MINipv4", "MINmac",
-                                "MAXmem", "MAXipv4", "MAXmac", "arch"]
+        # in table order, as the stripped names are
+        self.crit_unstripped = ["arch", "MINmem", "MAXmem", "MINipv4",
+                                "MAXipv4", "MINmac", "MAXmac"]
 
     def __call__(self, queue, table=AIdb.MANIFESTS_TABLE, onlyUsed=False,
             strip=False):
@@ -331,5 +336,94 @@ class ParseOptions(unittest.TestCase):
         self.assertEquals(exp_options['manifest_name'], options.manifest_name) 
         self.assertEquals(exp_options['criteria_file'], options.criteria_file)
 
+
+class SetCriteriaBatch(unittest.TestCase):
+    '''Tests for set_criteria_batch with a real database'''
+
+    # more manifests than SQLite's maximum expression depth of 1000
+    NUM_MANIFESTS = 1200
+
+    def setUp(self):
+        '''unit test set up'''
+        dbname = tempfile.NamedTemporaryFile(dir="/tmp", delete=False)
+        self.dbname = dbname.name
+        self.db = sqlite3.connect(dbname.name, isolation_level=None)
+        self.db.execute("CREATE TABLE manifests(name TEXT, instance INTEGER, "
+                        "arch TEXT, MINmem INTEGER, MAXmem INTEGER)")
+        self.db.execute("INSERT INTO manifests VALUES"
+                        "('other', 0, NULL, 50, 60)")
+        for num in xrange(self.NUM_MANIFESTS):
+            self.db.execute("INSERT INTO manifests VALUES"
+                            "('man%d', 0, NULL, %d, %d)" %
+                            (num, 100 + num * 10, 105 + num * 10))
+        self.aidb = AIdb.DB(self.dbname, commit=True)
+        self.names = ["man%d" % num for num in xrange(self.NUM_MANIFESTS)]
+
+    def tearDown(self):
+        '''unit test tear down'''
+        self.db.close()
+        os.remove(self.dbname)
+
+    def mem(self, name):
+        '''Returns the MINmem and MAXmem of manifest name in the DB'''
+        return self.db.execute("SELECT MINmem, MAXmem FROM manifests "
+                               "WHERE name = '%s'" % name).fetchone()
+
+    def test_exclude_many_names(self):
+        '''Ensure all rows but those excluded are read'''
+        rows = AIdb.getAllTableCriteria(self.aidb.getQueue(),
+                                        excludeNames=self.names)
+        self.assertEqual([row['name'] for row in rows], ['other'])
+
+    def test_batch(self):
+        '''Ensure a batch of many manifests is set'''
+        # the manifests' own published criteria do not collide
+        entries = [(name, {'arch': None, 'mem': [str(105 + num * 10),
+                                                 str(108 + num * 10)]},
+                    False)
+                   for num, name in enumerate(self.names)]
+        set_criteria.set_criteria_batch(self.aidb, entries)
+        self.assertEqual(self.mem('man0'), (105, 108))
+        self.assertEqual(self.mem('man1199'), (12095, 12098))
+        self.assertEqual(self.mem('other'), (50, 60))
+
+    def test_batch_collision(self):
+        '''Ensure a collision with a manifest not in a large batch is
+        found
+        '''
+        entries = [(name, {'arch': None, 'mem': [str(105 + num * 10),
+                                                 str(108 + num * 10)]},
+                    False)
+                   for num, name in enumerate(self.names)]
+        entries[-1] = ('man1199', {'arch': None, 'mem': ['55', '58']}, False)
+        self.assertRaises(SystemExit, set_criteria.set_criteria_batch,
+                          self.aidb, entries)
+        # the database is left unchanged
+        self.assertEqual(self.mem('man0'), (100, 105))
+
+    def test_batch_criteria_lookups(self):
+        '''Ensure the criteria columns are not looked up per manifest'''
+        calls = list()
+        get_criteria = AIdb.getCriteria
+
+        def counted(*args, **kwargs):
+            calls.append(args)
+            return get_criteria(*args, **kwargs)
+
+        entries = [(name, {'arch': None, 'mem': [str(105 + num * 10),
+                                                 str(108 + num * 10)]},
+                    False)
+                   for num, name in enumerate(self.names)]
+        AIdb.getCriteria = counted
+        try:
+            set_criteria.set_criteria_batch(self.aidb, entries[:1])
+            single = len(calls)
+            del calls[:]
+            set_criteria.set_criteria_batch(self.aidb, entries)
+        finally:
+            AIdb.getCriteria = get_criteria
+        self.assertEqual(len(calls), single)
+        self.assertEqual(self.mem('man1199'), (12095, 12098))
+
 if __name__ == '__main__':
     unittest.main()
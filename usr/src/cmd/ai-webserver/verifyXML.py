@@ -24,7 +24,6 @@
 A/I Verify Manifest
 """
 # Eventually bring names into convention.
-import os.path
 import sys
 import lxml.etree
 
@@ -32,6 +31,7 @@ import osol_install.auto_install.AI_database as AIdb
 import osol_install.auto_install.installadm_common as com
 
 from solaris_install import _
+from solaris_install.manifest import schema_registry
 
 
 def verifyDTDManifest(xml_dtd, data):
@@ -49,7 +49,7 @@ def verifyDTDManifest(xml_dtd, data):
     # in some places
     parser = lxml.etree.XMLParser(load_dtd=False, no_network=True,
                                   dtd_validation=False, remove_comments=False)
-    dtd = lxml.etree.DTD(os.path.abspath(xml_dtd))
+    dtd = schema_registry.get_dtd(xml_dtd)
     try:
         root = lxml.etree.parse(data, parser)
     except IOError:
@@ -58,10 +58,11 @@ def verifyDTDManifest(xml_dtd, data):
         for error in err.error_log:
             result.append(error.message)
         return None, result
-    if dtd.validate(root):
+    valid, error_log = dtd.validate(root)
+    if valid:
         return root, None
     else:
-        for err in dtd.error_log.filter_from_errors():
+        for err in error_log.filter_from_errors():
             result.append(err.message)
         return None, result
 
@@ -74,11 +75,10 @@ def verifyRelaxNGManifest(schema_f, data):
     import logging
     logging.debug('schema')
     try:
-        relaxng_schema_doc = lxml.etree.parse(schema_f)
+        relaxng = schema_registry.get_relaxng(schema_f)
     except IOError:
         raise SystemExit(_("Error:\tCan not open: %s" % schema_f))
-    logging.debug('RelaxNG doc=%s' % relaxng_schema_doc)
-    relaxng = lxml.etree.RelaxNG(relaxng_schema_doc)
+    logging.debug('RelaxNG schema=%s' % relaxng)
     logging.debug('RelaxNG parse data=%s' % data)
     try:
         root = lxml.etree.parse(data)
@@ -87,10 +87,11 @@ def verifyRelaxNGManifest(schema_f, data):
     except lxml.etree.XMLSyntaxError, err:
         return None, err.error_log.last_error
     logging.debug('validate')
-    if relaxng.validate(root):
+    valid, error_log = relaxng.validate(root)
+    if valid:
         return root, None
     logging.debug('error')
-    return None, relaxng.error_log.last_error
+    return None, error_log.last_error
 
 
 # =============================================================================
@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2011, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 """
@@ -32,9 +32,15 @@ import errno
 import gettext
 import logging
 import os
+import shlex
+import shutil
+import signal
 import sys
+import tempfile
 
+from multiprocessing.connection import Client, Listener
 from optparse import OptionParser
+from StringIO import StringIO
 from traceback import print_exc
 
 import solaris_install.manifest_input as milib
@@ -50,6 +56,81 @@ AIM_LOGGER = None
 VALIDATE = True
 NO_VALIDATE = False
 
+# Environment variable holding the address of the session in use, if any.
+AIM_SESSION = "AIM_SESSION"
+
+# Seconds a session may go without a command before it writes out the
+# manifest and ends itself.
+SESSION_TIMEOUT = 30 * 60
+
+# Request asking a session to write out the manifest and end.
+SESSION_END = "end"
+
+
+class _SessionTimeout(Exception):
+    '''
+    Raised from the SIGALRM handler when a session has been idle too long.
+    '''
+    pass
+
+
+class AimSession(object):
+    '''
+    Holds the ManifestInput which aimanifest commands operate on.
+
+    Normally every command builds its own ManifestInput, parsing the
+    manifest and digesting its DTD again, and writes the manifest out after
+    each change.  In batch and session mode a single AimSession serves
+    many commands: the manifest is parsed once, and changes are written
+    out only when a validate command is run or the session is closed.
+    '''
+
+    def __init__(self, autocommit=False):
+        '''
+        Args:
+          autocommit: True to write out the manifest after every change.
+        '''
+        self.autocommit = autocommit
+        self.modified = False
+        self._mim = None
+
+    @property
+    def mim(self):
+        '''
+        The ManifestInput, created on first use.
+
+        Raises:
+          Errors raised by ManifestInput()
+        '''
+        if self._mim is None:
+            # Pass AIM_MANIFEST as the output file.
+            self._mim = ManifestInput(os.environ.get("AIM_MANIFEST"),
+                                      os.environ.get("AIM_DTD"))
+        return self._mim
+
+    def changed(self):
+        '''
+        Note that the manifest was changed, writing it out if autocommit.
+
+        Raises:
+          Errors raised by ManifestInput.commit()
+        '''
+        if self.autocommit:
+            self.mim.commit(NO_VALIDATE)
+        else:
+            self.modified = True
+
+    def flush(self):
+        '''
+        Write out the manifest if it was changed since last written.
+
+        Raises:
+          Errors raised by ManifestInput.commit()
+        '''
+        if self.modified:
+            self.mim.commit(NO_VALIDATE)
+            self.modified = False
+
 
 class AimOptionParser(OptionParser):
     '''
@@ -84,6 +165,10 @@ def usage(argv):
         "    " + name + " load [-i] <filename>     " +
                   "Load / incrementally overlay XML file\n" +
         "    " + name + " validate                 Validate XML data\n" +
+        "    " + name + " batch [<filename>]       " +
+                  "Run commands read from file or stdin\n" +
+        "    " + name + " session start|end        " +
+                  "Start or end a session\n" +
         "\n    The -r option to set/add/get displays the path of " +
                   "the returned element\n" +
         "    in terms of node IDs.  This path may be used in " +
@@ -95,7 +180,10 @@ def usage(argv):
         "      AIM_DTD: Overrides the DTD given in the evolving manifest.  " +
                   "(Optional)\n" +
         "      AIM_LOGFILE: Logfile for additional information.            " +
-                  "(Optional)\n") % (
+                  "(Optional)\n" +
+        "      AIM_SESSION: Session to run commands in, as printed by      " +
+                  "(Optional)\n" +
+        "                   \"" + name + " session start\".\n") % (
         name, name)
     return usage_str
 
@@ -189,9 +277,17 @@ def _shutdown_logging():
     logging.shutdown()
 
 
-def _do_aimanifest(argv):
+def _do_aimanifest(argv, session=None):
     '''
     Main.  See usage for argv details.
+
+    Args:
+      argv: command and its arguments.
+
+      session: AimSession to run the command in.  If None, the command is
+          forwarded to the session named by AIM_SESSION if that is set, and
+          otherwise run against a new ManifestInput which is written out
+          after any change.
     '''
 
     usage_str = usage(argv)
@@ -217,15 +313,17 @@ def _do_aimanifest(argv):
 
     cmds_r_option = ["add", "set", "get"]
     cmds_w_value_arg = ["add", "set"]
-    cmds_wo_value_arg = ["get", "load"]
+    cmds_wo_value_arg = ["get", "load", "session"]
     cmds_w_no_args = ["validate"]
+    cmds_w_opt_arg = ["batch"]
 
     if ((command in cmds_w_value_arg and (len_args < 3)) or
         (command in cmds_wo_value_arg and (len_args < 2))):
         parser.error_w_errno(errno.EINVAL, _("missing argument"))
     if ((command in cmds_w_value_arg and (len_args > 3)) or
         (command in cmds_wo_value_arg and (len_args > 2)) or
-        (command in cmds_w_no_args and (len_args > 1))):
+        (command in cmds_w_no_args and (len_args > 1)) or
+        (command in cmds_w_opt_arg and (len_args > 2))):
         parser.error_w_errno(errno.EINVAL, _("extra arguments given"))
     if (command != "load") and options.is_incremental:
         parser.error_w_errno(errno.EINVAL,
@@ -234,10 +332,28 @@ def _do_aimanifest(argv):
         parser.error_w_errno(errno.EINVAL,
                      _("-r is not applicable for command given"))
 
-    # Pass AIM_MANIFEST as the output file.
+    if command in ["batch", "session"]:
+        if session is not None:
+            parser.error_w_errno(errno.EINVAL,
+                _("%s may not be run from within a batch or session") %
+                command)
+        if command == "batch":
+            return _do_batch(argv[0], path)
+        if path == "start":
+            return _start_session()
+        if path == "end":
+            return _end_session()
+        parser.error_w_errno(errno.EINVAL,
+                     _("session action must be \"start\" or \"end\""))
+
+    if session is None:
+        address = os.environ.get(AIM_SESSION)
+        if address:
+            return _session_request(address, (os.getcwd(), argv))
+        session = AimSession(autocommit=True)
+
     try:
-        mim = ManifestInput(os.environ.get("AIM_MANIFEST"),
-                            os.environ.get("AIM_DTD"))
+        mim = session.mim
     except (milib.MimError, IOError) as err:
         return (_handle_error(err))
 
@@ -250,7 +366,7 @@ def _do_aimanifest(argv):
                 path = mim.set(path, value)
             else:
                 path = mim.add(path, value)
-            mim.commit(NO_VALIDATE)
+            session.changed()
         except (milib.MimError, IOError) as err:
             return (_handle_error(err))
 
@@ -287,7 +403,7 @@ def _do_aimanifest(argv):
                      "mfile": path})
         try:
             mim.load(path, options.is_incremental)
-            mim.commit(NO_VALIDATE)
+            session.changed()
         except (milib.MimError, IOError) as err:
             return (_handle_error(err))
 
@@ -296,6 +412,8 @@ def _do_aimanifest(argv):
     elif (command == "validate"):
         AIM_LOGGER.info(_("Command:%s") % command)
         try:
+            # A session writes out the manifest when asked to validate it.
+            session.flush()
             mim.validate()
             AIM_LOGGER.info(_("Validation successful"))
         except (milib.MimError, IOError) as err:
@@ -309,6 +427,287 @@ def _do_aimanifest(argv):
     return 0  # No errors
 
 
+def _run_command(argv, session):
+    '''
+    Run one command in a batch or session.
+
+    Errors in the command's arguments are returned as its status rather
+    than ending the batch or session.
+
+    Returns:
+      Status of the command.
+    '''
+    try:
+        return _do_aimanifest(argv, session)
+    except SystemExit as err:
+        if err.code is None:
+            return 0
+        if isinstance(err.code, int):
+            return err.code
+        print >> sys.stderr, err.code
+        return 1
+
+
+def _do_batch(name, filename):
+    '''
+    Run commands read from a file, one per line, in a single session.
+
+    Lines are split into arguments following shell quoting rules.  Blank
+    lines and comments starting with "#" are skipped.  The batch stops at
+    the first failing command.  The manifest is written out when the batch
+    ends, whether or not all commands succeeded, and when a validate
+    command is run.  If AIM_SESSION is set, the commands are run in that
+    session instead.
+
+    Args:
+      name: program name, passed to each command as its argv[0].
+
+      filename: file to read commands from.  None or "-" for stdin.
+
+    Returns:
+      Status of the failing command, or 0 if all succeeded.
+    '''
+    if filename is None or filename == "-":
+        filename = "-"
+        infile = sys.stdin
+    else:
+        try:
+            infile = open(filename, "r")
+        except IOError as err:
+            return _handle_error(err)
+
+    # Within a session, hand each command to it rather than to a batch
+    # session of our own, which would overwrite its changes.
+    address = os.environ.get(AIM_SESSION)
+    session = None if address else AimSession()
+    rval = 0
+    try:
+        for (lineno, line) in enumerate(infile, 1):
+            try:
+                cmd_args = shlex.split(line, comments=True)
+            except ValueError as err:
+                print >> sys.stderr, _("%(file)s, line %(line)d: %(err)s") % \
+                    {"file": filename, "line": lineno, "err": str(err)}
+                rval = errno.EINVAL
+            else:
+                if not cmd_args:
+                    continue
+                if session is None:
+                    rval = _session_request(address,
+                                            (os.getcwd(), [name] + cmd_args))
+                else:
+                    rval = _run_command([name] + cmd_args, session)
+
+            if rval:
+                AIM_LOGGER.error(_("Batch stopped at %(file)s, line "
+                                   "%(line)d") %
+                                 {"file": filename, "line": lineno})
+                break
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+
+    if session is not None:
+        try:
+            session.flush()
+        except (milib.MimError, IOError) as err:
+            flush_rval = _handle_error(err)
+            if not rval:
+                rval = flush_rval
+    return rval
+
+
+def _session_timeout(signum, frame):
+    '''
+    SIGALRM handler for a session waiting on its next command.
+    '''
+    raise _SessionTimeout()
+
+
+def _session_command(session, cwd, argv):
+    '''
+    Run a command forwarded to the session, capturing its output.
+
+    Args:
+      session: AimSession the command is run in.
+
+      cwd: working directory of the client, which relative pathnames given
+          in argv are relative to.
+
+      argv: command and its arguments, or None to just write out the
+          manifest.
+
+    Returns:
+      (status, stdout, stderr) tuple of the command.
+    '''
+    saved_stdout = sys.stdout
+    saved_stderr = sys.stderr
+    sys.stdout = StringIO()
+    sys.stderr = StringIO()
+    try:
+        try:
+            os.chdir(cwd)
+            if argv is None:
+                rval = 0
+                session.flush()
+            else:
+                rval = _run_command(argv, session)
+        except (milib.MimError, IOError, OSError) as err:
+            rval = _handle_error(err)
+        except StandardError as err:
+            print >> sys.stderr, str(err)
+            AIM_LOGGER.exception(str(err))
+            rval = 1
+        return (rval, sys.stdout.getvalue(), sys.stderr.getvalue())
+    finally:
+        sys.stdout = saved_stdout
+        sys.stderr = saved_stderr
+        os.chdir("/")
+
+
+def _serve_session(listener):
+    '''
+    Run commands sent to the session until it is ended or times out.
+
+    Args:
+      listener: multiprocessing.connection.Listener clients connect to.
+    '''
+    session = AimSession()
+    signal.signal(signal.SIGALRM, _session_timeout)
+    try:
+        while True:
+            signal.alarm(SESSION_TIMEOUT)
+            conn = listener.accept()
+            signal.alarm(0)
+            try:
+                request = conn.recv()
+                if request == SESSION_END:
+                    conn.send(_session_command(session, "/", None))
+                    break
+                (cwd, argv) = request
+                conn.send(_session_command(session, cwd, argv))
+            except (EOFError, IOError) as err:
+                # Client went away; carry on with the next one.
+                AIM_LOGGER.warning(_("Session client error: %s") % str(err))
+            finally:
+                conn.close()
+    except _SessionTimeout:
+        AIM_LOGGER.warning(_("Session idle for %d seconds, ending it") %
+                           SESSION_TIMEOUT)
+        _session_command(session, "/", None)
+
+
+def _start_session():
+    '''
+    Start a session and print its address.
+
+    The session runs in the background as the invoking user, holding the
+    manifest in memory for the commands sent to it, until it is ended with
+    "session end" or has been idle for SESSION_TIMEOUT seconds.  The
+    manifest is written out when the session ends and when a validate
+    command is run.  AIM_MANIFEST and AIM_DTD are read when the session
+    starts.
+
+    Returns:
+      0 if the session was started, else an errno.
+    '''
+    if os.environ.get(AIM_SESSION):
+        print >> sys.stderr, _("Error: a session is already in use")
+        return errno.EBUSY
+
+    # Commands run in the session may come from other directories.
+    for var in ["AIM_MANIFEST", "AIM_DTD"]:
+        if os.environ.get(var):
+            os.environ[var] = os.path.abspath(os.environ[var])
+
+    # mkdtemp creates the directory readable only by its owner, so only the
+    # invoking user can reach the socket within.
+    sessdir = tempfile.mkdtemp(prefix="aimanifest-")
+    address = os.path.join(sessdir, "session")
+    (rfd, wfd) = os.pipe()
+
+    if os.fork():
+        os.close(wfd)
+        started = os.read(rfd, len(address))
+        os.close(rfd)
+        if started != address:
+            print >> sys.stderr, _("Error: could not start session")
+            return errno.EIO
+        # Localization not needed here.
+        print address
+        return 0
+
+    # Child: detach and serve the session.
+    rval = 1
+    try:
+        os.close(rfd)
+        os.setsid()
+        os.chdir("/")
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fdesc in range(3):
+            os.dup2(devnull, fdesc)
+        os.close(devnull)
+
+        listener = Listener(address, "AF_UNIX")
+        os.write(wfd, address)
+        os.close(wfd)
+        try:
+            _serve_session(listener)
+            rval = 0
+        finally:
+            listener.close()
+    except StandardError as err:
+        AIM_LOGGER.exception(str(err))
+    finally:
+        shutil.rmtree(sessdir, ignore_errors=True)
+        _shutdown_logging()
+        os._exit(rval)
+
+
+def _end_session():
+    '''
+    Write out the manifest and end the session named by AIM_SESSION.
+
+    Returns:
+      Status of writing out the manifest.
+    '''
+    address = os.environ.get(AIM_SESSION)
+    if not address:
+        print >> sys.stderr, _("Error: no session in use")
+        return errno.EINVAL
+    return _session_request(address, SESSION_END)
+
+
+def _session_request(address, request):
+    '''
+    Send a request to a session and display its output.
+
+    Args:
+      address: address of the session.
+
+      request: (cwd, argv) tuple of the command to run, or SESSION_END.
+
+    Returns:
+      Status of the request.
+    '''
+    try:
+        conn = Client(address, "AF_UNIX")
+        try:
+            conn.send(request)
+            (rval, out, err) = conn.recv()
+        finally:
+            conn.close()
+    except (EOFError, IOError, OSError) as err:
+        print >> sys.stderr, _("Error: session %(addr)s is not "
+                               "responding: %(err)s") % \
+            {"addr": address, "err": str(err)}
+        return errno.EIO
+
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+    return rval
+
+
 def main(argv):
     '''
     Main program.
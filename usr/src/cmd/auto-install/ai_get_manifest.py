@@ -19,7 +19,7 @@
 #
 # CDDL HEADER END
 #
-# Copyright (c) 2009, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2009, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 # ai_get_manifest - AI Service Choosing Engine
 #
@@ -34,7 +34,6 @@ import gettext
 import httplib
 import os
 import socket
-from subprocess import Popen, PIPE
 import re
 import sys
 import tempfile
@@ -43,6 +42,7 @@ import traceback
 import urllib
 
 from solaris_install import _, system_temp_path
+from solaris_install.target.inventory import get_inventory
 
 VERSION_FILE = '/usr/share/auto_install/version'
 
@@ -52,6 +52,10 @@ SC_EXTENSION = '.xml'
 
 AI_MANIFEST_ATTACHMENT_NAME = 'manifest.xml'  # named as MIME attachment
 
+# sections of the hardware inventory the criteria are obtained from
+AI_INVENTORY_SECTIONS = ['platform', 'cpu', 'memory', 'network']
+AI_INVENTORY = None
+
 
 class AILog:
     """
@@ -141,50 +145,26 @@ class AILog:
 AIGM_LOG = AILog("AISC")
 
 
-def ai_exec_cmd(cmd):
-    """     Description: Executes provided command using subprocess.Popen()
-                         method and captures its stdout & stderr.
-                         stderr is captured for debugging purposes
+def ai_inventory_fact(section, key):
+    """     Description: Returns a fact of the hardware inventory.  The
+                         inventory is gathered once, and shared with the
+                         rest of the installation through the inventory
+                         file.
 
             Parameters:
-                cmd - Command to be executed
+                section - section of the inventory
+                key - name of the fact
 
             Returns:
-                captured stdout from 'cmd'
-                return code - 0..success, -1..failure
+                the fact, None if unknown
     """
 
-    AIGM_LOG.post(AILog.AI_DBGLVL_INFO, "cmd:" + cmd)
+    global AI_INVENTORY
 
-    try:
-        cmd_popen = Popen(cmd, shell=True, stdout=PIPE)
-        (cmd_stdout, cmd_stderr) = cmd_popen.communicate()
+    if AI_INVENTORY is None:
+        AI_INVENTORY = get_inventory(AI_INVENTORY_SECTIONS)
 
-    except OSError:
-        AIGM_LOG.post(AILog.AI_DBGLVL_ERR,
-                      "Popen() raised OSError exception")
-
-        return None, -1
-
-    except ValueError:
-        AIGM_LOG.post(AILog.AI_DBGLVL_ERR,
-                      "Popen() raised ValueError exception")
-
-        return None, -1
-
-    # capture output of stderr for debugging purposes
-    if cmd_stderr is not None:
-        AIGM_LOG.post(AILog.AI_DBGLVL_WARN,
-                      " stderr: %s", cmd_stderr)
-
-    # check if child process terminated successfully
-    if cmd_popen.returncode != 0:
-        AIGM_LOG.post(AILog.AI_DBGLVL_ERR,
-                      "Command failed: ret=%d", cmd_popen.returncode)
-
-        return None, -1
-
-    return cmd_stdout, 0
+    return AI_INVENTORY.get(section, key)
 
 
 class AICriteria:
@@ -228,15 +208,12 @@ class AICriteriaArch(AICriteria):
             AICriteria.__init__(self, AICriteriaArch.client_arch)
             return
 
-        cmd = "/usr/bin/uname -m"
-        client_arch, ret = ai_exec_cmd(cmd)
+        AICriteriaArch.client_arch = ai_inventory_fact("platform", "machine")
 
-        if ret != 0 or client_arch == "":
+        if not AICriteriaArch.client_arch:
             AIGM_LOG.post(AILog.AI_DBGLVL_ERR,
                           "Could not obtain machine architecture")
             AICriteriaArch.client_arch = None
-        else:
-            AICriteriaArch.client_arch = client_arch.strip()
 
         AICriteria.__init__(self, AICriteriaArch.client_arch)
 
@@ -254,15 +231,12 @@ class AICriteriaPlatform(AICriteria):
                                  AICriteriaPlatform.client_platform)
             return
 
-        cmd = "/usr/bin/uname -i"
-        AICriteriaPlatform.client_platform, ret = ai_exec_cmd(cmd)
+        AICriteriaPlatform.client_platform = \
+            ai_inventory_fact("platform", "platform")
 
-        if ret != 0 or AICriteriaPlatform.client_platform == "":
+        if not AICriteriaPlatform.client_platform:
             AIGM_LOG.post(AILog.AI_DBGLVL_ERR,
                           "Could not obtain machine platform")
-        else:
-            AICriteriaPlatform.client_platform = \
-                AICriteriaPlatform.client_platform.strip()
 
         AICriteria.__init__(self, AICriteriaPlatform.client_platform)
 
@@ -279,15 +253,11 @@ class AICriteriaCPU(AICriteria):
             AICriteria.__init__(self, AICriteriaCPU.client_cpu)
             return
 
-        cmd = "/usr/bin/uname -p"
-        AICriteriaCPU.client_cpu, ret = ai_exec_cmd(cmd)
+        AICriteriaCPU.client_cpu = ai_inventory_fact("cpu", "processor")
 
-        if ret != 0 or AICriteriaCPU.client_cpu == "":
+        if not AICriteriaCPU.client_cpu:
             AIGM_LOG.post(AILog.AI_DBGLVL_ERR,
                           "Could not obtain processor type")
-        else:
-            AICriteriaCPU.client_cpu = \
-                AICriteriaCPU.client_cpu.strip()
 
         AICriteria.__init__(self, AICriteriaCPU.client_cpu)
 
@@ -307,42 +277,19 @@ class AICriteriaMemSize(AICriteria):
             return
 
         AICriteriaMemSize.client_mem_size_initialized = True
-        cmd = "/usr/sbin/prtconf -vp | /usr/bin/grep '^Memory size: '"
-        client_mem_info, ret = ai_exec_cmd(cmd)
+        client_mem_size = ai_inventory_fact("memory", "size_mb")
 
-        if ret != 0 or client_mem_info == "":
+        if client_mem_size is None:
             AIGM_LOG.post(AILog.AI_DBGLVL_ERR,
                           "Could not obtain memory size")
             AICriteriaMemSize.client_mem_size = None
             AICriteria.__init__(self)
             return
 
-        (client_mem_size, client_mem_unit) = client_mem_info.split()[2:]
-        client_mem_size = long(client_mem_size)
-
         AIGM_LOG.post(AILog.AI_DBGLVL_INFO,
-                      "prtconf(1M) reported: %ld %s", client_mem_size,
-                      client_mem_unit)
+                      "prtconf(1M) reported: %ld Megabytes", client_mem_size)
 
-        if client_mem_size == 0 or client_mem_unit == "":
-            AIGM_LOG.post(AILog.AI_DBGLVL_ERR,
-                          "Could not obtain memory size")
-            AICriteriaMemSize.client_mem_size = None
-            AICriteria.__init__(self)
-            return
-
-        if client_mem_unit == "Kilobytes":
-            client_mem_size /= 1024
-        elif client_mem_unit == "Gigabytes":
-            client_mem_size *= 1024
-        elif client_mem_unit == "Terabytes":
-            client_mem_size *= 1024 * 1024
-        elif client_mem_unit != "Megabytes":
-            AIGM_LOG.post(AILog.AI_DBGLVL_WARN,
-                          "Unknown mem size units %s", client_mem_unit)
-            client_mem_size = 0
-
-        AICriteriaMemSize.client_mem_size = repr(client_mem_size).rstrip('L')
+        AICriteriaMemSize.client_mem_size = str(client_mem_size)
 
         AICriteria.__init__(self, AICriteriaMemSize.client_mem_size)
 
@@ -366,46 +313,24 @@ class AICriteriaNetworkInterface(AICriteria):
 
         AICriteriaNetworkInterface.network_iface_initialized = True
         #
-        # Obtain network interface name, which will be queried in next
-        # step in order to obtain required network parameters
+        # The inventory holds the first interface, which is UP - omitting
+        # loopback interfaces - and the information ifconfig reports about
+        # that interface.
         #
-        # Search for the first interface, which is UP - omit loopback
-        # interfaces. Then use ifconfig for query the information about
-        # that interface and store the result.
-        #
-        cmd = "/usr/sbin/ifconfig -au | /usr/bin/grep '[0-9]:' " \
-            "| /usr/bin/grep -v 'LOOPBACK'"
-        AICriteriaNetworkInterface.network_iface, ret = ai_exec_cmd(cmd)
+        AICriteriaNetworkInterface.network_iface = \
+            ai_inventory_fact("network", "interface")
 
-        if ret != 0:
+        if AICriteriaNetworkInterface.network_iface is None:
             AIGM_LOG.post(AILog.AI_DBGLVL_ERR,
                           "Could not obtain name of valid network interface")
-            AICriteriaNetworkInterface.network_iface = None
         else:
-            AICriteriaNetworkInterface.network_iface = \
-                AICriteriaNetworkInterface.network_iface.split(':')[0]
-
             AIGM_LOG.post(AILog.AI_DBGLVL_INFO,
                           "Network interface obtained: %s",
                           AICriteriaNetworkInterface.network_iface)
 
-            #
-            # Collect all available information about network interface
-            #
-            cmd = "/usr/sbin/ifconfig %s" % \
-                AICriteriaNetworkInterface.network_iface
-
-            AICriteriaNetworkInterface.ifconfig_iface_info, ret = \
-                ai_exec_cmd(cmd)
-
-            if ret != 0 or \
-               AICriteriaNetworkInterface.ifconfig_iface_info == "":
-                AIGM_LOG.post(AILog.AI_DBGLVL_ERR,
-                              "Could not obtain information about "
-                              "network interface %s",
-                              AICriteriaNetworkInterface.network_iface)
-
-                AICriteriaNetworkInterface.ifconfig_iface_info = None
+            AICriteriaNetworkInterface.ifconfig_iface_info = \
+                dict((key, ai_inventory_fact("network", key))
+                     for key in ("ipv4", "netmask", "mac"))
 
 
 class AICriteriaMAC(AICriteriaNetworkInterface):
@@ -430,17 +355,13 @@ class AICriteriaMAC(AICriteriaNetworkInterface):
             AIGM_LOG.post(AILog.AI_DBGLVL_ERR,
                           "Could not obtain MAC address")
         else:
-            AICriteriaMAC.client_mac = AICriteriaNetworkInterface. \
-                ifconfig_iface_info.split("ether", 1)
+            AICriteriaMAC.client_mac = \
+                AICriteriaNetworkInterface.ifconfig_iface_info["mac"]
 
-            if len(AICriteriaMAC.client_mac) < 2:
+            if AICriteriaMAC.client_mac is None:
                 AIGM_LOG.post(AILog.AI_DBGLVL_ERR,
                               "Could not obtain client MAC address")
-                AICriteriaMAC.client_mac = None
             else:
-                AICriteriaMAC.client_mac = AICriteriaMAC.\
-                    client_mac[1].strip().split()[0].strip()
-
                 #
                 # remove ':' and pad with '0's
                 #
@@ -491,13 +412,13 @@ class AICriteriaIP(AICriteriaNetworkInterface):
             return
 
         AICriteriaIP.client_ip_initialized = True
-        if AICriteriaNetworkInterface.ifconfig_iface_info == None:
+        if AICriteriaNetworkInterface.ifconfig_iface_info == None or \
+           AICriteriaNetworkInterface.ifconfig_iface_info["ipv4"] == None:
             AIGM_LOG.post(AILog.AI_DBGLVL_ERR,
                           "Could not obtain IP address")
         else:
-            AICriteriaIP.client_ip = AICriteriaNetworkInterface. \
-                ifconfig_iface_info.split("inet", 1)[1].strip().\
-                split()[0].strip()
+            AICriteriaIP.client_ip = \
+                AICriteriaNetworkInterface.ifconfig_iface_info["ipv4"]
 
             # remove '.'
             ip_split = AICriteriaIP.client_ip.split('.')
@@ -532,14 +453,14 @@ class AICriteriaNetwork(AICriteriaIP):
         AICriteriaNetwork.client_net_initialized = True
 
         if AICriteriaNetworkInterface.ifconfig_iface_info == None or \
-            AICriteriaIP.client_ip == None:
+            AICriteriaIP.client_ip == None or \
+            AICriteriaNetworkInterface.ifconfig_iface_info["netmask"] == None:
             AIGM_LOG.post(AILog.AI_DBGLVL_ERR,
                           "Could not obtain network address")
         else:
             # extract network mask
-            client_netmask = \
-                long(AICriteriaNetworkInterface.ifconfig_iface_info.
-                    split("netmask", 1)[1].strip().split()[0].strip(), 16)
+            client_netmask = long(AICriteriaNetworkInterface.
+                                  ifconfig_iface_info["netmask"], 16)
 
             # Translate IP address in string format to long
             ip_part = AICriteriaIP.client_ip.split('.')
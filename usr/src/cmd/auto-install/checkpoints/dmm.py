@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2011, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 '''
@@ -38,7 +38,6 @@ import errno
 import os
 import linecache
 import pwd
-import platform
 import re
 import shutil
 import stat
@@ -56,7 +55,7 @@ from solaris_install.engine.checkpoint import AbstractCheckpoint
 from solaris_install.manifest import ManifestError, validate_manifest
 from solaris_install.manifest.parser import ManifestParserData, \
     MANIFEST_PARSER_DATA
-from solaris_install.target.libdiskmgt import const, diskmgt
+from solaris_install.target.inventory import get_inventory
 
 # Non-privileged account under which scripts are run / manifests are built.
 AIUSER_ACCOUNT_NAME = "aiuser"
@@ -72,10 +71,11 @@ SYSTEM_CONF = "/etc/netboot/system.conf"
 # Commands
 
 DEVPROP = "/sbin/devprop"
-ISAINFO = "/usr/bin/isainfo"
 SU = "/usr/bin/su"
 TEST = "/usr/bin/test"
-UNAME = "/usr/sbin/uname"
+
+# sections of the hardware inventory the environment is set up from
+DMM_INVENTORY_SECTIONS = ["platform", "cpu", "disks"]
 
 DERIVED_MANIFEST_DATA = "derived_manifest_data"
 
@@ -229,6 +229,17 @@ class DerivedManifestModule(AbstractCheckpoint):
         else:
             return subproc.stdout.readline().strip()
 
+    def inventory_fact(self, inventory, section, key, error_string):
+        '''
+        Return a fact of the hardware inventory as a string, or "" if it is
+        unknown.
+        '''
+        fact = inventory.get(section, key)
+        if fact is None:
+            self.logger.critical(MSG_HEADER + error_string)
+            return ""
+        return str(fact)
+
     def setup_install_svc_in_env(self, arch):
         '''
         Set up install_service variable for DMM environment.
@@ -279,32 +290,34 @@ class DerivedManifestModule(AbstractCheckpoint):
             os.environ["SI_NETWORK"] = ""
 
     @classmethod
-    def setup_disks_in_env(cls):
+    def setup_disks_in_env(cls, inventory):
         '''
         Set up disk info for DMM environment.
         This includes:
             SI_DISKNAME_#
             SI_DISKSIZE_#
             SI_NUMDISKS
+
+        Args:
+          inventory: hardware inventory holding the disks.
         '''
         disknum = 0
 
         # Show only fixed, operational drives.
-        for drive in diskmgt.descriptors_by_type(const.DRIVE):
-            if drive.attributes.type != "FIXED":
+        for drive in inventory.get("disks") or []:
+            if drive["type"] != "FIXED":
                 continue
-            if drive.attributes.status != "UP":
+            if drive["status"] != "UP":
                 continue
-            if drive.media is None:
+            if drive["blocks"] is None:
                 continue
 
-            size = long(drive.media.attributes.blocksize *
-                        drive.media.attributes.size) / BYTES_PER_MB
+            size = long(drive["blocksize"] * drive["blocks"]) / BYTES_PER_MB
             if (size == 0):
                 continue
 
             disknum += 1
-            os.environ["SI_DISKNAME_%d" % disknum] = drive.aliases[0].name
+            os.environ["SI_DISKNAME_%d" % disknum] = str(drive["name"])
             os.environ["SI_DISKSIZE_%d" % disknum] = "%ld" % size
 
         os.environ["SI_NUMDISKS"] = "%d" % disknum
@@ -340,28 +353,33 @@ class DerivedManifestModule(AbstractCheckpoint):
         # Export the loglevel so the aimanifest command can use the same level.
         os.environ["AIM_LOGLEVEL"] = str(self.logger.getEffectiveLevel())
 
-        # Set up legacy info variables for the script.
+        # Set up legacy info variables for the script, from the hardware
+        # inventory gathered by ai_get_manifest, if it ran.
+        inventory = get_inventory(DMM_INVENTORY_SECTIONS)
 
-        (system, nodename, release, version, machine, processor) = \
-            platform.uname()
+        (system, nodename, release, version, machine) = os.uname()
+        processor = self.inventory_fact(inventory, "cpu", "processor",
+                                        "Error getting processor type "
+                                        "via uname -p")
         os.environ["SI_ARCH"] = processor
         os.environ["SI_CPU"] = processor  # Same as SI_ARCH
         os.environ["SI_HOSTNAME"] = nodename
         os.environ["SI_KARCH"] = machine
         os.environ["SI_MODEL"] = os.environ["SI_PLATFORM"] = \
-            self.call_cmd([UNAME, "-i"],
-                          "Error getting system model / platform via uname -i")
+            self.inventory_fact(inventory, "platform", "platform",
+                                "Error getting system model / platform via "
+                                "uname -i")
         os.environ["SI_NATISA"] = \
-            self.call_cmd([ISAINFO, "-n"],
-                          "Error getting system native instruction set "
-                          "arch via isainfo -n.")
+            self.inventory_fact(inventory, "cpu", "isa",
+                                "Error getting system native instruction set "
+                                "arch via isainfo -n.")
         os.environ["SI_MEMSIZE"] = str(os.sysconf("SC_PHYS_PAGES") *
                                        os.sysconf("SC_PAGE_SIZE"))
 
         os.environ["SI_MANIFEST_SCRIPT"] = self.dmd.script
         self.setup_install_svc_in_env(processor)
         self.setup_net_in_env()
-        self.setup_disks_in_env()
+        self.setup_disks_in_env(inventory)
 
     def execute(self, dry_run=False):
         '''Validate script and then run it.'''
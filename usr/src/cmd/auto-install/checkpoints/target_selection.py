@@ -40,6 +40,7 @@ from solaris_install.engine.checkpoint import AbstractCheckpoint as Checkpoint
 from solaris_install.target import Target, vdevs
 from solaris_install.target.controller import TargetController, \
     DEFAULT_VDEV_NAME, SwapDumpGeneralError, SwapDumpSpaceError
+from solaris_install.target.disk_index import DiskIndex
 from solaris_install.target.logical import Logical, Zpool, Vdev, BE, Zvol, \
     Filesystem, DatasetOptions, PoolOptions
 from solaris_install.target.physical import Disk, Iscsi, Partition, Slice
@@ -91,6 +92,7 @@ class TargetSelection(Checkpoint):
         self._discovered = None
         self._wipe_disk = False
         self._discovered_disks = list()
+        self._disk_index = None
         self._discovered_zpools = list()
         self._discovered_zpool_map = dict()
         self._remaining_zpool_map = dict()
@@ -146,32 +148,13 @@ class TargetSelection(Checkpoint):
                     - dev_vendor
                     - dev_size
                   In this scenario, first matching disk will be returned.
-        '''
-
-        for discovered_disk in self._discovered_disks:
-            # Attempt to match ctd/volid/devpath/devid first
-            if discovered_disk.name_matches(disk):
-                return discovered_disk
-
-            # Attempt to match disk_prop.  Only match disk properties if all
-            # ctd/volid/devpath/devid/receptacle/wwn are None, then attempt to
-            # match on boot disk or one of the disk properties if specified
-            if disk.ctd is None and disk.volid is None and \
-               disk.devpath is None and disk.devid is None and \
-               disk.wwn is None:
-
-                # Attempt to match on boot_disk
-                if disk.is_boot_disk() and discovered_disk.is_boot_disk():
-                    return discovered_disk
 
-                # Attempt to match disk_prop. Any of the properties
-                # dev_type/dev_vendor/dev_size must been specified
-                if discovered_disk.disk_prop is not None and \
-                    disk.disk_prop is not None:
-                    if discovered_disk.disk_prop.prop_matches(disk.disk_prop):
-                        return discovered_disk
-
-        return None
+           The discovered disks are looked up in the index of their
+           identifiers, built from the discovered tree.
+        '''
+        if self._disk_index is None:
+            return None
+        return self._disk_index.find(disk)
 
     @staticmethod
     def __is_iterable(obj):
@@ -1102,9 +1085,9 @@ class TargetSelection(Checkpoint):
                                     devsize = copy.copy(device.size)
                                     if vdev.redundancy == "none":
                                         # Concatenate device sizes together
-                                        retsize = Size(str(retsize.byte_value +
-                                            devsize.byte_value) +
-                                            Size.byte_units)
+                                        retsize = Size.from_bytes(
+                                            retsize.byte_value +
+                                            devsize.byte_value)
                                     else:
                                         # Get size of smallest device
                                         if devsize < retsize:
@@ -3175,8 +3158,9 @@ class TargetSelection(Checkpoint):
         self.dry_run = dry_run
         self.controller._dry_run = self.dry_run
 
-        # Store list of discovered disks
-        self._discovered_disks = discovered.get_descendants(class_type=Disk)
+        # Store list of discovered disks, and index them by identifier
+        self._disk_index = DiskIndex(discovered)
+        self._discovered_disks = self._disk_index.disks
 
         # Store list of discovered zpools
         self._discovered_zpools = discovered.get_descendants(class_type=Zpool)
@@ -21,12 +21,13 @@
 #
 
 #
-# Copyright (c) 2010, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 """init module for the distribution constructor"""
 
-__all__ = ["cli", "distro_const", "execution_checkpoint", "distro_spec"]
+__all__ = ["build_cache", "cli", "distro_const", "execution_checkpoint",
+           "distro_spec", "lofi_compress"]
 
 
 import logging
@@ -36,6 +37,7 @@ import shutil
 import sys
 import time
 
+import build_cache
 import distro_spec
 import execution_checkpoint
 
@@ -59,6 +61,7 @@ from solaris_install.logger import DEFAULTLOG, FileHandler, InstallFormatter
 from solaris_install.manifest.parser import ManifestError
 from solaris_install.target import Target
 from solaris_install.target.logical import Filesystem, Zpool
+from solaris_install.target.size import Size
 from solaris_install.transfer.info import Destination, Dir, Image, Software, \
     Source
 
@@ -139,6 +142,8 @@ def parse_args(baseargs=None):
 
     usage = "%prog build [-v] [-r <checkpoint name>] " + \
             "[-p <checkpoint name>] " + \
+            "[-c <cache dataset> [--cache-point <checkpoint name>] " + \
+            "[--cache-entries <count>] [--cache-size <size>]] " + \
             "[-l] manifest"
     parser = optparse.OptionParser(usage=usage)
     parser.add_option("-v", "--verbose", dest="verbose", default=False,
@@ -150,6 +155,16 @@ def parse_args(baseargs=None):
     parser.add_option("-l", "--list", dest="list_checkpoints",
                       action="store_true",
                       help="List all possible checkpoints")
+    parser.add_option("-c", "--cache", dest="cache_dataset",
+                      help="Dataset holding the build cache")
+    parser.add_option("--cache-point", dest="cache_point",
+                      default=build_cache.DEFAULT_CACHE_POINT,
+                      help="Last checkpoint whose results are cached")
+    parser.add_option("--cache-entries", dest="cache_entries", type="int",
+                      default=build_cache.DEFAULT_MAX_ENTRIES,
+                      help="Number of build cache entries to keep")
+    parser.add_option("--cache-size", dest="cache_size",
+                      help="Space the build cache entries may use (eg 20gb)")
 
     (options, args) = parser.parse_args(baseargs)
 
@@ -162,6 +177,18 @@ def parse_args(baseargs=None):
     elif len(args) != 2:
         parser.error("invalid number of arguments to distro_const")
 
+    if options.cache_dataset is None:
+        if options.cache_size is not None:
+            parser.error("--cache-size requires a cache dataset")
+    elif options.cache_entries < 1:
+        parser.error("--cache-entries must be at least 1")
+    elif options.cache_size is not None:
+        try:
+            options.cache_size = \
+                Size(options.cache_size).get(Size.byte_units)
+        except ValueError as err:
+            parser.error(str(err))
+
     return (options, args)
 
 
@@ -398,6 +425,12 @@ def setup_build_dataset(zpool_name, base_dataset, base_action, base_dataset_mp,
     media_node = Filesystem(os.path.join(base_dataset, "media"))
     media_node.mountpoint = media_mp
 
+    # a build_data restored from the build cache is a clone of a cache entry.
+    # Destroy it so that build_data@empty is really empty.
+    if resume_checkpoint is None and empty_snap.exists and \
+       build_data.get("origin") != "-":
+        build_data.destroy(dry_run=False, recursive=True)
+
     if base_action == "preserve":
         # check to see if base_dataset/build_data@empty exists.
         if resume_checkpoint is None and empty_snap.exists:
@@ -526,6 +559,39 @@ def update_doc_paths(build_data_mp):
             image_node.img_root = path
 
 
+def restore_build_cache(options, zpool_name, build_data,
+                        registered_checkpoints, doc_dict, pause_checkpoint):
+    """ function to set up the build cache and, if it holds an entry for
+    this build, restore build_data from it.
+
+    Returns the BuildCache, or None if no cache is to be used.
+    """
+    eng = InstallEngine.get_instance()
+    doc = eng.data_object_cache
+
+    if not options.cache_dataset.startswith(zpool_name + "/"):
+        raise RuntimeError("distro_const: the build cache dataset must be "
+                           "in the %s pool" % zpool_name)
+
+    cache = build_cache.BuildCache(options.cache_dataset,
+                                   options.cache_point,
+                                   options.cache_entries,
+                                   options.cache_size)
+    cp_names = [name for (name, desc) in registered_checkpoints]
+    cache.compute_key(doc, cp_names, doc_dict)
+
+    # restoring marks every checkpoint up to the cache point completed, so
+    # only restore if the build is not to pause at or before it
+    if pause_checkpoint is not None and pause_checkpoint in cp_names and \
+       cp_names.index(pause_checkpoint) <= cp_names.index(cache.cache_point):
+        DC_LOGGER.info("Pausing at or before %s; not using the build cache" %
+                       cache.cache_point)
+        return None
+
+    cache.restore(build_data)
+    return cache
+
+
 def main():
     """ primary execution function for distro_const
     """
@@ -633,6 +699,15 @@ def main():
                 doc.volatile.insert_children(DataObjectDict(DC_LABEL, doc_dict,
                                                             generate_xml=True))
 
+                # look for a build cache entry unless resuming, where the
+                # build_data dataset is already populated
+                cache = None
+                if options.cache_dataset is not None and \
+                   resume_checkpoint is None:
+                    cache = restore_build_cache(options, zpool_name,
+                        eng.dataset, registered_checkpoints, doc_dict,
+                        pause_checkpoint)
+
                 # if we're trying to pause at the very first checkpoint,
                 # there's nothing to execute, so return 0
                 if pause_checkpoint == registered_checkpoints[0][0]:
@@ -640,6 +715,14 @@ def main():
 
                 execute_checkpoint(new_detaillog, resume_checkpoint,
                     pause_checkpoint)
+
+                # failing to save the cache entry doesn't fail the build
+                if cache is not None:
+                    try:
+                        cache.save(eng.dataset)
+                    except CalledProcessError as err:
+                        DC_LOGGER.warning("Unable to save build cache "
+                                          "entry: %s" % err)
     # catch any errors and log them.
     except BaseException as msg:
         if DC_LOGGER is not None:
@@ -0,0 +1,300 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+""" build_cache.py - content addressed cache of distro_const build_data
+datasets.
+
+A build normally starts from an empty build_data dataset and repeats the
+package transfer and image preparation steps even when nothing they depend
+on has changed.  The build cache keeps a copy of build_data, as it was
+after a chosen checkpoint (the cache point) completed, in a child dataset
+of a cache dataset.  The entry is named by a hash of everything the
+checkpoints up to the cache point depend on:
+
+    - the software sections of the manifest (publishers, origins and the
+      package list),
+    - the configuration sections of the manifest, including the contents
+      of the SMF profiles and other files they name as their source,
+    - the build paths handed to the checkpoints, and
+    - the registration (module, class, args and kwargs) of each checkpoint
+      up to the cache point, including the contents of any files named by
+      the args or kwargs.
+
+A later build with the same key clones the entry in place of build_data,
+reloads the DOC from the cache point and resumes with the checkpoint
+after it.
+
+Packages are hashed as named in the manifest, not as resolved by pkg(5),
+so an entry is reused even if newer versions of unpinned packages have
+been published since it was saved.  Pin versions, or clear the cache,
+when that matters.
+"""
+
+import hashlib
+import logging
+import os
+import time
+
+from solaris_install import CalledProcessError, Popen, run
+from solaris_install.configuration.configuration import Configuration
+from solaris_install.engine import INSTALL_LOGGER_NAME, InstallEngine
+from solaris_install.target.logical import Filesystem
+from solaris_install.transfer.info import Software
+
+ZFS = "/usr/sbin/zfs"
+
+# default checkpoint to cache the build up to.  Everything before
+# pkg-img-mod only depends on the software, configuration and checkpoint
+# sections of the manifest.
+DEFAULT_CACHE_POINT = "pre-pkg-img-mod"
+
+# default number of entries to keep in the cache
+DEFAULT_MAX_ENTRIES = 4
+
+# ZFS user property recording when an entry was last saved or used
+LAST_USED_PROP = "org.opensolaris.caiman:dc-last-used"
+
+# prefix of the cache entry dataset names
+ENTRY_PREFIX = "dc-"
+
+
+class BuildCache(object):
+    """ BuildCache - save and restore build_data datasets keyed by the
+    inputs of the checkpoints up to the cache point.
+
+    cache_dataset - name of the dataset holding the cache entries.  It must
+    be in the same pool as build_data so that entries can be cloned.
+    cache_point - name of the last checkpoint whose results are cached
+    max_entries - number of entries kept after a save
+    max_size - optional limit, in bytes, on the space used by the entries
+    """
+
+    def __init__(self, cache_dataset, cache_point=DEFAULT_CACHE_POINT,
+                 max_entries=DEFAULT_MAX_ENTRIES, max_size=None):
+        self.cache = Filesystem(cache_dataset)
+        self.cache_point = cache_point
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.key = None
+        self.checkpoint_names = list()
+        self.logger = logging.getLogger(INSTALL_LOGGER_NAME)
+
+    def compute_key(self, doc, checkpoint_names, paths):
+        """ compute_key() - compute and return the cache key for the
+        checkpoints up to and including the cache point.
+
+        doc - the DOC, with the manifest and build paths already filled in
+        checkpoint_names - registered checkpoint names, in order
+        paths - dictionary of the build paths given to the checkpoints
+        """
+        if self.cache_point not in checkpoint_names:
+            raise RuntimeError("Build cache point '%s' is not a registered "
+                               "checkpoint" % self.cache_point)
+
+        eng = InstallEngine.get_instance()
+
+        digest = hashlib.sha1()
+        for software in doc.volatile.get_descendants(class_type=Software):
+            digest.update(software.get_xml_tree_str() or "")
+        for config in doc.volatile.get_descendants(class_type=Configuration):
+            digest.update(config.get_xml_tree_str() or "")
+            if config.source is not None and os.path.isfile(config.source):
+                with open(config.source) as source_file:
+                    digest.update(source_file.read())
+        digest.update(_canonical(paths))
+
+        for name in checkpoint_names:
+            cp_data = eng.get_cp_data(name)
+            cp_info = cp_data.cp_info
+            digest.update(_canonical([name, cp_info.module_path,
+                                      cp_info.checkpoint_class_name,
+                                      cp_data.args, cp_data.kwargs]))
+            for filename in _file_args([cp_data.args, cp_data.kwargs]):
+                with open(filename) as arg_file:
+                    digest.update(arg_file.read())
+            if name == self.cache_point:
+                break
+
+        self.checkpoint_names = list(checkpoint_names)
+        self.key = ENTRY_PREFIX + digest.hexdigest()
+        return self.key
+
+    @property
+    def entry(self):
+        """ Filesystem of the cache entry for the current key """
+        return Filesystem(os.path.join(self.cache.name, self.key))
+
+    @property
+    def entry_snapshot(self):
+        """ short name of the snapshot cloned to restore an entry """
+        return InstallEngine.SNAPSHOT_NAME % {"checkpoint":
+            self.cache_point + InstallEngine.CP_COMPLETED_SUFFIX}
+
+    def restore(self, build_data):
+        """ restore() - replace build_data with a clone of the cache entry
+        for the current key, reload the DOC as it was after the cache point
+        and mark the checkpoints up to the cache point completed.
+
+        Returns True if the entry was restored and False if there is no
+        entry for the key.
+        """
+        entry = self.entry
+        if not self.cache.exists or not entry.exists or \
+           entry.snapname(self.entry_snapshot) not in entry.snapshot_list:
+            self.logger.info("Build cache miss: %s" % self.key)
+            return False
+
+        self.logger.info("Build cache hit: %s" % self.key)
+        mountpoint = build_data.get("mountpoint")
+        build_data.destroy(dry_run=False, recursive=True)
+        run([ZFS, "clone", "-o", "mountpoint=%s" % mountpoint,
+             entry.snapname(self.entry_snapshot), build_data.name])
+
+        # the @empty snapshot lets resumed builds find the build datasets
+        # set up as usual
+        build_data.snapshot("empty")
+        self._touch(entry)
+
+        eng = InstallEngine.get_instance()
+        completed_name = self.cache_point + InstallEngine.CP_COMPLETED_SUFFIX
+        eng.data_object_cache.load_from_snapshot(
+            eng.get_cache_filename(completed_name))
+
+        completed = True
+        for name in self.checkpoint_names:
+            eng.get_cp_data(name).completed = completed
+            if name == self.cache_point:
+                completed = False
+        return True
+
+    def save(self, build_data):
+        """ save() - copy build_data, as it was after the cache point, into
+        the cache entry for the current key and evict old entries.
+        """
+        eng = InstallEngine.get_instance()
+        if not eng.get_cp_data(self.cache_point).completed:
+            self.logger.debug("Build cache point %s not reached; not saving" %
+                              self.cache_point)
+            return
+
+        entry = self.entry
+        if entry.exists:
+            self._touch(entry)
+            return
+
+        if not self.cache.exists:
+            run([ZFS, "create", "-p", "-o", "mountpoint=none",
+                 self.cache.name])
+
+        self.logger.info("Saving build cache entry %s" % self.key)
+        snapshot = build_data.snapname(self.entry_snapshot)
+        send = Popen([ZFS, "send", snapshot], stdout=Popen.PIPE)
+        try:
+            run([ZFS, "receive", "-u", entry.name], stdin=send.stdout)
+        finally:
+            send.stdout.close()
+            if send.wait() != 0:
+                raise CalledProcessError(send.returncode,
+                                         [ZFS, "send", snapshot])
+        self._touch(entry)
+        self.evict(keep=entry.name)
+
+    def entries(self):
+        """ entries() - return a list of (last_used, used, name) tuples for
+        the cache entries, least recently used first.
+        """
+        if not self.cache.exists:
+            return []
+
+        cmd = [ZFS, "list", "-H", "-p", "-d", "1", "-t", "filesystem",
+               "-o", "name,used,%s" % LAST_USED_PROP, self.cache.name]
+        entries = []
+        for line in run(cmd).stdout.splitlines():
+            name, used, last_used = line.split("\t")
+            if not os.path.basename(name).startswith(ENTRY_PREFIX):
+                continue
+            if not last_used.isdigit():
+                last_used = "0"
+            entries.append((long(last_used), long(used), name))
+        entries.sort()
+        return entries
+
+    def evict(self, keep=None):
+        """ evict() - destroy the least recently used entries until at most
+        max_entries remain and they use at most max_size bytes.  Entries
+        still cloned by a build_data dataset, and the entry named by keep,
+        are never destroyed.
+        """
+        entries = self.entries()
+        total = sum(used for (last_used, used, name) in entries)
+        count = len(entries)
+        for (last_used, used, name) in entries:
+            if count <= self.max_entries and \
+               (self.max_size is None or total <= self.max_size):
+                break
+            if name == keep:
+                continue
+            try:
+                run([ZFS, "destroy", "-r", name])
+            except CalledProcessError:
+                # still the origin of a build_data clone
+                self.logger.debug("Build cache entry %s is in use" % name)
+                continue
+            self.logger.info("Evicted build cache entry %s" %
+                             os.path.basename(name))
+            total -= used
+            count -= 1
+
+    def _touch(self, entry):
+        """ record the entry as just used """
+        entry.set(LAST_USED_PROP, int(time.time()), dry_run=False)
+
+
+def _canonical(value):
+    """ return a string representing value, independent of dictionary
+    ordering
+    """
+    if isinstance(value, dict):
+        return "{%s}" % ", ".join("%r: %s" % (key, _canonical(value[key]))
+                                  for key in sorted(value))
+    if isinstance(value, (list, tuple)):
+        return "[%s]" % ", ".join(_canonical(item) for item in value)
+    return repr(value)
+
+
+def _file_args(value):
+    """ return the names of the regular files named by the strings in
+    value, in order
+    """
+    if isinstance(value, basestring):
+        if value.startswith("/") and os.path.isfile(value):
+            return [value]
+        return []
+    if isinstance(value, dict):
+        value = [value[key] for key in sorted(value)]
+    if isinstance(value, (list, tuple)):
+        return [name for item in value for name in _file_args(item)]
+    return []
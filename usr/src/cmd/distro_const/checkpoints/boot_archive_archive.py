@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2010, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 """ boot_archive_archive - archive the boot archive directory
@@ -36,7 +36,7 @@ from solaris_install import DC_LABEL, run, run_silent
 from solaris_install.engine.checkpoint import AbstractCheckpoint as Checkpoint
 from solaris_install.data_object.data_dict import DataObjectDict
 from solaris_install.engine import InstallEngine
-from osol_install.install_utils import dir_size
+from osol_install.install_utils import dir_scan, dir_size
 from solaris_install.target.logical import Lofi
 from solaris_install.transfer.cpio import TransferCPIOAttr
 from solaris_install.transfer.info import INSTALL
@@ -112,15 +112,8 @@ class BootArchiveArchive(Checkpoint):
         directory - root of the boot archive
         size - the size of the boot archive
         """
-        file_count = 0
-
-        # get the cwd to return to later
-        cwd = os.getcwd()
-
-        # change to the boot_archive directory
-        os.chdir(directory)
-        for _none, dirs, files in os.walk("."):
-            file_count += len(files) + len(dirs)
+        # the count is cached from the scan done by calculate_ba_size()
+        file_count = dir_scan(directory)[1]
 
         # Add inode overhead for multiple disk systems using 500 disks as a
         # target upper bound.
@@ -145,9 +138,6 @@ class BootArchiveArchive(Checkpoint):
             self.logger.debug("Calculated number of bytes per inode: %d" % \
                               nbpi)
 
-        # return back to the cwd
-        os.chdir(cwd)
-
         return nbpi
 
     def calculate_ba_size(self, directory):
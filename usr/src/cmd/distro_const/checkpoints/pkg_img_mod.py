@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2010, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 """ pkg_img_mod
@@ -33,9 +33,12 @@
 import os
 import platform
 import shutil
+import tempfile
+import threading
+import time
 
 from osol_install.install_utils import dir_size, file_size
-from solaris_install import CalledProcessError, DC_LABEL, Popen, run
+from solaris_install import DC_LABEL, Popen, run
 from solaris_install.data_object.data_dict import DataObjectDict
 from solaris_install.engine import InstallEngine
 from solaris_install.engine.checkpoint import AbstractCheckpoint as Checkpoint
@@ -45,11 +48,16 @@ from solaris_install.transfer.media_transfer import TRANSFER_MEDIA, \
     INSTALL_TARGET_VAR, MEDIA_DIR_VAR, TRANSFER_MANIFEST_NAME, \
     TRANSFER_MISC
 from solaris_install.manifest.writer import ManifestWriter
+from solaris_install.distro_const import lofi_compress
 
 # load a table of common unix cli calls
 import solaris_install.distro_const.cli as cli
 cli = cli.CLI()
 
+# names of the file system archives in the package image
+USR_ARCHIVE = "solaris.zlib"
+MISC_ARCHIVE = "solarismisc.zlib"
+
 
 class PkgImgMod(Checkpoint):
     """ PkgImgMod - class to modify the pkg_image directory after the boot
@@ -70,12 +78,19 @@ class PkgImgMod(Checkpoint):
 
         self.dist_iso_sort = arg.get("dist_iso_sort")
 
+        # stream the archives straight into the compressor rather than
+        # writing them out and compressing them with lofiadm.  Only the
+        # gzip compression types can be streamed.
+        self.stream_compression = \
+            arg.get("stream_compression", "false").lower() == "true"
+
         # instance attributes
         self.doc = None
         self.dc_dict = {}
         self.pkg_img_path = None
         self.ba_build = None
         self.tmp_dir = None
+        self.archive_stats = {}
 
     def get_progress_estimate(self):
         """Returns an estimate of the time this checkpoint will take"""
@@ -172,48 +187,108 @@ class PkgImgMod(Checkpoint):
         os.symlink(os.path.join("..", "platform"),
                    os.path.join(self.pkg_img_path, "boot/platform"))
 
-    def create_usr_archive(self):
-        """ class method to create the /usr file system archive
+    def mkisofs_cmd(self, directory, output=None, sort=False):
+        """ class method to return the mkisofs command archiving directory
+        to output, or to stdout if output is None
         """
-        os.chdir(self.pkg_img_path)
-
-        # Generate the /usr file system archive.
-        self.logger.info("Generating /usr file system archive")
-
-        cmd = [cli.MKISOFS, "-o", "solaris.zlib", "-quiet", "-N",
-               "-l", "-R", "-U", "-allow-multidot", "-no-iso-translate",
-               "-cache-inodes", "-d", "-D", "-V", "\"compress\"", "usr"]
+        cmd = [cli.MKISOFS, "-quiet", "-N", "-l", "-R", "-U",
+               "-allow-multidot", "-no-iso-translate", "-cache-inodes",
+               "-d", "-D", "-V", "\"compress\""]
+        if output is not None:
+            cmd[1:1] = ["-o", output]
 
         # Use the iso_sort file if one is specified
-        if self.dist_iso_sort is not None and \
+        if sort and self.dist_iso_sort is not None and \
            os.path.exists(self.dist_iso_sort):
-            # insert the flags directly after the name of the output file
-            cmd.insert(3, "-sort")
-            cmd.insert(4, self.dist_iso_sort)
-        run(cmd)
-
-        self.logger.info("Compressing /usr file system archive using: " +
-                         self.compression_type)
-
-        cmd = [cli.LOFIADM, "-C", self.compression_type,
-               os.path.join(self.pkg_img_path, "solaris.zlib")]
-        try:
-            p = run(cmd)
-        except CalledProcessError:
-            raise RuntimeError("Compression of /usr file system failed: " +
-                               os.strerror(p.returncode))
-
-    def create_misc_archive(self):
-        """ class method to create the /mnt/misc file system archive
+            cmd.extend(["-sort", self.dist_iso_sort])
+        cmd.append(directory)
+        return cmd
+
+    def build_archive(self, archive, directory, sort=False):
+        """ class method to archive directory of the package image to the
+        compressed file archive, recording and logging how long it took and
+        how well it compressed.
         """
-        os.chdir(self.pkg_img_path)
+        path = os.path.join(self.pkg_img_path, archive)
+        start = time.time()
+
+        if self.stream_compression and \
+           self.compression_type in lofi_compress.ALGORITHMS:
+            self.logger.info("Generating and compressing %s using: %s" %
+                             (archive, self.compression_type))
+            cmd = self.mkisofs_cmd(directory, sort=sort)
+            with tempfile.TemporaryFile() as errfile:
+                p = Popen(cmd, stdout=Popen.PIPE, stderr=errfile,
+                          cwd=self.pkg_img_path)
+                try:
+                    (size, compressed_size) = lofi_compress.compress_stream(
+                        p.stdout, path, self.compression_type)
+                finally:
+                    p.stdout.close()
+                    p.wait()
+                errfile.seek(0)
+                errors = errfile.read()
+            if errors:
+                self.logger.debug(errors)
+            if p.returncode != 0:
+                raise RuntimeError("Generation of %s failed: %s" %
+                                   (archive, errors or
+                                    os.strerror(p.returncode)))
+            generate_time = time.time() - start
+            compress_time = None
+        else:
+            run(self.mkisofs_cmd(directory, archive, sort),
+                cwd=self.pkg_img_path)
+            size = os.path.getsize(path)
+            generate_time = time.time() - start
+
+            self.logger.info("Compressing %s using: %s" %
+                             (archive, self.compression_type))
+            cmd = [cli.LOFIADM, "-C", self.compression_type, path]
+            p = run(cmd, check_result=Popen.ANY)
+            if p.returncode != 0:
+                if "invalid algorithm name" in p.stderr:
+                    raise RuntimeError("Invalid compression algorithm " +
+                        "specified for %s: %s" %
+                        (archive, self.compression_type))
+                else:
+                    raise RuntimeError("Compression of %s failed: %s" %
+                        (archive, os.strerror(p.returncode)))
+            compressed_size = os.path.getsize(path)
+            compress_time = time.time() - start - generate_time
+
+        stats = {"size": size,
+                 "compressed_size": compressed_size,
+                 "generate_time": generate_time,
+                 "compress_time": compress_time}
+        self.archive_stats[archive] = stats
+
+        ratio = 100.0 * compressed_size / max(size, 1)
+        msg = "%s: %d MB compressed to %d MB (%.1f%%) in %.1fs" % \
+              (archive, size / 2 ** 20, compressed_size / 2 ** 20, ratio,
+               time.time() - start)
+        if compress_time is not None:
+            msg += " (generation %.1fs, compression %.1fs)" % \
+                   (generate_time, compress_time)
+        self.logger.info(msg)
+        return stats
 
-        self.logger.info("Generating /mnt/misc file system archive")
+    def create_usr_archive(self):
+        """ class method to create the /usr file system archive
+        """
+        # Generate the /usr file system archive.
+        self.logger.info("Generating /usr file system archive")
+        self.build_archive(USR_ARCHIVE, "usr", sort=True)
 
-        os.mkdir("miscdirs")
-        shutil.move("opt", "miscdirs")
-        shutil.move("etc", "miscdirs")
-        shutil.move("var", "miscdirs")
+    def prepare_misc_archive(self):
+        """ class method to gather the contents of the /mnt/misc file system
+        archive in the miscdirs directory and record their transfer in the
+        DOC
+        """
+        os.mkdir(os.path.join(self.pkg_img_path, "miscdirs"))
+        for directory in ["opt", "etc", "var"]:
+            shutil.move(os.path.join(self.pkg_img_path, directory),
+                        os.path.join(self.pkg_img_path, "miscdirs"))
 
         # add Software node to install items from /mnt/misc
 
@@ -235,27 +310,9 @@ class PkgImgMod(Checkpoint):
         misc_software_node.insert_children([src, dst, tr_install_misc])
         self.doc.persistent.insert_children(misc_software_node)
 
-        cmd = [cli.MKISOFS, "-o", "solarismisc.zlib", "-N", "-l", "-R",
-               "-U", "-allow-multidot", "-no-iso-translate", "-quiet",
-               "-cache-inodes", "-d", "-D", "-V", "\"compress\"",
-               "miscdirs"]
-        run(cmd)
-
-        self.logger.info("Compressing /mnt/misc file system archive " +
-                         "using: " + self.compression_type)
-
-        cmd = [cli.LOFIADM, "-C", self.compression_type,
-               os.path.join(self.pkg_img_path, "solarismisc.zlib")]
-        p = run(cmd, check_result=Popen.ANY)
-        if p.returncode != 0:
-            if "invalid algorithm name" in p.stderr:
-                raise RuntimeError("Invalid compression algorithm " +
-                    "specified for /mnt/misc archive: " +
-                    self.compression_type)
-            else:
-                raise RuntimeError("Compression of /mnt/misc file system " +
-                                   "failed:  " + os.strerror(p.returncode))
-
+    def remove_archived(self):
+        """ class method to remove the directories held in the archives
+        """
         # the removal of /usr must be deferred to until solarismisc.zlib has
         # been created because the contents of solarismisc.zlib actually come
         # from /usr
@@ -264,6 +321,48 @@ class PkgImgMod(Checkpoint):
         shutil.rmtree(os.path.join(self.pkg_img_path, "usr"),
                       ignore_errors=True)
 
+    def create_misc_archive(self):
+        """ class method to create the /mnt/misc file system archive
+        """
+        self.logger.info("Generating /mnt/misc file system archive")
+        self.prepare_misc_archive()
+        self.build_archive(MISC_ARCHIVE, "miscdirs")
+        self.remove_archived()
+
+    def create_archives(self):
+        """ class method to create the /usr and /mnt/misc file system
+        archives concurrently
+        """
+        self.logger.info("Generating /usr and /mnt/misc file system archives")
+        self.prepare_misc_archive()
+
+        errors = []
+
+        def build(archive, directory, sort):
+            """ build one archive, saving any error for the main thread """
+            try:
+                self.build_archive(archive, directory, sort)
+            except BaseException as err:
+                self.logger.exception("Unable to create %s" % archive)
+                errors.append(err)
+
+        threads = [threading.Thread(target=build, name=archive,
+                                    args=(archive, directory, sort))
+                   for (archive, directory, sort) in
+                   [(USR_ARCHIVE, "usr", True),
+                    (MISC_ARCHIVE, "miscdirs", False)]]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+        self.logger.info("File system archives created in %.1fs" %
+                         (time.time() - start))
+        self.remove_archived()
+
     def add_content_list_to_doc(self, content_list):
         src_path = Dir(MEDIA_DIR_VAR)
         src = Source()
@@ -350,11 +449,8 @@ class PkgImgMod(Checkpoint):
         # clean up the root of the package image path
         self.strip_root()
 
-        # create the /usr archive
-        self.create_usr_archive()
-
-        # create the /mnt/misc archive
-        self.create_misc_archive()
+        # create the /usr and /mnt/misc archives
+        self.create_archives()
 
 
 class LiveCDPkgImgMod(PkgImgMod, Checkpoint):
@@ -405,11 +501,8 @@ class LiveCDPkgImgMod(PkgImgMod, Checkpoint):
         # clean up the root of the package image path
         self.strip_root()
 
-        # create the /usr archive
-        self.create_usr_archive()
-
-        # create the /mnt/misc archive
-        self.create_misc_archive()
+        # create the /usr and /mnt/misc archives
+        self.create_archives()
 
         # strip the /platform directory
         self.strip_platform()
@@ -439,11 +532,8 @@ class TextPkgImgMod(PkgImgMod, Checkpoint):
         # clean up the root of the package image path
         self.strip_root()
 
-        # create the /usr archive
-        self.create_usr_archive()
-
-        # create the /mnt/misc archive
-        self.create_misc_archive()
+        # create the /usr and /mnt/misc archives
+        self.create_archives()
 
         # get the platform of the system
         arch = platform.processor()
@@ -485,11 +575,8 @@ class AIPkgImgMod(TextPkgImgMod):
         # clean up the root of the package image path
         self.strip_root()
 
-        # create the /usr archive
-        self.create_usr_archive()
-
-        # create the /mnt/misc archive
-        self.create_misc_archive()
+        # create the /usr and /mnt/misc archives
+        self.create_archives()
 
         # get the platform of the system
         arch = platform.processor()
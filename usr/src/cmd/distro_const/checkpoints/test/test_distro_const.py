@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 """ test_distro_const
@@ -35,11 +35,13 @@ import tempfile
 import unittest
 
 import solaris_install.distro_const as dc
+import solaris_install.distro_const.build_cache as dc_cache
 import solaris_install.distro_const.distro_spec as dc_spec
 import solaris_install.distro_const.execution_checkpoint as dc_exec
 
 from lxml import etree
 
+from solaris_install.configuration.configuration import Configuration
 from solaris_install.engine.test import engine_test_utils
 from solaris_install.logger import INSTALL_LOGGER_NAME
 from solaris_install.target import Target
@@ -202,6 +204,31 @@ class TestParseArgs(unittest.TestCase):
         except:
             self.fail(" ".join(args) + " failed to parse correctly")
 
+    def test_cache_flags(self):
+        """ verify the build cache flags work
+        """
+        args = ["build", "-c", "rpool/dc/cache", "--cache-point", "cp1",
+                "--cache-entries", "2", "--cache-size", "2gb",
+                "manifest.xml"]
+        (options, args) = dc.parse_args(args)
+        self.assertEqual(options.cache_dataset, "rpool/dc/cache")
+        self.assertEqual(options.cache_point, "cp1")
+        self.assertEqual(options.cache_entries, 2)
+        self.assertEqual(options.cache_size, 2 * 2 ** 30)
+
+    def test_cache_size_without_cache(self):
+        """ verify --cache-size requires -c
+        """
+        args = ["build", "--cache-size", "2gb", "manifest.xml"]
+        self.assertRaises(SystemExit, dc.parse_args, args)
+
+    def test_bad_cache_size(self):
+        """ verify an invalid --cache-size is rejected
+        """
+        args = ["build", "-c", "rpool/dc/cache", "--cache-size", "lots",
+                "manifest.xml"]
+        self.assertRaises(SystemExit, dc.parse_args, args)
+
 
 class TestStreamHandler(unittest.TestCase):
     """ test case for setting up the StreamHandler
@@ -287,6 +314,102 @@ class TestRegisterCheckpoints(unittest.TestCase):
         self.assertRaises(RuntimeError, dc.register_checkpoints, self.logger)
 
 
+class TestBuildCacheKey(unittest.TestCase):
+    """ test case for testing the build cache key
+    """
+    def setUp(self):
+        self.eng = engine_test_utils.get_new_engine_instance()
+        self.doc = self.eng.data_object_cache
+
+        self.distro = dc_spec.Distro("distro")
+        self.execution = dc_exec.Execution("execution")
+        self.execution.stop_on_error = "True"
+        self.cps = list()
+        for name in ["cp1", "cp2", "cp3"]:
+            cp = dc_exec.Checkpoint(name)
+            cp.mod_path = "unittest"
+            cp.checkpoint_class = "FunctionTestCase"
+            cp.kwargs = {"description": name}
+            self.cps.append(cp)
+        self.execution.insert_children(self.cps)
+        self.distro.insert_children(self.execution)
+        self.doc.volatile.insert_children(self.distro)
+
+        # an SMF profile applied by one of the checkpoints
+        self.fh, self.profile = tempfile.mkstemp(suffix=".xml")
+        os.write(self.fh, "<service_bundle/>\n")
+        os.close(self.fh)
+        self.config = Configuration("cp2")
+        self.config.source = self.profile
+        self.distro.insert_children(self.config)
+
+        self.paths = {"pkg_img_path": "/build_data/pkg_image"}
+        self.logger = logging.getLogger(INSTALL_LOGGER_NAME)
+
+    def tearDown(self):
+        engine_test_utils.reset_engine()
+        if os.path.exists(self.profile):
+            os.remove(self.profile)
+
+    def get_key(self, cache_point="cp2"):
+        """ register the checkpoints in a new engine and return the key
+        """
+        engine_test_utils.reset_engine()
+        self.eng = engine_test_utils.get_new_engine_instance()
+        self.eng.data_object_cache.volatile.insert_children(self.distro)
+        names = [name for (name, desc) in
+                 dc.register_checkpoints(self.logger)]
+        cache = dc_cache.BuildCache("rpool/dc/cache", cache_point)
+        return cache.compute_key(self.eng.data_object_cache, names,
+                                 self.paths)
+
+    def test_same_inputs(self):
+        """ the key is the same for the same inputs
+        """
+        self.assertEqual(self.get_key(), self.get_key())
+
+    def test_changed_kwargs(self):
+        """ changing a checkpoint up to the cache point changes the key
+        """
+        key = self.get_key()
+        self.cps[1].kwargs = {"description": "changed"}
+        self.assertNotEqual(key, self.get_key())
+
+    def test_changed_paths(self):
+        """ changing the build paths changes the key
+        """
+        key = self.get_key()
+        self.paths["pkg_img_path"] = "/other/pkg_image"
+        self.assertNotEqual(key, self.get_key())
+
+    def test_changed_profile(self):
+        """ editing an SMF profile named by the manifest changes the key
+        """
+        key = self.get_key()
+        with open(self.profile, "a") as fh:
+            fh.write("<!-- changed -->\n")
+        self.assertNotEqual(key, self.get_key())
+
+    def test_changed_config_source(self):
+        """ naming a different SMF profile changes the key
+        """
+        key = self.get_key()
+        self.config.source = "/etc/other_profile.xml"
+        self.assertNotEqual(key, self.get_key())
+
+    def test_after_cache_point(self):
+        """ changing a checkpoint after the cache point keeps the key
+        """
+        key = self.get_key()
+        self.cps[2].kwargs = {"description": "changed"}
+        self.assertEqual(key, self.get_key())
+
+    def test_unknown_cache_point(self):
+        """ an unregistered cache point is rejected
+        """
+        self.assertRaises(RuntimeError, self.get_key, "no-such-checkpoint")
+
+
 class TestParseManifest(unittest.TestCase):
     """ test case for testing the parse_manifest function
     """
@@ -0,0 +1,121 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+""" test_lofi_compress
+
+ Test program for solaris_install/distro_const/lofi_compress.py
+
+"""
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+
+from cStringIO import StringIO
+
+from solaris_install.distro_const import lofi_compress
+
+
+def read_lofi_file(path):
+    """ decode the lofi compressed file at path, returning the algorithm, the
+    segment flags and the uncompressed data
+    """
+    with open(path, "rb") as lofi_file:
+        data = lofi_file.read()
+
+    header_fmt = ">%dsIII" % lofi_compress.MAXALGLEN
+    header_size = struct.calcsize(header_fmt)
+    (algorithm, segment_size, entries, last_segment_size) = \
+        struct.unpack(header_fmt, data[:header_size])
+    index_fmt = ">%dQ" % entries
+    index_size = struct.calcsize(index_fmt)
+    index = struct.unpack(index_fmt,
+                          data[header_size:header_size + index_size])
+    base = header_size + index_size
+
+    flags = []
+    output = []
+    for (start, end) in zip(index, index[1:]):
+        segment = data[base + start:base + end]
+        flags.append(ord(segment[0]))
+        if ord(segment[0]) == lofi_compress.COMPRESSED:
+            output.append(zlib.decompress(segment[1:]))
+        else:
+            output.append(segment[1:])
+    assert len(data) == base + index[-1]
+    if output:
+        assert len(output[-1]) == last_segment_size
+    return (algorithm.rstrip("\0"), flags, "".join(output))
+
+
+class TestCompressStream(unittest.TestCase):
+    """ test case for compress_stream()
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(dir="/var/tmp", prefix="test_lofi_")
+        self.path = os.path.join(self.tmp_dir, "test.zlib")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_round_trip(self):
+        """ compressed segments decompress to the original data, in order
+        """
+        data = "".join("line %d of the archive\n" % i for i in range(50000))
+        (size, compressed_size) = lofi_compress.compress_stream(
+            StringIO(data), self.path, threads=3, segment_size=4096)
+        (algorithm, flags, output) = read_lofi_file(self.path)
+        self.assertEqual(algorithm, "gzip")
+        self.assertEqual(output, data)
+        self.assertEqual(size, len(data))
+        self.assertEqual(compressed_size, os.path.getsize(self.path))
+        self.assertTrue(compressed_size < size)
+        self.assertTrue(lofi_compress.UNCOMPRESSED not in flags)
+
+    def test_incompressible(self):
+        """ segments that do not compress are stored uncompressed
+        """
+        data = os.urandom(10000)
+        lofi_compress.compress_stream(StringIO(data), self.path,
+                                      "gzip-9", segment_size=4096)
+        (algorithm, flags, output) = read_lofi_file(self.path)
+        self.assertEqual(algorithm, "gzip-9")
+        self.assertEqual(output, data)
+        self.assertEqual(flags, [lofi_compress.UNCOMPRESSED] * 3)
+
+    def test_bad_algorithm(self):
+        """ algorithms other than gzip are rejected
+        """
+        self.assertRaises(ValueError, lofi_compress.compress_stream,
+                          StringIO("data"), self.path, "lzma")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+"""
+lofi_compress.py:  write lofi(7D) compressed files from a stream.
+
+lofiadm -C compresses an existing file in place, so an archive has to be
+written out in full before it can be compressed.  compress_stream() reads
+the uncompressed data from any file object, such as the stdout of
+mkisofs, and compresses its segments on several threads.
+
+A compressed file has the same layout as one written by lofiadm -C:
+
+    algorithm name          MAXALGLEN bytes, NUL padded
+    segment size            uint32
+    index entries           uint32, number of segments + 1
+    last segment size       uint32, uncompressed size of the last segment
+    index                   uint64 per entry, offset of each segment from
+                            the end of the index.  The last entry is the
+                            end of the last segment.
+    segments                a one byte COMPRESSED or UNCOMPRESSED flag
+                            followed by the segment data
+
+All integers are big endian.  Only the gzip algorithms are available, as
+they only need zlib.
+"""
+
+import collections
+import os
+import struct
+import tempfile
+import zlib
+
+from multiprocessing.pool import ThreadPool
+
+# default segment size used by lofiadm
+SEGMENT_SIZE = 128 * 1024
+
+# length of the algorithm name in the header
+MAXALGLEN = 36
+
+# segment flags
+UNCOMPRESSED = 0
+COMPRESSED = 1
+
+# zlib compression level of each algorithm
+ALGORITHMS = {"gzip": 6, "gzip-6": 6, "gzip-9": 9}
+
+# segments queued per thread before the reader waits for the oldest
+SEGMENTS_PER_THREAD = 4
+
+
+def _compress_segment(data, level):
+    """ compress one segment, keeping it uncompressed if that is smaller
+    """
+    compressed = zlib.compress(data, level)
+    if len(compressed) < len(data):
+        return chr(COMPRESSED) + compressed
+    return chr(UNCOMPRESSED) + data
+
+
+def _read_segment(infile, segment_size):
+    """ read a full segment from infile, or what remains at the end of it
+    """
+    chunks = []
+    remaining = segment_size
+    while remaining > 0:
+        chunk = infile.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return "".join(chunks)
+
+
+def compress_stream(infile, outpath, algorithm="gzip", threads=None,
+                    segment_size=SEGMENT_SIZE):
+    """ compress_stream() - read infile to its end and write it to outpath
+    as a lofi compressed file.
+
+    infile - file object to read the uncompressed data from
+    outpath - path of the compressed file to write
+    algorithm - one of the keys of ALGORITHMS
+    threads - number of compression threads.  Defaults to the number of
+    CPUs.
+    segment_size - uncompressed size of each segment
+
+    Returns a (uncompressed size, compressed size) tuple, in bytes.
+
+    The compressed segments are spooled to a temporary file next to outpath
+    until the index, which precedes them, is known.
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError("unsupported lofi compression algorithm: %s" %
+                         algorithm)
+    level = ALGORITHMS[algorithm]
+
+    if threads is None:
+        threads = os.sysconf("SC_NPROCESSORS_ONLN")
+    threads = max(1, threads)
+
+    index = [0]
+    uncompressed_size = 0
+    last_segment_size = 0
+
+    pool = ThreadPool(threads)
+    spool = tempfile.TemporaryFile(dir=os.path.dirname(outpath) or ".")
+    try:
+        pending = collections.deque()
+
+        def write_oldest():
+            """ write the oldest queued segment to the spool """
+            segment = pending.popleft().get()
+            spool.write(segment)
+            index.append(index[-1] + len(segment))
+
+        while True:
+            data = _read_segment(infile, segment_size)
+            if not data:
+                break
+            uncompressed_size += len(data)
+            last_segment_size = len(data)
+            pending.append(pool.apply_async(_compress_segment,
+                                            (data, level)))
+            if len(pending) >= threads * SEGMENTS_PER_THREAD:
+                write_oldest()
+        while pending:
+            write_oldest()
+
+        header = struct.pack(">%dsIII" % MAXALGLEN, algorithm,
+                             segment_size, len(index), last_segment_size)
+        header += struct.pack(">%dQ" % len(index), *index)
+
+        spool.seek(0)
+        with open(outpath, "wb") as outfile:
+            outfile.write(header)
+            while True:
+                chunk = spool.read(1024 * 1024)
+                if not chunk:
+                    break
+                outfile.write(chunk)
+    finally:
+        pool.terminate()
+        pool.join()
+        spool.close()
+
+    return (uncompressed_size, len(header) + index[-1])
@@ -27,7 +27,6 @@ AI create-client / delete-client
 import logging
 import os
 import re
-import shutil
 import sys
 
 import osol_install.auto_install.AI_database as AIdb
@@ -111,10 +110,11 @@ def setup_x86_client(service, mac_address, bootargs=''):
     menulst = os.path.join(service.config_dir, grub.MENULST)
     client_menulst = _menulst_path(client_id)
 
-    # copy service's menu.lst file to menu.lst.<client_id>
+    # copy service's menu.lst file to menu.lst.<client_id>; clients with
+    # the same boot configuration share one file in the menu.lst store
     try:
-        shutil.copy(menulst, client_menulst)
-    except IOError as err:
+        grub.link_menulst(menulst, client_menulst)
+    except (IOError, OSError) as err:
         print >> sys.stderr, cw(_("Unable to copy grub menu.lst file: %s") %
            err.strerror)
         return
@@ -129,7 +129,8 @@ def setup_x86_client(service, mac_address, bootargs=''):
     # if the client specifies bootargs, use them. Otherwise, inherit
     # the bootargs specified in the service (do nothing)
     if bootargs:
-        grub.update_bootargs(client_menulst, service.bootargs, bootargs)
+        grub.update_menulsts([client_menulst], grub.bootargs_line,
+                             service.bootargs, bootargs)
         clientinfo[config.BOOTARGS] = bootargs
 
     config.add_client_info(service.name, client_id, clientinfo)
@@ -222,6 +223,9 @@ def remove_client(client_id):
     # remove client specific symlinks/files
     _cleanup_files(client_id, more_files)
 
+    # drop the client's menu.lst from the store if no other client uses it
+    grub.prune_menulst_store()
+
 
 def remove_client_dhcp_config(client_id):
     '''
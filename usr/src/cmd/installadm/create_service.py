@@ -38,8 +38,6 @@ import tempfile
 import osol_install.auto_install.ai_smf_service as aismf
 import osol_install.auto_install.installadm_common as com
 import osol_install.auto_install.service_config as config
-import pkg.client.api_errors
-import pkg.client.history
 
 from optparse import OptionParser, OptionValueError
 from osol_install.auto_install.installadm_common import _, cli_wrap as cw
@@ -520,6 +518,9 @@ def do_create_baseservice(options):
             raise SystemExit(cw(_('Please re-enter command and specify '
                              'a valid Automated Installer ISO file')))
     else:
+        # only load the pkg(5) client API when creating from a package
+        import pkg.client.api_errors
+        import pkg.client.history
         try:
             image = InstalladmPkgImage.image_create(options.srcimage,
                 options.imagepath,
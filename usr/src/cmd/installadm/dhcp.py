@@ -29,12 +29,11 @@ of the ISC DHCP server (dhcpd(8)).
 import logging
 import os
 import re
-import socket
-import struct
 import sys
 import time
 
 import osol_install.auto_install.installadm_common as com
+import osol_install.auto_install.ip_ranges as ipr
 
 from osol_install.auto_install.installadm_common import _, cli_wrap as cw
 from osol_install.libaimdns import getifaddrs
@@ -313,24 +312,64 @@ class DHCPSubnet(DHCPData):
         ranges - A list of tuples, each tuple consisting of the
                  low and high addresses of a range in the subnet
     '''
-    def __init__(self, server, subnet_ip):
+    def __init__(self, server, subnet_ip, ranges=None):
 
         if not isinstance(server, DHCPServer):
             raise ValueError('object passed not a DHCPServer object')
 
         self.subnet_ip = subnet_ip
-        self.ranges = list()
 
-        # Set up a regular expression to extract the low and high addresses
-        # of a range from a 'range' string in the configuration data.
-        regexp = re.compile("^range\s+(%s)\s+(%s)" % (IP_PATTERN, IP_PATTERN))
+        # Populate the 'ranges' list of tuples from the DHCP server's
+        # address index, unless the caller already has them at hand.
+        if ranges is None:
+            ranges = server._address_index().ranges.get(subnet_ip, ())
+        self.ranges = list(ranges)
 
-        # Populate the 'ranges' list of tuples by applying the regexp across
-        # the DHCP server's current config and checking for our subnet_ip.
-        matches = filter(bool, map(regexp.match, server._current_config()))
-        self.ranges = [m.groups()
-            for m in matches
-                if _get_subnet(m.group(1), _get_mask(m.group(1))) == subnet_ip]
+
+class _DHCPAddressIndex(object):
+    '''
+    Index of the subnets and address ranges of a DHCP configuration, built
+    in a single pass over the configuration data.
+    Constructor arguments:
+        config_lines - iterable of configuration lines, as returned by
+                       DHCPServer._current_config()
+    Attributes:
+        subnets - ip_ranges.IntervalMap of each subnet's address range to
+                  its base address
+        ranges - dict mapping each subnet's base address to a list of
+                 (loaddr, hiaddr) tuples of the ranges in that subnet
+    '''
+    def __init__(self, config_lines):
+        subnet_re = re.compile("^subnet\s+(%s)\s+netmask\s+(%s)" %
+                               (IP_PATTERN, IP_PATTERN))
+        range_re = re.compile("^range\s+(%s)\s+(%s)" %
+                              (IP_PATTERN, IP_PATTERN))
+
+        self.subnets = ipr.IntervalMap()
+        self.ranges = dict()
+        all_ranges = list()
+        for line in config_lines:
+            m = subnet_re.match(line)
+            if m is not None:
+                (subnet_ip, netmask) = m.groups()
+                try:
+                    (low, high) = ipr.network_range(subnet_ip, netmask)
+                    self.subnets.add(low, high, subnet_ip)
+                except ValueError:
+                    logging.debug("dhcp: ignoring subnet %s netmask %s",
+                                  subnet_ip, netmask)
+                    continue
+                self.ranges.setdefault(subnet_ip, list())
+                continue
+            m = range_re.match(line)
+            if m is not None:
+                all_ranges.append(m.groups())
+
+        # A range belongs to the subnet its low address is a member of
+        for addrs in all_ranges:
+            subnet_ip = self.subnets.lookup(ipr.ip_to_int(addrs[0]))
+            if subnet_ip is not None:
+                self.ranges[subnet_ip].append(addrs)
 
 
 class DHCPArchClass(DHCPData):
@@ -752,34 +791,25 @@ class DHCPServer(object):
         Return a list of DHCPSubnet objects representing each of the subnets
         that are currently configured.
         '''
-        # Set up a utility to test for subnet strings
-        def _subnet_check(s):
-            if s is not None:
-                return s.startswith("subnet")
-
-        # Set up a regular expression to extract the subnet IP from a 'subnet'
-        # string in the configuration data.
-        regexp = re.compile("^subnet\s+(%s)" % IP_PATTERN)
-
-        # Build a list of all subnet IPs in the current config. Innermost scope
-        # filters for "subnet" lines, the map applies the regular expression,
-        # and the outer filter will iterate on the matches.
-        nets = list()
-        nets = [m.group(1)
-            for m in filter(bool, map(regexp.match,
-                filter(_subnet_check, self._current_config())))]
+        index = self._address_index()
+        return [DHCPSubnet(self, subnet_ip, index.ranges[subnet_ip])
+                for (low, high, subnet_ip) in index.subnets]
 
-        # Now build up and return a list of DHCPSubnet objects
-        return [DHCPSubnet(self, subnet_ip) for subnet_ip in nets]
+    def _address_index(self):
+        '''
+        Return a _DHCPAddressIndex of the subnets and ranges that are
+        currently configured.
+        '''
+        return _DHCPAddressIndex(self._current_config())
 
     def lookup_subnet(self, subnet_ip):
         '''
         Return a DHCPSubnet object representing the subnet defined by
         subnet_ip. Return None if not found.
         '''
-        for net in self._subnets:
-            if net.subnet_ip == subnet_ip:
-                return net
+        index = self._address_index()
+        if subnet_ip in index.ranges:
+            return DHCPSubnet(self, subnet_ip, index.ranges[subnet_ip])
 
     def add_address_range(self, ipaddr, count, bootserver):
         '''
@@ -1192,9 +1222,7 @@ def _get_subnet(ipaddr, netmask):
     '''
     Derive the subnet of this IP address and return it in "A.B.C.D" format.
     '''
-    ipaddr_int = struct.unpack('L', socket.inet_aton(ipaddr))[0]
-    mask_int = struct.unpack('L', socket.inet_aton(netmask))[0]
-    return socket.inet_ntoa(struct.pack('L', ipaddr_int & mask_int))
+    return ipr.int_to_ip(ipr.network_range(ipaddr, netmask)[0])
 
 
 def _get_broadcast_address(subnet_ip, netmask_ip):
@@ -1202,20 +1230,15 @@ def _get_broadcast_address(subnet_ip, netmask_ip):
     Calculate the broadcast address for this subnet from the subnet address
     and its netmask.
     '''
-    subnet_int = struct.unpack('L', socket.inet_aton(subnet_ip))[0]
-    netmask_int = struct.unpack('L', socket.inet_aton(netmask_ip))[0]
-    return socket.inet_ntoa(struct.pack('L',
-                            subnet_int | (0xffffffff - netmask_int)))
+    return ipr.int_to_ip(ipr.network_range(subnet_ip, netmask_ip)[1])
 
 
 def _ip_is_in_network(ipaddr, subnet_ip, netmask):
     '''
     Return True if ipaddr is a member of the subnet_ip network.
     '''
-    ipaddr_int = struct.unpack('L', socket.inet_aton(ipaddr))[0]
-    subnet_int = struct.unpack('L', socket.inet_aton(subnet_ip))[0]
-    netmask_int = struct.unpack('L', socket.inet_aton(netmask))[0]
-    return (ipaddr_int & netmask_int) == (subnet_int & netmask_int)
+    (low, high) = ipr.network_range(subnet_ip, netmask)
+    return low <= ipr.ip_to_int(ipaddr) <= high
 
 
 def _set_and_check_hiaddr(subnet_ip, netmask, loaddr, count):
@@ -1248,23 +1271,14 @@ def _check_subnet_for_overlap(subnet, loaddr, hiaddr):
     if not isinstance(subnet, DHCPSubnet):
         raise ValueError('object passed not a DHCPSubnet object')
 
-    # Set up a regular expression to pull the last tuple from IP and use it to
-    # pull off the last tuple of the addrs passed in.  Then build a set
-    # consisting of the entire range.
-    regexp = re.compile("^\d{1,3}\.\d{1,3}\.\d{1,3}\.(\d{1,3})$")
-    new_addrs = [int(m.group(1))
-        for m in filter(bool, map(regexp.match, [loaddr, hiaddr]))]
-    new_set = set(range(new_addrs[0], (new_addrs[1] + 1)))
-
-    # Now do the same for each range that is configured for this subnet and
-    # compare to our new set as we iterate through.  If any duplicates are
-    # found, we have an overlap, and we'll fail the allocation.
-    for r in subnet.ranges:
-        addrs = [int(m.group(1)) for m in filter(bool, map(regexp.match, r))]
-        if new_set & set(range(addrs[0], (addrs[1] + 1))):
-            raise DHCPServerError(cw(_("check_subnet_for_overlap: adding "
-                                       "range causes overlap on subnet %s")
-                                       % subnet.subnet_ip))
+    # Build a sorted interval set of the ranges configured for this subnet
+    # and check our new range against it.
+    configured = ipr.IntervalSet((ipr.ip_to_int(lo), ipr.ip_to_int(hi))
+                                 for (lo, hi) in subnet.ranges)
+    if configured.overlaps(ipr.ip_to_int(loaddr), ipr.ip_to_int(hiaddr)):
+        raise DHCPServerError(cw(_("check_subnet_for_overlap: adding "
+                                   "range causes overlap on subnet %s")
+                                   % subnet.subnet_ip))
 
 
 def _get_domain(svc):
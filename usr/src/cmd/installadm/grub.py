@@ -25,16 +25,146 @@
 #
 '''
 functions supporting creating and modifying menu.lst
+
+Per-client menu.lst files are kept in a content-addressed store: each
+distinct menu.lst content is written once into MENULST_STORE (named by
+its SHA-1 digest) and every client file is a hard link to it. Clients
+with identical boot configurations thus share a single file, and
+update_menulsts() rewrites each distinct configuration only once.
 '''
-import fileinput
+import errno
+import hashlib
 import logging
 import os
-import sys
+import tempfile
 
+import osol_install.auto_install.installadm_common as com
 from osol_install.auto_install.installadm_common import XDEBUG
 
 MENULST = 'menu.lst'
 
+# Store of distinct client menu.lst files, relative to the boot directory.
+# It must be on the same filesystem as the client files it is linked to.
+MENULST_STORE = '.menu.lst.store'
+
+
+def bootargs_line(line, oldbootargs, bootargs):
+    '''Return line of a menu.lst with bootargs updated
+
+     Input:
+        line - a single line of a menu.lst file
+        oldbootargs - bootargs to replace
+        bootargs - replacement bootargs
+
+    '''
+    bootargs = bootargs.strip()
+    parts = line.partition(' -B')
+    if parts[1]:
+        ending = parts[2].lstrip()
+        # Need to check for oldbootargs because '' is
+        # a valid value
+        if oldbootargs and oldbootargs in ending:
+            ending = ending.replace(oldbootargs, bootargs)
+        else:
+            ending = bootargs + ending
+        line = parts[0] + ' -B ' + ending
+    return line
+
+
+def svcname_line(line, newsvcname, mountdir):
+    '''Return line of a menu.lst with svcname/mountdir updated
+
+     Input:
+        line - a single line of a menu.lst file
+        newsvcname - replacement svcname
+        mountdir - mountdir to replace with new svcname
+
+    '''
+    install_svc = 'install_service='
+    kernel_str = '\tkernel$ /'
+    module_str = '\tmodule$ /'
+    newline = line
+    parts = newline.partition(kernel_str)
+    if parts[1]:
+        ending = parts[2].partition('/')[2]
+        newline = kernel_str + mountdir + '/' + ending
+        parts = newline.partition(install_svc)
+        if parts[1]:
+            ending = parts[2].partition(',')[2]
+            newline = parts[0] + install_svc + newsvcname + ',' + \
+                      ending
+    else:
+        parts = newline.partition(module_str)
+        if parts[1]:
+            ending = parts[2].partition('/')[2]
+            newline = module_str + mountdir + '/' + ending
+    return newline
+
+
+def imagepath_line(line, oldpath, newpath):
+    '''Return line of a menu.lst with imagepath updated
+
+     Input:
+        line - a single line of a menu.lst file
+        oldpath - imagepath to replace
+        newpath - new imagepath
+
+    '''
+    install_media = 'install_media='
+    newline = line
+    parts = newline.partition(install_media)
+    # Example line (spaces added for readability):
+    #   kernel$ /mysvc/platform/i86pc/kernel/$ISADIR/unix -B
+    #      install_media=http://$serverIP:5555//export/auto_install/myimg,
+    #      install_service=mysvc,install_svc_address=$serverIP:5555
+    if parts[1]:
+        # The line contains 'install_media='.
+        # parts[2] is:
+        #   http://$serverIP:5555//export/auto_install/myimg,
+        #      install_service=mysvc,install_svc_address=$serverIP:5555
+        ending_parts = parts[2].partition(',')
+        media_str = ending_parts[0]
+        #   http://$serverIP:5555//export/auto_install/myimg
+
+        rest_of_string = ending_parts[1] + ending_parts[2]
+        #   ,install_service=mysvc,install_svc_address=$serverIP:5555
+
+        new_media_str = media_str.replace(oldpath, newpath, 1)
+        #   http://$serverIP:5555//foo/newpath
+
+        newline = parts[0] + install_media + new_media_str + rest_of_string
+        #   kernel$ /mysvc/platform/i86pc/kernel/$ISADIR/unix -B
+        #      install_media=http://$serverIP:5555//foo/newpath,
+        #      install_service=mysvc,install_svc_address=$serverIP:5555
+    return newline
+
+
+def _update_menulst(menulstpath, update_line, *args):
+    '''Rewrite menulstpath, passing each line through
+    update_line(line, *args). The file is replaced atomically, and
+    only if its content changes.
+
+    '''
+    with open(menulstpath, 'r') as menulst:
+        content = menulst.read()
+    updated = ''.join(update_line(line, *args)
+                      for line in content.splitlines(True))
+    if updated == content:
+        return
+
+    stat_info = os.stat(menulstpath)
+    (tfd, tmppath) = tempfile.mkstemp(dir=os.path.dirname(menulstpath))
+    try:
+        try:
+            os.write(tfd, updated)
+        finally:
+            os.close(tfd)
+        os.chmod(tmppath, stat_info.st_mode & 07777)
+        os.rename(tmppath, menulstpath)
+    except:
+        os.remove(tmppath)
+        raise
+
 
 def update_bootargs(menulstpath, oldbootargs, bootargs):
     '''Update bootargs in menu.lst
@@ -48,20 +178,7 @@ def update_bootargs(menulstpath, oldbootargs, bootargs):
     logging.log(XDEBUG, 'in update_bootargs menu.lst=%s oldbootargs=%s '
                 'bootargs=%s', menulstpath, oldbootargs, bootargs)
 
-    bootargs = bootargs.strip()
-    for line in fileinput.input(menulstpath, inplace=1):
-        newline = line
-        parts = line.partition(' -B')
-        if parts[1]:
-            ending = parts[2].lstrip()
-            # Need to check for oldbootargs because '' is
-            # a valid value
-            if oldbootargs and oldbootargs in ending:
-                ending = ending.replace(oldbootargs, bootargs)
-            else:
-                ending = bootargs + ending
-            newline = parts[0] + ' -B ' + ending
-        sys.stdout.write(newline)
+    _update_menulst(menulstpath, bootargs_line, oldbootargs, bootargs)
 
 
 def update_svcname(menulstpath, newsvcname, mountdir):
@@ -75,26 +192,7 @@ def update_svcname(menulstpath, newsvcname, mountdir):
     '''
     logging.log(XDEBUG, 'in update_menulst %s %s %s',
                 menulstpath, newsvcname, mountdir)
-    install_svc = 'install_service='
-    kernel_str = '\tkernel$ /'
-    module_str = '\tmodule$ /'
-    for line in fileinput.input(menulstpath, inplace=1):
-        newline = line
-        parts = newline.partition(kernel_str)
-        if parts[1]:
-            ending = parts[2].partition('/')[2]
-            newline = kernel_str + mountdir + '/' + ending
-            parts = newline.partition(install_svc)
-            if parts[1]:
-                ending = parts[2].partition(',')[2]
-                newline = parts[0] + install_svc + newsvcname + ',' + \
-                          ending
-        else:
-            parts = newline.partition(module_str)
-            if parts[1]:
-                ending = parts[2].partition('/')[2]
-                newline = module_str + mountdir + '/' + ending
-        sys.stdout.write(newline)
+    _update_menulst(menulstpath, svcname_line, newsvcname, mountdir)
 
 
 def update_imagepath(menulstpath, oldpath, newpath):
@@ -108,34 +206,140 @@ def update_imagepath(menulstpath, oldpath, newpath):
     '''
     logging.log(XDEBUG, 'in update_imagepath %s %s %s',
                 menulstpath, oldpath, newpath)
-    install_media = 'install_media='
-    for line in fileinput.input(menulstpath, inplace=1):
-        newline = line
-        parts = newline.partition(install_media)
-        # Example line (spaces added for readability):
-        #   kernel$ /mysvc/platform/i86pc/kernel/$ISADIR/unix -B
-        #      install_media=http://$serverIP:5555//export/auto_install/myimg,
-        #      install_service=mysvc,install_svc_address=$serverIP:5555
-        if parts[1]:
-            # The line contains 'install_media='.
-            # parts[2] is:
-            #   http://$serverIP:5555//export/auto_install/myimg,
-            #      install_service=mysvc,install_svc_address=$serverIP:5555
-            ending_parts = parts[2].partition(',')
-            media_str = ending_parts[0]
-            #   http://$serverIP:5555//export/auto_install/myimg
-
-            rest_of_string = ending_parts[1] + ending_parts[2]
-            #   ,install_service=mysvc,install_svc_address=$serverIP:5555
-
-            new_media_str = media_str.replace(oldpath, newpath, 1)
-            #   http://$serverIP:5555//foo/newpath
-
-            newline = parts[0] + install_media + new_media_str + rest_of_string
-            #   kernel$ /mysvc/platform/i86pc/kernel/$ISADIR/unix -B
-            #      install_media=http://$serverIP:5555//foo/newpath,
-            #      install_service=mysvc,install_svc_address=$serverIP:5555
-        sys.stdout.write(newline)
+    _update_menulst(menulstpath, imagepath_line, oldpath, newpath)
+
+
+def _get_store_dir(store_dir):
+    '''Return store_dir, defaulting to MENULST_STORE in the boot dir'''
+    if store_dir is None:
+        store_dir = os.path.join(com.BOOT_DIR, MENULST_STORE)
+    return store_dir
+
+
+def _store_menulst(content, store_dir):
+    '''Return path of the stored file holding content, creating it
+    if no menu.lst with this content is stored yet.
+
+    '''
+    stored = os.path.join(store_dir, hashlib.sha1(content).hexdigest())
+    if os.path.exists(stored):
+        return stored
+
+    if not os.path.isdir(store_dir):
+        os.makedirs(store_dir, 0755)
+    # write to a temporary file first so a partially written file
+    # is never visible under its digest
+    (tfd, tmppath) = tempfile.mkstemp(dir=store_dir)
+    try:
+        os.write(tfd, content)
+    finally:
+        os.close(tfd)
+    os.chmod(tmppath, 0644)
+    os.rename(tmppath, stored)
+    return stored
+
+
+def _link_menulst(stored, menulstpath):
+    '''Atomically make menulstpath a hard link to stored'''
+    if os.path.exists(menulstpath) and os.path.samefile(stored, menulstpath):
+        return
+    tmppath = menulstpath + '.new'
+    if os.path.lexists(tmppath):
+        os.remove(tmppath)
+    os.link(stored, tmppath)
+    os.rename(tmppath, menulstpath)
+
+
+def _store_and_link(content, store_dir, menulstpath):
+    '''Make menulstpath a hard link to the stored file holding content.
+    A concurrent prune_menulst_store() may remove the stored file before
+    it is linked to; it is then stored again.
+
+    '''
+    while True:
+        stored = _store_menulst(content, store_dir)
+        try:
+            _link_menulst(stored, menulstpath)
+            return
+        except OSError as err:
+            if err.errno != errno.ENOENT or os.path.exists(stored):
+                raise
+            logging.log(XDEBUG, '%s was pruned before it was linked to',
+                        stored)
+
+
+def link_menulst(srcpath, menulstpath, store_dir=None):
+    '''Install the content of srcpath as menulstpath, sharing one stored
+    file with all other client menu.lst files of identical content.
+
+     Input:
+        srcpath - menu.lst to copy (typically the service's menu.lst)
+        menulstpath - path of client menu.lst file to create or replace
+        store_dir - content store directory; defaults to MENULST_STORE
+                    in the boot directory
+
+    '''
+    logging.log(XDEBUG, 'in link_menulst %s %s', srcpath, menulstpath)
+    with open(srcpath, 'r') as src:
+        content = src.read()
+    _store_and_link(content, _get_store_dir(store_dir), menulstpath)
+
+
+def update_menulsts(menulstpaths, update_line, *args, **kwargs):
+    '''Update several client menu.lst files, passing each line through
+    update_line(line, *args) (e.g. bootargs_line). Files sharing a stored
+    configuration are rewritten only once and end up sharing the
+    updated one.
+
+     Input:
+        menulstpaths - paths of client menu.lst files to update
+        update_line - one of bootargs_line, svcname_line or imagepath_line
+        args - additional arguments to update_line
+        store_dir (keyword) - content store directory; defaults to
+                              MENULST_STORE in the boot directory
+     Returns:
+        number of distinct configurations rewritten
+
+    '''
+    store_dir = _get_store_dir(kwargs.get('store_dir'))
+    logging.log(XDEBUG, 'in update_menulsts %s %s %s', menulstpaths,
+                update_line.__name__, args)
+
+    # index client files by the file they are linked to
+    shared = dict()
+    for path in menulstpaths:
+        stat_info = os.stat(path)
+        shared.setdefault((stat_info.st_dev, stat_info.st_ino),
+                          list()).append(path)
+
+    for paths in shared.itervalues():
+        with open(paths[0], 'r') as menulst:
+            content = ''.join(update_line(line, *args) for line in menulst)
+        for path in paths:
+            _store_and_link(content, store_dir, path)
+
+    prune_menulst_store(store_dir)
+    return len(shared)
+
+
+def prune_menulst_store(store_dir=None):
+    '''Remove stored menu.lst files no client file is linked to anymore'''
+    store_dir = _get_store_dir(store_dir)
+    if not os.path.isdir(store_dir):
+        return
+    for name in os.listdir(store_dir):
+        stored = os.path.join(store_dir, name)
+        # skip temporary files of a store in progress
+        if name.startswith('tmp'):
+            continue
+        try:
+            if os.stat(stored).st_nlink == 1:
+                logging.log(XDEBUG, 'removing unreferenced %s', stored)
+                os.remove(stored)
+        except OSError as err:
+            # already removed by a concurrent prune
+            if err.errno != errno.ENOENT:
+                raise
 
 
 def setup_grub(svc_name, image_path, image_info, srv_address, menu_path,
@@ -52,11 +52,6 @@ import logging
 import os
 import shutil
 
-import pkg.client.api
-import pkg.client.imageconfig
-import pkg.client.imagetypes
-import pkg.client.progress
-
 import osol_install.auto_install.installadm_common as com
 
 from osol_install.auto_install.installadm_common import _, cli_wrap as cw
@@ -66,6 +61,21 @@ from solaris_install import Popen, PKG5_API_VERSION
 _FILE = '/usr/bin/file'
 
 
+def _import_pkg():
+    '''Import the parts of the pkg(5) client API used here and return the
+    top-level pkg package. Loading the API is expensive, so this is only
+    done once an image is actually created or queried through pkg(5).
+
+    '''
+    import pkg.client.api
+    import pkg.client.api_errors
+    import pkg.client.imageconfig
+    import pkg.client.imagetypes
+    import pkg.client.progress
+    import pkg.client.publisher
+    return pkg
+
+
 class ImageError(StandardError):
     '''Base class for InstalladmImage-unique errors'''
     pass
@@ -231,6 +241,7 @@ class InstalladmPkgImage(InstalladmImage):
     @classmethod
     def image_create(cls, fmri_or_p5i, targetdir, arch=None, publisher=None):
         logging.debug("image_create, install from=%s", fmri_or_p5i)
+        pkg = _import_pkg()
         tracker = pkg.client.progress.CommandLineProgressTracker()
         root_img = pkg.client.api.ImageInterface(
             "/", PKG5_API_VERSION, tracker, None, cls._PKG_CLIENT_NAME)
@@ -294,6 +305,7 @@ class InstalladmPkgImage(InstalladmImage):
     @property
     def pkg_image(self):
         if self._pkgimg is None:
+            pkg = _import_pkg()
             tracker = pkg.client.progress.CommandLineProgressTracker()
             # installadm is non-interactive, so we don't need to track
             # the "cancel_state" like, for example, packagemanager
@@ -307,6 +319,7 @@ class InstalladmPkgImage(InstalladmImage):
         return self._pkgimg
     
     def _install_package(self, fmri_or_p5i):
+        pkg = _import_pkg()
         try:
             p5i_data = self.pkg_image.parse_p5i(location=fmri_or_p5i)
             
@@ -354,6 +367,7 @@ class InstalladmPkgImage(InstalladmImage):
     def get_basename(self):
         '''Get pkg service basename '''
         basename = "solarisx"
+        pkg = _import_pkg()
         try:
             pkg_list = self.pkg_image.get_pkg_list(
                 pkg.client.api.ImageInterface.LIST_INSTALLED,
@@ -24,6 +24,7 @@
 '''
 installadm - administration of AI services, manifests, and clients
 '''
+import importlib
 import logging
 import os
 import sys
@@ -34,20 +35,6 @@ import osol_install.auto_install.service_config as config
 
 from optparse import OptionParser, SUPPRESS_HELP
 
-from osol_install.auto_install import create_client
-from osol_install.auto_install import create_profile
-from osol_install.auto_install import create_service
-from osol_install.auto_install import delete_client
-from osol_install.auto_install import delete_manifest
-from osol_install.auto_install import delete_profile
-from osol_install.auto_install import delete_service
-from osol_install.auto_install import export
-from osol_install.auto_install import list as ai_list
-from osol_install.auto_install import publish_manifest
-from osol_install.auto_install import rename_service
-from osol_install.auto_install import set_criteria
-from osol_install.auto_install import set_service
-from osol_install.auto_install import validate_profile
 from osol_install.auto_install.installadm_common import _, \
     CHECK_SETUP_SCRIPT, validate_service_name, XDEBUG, setup_logging, \
     cli_wrap as cw
@@ -60,6 +47,113 @@ from solaris_install import Popen, CalledProcessError
 DEFAULT_LOG_LEVEL = logging.WARN
 DEBUG_LOG_LEVEL = logging.DEBUG
 
+SUBCMD_PACKAGE = 'osol_install.auto_install'
+
+# SUB_CMDS is a dictionary. The value for each subcommand key is a tuple
+# consisting of the module implementing the subcommand (None if implemented
+# in this file), the name of the function to call to invoke the subcommand
+# and the name of the function to call to get usage for the subcommand.
+# Modules are only imported when their subcommand is invoked or its usage
+# is displayed, so that e.g. 'installadm list' does not load the modules
+# (and the pkg(5) or lxml dependencies) of every other subcommand.
+SUB_CMDS = {
+    'create-service':    ('create_service', 'do_create_service',
+                          'get_usage'),
+    'delete-service':    ('delete_service', 'do_delete_service',
+                          'get_usage'),
+    'rename-service':    ('rename_service', 'do_rename_service',
+                          'get_usage'),
+    'set-service':       ('set_service', 'do_set_service', 'get_usage'),
+    'list':              ('list', 'do_list', 'get_usage'),
+    'enable':            (None, 'do_enable_service', 'get_enable_usage'),
+    'disable':           (None, 'do_disable_service', 'get_disable_usage'),
+    'create-client':     ('create_client', 'do_create_client', 'get_usage'),
+    'create-profile':    ('create_profile', 'do_create_profile',
+                          'get_create_usage'),
+    'update-profile':    ('create_profile', 'do_update_profile',
+                          'get_update_usage'),
+    'delete-client':     ('delete_client', 'do_delete_client', 'get_usage'),
+    'create-manifest':   ('publish_manifest', 'do_publish_manifest',
+                          'get_create_usage'),
+    'add-manifest':      ('publish_manifest', 'do_publish_manifest',  # alias
+                          'get_create_usage'),
+    'update-manifest':   ('publish_manifest', 'do_update_manifest',
+                          'get_update_usage'),
+    'delete-manifest':   ('delete_manifest', 'do_delete_manifest',
+                          'get_usage'),
+    'delete-profile':    ('delete_profile', 'do_delete_profile',
+                          'get_usage'),
+    'export':            ('export', 'do_export', 'get_usage'),
+    'remove':            ('delete_manifest', 'do_delete_manifest',  # alias
+                          'get_usage'),
+    'set-criteria':      ('set_criteria', 'do_set_criteria', 'get_usage'),
+    'validate':          ('validate_profile', 'do_validate_profile',
+                          'get_usage'),
+    'help':              (None, None, 'get_help_usage')
+    }
+
+# CMDS is a list of subcommands used to dictate the order of
+# the commands listed in the usage output
+CMDS = ["create-service",
+        "delete-service",
+        "rename-service",
+        "set-service",
+        "list",
+        "enable",
+        "disable",
+        "create-client",
+        "delete-client",
+        "create-manifest",
+        "update-manifest",
+        "delete-manifest",
+        "create-profile",
+        "update-profile",
+        "delete-profile",
+        "export",
+        "validate",
+        "set-criteria",
+        "help",
+        ]
+
+
+def get_subcommand(sub_cmd):
+    ''' Look up a subcommand, importing the module implementing it
+
+    Input:
+        sub_cmd - name of the subcommand, a key of SUB_CMDS
+    Return:
+        tuple of the function invoking the subcommand (None for help)
+        and the function returning its usage
+
+    '''
+    (module_name, func_name, usage_name) = SUB_CMDS[sub_cmd]
+    if module_name is None:
+        module = sys.modules[__name__]
+    else:
+        module = importlib.import_module(SUBCMD_PACKAGE + '.' + module_name)
+    func = None
+    if func_name is not None:
+        func = getattr(module, func_name)
+    return func, getattr(module, usage_name)
+
+
+def get_full_usage():
+    ''' get usage for installadm and all subcommands'''
+    usage_str = "Usage: installadm [options] <subcommand> <args> ..."
+    for entry in CMDS:
+        usage_str += '\n' + get_subcommand(entry)[1]()
+    return usage_str
+
+
+class _InstalladmOptionParser(OptionParser):
+    ''' OptionParser which builds the full usage message only when it is
+    actually displayed, since that requires importing every subcommand.
+
+    '''
+    def get_usage(self):
+        self.set_usage(get_full_usage())
+        return OptionParser.get_usage(self)
+
 
 def get_enable_usage():
     ''' get usage for enable'''
@@ -214,80 +308,7 @@ def main():
         4 if VersionError encountered
 
     '''
-    # sub_cmds is a dictionary. The value for each subcommand key
-    # is a tuple consisting of the method to call to invoke the
-    # subcommand and the method to call to get usage for the subcommand.
-    sub_cmds = {
-        'create-service':    (create_service.do_create_service,
-                              create_service.get_usage()),
-        'delete-service':    (delete_service.do_delete_service,
-                              delete_service.get_usage()),
-        'rename-service':    (rename_service.do_rename_service,
-                              rename_service.get_usage()),
-        'set-service':       (set_service.do_set_service,
-                              set_service.get_usage()),
-        'list':              (ai_list.do_list,
-                              ai_list.get_usage()),
-        'enable':            (do_enable_service,
-                              get_enable_usage()),
-        'disable':           (do_disable_service,
-                              get_disable_usage()),
-        'create-client':     (create_client.do_create_client,
-                              create_client.get_usage()),
-        'create-profile':    (create_profile.do_create_profile,
-                              create_profile.get_create_usage()),
-        'update-profile':    (create_profile.do_update_profile,
-                              create_profile.get_update_usage()),
-        'delete-client':     (delete_client.do_delete_client,
-                              delete_client.get_usage()),
-        'create-manifest':   (publish_manifest.do_publish_manifest,
-                              publish_manifest.get_create_usage()),
-        'add-manifest':      (publish_manifest.do_publish_manifest,  # alias
-                              publish_manifest.get_create_usage()),
-        'update-manifest':   (publish_manifest.do_update_manifest,
-                              publish_manifest.get_update_usage()),
-        'delete-manifest':   (delete_manifest.do_delete_manifest,
-                              delete_manifest.get_usage()),
-        'delete-profile':    (delete_profile.do_delete_profile,
-                              delete_profile.get_usage()),
-        'export':            (export.do_export,
-                              export.get_usage()),
-        'remove':            (delete_manifest.do_delete_manifest,  # alias
-                              delete_manifest.get_usage()),
-        'set-criteria':      (set_criteria.do_set_criteria,
-                              set_criteria.get_usage()),
-        'validate':          (validate_profile.do_validate_profile,
-                              validate_profile.get_usage()),
-        'help':              (None, get_help_usage())
-        }
-
-    # cmds is a list of subcommands used to dictate the order of
-    # the commands listed in the usage output
-    cmds = ["create-service",
-            "delete-service",
-            "rename-service",
-            "set-service",
-            "list",
-            "enable",
-            "disable",
-            "create-client",
-            "delete-client",
-            "create-manifest",
-            "update-manifest",
-            "delete-manifest",
-            "create-profile",
-            "update-profile",
-            "delete-profile",
-            "export",
-            "validate",
-            "set-criteria",
-            "help",
-            ]
-
-    usage_str = "Usage: installadm [options] <subcommand> <args> ..."
-    for entry in cmds:
-        usage_str += '\n' + sub_cmds[entry][1]
-    parser = OptionParser(usage=usage_str)
+    parser = _InstalladmOptionParser()
 
     # add private debug option, which provides console output that might
     # be useful during development or bug fixing.
@@ -300,7 +321,7 @@ def main():
     sub_cmd = None
     index = 0
     for index, arg in enumerate(sys.argv):
-        if arg in sub_cmds:
+        if arg in SUB_CMDS:
             sub_cmd = arg
             break
 
@@ -339,8 +360,8 @@ def main():
         else:
             # print help for single subcommand
             subcmd = sys.argv[index + 1]
-            if subcmd in sub_cmds:
-                print(sub_cmds.get(sys.argv[index + 1], None)[1])
+            if subcmd in SUB_CMDS:
+                print(get_subcommand(subcmd)[1]())
             else:
                 parser.print_help()
         sys.exit()
@@ -353,7 +374,7 @@ def main():
             raise SystemExit(err)
 
         # Invoke the function which implements the specified subcommand
-        func = sub_cmds[sub_cmd][0]
+        func = get_subcommand(sub_cmd)[0]
 
         logging.debug("Invoking subcommand: %s %s",
                       func.func_name, sys.argv[index + 1:])
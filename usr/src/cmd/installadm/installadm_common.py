@@ -35,6 +35,8 @@ import time
 
 from textwrap import fill, dedent
 
+from osol_install.auto_install.ip_ranges import IntervalSet, cidr_range, \
+    ip_to_int
 from osol_install.libaimdns import getifaddrs, getboolean_property, \
     getstrings_property
 from solaris_install import Popen
@@ -811,22 +813,6 @@ def validate_service_name(svcname):
         raise ValueError(error)
 
 
-def _convert_ipv4(ip):
-    '''Converts an IPv4 address into an integer
-       Args:
-            ip - IPv4 address to convert
-
-       Returns:
-            an integer of the converted IPv4 address
-
-       Raises:
-            None
-    '''
-    seg = ip.split('.')
-    return (int(seg[3]) << 24) + (int(seg[2]) << 16) + \
-            (int(seg[1]) << 8) + int(seg[0])
-
-
 def _convert_cidr_mask(cidr_mask):
     '''Converts a CIDR mask into an IPv4 mask
         Args:
@@ -873,31 +859,37 @@ def compare_ipv4(ipv4_one, ipv4_two):
        Raises:
            None
     '''
-    # ensure there is no '/' (slash) in the first address,
-    # effectively ignoring the CIDR mask.
-    slash = ipv4_one.find('/')
-    if '/' in ipv4_one:
-        ipv4_one = ipv4_one[:slash]
-    ipv4_one_num = _convert_ipv4(ipv4_one)
-
-    # convert ipv4_two taking into account the possible CIDR mask
-    if '/' not in ipv4_two:
-        mask_two = _convert_cidr_mask(0)
-        ipv4_two_num = _convert_ipv4(ipv4_two)
-    else:
-        mask_two = _convert_cidr_mask(int(ipv4_two.split('/')[-1]))
-        if not mask_two:
-            return False  # invalid mask
-        ipv4_two_num = _convert_ipv4(ipv4_two.split('/')[0])
-    mask_two_num = _convert_ipv4(mask_two)
-
-    if '/' in ipv4_two and \
-         mask_two_num & ipv4_two_num == mask_two_num & ipv4_one_num:
-        return True
-    elif ipv4_one_num == ipv4_two_num:
-        return True
+    # ignore any CIDR mask in the first address
+    ipv4_one_num = ip_to_int(ipv4_one.partition('/')[0])
+
+    # the range of addresses covered by ipv4_two, with its CIDR mask
+    try:
+        (low, high) = cidr_range(ipv4_two)
+    except ValueError:
+        return False  # invalid mask
 
-    return False
+    return low <= ipv4_one_num <= high
+
+
+def network_set(networks):
+    '''Description:
+        Builds an IntervalSet of the addresses covered by a list of networks,
+        for repeated use with in_networks(). Networks with an invalid CIDR
+        mask are ignored, as they never match in compare_ipv4().
+
+    Args:
+        networks - a list of networks from the SMF property networks
+
+    Returns:
+        an ip_ranges.IntervalSet
+    '''
+    addresses = IntervalSet()
+    for network in networks:
+        try:
+            addresses.add(*cidr_range(network))
+        except ValueError:
+            continue
+    return addresses
 
 
 def in_networks(inter_ipv4, networks):
@@ -907,7 +899,8 @@ def in_networks(inter_ipv4, networks):
 
     Args:
         inter_ipv4 - an interface IPv4 address
-        networks   - a list of networks from the SMF property networks
+        networks   - a list of networks from the SMF property networks,
+                     or an IntervalSet of them as built by network_set()
 
     Returns:
         True if the interface's IPv4 address is in the network -- OR --
@@ -916,12 +909,10 @@ def in_networks(inter_ipv4, networks):
     Raises:
         None
     '''
-    # iterate over the network list
-    for network in networks:
-        # check if the interface's IPv4 address is in the network
-        if compare_ipv4(inter_ipv4, network):
-            return True
-    return False
+    if not isinstance(networks, IntervalSet):
+        networks = network_set(networks)
+    # check if the interface's IPv4 address is in any of the networks
+    return ip_to_int(inter_ipv4.partition('/')[0]) in networks
 
 
 def get_valid_networks():
@@ -942,7 +933,7 @@ def get_valid_networks():
     interfaces = getifaddrs()
     # get the exclude and networks service property values
     exclude = getboolean_property(SRVINST, EXCLPROP)
-    networks = getstrings_property(SRVINST, NETSPROP)
+    networks = network_set(getstrings_property(SRVINST, NETSPROP))
 
     valid_networks = set()
     for inf in interfaces:
@@ -0,0 +1,209 @@
+#!/usr/bin/python2.7
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+'''
+Integer based IPv4 address and range handling, shared by installadm's DHCP
+and network configuration code.
+
+Addresses are converted from dotted quad form once, and ranges are kept in
+sorted interval structures so that membership and overlap checks are
+O(log n) in the number of configured ranges or networks.
+'''
+import bisect
+import socket
+import struct
+
+MAX_IPV4 = 0xffffffff
+
+
+def ip_to_int(ipaddr):
+    '''Convert an IPv4 address in 'A.B.C.D' format to an integer.
+    Raises ValueError if ipaddr is not a valid IPv4 address.
+
+    >>> ip_to_int('10.0.1.2')
+    167772418
+    '''
+    octets = ipaddr.split('.')
+    if len(octets) != 4:
+        raise ValueError("invalid IPv4 address: %s" % ipaddr)
+    value = 0
+    for octet in octets:
+        octet = int(octet)
+        if octet < 0 or octet > 255:
+            raise ValueError("invalid IPv4 address: %s" % ipaddr)
+        value = (value << 8) | octet
+    return value
+
+
+def int_to_ip(value):
+    '''Convert an integer to an IPv4 address in 'A.B.C.D' format.
+
+    >>> int_to_ip(167772418)
+    '10.0.1.2'
+    '''
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+def cidr_to_mask(bits):
+    '''Convert a CIDR prefix length to an integer netmask.
+    Raises ValueError if bits is not in the range 0-32.
+
+    >>> int_to_ip(cidr_to_mask(20))
+    '255.255.240.0'
+    '''
+    if bits < 0 or bits > 32:
+        raise ValueError("invalid CIDR mask: %s" % bits)
+    return (MAX_IPV4 << (32 - bits)) & MAX_IPV4
+
+
+def network_range(ipaddr, netmask):
+    '''Return the (low, high) integer addresses of the network ipaddr is
+    a member of, given its netmask in 'A.B.C.D' format.
+
+    >>> [int_to_ip(i) for i in network_range('10.0.1.2', '255.255.255.0')]
+    ['10.0.1.0', '10.0.1.255']
+    '''
+    mask = ip_to_int(netmask)
+    low = ip_to_int(ipaddr) & mask
+    return low, low | (MAX_IPV4 & ~mask)
+
+
+def cidr_range(network):
+    '''Return the (low, high) integer addresses covered by network, an
+    IPv4 address optionally followed by a CIDR mask ('A.B.C.D[/N]').
+    An address without a mask covers just that address.
+    Raises ValueError for a bad address or mask.
+
+    >>> [int_to_ip(i) for i in cidr_range('10.0.1.2/23')]
+    ['10.0.0.0', '10.0.1.255']
+    >>> [int_to_ip(i) for i in cidr_range('10.0.1.2')]
+    ['10.0.1.2', '10.0.1.2']
+    '''
+    (ipaddr, sep, bits) = network.partition('/')
+    value = ip_to_int(ipaddr)
+    if not sep:
+        return value, value
+    mask = cidr_to_mask(int(bits))
+    low = value & mask
+    return low, low | (MAX_IPV4 & ~mask)
+
+
+class IntervalSet(object):
+    '''A set of integers stored as sorted, disjoint, inclusive intervals.
+    Overlapping or adjacent intervals are merged as they are added.
+
+    >>> ranges = IntervalSet([(10, 20), (30, 40)])
+    >>> ranges.overlaps(15, 25), ranges.overlaps(21, 29), 40 in ranges
+    (True, False, True)
+    >>> ranges.add(21, 29)
+    >>> list(ranges)
+    [(10, 40)]
+    '''
+
+    def __init__(self, intervals=()):
+        self._starts = list()
+        self._ends = list()
+        for low, high in intervals:
+            self.add(low, high)
+
+    def add(self, low, high):
+        '''Add the interval low..high (inclusive)'''
+        if low > high:
+            raise ValueError("invalid interval: %s-%s" % (low, high))
+        # first interval ending at or after low - 1 and the one past the
+        # last interval starting at or before high + 1; everything in
+        # between touches the new interval and is merged into it
+        first = bisect.bisect_left(self._ends, low - 1)
+        last = bisect.bisect_right(self._starts, high + 1)
+        if first < last:
+            low = min(low, self._starts[first])
+            high = max(high, self._ends[last - 1])
+        self._starts[first:last] = [low]
+        self._ends[first:last] = [high]
+
+    def overlaps(self, low, high):
+        '''Return True if any integer in low..high is in the set'''
+        index = bisect.bisect_left(self._ends, low)
+        return index < len(self._starts) and self._starts[index] <= high
+
+    def __contains__(self, value):
+        return self.overlaps(value, value)
+
+    def __iter__(self):
+        return iter(zip(self._starts, self._ends))
+
+    def __len__(self):
+        return len(self._starts)
+
+
+class IntervalMap(object):
+    '''A mapping from disjoint, inclusive integer intervals to values,
+    such as from configured subnets to their subnet address.
+
+    >>> subnets = IntervalMap()
+    >>> subnets.add(0, 255, 'net0')
+    >>> subnets.add(512, 767, 'net2')
+    >>> subnets.lookup(600), subnets.lookup(300)
+    ('net2', None)
+    '''
+
+    def __init__(self):
+        self._starts = list()
+        self._ends = list()
+        self._values = list()
+
+    def add(self, low, high, value):
+        '''Map the interval low..high (inclusive) to value.
+        Raises ValueError if it overlaps an interval already mapped.
+        '''
+        if low > high:
+            raise ValueError("invalid interval: %s-%s" % (low, high))
+        index = bisect.bisect_left(self._ends, low)
+        if index < len(self._starts) and self._starts[index] <= high:
+            raise ValueError("interval %s-%s overlaps %s-%s" %
+                             (low, high, self._starts[index],
+                              self._ends[index]))
+        self._starts.insert(index, low)
+        self._ends.insert(index, high)
+        self._values.insert(index, value)
+
+    def lookup(self, value, default=None):
+        '''Return the value mapped to the interval containing value'''
+        index = bisect.bisect_left(self._ends, value)
+        if index < len(self._starts) and self._starts[index] <= value:
+            return self._values[index]
+        return default
+
+    def __iter__(self):
+        return iter(zip(self._starts, self._ends, self._values))
+
+    def __len__(self):
+        return len(self._starts)
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -52,8 +52,6 @@ import osol_install.auto_install.installadm_common as com
 import osol_install.auto_install.service_config as config
 import osol_install.libaimdns as libaimdns
 
-from osol_install.auto_install.data_files import DataFiles, insert_SQL, \
-    place_manifest, validate_file
 from osol_install.auto_install.image import InstalladmImage, ImageError
 from osol_install.auto_install.installadm_common import _, cli_wrap as cw
 from solaris_install import Popen, CalledProcessError, force_delete
@@ -882,23 +880,34 @@ class AIService(object):
                 if sub_alias_was_mounted:
                     aliassvc.enable()
 
-            # recreate menu.lst files for clients
+            # recreate menu.lst files for clients: copy alias' menu.lst
+            # file to menu.lst.<clientid>. Clients share a single file
+            # in the menu.lst store until their bootargs differ.
+            client_menulsts = list()
+            clients_by_bootargs = dict()
             for clientid in all_clients:
                 (service, datadict) = config.find_client(clientid)
                 client_bootargs = datadict.get(config.BOOTARGS, '')
                 client_menulst = get_client_menulst(clientid)
 
-                # copy alias' menu.lst file to menu.lst.<clientid>
                 logging.debug("update_basesvc: copying new menu.lst from %s "
                               "to %s", self_menulstpath, client_menulst)
-                shutil.copy(self_menulstpath, client_menulst)
-                grub.update_svcname(client_menulst, self.name, self.name)
+                grub.link_menulst(self_menulstpath, client_menulst)
+                client_menulsts.append(client_menulst)
 
                 # if the client has bootargs, use them. Otherwise, inherit
                 # the bootargs specified in the alias (do nothing)
                 if client_bootargs:
-                    grub.update_bootargs(client_menulst, self.bootargs,
-                                         client_bootargs)
+                    clients_by_bootargs.setdefault(client_bootargs,
+                                                   list()).append(
+                                                       client_menulst)
+
+            if client_menulsts:
+                grub.update_menulsts(client_menulsts, grub.svcname_line,
+                                     self.name, self.name)
+            for client_bootargs, menulsts in clients_by_bootargs.iteritems():
+                grub.update_menulsts(menulsts, grub.bootargs_line,
+                                     self.bootargs, client_bootargs)
 
         # Turning point: Function calls prior to this line will reference
         # the 'old' base service's image. Function calls after this line
@@ -933,6 +942,9 @@ class AIService(object):
         is returned.
 
         '''
+        # data_files pulls in lxml; only load it when actually validating
+        from osol_install.auto_install.data_files import DataFiles
+
         db_conn = self.database()
         manifests = AIdb.getNames(db_conn.getQueue(), AIdb.MANIFESTS_TABLE)
 
@@ -981,6 +993,8 @@ class AIService(object):
         is returned.
 
         '''
+        from osol_install.auto_install.data_files import validate_file
+
         failures = 0
 
         if self.image.version < 2:
@@ -1247,6 +1261,9 @@ class AIService(object):
         (See _setup_manifest_dir)
 
         '''
+        from osol_install.auto_install.data_files import DataFiles, \
+            insert_SQL, place_manifest
+
         self._setup_manifest_dir()
 
         default_xml = os.path.join(self.image.path,
@@ -1327,10 +1344,12 @@ class AIService(object):
             for alias in all_aliases:
                 all_clients.extend(config.get_clients(alias).keys())
 
-            for clientid in all_clients:
-                client_menulstpath = get_client_menulst(clientid)
-                grub.update_imagepath(client_menulstpath, self.image.path,
-                                      new_path)
+            # each distinct client configuration is rewritten only once
+            client_menulsts = [get_client_menulst(clientid)
+                               for clientid in all_clients]
+            if client_menulsts:
+                grub.update_menulsts(client_menulsts, grub.imagepath_line,
+                                     self.image.path, new_path)
             for alias in all_aliases:
                 aliassvc = AIService(alias)
                 alias_menulstpath = os.path.join(aliassvc.config_dir, MENULST)
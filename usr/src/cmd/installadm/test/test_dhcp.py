@@ -109,5 +109,66 @@ class DHCPServerTest(unittest.TestCase):
         # return umask to the original value
         os.umask(orig_umask)
 
+
+class DHCPAddressIndexTest(unittest.TestCase):
+    '''Tests for indexing subnets and ranges of synthetic configurations'''
+
+    def setUp(self):
+        '''Build a configuration with many subnets, each with two ranges'''
+        self.config = ["default-lease-time 900;"]
+        for net in xrange(200):
+            self.config.extend([
+                "subnet 10.%d.%d.0 netmask 255.255.255.0 {" %
+                    (net / 256, net % 256),
+                "range 10.%d.%d.10 10.%d.%d.19;" %
+                    ((net / 256, net % 256) * 2),
+                "range 10.%d.%d.100 10.%d.%d.149;" %
+                    ((net / 256, net % 256) * 2),
+                "option routers 10.%d.%d.1;" % (net / 256, net % 256),
+                "}"])
+
+    def test_index(self):
+        '''Test ranges are attributed to the subnet containing them'''
+        index = dhcp._DHCPAddressIndex(self.config)
+        self.assertEqual(len(index.subnets), 200)
+        self.assertEqual(index.ranges["10.0.42.0"],
+                         [("10.0.42.10", "10.0.42.19"),
+                          ("10.0.42.100", "10.0.42.149")])
+
+    def test_range_outside_subnets(self):
+        '''Test a range not within any configured subnet is ignored'''
+        index = dhcp._DHCPAddressIndex(self.config +
+                                       ["range 192.168.0.10 192.168.0.20;"])
+        self.assertEqual(sum(len(r) for r in index.ranges.values()), 400)
+
+    def test_check_subnet_for_overlap(self):
+        '''Test overlapping and disjoint new ranges'''
+        index = dhcp._DHCPAddressIndex(self.config)
+        subnet = dhcp.DHCPSubnet.__new__(dhcp.DHCPSubnet)
+        subnet.subnet_ip = "10.0.7.0"
+        subnet.ranges = index.ranges[subnet.subnet_ip]
+
+        dhcp._check_subnet_for_overlap(subnet, "10.0.7.20", "10.0.7.99")
+        dhcp._check_subnet_for_overlap(subnet, "10.0.7.150", "10.0.7.200")
+        for (loaddr, hiaddr) in (("10.0.7.19", "10.0.7.30"),
+                                 ("10.0.7.0", "10.0.7.255"),
+                                 ("10.0.7.149", "10.0.7.149")):
+            self.assertRaises(dhcp.DHCPServerError,
+                              dhcp._check_subnet_for_overlap, subnet,
+                              loaddr, hiaddr)
+
+    def test_network_helpers(self):
+        '''Test subnet, broadcast and membership computations'''
+        self.assertEqual(dhcp._get_subnet("10.1.2.3", "255.255.0.0"),
+                         "10.1.0.0")
+        self.assertEqual(dhcp._get_broadcast_address("10.1.0.0",
+                                                     "255.255.0.0"),
+                         "10.1.255.255")
+        self.assertTrue(dhcp._ip_is_in_network("10.1.200.3", "10.1.0.0",
+                                               "255.255.0.0"))
+        self.assertFalse(dhcp._ip_is_in_network("10.2.0.1", "10.1.0.0",
+                                                "255.255.0.0"))
+
+
 if __name__ == '__main__':
     unittest.main()
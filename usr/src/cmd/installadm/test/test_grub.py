@@ -19,7 +19,7 @@
 #
 # CDDL HEADER END
 #
-# Copyright (c) 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2011, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 '''
@@ -30,6 +30,7 @@ must be rebuilt for these tests to pick up any changes in the tested code.
 
 import unittest
 import os
+import shutil
 import tempfile
 import osol_install.auto_install.grub as grub
 
@@ -111,6 +112,128 @@ class TestGrub(unittest.TestCase):
         expected_text = self.menulst_txt.replace(self.bootargs, newbootargs)
         self.assertEqual(newmenulst, expected_text)
 
+    def test_update_unchanged(self):
+        '''verify an update that changes nothing leaves the file alone'''
+        os.chmod(self.mymenulst, 0640)
+        before = os.stat(self.mymenulst)
+        grub.update_imagepath(self.mymenulst, '/not/the/path', '/new/path')
+        after = os.stat(self.mymenulst)
+        self.assertEqual(before.st_ino, after.st_ino)
+
+        grub.update_imagepath(self.mymenulst, self.path, '/new/path')
+        after = os.stat(self.mymenulst)
+        self.assertNotEqual(before.st_ino, after.st_ino)
+        self.assertEqual(after.st_mode & 0777, 0640)
+
+
+class TestMenulstStore(unittest.TestCase):
+    '''Tests for the content-addressed client menu.lst store'''
+
+    def setUp(self):
+        '''unit test set up'''
+        self.bootdir = tempfile.mkdtemp(dir="/tmp")
+        self.store = os.path.join(self.bootdir, grub.MENULST_STORE)
+        self.svc_menulst = os.path.join(self.bootdir, grub.MENULST)
+        self.menulst_txt = (
+            "default=0\n"
+            "title Automated Install\n"
+            "\tkernel$ /mysvc/platform/i86pc/kernel/$ISADIR/unix -B "
+            "install=true,install_media=http://$serverIP:5555//export/img,"
+            "install_service=mysvc,install_svc_address=$serverIP:5555\n"
+            "\tmodule$ /mysvc/platform/i86pc/$ISADIR/boot_archive\n")
+        with open(self.svc_menulst, 'w') as menulst:
+            menulst.write(self.menulst_txt)
+        self.clients = [os.path.join(self.bootdir, grub.MENULST + '.01' +
+                                     str(i) * 12) for i in range(4)]
+
+    def tearDown(self):
+        '''unit test tear down'''
+        shutil.rmtree(self.bootdir)
+
+    def read(self, path):
+        '''return content of path'''
+        with open(path, 'r') as menulst:
+            return menulst.read()
+
+    def link_clients(self):
+        '''link all test clients to the service menu.lst'''
+        for client in self.clients:
+            grub.link_menulst(self.svc_menulst, client, store_dir=self.store)
+
+    def test_link_menulst_shares_file(self):
+        '''verify identical client menu.lst files share one stored file'''
+        self.link_clients()
+        self.assertEqual(len(os.listdir(self.store)), 1)
+        for client in self.clients:
+            self.assertEqual(self.read(client), self.menulst_txt)
+            self.assertTrue(os.path.samefile(client, self.clients[0]))
+
+    def test_update_menulsts(self):
+        '''verify update_menulsts rewrites each distinct config once'''
+        self.link_clients()
+        grub.update_menulsts(self.clients[:2], grub.bootargs_line, '',
+                             'console=ttya,', store_dir=self.store)
+        self.assertEqual(len(os.listdir(self.store)), 2)
+        self.assertTrue(os.path.samefile(self.clients[0], self.clients[1]))
+        self.assertFalse(os.path.samefile(self.clients[1], self.clients[2]))
+        self.assertTrue('-B console=ttya,install=true' in
+                        self.read(self.clients[0]))
+        self.assertEqual(self.read(self.clients[3]), self.menulst_txt)
+
+        newpath = '/export/newimg'
+        rewritten = grub.update_menulsts(self.clients, grub.imagepath_line,
+                                         '/export/img', newpath,
+                                         store_dir=self.store)
+        self.assertEqual(rewritten, 2)
+        self.assertEqual(len(os.listdir(self.store)), 2)
+        for client in self.clients:
+            self.assertTrue(newpath in self.read(client))
+
+    def test_update_menulsts_matches_update(self):
+        '''verify update_menulsts matches the in-place update functions'''
+        self.link_clients()
+        grub.update_menulsts(self.clients, grub.svcname_line, 'newsvc',
+                             'newsvc', store_dir=self.store)
+        grub.update_svcname(self.svc_menulst, 'newsvc', 'newsvc')
+        self.assertEqual(self.read(self.clients[0]),
+                         self.read(self.svc_menulst))
+
+    def test_prune_menulst_store(self):
+        '''verify stored files are removed once no client uses them'''
+        self.link_clients()
+        for client in self.clients[:-1]:
+            os.remove(client)
+        grub.prune_menulst_store(self.store)
+        self.assertEqual(len(os.listdir(self.store)), 1)
+        os.remove(self.clients[-1])
+        grub.prune_menulst_store(self.store)
+        self.assertEqual(os.listdir(self.store), [])
+
+    def test_link_menulst_pruned(self):
+        '''verify a stored file pruned before it is linked to is stored
+        again'''
+        store_menulst = grub._store_menulst
+        pruned = []
+
+        def store_then_prune(content, store_dir):
+            '''store content, then prune it as a concurrent prune would'''
+            stored = store_menulst(content, store_dir)
+            if not pruned:
+                grub.prune_menulst_store(store_dir)
+                pruned.append(stored)
+            return stored
+
+        grub._store_menulst = store_then_prune
+        try:
+            self.link_clients()
+        finally:
+            grub._store_menulst = store_menulst
+        self.assertEqual(len(pruned), 1)
+        self.assertEqual(len(os.listdir(self.store)), 1)
+        for client in self.clients:
+            self.assertEqual(self.read(client), self.menulst_txt)
+            self.assertTrue(os.path.samefile(client, pruned[0]))
+
 
 if __name__ == '__main__':
     unittest.main()
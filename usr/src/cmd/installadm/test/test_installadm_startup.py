@@ -0,0 +1,105 @@
+#!/usr/bin/python2.7
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+
+'''
+To run these tests, see the instructions in usr/src/tools/tests/README.
+Remember that since the proto area is used for the PYTHONPATH, the gate
+must be rebuilt for these tests to pick up any changes in the tested code.
+
+Each subcommand module is imported in a fresh interpreter so that the set
+of modules it pulls in is measured in isolation from everything the test
+runner has already loaded.
+
+'''
+
+import os
+import subprocess
+import sys
+import unittest
+
+# Modules which are expensive to load and which should only be imported
+# by the subcommands which actually need them.
+HEAVY_MODULES = ['pkg.client.api', 'lxml.etree', 'sqlite3']
+
+_PROBE = '''
+import sys
+__import__('osol_install.auto_install.%s')
+print ' '.join(name for name in %r if name in sys.modules)
+'''
+
+
+def probe_import(module):
+    '''Import osol_install.auto_install.<module> in a new interpreter.
+
+    Returns the list of HEAVY_MODULES that were loaded as a side effect.
+
+    '''
+    cmd = [sys.executable, '-c', _PROBE % (module, HEAVY_MODULES)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, env=os.environ.copy())
+    out, err = proc.communicate()
+    if proc.returncode != 0:
+        raise AssertionError("importing %s failed:\n%s" % (module, err))
+    return out.split()
+
+
+class LightSubcommandImports(unittest.TestCase):
+    '''Subcommands that neither create images nor validate XML must not
+    load the pkg(5) client API, lxml or sqlite at import time.
+
+    '''
+
+    def _check(self, module):
+        '''Assert importing module loads none of HEAVY_MODULES'''
+        loaded = probe_import(module)
+        self.assertEqual(loaded, [], "%s loaded %s" % (module, loaded))
+
+    def test_list(self):
+        '''installadm list does not load heavy modules'''
+        self._check('list')
+
+    def test_delete_client(self):
+        '''installadm delete-client does not load heavy modules'''
+        self._check('delete_client')
+
+    def test_create_client(self):
+        '''installadm create-client does not load heavy modules'''
+        self._check('create_client')
+
+    def test_rename_service(self):
+        '''installadm rename-service does not load heavy modules'''
+        self._check('rename_service')
+
+    def test_set_service(self):
+        '''installadm set-service does not load heavy modules'''
+        self._check('set_service')
+
+    def test_service(self):
+        '''the service module itself does not load heavy modules'''
+        self._check('service')
+
+
+if __name__ == '__main__':
+    unittest.main()
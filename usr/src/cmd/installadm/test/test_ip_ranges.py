@@ -0,0 +1,118 @@
+#!/usr/bin/python2.7
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+'''
+To run these tests, see the instructions in usr/src/tools/tests/README.
+Remember that since the proto area is used for the PYTHONPATH, the gate
+must be rebuilt for these tests to pick up any changes in the tested code.
+
+'''
+
+import random
+import unittest
+
+import osol_install.auto_install.ip_ranges as ipr
+
+
+class IPv4ConversionTest(unittest.TestCase):
+    '''Tests for dotted quad and CIDR conversions'''
+
+    def test_round_trip(self):
+        '''Test ip_to_int and int_to_ip are inverses'''
+        for addr in ("0.0.0.0", "10.0.15.5", "192.168.168.10",
+                     "255.255.255.255"):
+            self.assertEqual(ipr.int_to_ip(ipr.ip_to_int(addr)), addr)
+
+    def test_bad_addresses(self):
+        '''Test malformed addresses raise ValueError'''
+        for addr in ("10.0.0", "10.0.0.256", "a.b.c.d", "10.0.0.1.2", ""):
+            self.assertRaises(ValueError, ipr.ip_to_int, addr)
+
+    def test_cidr_range(self):
+        '''Test address ranges of CIDR networks'''
+        self.assertEqual(ipr.cidr_range("10.0.15.5/32"),
+                         (ipr.ip_to_int("10.0.15.5"),) * 2)
+        self.assertEqual(ipr.cidr_range("10.0.15.5/0"), (0, ipr.MAX_IPV4))
+        self.assertEqual(ipr.cidr_range("192.168.1.77/26"),
+                         (ipr.ip_to_int("192.168.1.64"),
+                          ipr.ip_to_int("192.168.1.127")))
+        self.assertRaises(ValueError, ipr.cidr_range, "10.0.15.5/48")
+
+
+class IntervalSetTest(unittest.TestCase):
+    '''Tests for IntervalSet'''
+
+    def test_merge(self):
+        '''Test overlapping and adjacent intervals are merged'''
+        ranges = ipr.IntervalSet([(50, 60), (10, 20), (30, 40)])
+        self.assertEqual(list(ranges), [(10, 20), (30, 40), (50, 60)])
+        ranges.add(21, 29)
+        self.assertEqual(list(ranges), [(10, 40), (50, 60)])
+        ranges.add(0, 100)
+        self.assertEqual(list(ranges), [(0, 100)])
+        self.assertRaises(ValueError, ranges.add, 5, 4)
+
+    def test_matches_brute_force(self):
+        '''Test overlap queries against a brute force model'''
+        rand = random.Random(42)
+        ranges = ipr.IntervalSet()
+        members = set()
+        for i in xrange(300):
+            low = rand.randint(0, 5000)
+            high = low + rand.randint(0, 20)
+            ranges.add(low, high)
+            members.update(xrange(low, high + 1))
+        for i in xrange(2000):
+            low = rand.randint(0, 5100)
+            high = low + rand.randint(0, 10)
+            self.assertEqual(ranges.overlaps(low, high),
+                             bool(members.intersection(xrange(low,
+                                                              high + 1))))
+
+
+class IntervalMapTest(unittest.TestCase):
+    '''Tests for IntervalMap'''
+
+    def test_lookup(self):
+        '''Test lookup of many synthetic /24 subnets'''
+        subnets = ipr.IntervalMap()
+        for net in xrange(4096):
+            subnet_ip = "10.%d.%d.0" % (net / 256, net % 256)
+            subnets.add(*(ipr.cidr_range(subnet_ip + "/24") + (subnet_ip,)))
+        self.assertEqual(subnets.lookup(ipr.ip_to_int("10.15.255.7")),
+                         "10.15.255.0")
+        self.assertEqual(subnets.lookup(ipr.ip_to_int("10.16.0.1")), None)
+        self.assertEqual(subnets.lookup(ipr.ip_to_int("9.255.255.255")),
+                         None)
+
+    def test_overlap_rejected(self):
+        '''Test adding an overlapping interval raises ValueError'''
+        subnets = ipr.IntervalMap()
+        subnets.add(*(ipr.cidr_range("10.0.0.0/16") + ("a",)))
+        self.assertRaises(ValueError, subnets.add,
+                          *(ipr.cidr_range("10.0.5.0/24") + ("b",)))
+
+
+if __name__ == '__main__':
+    unittest.main()
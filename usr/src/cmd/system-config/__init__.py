@@ -111,6 +111,7 @@ def configure_group(group=None):
         return False
 
 from solaris_install.logger import FileHandler, INSTALL_LOGGER_NAME
+from solaris_install.sysconfig import batch
 from solaris_install.sysconfig.date_time import DateTimeScreen
 from solaris_install.sysconfig.network_nic_configure import NICConfigure
 from solaris_install.sysconfig.network_nic_select import NICSelect
@@ -620,6 +621,38 @@ def do_create_profile(options):
         _exit(options.logname, errcode=1)
 
 
+def do_create_profiles_batch(options):
+    '''Create a System Configuration profile for each host listed in
+    options.hosts'''
+    try:
+        InstallEngine(default_log=options.logname,
+                      loglevel=options.log_level, debug=options.debug)
+        global LOGGER
+        LOGGER = logging.getLogger(INSTALL_LOGGER_NAME)
+
+        if options.profile == DEFAULT_SC_LOCATION:
+            output_dir = os.path.dirname(DEFAULT_SC_LOCATION)
+        else:
+            output_dir = options.profile
+
+        hosts = batch.read_hosts(options.hosts)
+        LOGGER.info("Creating %d SC profiles in %s", len(hosts), output_dir)
+        writer = batch.ProfileBatch(output_dir, XSLT_FILE,
+                                    threads=options.threads)
+        results = writer.write_profiles(hosts)
+    except (batch.BatchError, IOError) as err:
+        print err
+        _exit(options.logname, errcode=1)
+
+    failed = [(host, error) for (host, path, error) in results if error]
+    for (host, error) in failed:
+        print _("Failed to generate SC profile for %(host)s: %(err)s") % \
+            {'host': host.get("hostname"), 'err': error}
+    print _("%(ok)d of %(total)d SC profiles successfully generated.") % \
+        {'ok': len(results) - len(failed), 'total': len(results)}
+    _exit(options.logname, errcode=int(bool(failed)))
+
+
 def do_unconfigure(sub_cmd, options):
     '''Performs the requested unconfigure operations'''
     try:
@@ -895,7 +928,9 @@ def _parse_options(arguments):
             "\n\t%prog configure [-s] [-g system] " + \
             "[-c config_profile.xml | dir] [--destructive]" + \
             "\n\t%prog create-profile [-g system] " + \
-            "[-o output_file] [-l logfile] [-v verbosity] [-b]"
+            "[-o output_file] [-l logfile] [-v verbosity] [-b]" + \
+            "\n\t%prog create-profile --hosts hosts_file " + \
+            "[-o output_dir] [--threads N] [-l logfile] [-v verbosity]"
 
     parser = OptionParser(usage=usage)
 
@@ -970,6 +1005,16 @@ def _parse_options(arguments):
                           help=_("Force the tool to run in "
                           "black and white. This may be useful on some SPARC "
                           "machines with unsupported frame buffers\n"))
+        parser.add_option("--hosts", dest="hosts", metavar="FILE",
+                          help=_("Non-interactively create a profile for "
+                          "each host listed in the CSV or JSON FILE. "
+                          "Profiles are saved into the directory given "
+                          "by -o [default: %s]") %
+                          os.path.dirname(DEFAULT_SC_LOCATION))
+        parser.add_option("--threads", dest="threads", type="int",
+                          metavar="N", default=batch.DEFAULT_THREADS,
+                          help=_("Number of profiles created in parallel "
+                          "with --hosts [default: %default]"))
         (options, sub_cmd) = parse_create_profile_args(parser, arguments)
     else:
         parser.error("Invalid subcommand \n"
@@ -1102,7 +1147,10 @@ def main():
     if sub_cmd[0] == CONFIGURE or sub_cmd[0] == UNCONFIGURE:
         do_unconfigure(sub_cmd[0], options)
     elif sub_cmd[0] == CREATE_PROFILE:
-        do_create_profile(options)
+        if options.hosts:
+            do_create_profiles_batch(options)
+        else:
+            do_create_profile(options)
 
     sys.exit(SU_OK)
 
@@ -0,0 +1,256 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+'''
+Generate System Configuration profiles for many hosts at once.
+
+'sysconfig create-profile --hosts FILE' reads the parameters of each host
+from a CSV file (with a header line naming the fields) or a JSON file (a
+list of objects), and writes one SC profile per host.  The XSLT stylesheet
+and the service bundle DTD are compiled once and shared by all hosts, and
+the profiles are built and written by several threads.
+
+Recognized fields (unknown fields are ignored; empty values are unset):
+
+    hostname            required
+    profile             output file name, default <hostname>.xml
+    timezone            default UTC
+    locale              LANG of the system, not set by default
+    keyboard            default US-English
+    terminal_type       default vt100
+    network             automatic, manual or none; not configured if unset
+    nic                 NIC name, required for manual network
+    ip_address          required for manual network
+    netmask             default 255.255.255.0
+    gateway             default route
+    dns_servers         space or comma separated DNS server addresses
+    dns_search          space or comma separated DNS search domains
+    domain              DNS domain
+    root_password       required
+    user_login          initial user; root becomes a role if set
+    user_name           description (real name) of the initial user
+    user_password       password of the initial user
+    encrypted           "true" if the passwords are already encrypted
+'''
+
+import csv
+import json
+import logging
+import os
+import re
+import tempfile
+
+from lxml import etree
+from multiprocessing.pool import ThreadPool
+
+from solaris_install.logger import INSTALL_LOGGER_NAME
+from solaris_install.manifest import schema_registry
+from solaris_install.sysconfig.profile import ConfigProfile
+from solaris_install.sysconfig.profile.nameservice_info import \
+    NameServiceInfo
+from solaris_install.sysconfig.profile.network_info import NetworkInfo
+from solaris_install.sysconfig.profile.system_info import SystemInfo
+from solaris_install.sysconfig.profile.user_info import UserInfo, \
+    UserInfoContainer
+
+SC_DTD_FILE = "/usr/share/lib/xml/dtd/service_bundle.dtd.1"
+
+# default number of threads writing profiles
+DEFAULT_THREADS = 8
+
+# defaults for values describing the console and keyboard of the
+# target host, which can't be determined from the system running sysconfig
+DEFAULT_KEYBOARD = "US-English"
+DEFAULT_TERMINAL_TYPE = "vt100"
+
+
+class BatchError(Exception):
+    '''Raised for invalid host parameters or unreadable hosts files'''
+    pass
+
+
+def read_hosts(path):
+    '''Read host parameters from the CSV or JSON file at path.
+    Files ending in .json are read as JSON, all others as CSV.
+
+    Returns a list of dictionaries, one per host.
+    '''
+    try:
+        with open(path, "rb") as hosts_file:
+            if path.endswith(".json"):
+                hosts = json.load(hosts_file)
+            else:
+                hosts = list(csv.DictReader(hosts_file))
+    except (IOError, ValueError, csv.Error) as err:
+        raise BatchError("Unable to read hosts file %s: %s" % (path, err))
+
+    if not isinstance(hosts, list) or \
+       not all(isinstance(host, dict) for host in hosts):
+        raise BatchError("Hosts file %s must list one object per host" %
+                         path)
+
+    # treat empty CSV fields as unset
+    return [dict((key, value) for (key, value) in host.iteritems()
+                 if value not in (None, "")) for host in hosts]
+
+
+def _split(value):
+    '''Split a space or comma separated list'''
+    return [item for item in re.split(r"[\s,]+", value) if item]
+
+
+def build_profile(host):
+    '''Return the ConfigProfile describing the parameters of host'''
+    hostname = host.get("hostname")
+    if not hostname:
+        raise BatchError("hostname not specified")
+    if "root_password" not in host:
+        raise BatchError("root_password not specified for %s" % hostname)
+
+    profile = ConfigProfile()
+    profile.system = SystemInfo(hostname=hostname,
+        tz_timezone=host.get("timezone", SystemInfo.UTC),
+        keyboard=host.get("keyboard", DEFAULT_KEYBOARD),
+        locale=host.get("locale"),
+        terminal_type=host.get("terminal_type", DEFAULT_TERMINAL_TYPE))
+
+    net_type = host.get("network")
+    if net_type is not None:
+        nic = host.get("nic")
+        if net_type == NetworkInfo.MANUAL and \
+           (nic is None or "ip_address" not in host):
+            raise BatchError("manual network for %s needs nic and "
+                             "ip_address" % hostname)
+        try:
+            profile.nic = NetworkInfo(
+                nic_iface={NetworkInfo.NIC_NAME_KEY: nic,
+                           NetworkInfo.NIC_DEV_KEY: nic,
+                           NetworkInfo.NIC_LINK_KEY: nic},
+                net_type=net_type, ip_address=host.get("ip_address"),
+                netmask=host.get("netmask"), gateway=host.get("gateway"))
+        except ValueError as err:
+            raise BatchError("%s: %s" % (hostname, err))
+
+    if "dns_servers" in host:
+        profile.nameservice = NameServiceInfo(
+            domain=host.get("domain", ""),
+            dns_server=_split(host["dns_servers"]),
+            dns_search=_split(host.get("dns_search", "")))
+
+    encrypted = str(host.get("encrypted", "")).lower() in ("true", "yes",
+                                                           "1")
+    user_login = host.get("user_login")
+    if user_login and not host.get("user_password"):
+        raise BatchError("user_password not specified for user %s on %s" %
+                         (user_login, hostname))
+    root = UserInfo(login_name="root", password=host["root_password"],
+                    encrypted=encrypted, is_role=bool(user_login))
+    user = UserInfo(real_name=host.get("user_name"), login_name=user_login,
+                    password=host.get("user_password"),
+                    encrypted=encrypted, gid=10, shell="/usr/bin/bash",
+                    roles="root", profiles="System Administrator",
+                    sudoers="ALL=(ALL) ALL")
+    profile.users = UserInfoContainer(root, user)
+
+    return profile
+
+
+class ProfileBatch(object):
+    '''Writes SC profiles for a list of hosts into output_dir.
+
+    The XSLT stylesheet and the DTD are compiled once, when the
+    ProfileBatch is created.
+    '''
+
+    def __init__(self, output_dir, xslt_file, dtd_file=SC_DTD_FILE,
+                 threads=DEFAULT_THREADS):
+        self.logger = logging.getLogger(INSTALL_LOGGER_NAME)
+        self.output_dir = output_dir
+        self.threads = max(1, threads)
+        self.transform = schema_registry.get_xslt(xslt_file)
+        self.dtd = schema_registry.get_dtd(dtd_file)
+
+    def write_profile(self, host):
+        '''Write the SC profile of host.  Returns the path of the profile.
+        Raises BatchError if the parameters of host are invalid or the
+        resulting profile does not validate.
+        '''
+        profile = build_profile(host)
+        tree = self.transform.transform(
+            etree.ElementTree(profile.get_xml_tree()))
+        valid, error_log = self.dtd.validate(tree.getroot())
+        if not valid:
+            raise BatchError("Profile for %s does not validate: %s" %
+                             (host["hostname"],
+                              " : ".join(str(error) for error in
+                                         error_log.filter_from_errors())))
+        text = etree.tostring(tree, pretty_print=True)
+
+        path = os.path.join(self.output_dir,
+                            host.get("profile", host["hostname"] + ".xml"))
+        # profiles contain password hashes, so make them readable by
+        # the owner only, as the interactive tool does
+        (tfd, tmppath) = tempfile.mkstemp(dir=os.path.dirname(path),
+                                          suffix=".xml")
+        try:
+            try:
+                os.write(tfd, text)
+            finally:
+                os.close(tfd)
+            os.chmod(tmppath, 0400)
+            os.rename(tmppath, path)
+        except:
+            os.remove(tmppath)
+            raise
+
+        self.logger.debug("Wrote SC profile %s", path)
+        return path
+
+    def _write_one(self, host):
+        '''Write the profile of host, returning (host, path, error)'''
+        try:
+            return (host, self.write_profile(host), None)
+        except (BatchError, EnvironmentError) as err:
+            self.logger.error("Failed to generate SC profile for %s: %s",
+                         host.get("hostname"), err)
+            return (host, None, err)
+
+    def write_profiles(self, hosts):
+        '''Write the SC profiles of hosts, in parallel.
+
+        Returns a list of (host, path, error) tuples in the order of hosts.
+        path is None and error is set for each profile that could not be
+        written.
+        '''
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+
+        pool = ThreadPool(min(self.threads, max(1, len(hosts))))
+        try:
+            return pool.map(self._write_one, hosts)
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,126 @@
+#!/usr/bin/python2.7
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+'''
+To run these tests, see the instructions in usr/src/tools/tests/README.
+Remember that since the proto area is used for the PYTHONPATH, the gate
+must be rebuilt for these tests to pick up any changes in the tested code.
+
+'''
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from lxml import etree
+
+import solaris_install.sysconfig.batch as batch
+from solaris_install.sysconfig.profile.network_info import NetworkInfo
+
+
+XSLT = os.environ["ROOT"] + "/usr/share/sysconfig/xslt/doc2sc_profile.xslt"
+
+HOSTS_CSV = '''hostname,timezone,network,nic,ip_address,root_password,\
+user_login,user_password,encrypted
+host1,Europe/Prague,automatic,,,rootpw,,,
+host2,,manual,net0,10.0.0.2,$5$abc$def,jack,$5$ghi$jkl,true
+,,,,,rootpw,,,
+'''
+
+
+class TestBatch(unittest.TestCase):
+    '''Tests for batch SC profile generation'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir="/tmp")
+        self.hosts_csv = os.path.join(self.tmpdir, "hosts.csv")
+        with open(self.hosts_csv, "w") as hosts_file:
+            hosts_file.write(HOSTS_CSV)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read_hosts_csv(self):
+        '''read_hosts() reads CSV, dropping empty fields'''
+        hosts = batch.read_hosts(self.hosts_csv)
+        self.assertEqual(len(hosts), 3)
+        self.assertEqual(hosts[0], {"hostname": "host1",
+                                    "timezone": "Europe/Prague",
+                                    "network": "automatic",
+                                    "root_password": "rootpw"})
+        self.assertEqual(hosts[2], {"root_password": "rootpw"})
+
+    def test_read_hosts_json(self):
+        '''read_hosts() reads JSON and rejects other structures'''
+        path = os.path.join(self.tmpdir, "hosts.json")
+        with open(path, "w") as hosts_file:
+            json.dump([{"hostname": "host1", "root_password": "x"}],
+                      hosts_file)
+        self.assertEqual(batch.read_hosts(path),
+                         [{"hostname": "host1", "root_password": "x"}])
+
+        with open(path, "w") as hosts_file:
+            json.dump({"hostname": "host1"}, hosts_file)
+        self.assertRaises(batch.BatchError, batch.read_hosts, path)
+
+    def test_build_profile(self):
+        '''build_profile() fills in the profile from host parameters'''
+        hosts = batch.read_hosts(self.hosts_csv)
+        profile = batch.build_profile(hosts[1])
+        self.assertEqual(profile.system.hostname, "host2")
+        self.assertEqual(profile.nic.type, NetworkInfo.MANUAL)
+        self.assertEqual(profile.users.user.login_name, "jack")
+        self.assertEqual(profile.users.user.password, "$5$ghi$jkl")
+        self.assertTrue(profile.users.root.is_role)
+
+        self.assertRaises(batch.BatchError, batch.build_profile, hosts[2])
+        self.assertRaises(batch.BatchError, batch.build_profile,
+                          {"hostname": "host3", "root_password": "x",
+                           "network": "manual"})
+        # a user without a password could never log in to assume root
+        self.assertRaises(batch.BatchError, batch.build_profile,
+                          {"hostname": "host4", "root_password": "x",
+                           "user_login": "jack"})
+
+    def test_write_profiles(self):
+        '''write_profiles() writes a valid profile per host and reports
+        the hosts that failed'''
+        hosts = batch.read_hosts(self.hosts_csv)
+        writer = batch.ProfileBatch(self.tmpdir, XSLT, threads=2)
+        results = writer.write_profiles(hosts)
+
+        self.assertEqual([path for (host, path, error) in results],
+                         [os.path.join(self.tmpdir, "host1.xml"),
+                          os.path.join(self.tmpdir, "host2.xml"), None])
+        self.assertTrue(isinstance(results[2][2], batch.BatchError))
+
+        tree = etree.parse(results[1][1])
+        self.assertEqual(tree.getroot().get("name"), "sysconfig")
+        nodenames = tree.xpath("//propval[@name='nodename']/@value")
+        self.assertEqual(nodenames, ["host2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
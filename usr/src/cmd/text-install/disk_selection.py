@@ -19,7 +19,7 @@
 #
 # CDDL HEADER END
 #
-# Copyright (c) 2009, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2009, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 '''
@@ -71,6 +71,7 @@ class DiskScreen(BaseScreen):
     REC_SIZE_TEXT = _("Recommended size: ")
     MIN_SIZE_TEXT = _("    Minimum size: ")
     DISK_SEEK_TEXT = _("Seeking disks on system")
+    DISKS_FOUND_TEXT = _("Disks found so far: %d")
     FOUND_x86 = _("The following partitions were found on the disk.")
     FOUND_SPARC = _("The following slices were found on the disk.")
     PROPOSED_x86 = _("A partition table was not found. The following is "
@@ -195,34 +196,40 @@ class DiskScreen(BaseScreen):
     size_line = property(get_size_line)
     
     def wait_for_disks(self):
-        '''Block while waiting for libtd to finish. Catch F9 and quit
-        if needed
+        '''Block while waiting for libtd to finish, listing the disks
+        found as target discovery inserts them into the DOC. Catch F9 and
+        quit if needed. Returns immediately once discovery has completed,
+        so revisiting this screen never waits again.
         
         '''
-        self.main_win.actions.pop(curses.KEY_F2, None)
-        self.main_win.actions.pop(curses.KEY_F6, None)
-        self.main_win.actions.pop(curses.KEY_F3, None)
-        self.main_win.show_actions()
+        if not self._target_discovery_completed:
+            self.main_win.actions.pop(curses.KEY_F2, None)
+            self.main_win.actions.pop(curses.KEY_F6, None)
+            self.main_win.actions.pop(curses.KEY_F3, None)
+            self.main_win.show_actions()
 
-        self.center_win.add_text(DiskScreen.DISK_SEEK_TEXT, 5, 1,
-                                 self.win_size_x - 3)
-        self.main_win.do_update()
-        offset = textwidth(DiskScreen.DISK_SEEK_TEXT) + 2
-        spin_index = 0
-        self.center_win.window.timeout(250)
-
-        while not self._target_discovery_completed:
-            input_key = self.main_win.getch()
-            if input_key == curses.KEY_F9:
-                if self.confirm_quit():
-                    raise QuitException
-            self.center_win.add_text(DiskScreen.SPINNER[spin_index], 5, offset)
-            self.center_win.no_ut_refresh()
+            self.center_win.add_text(DiskScreen.DISK_SEEK_TEXT, 5, 1,
+                                     self.win_size_x - 3)
             self.main_win.do_update()
-            spin_index = (spin_index + 1) % len(DiskScreen.SPINNER)
-
-        self.center_win.window.timeout(-1)
-        self.center_win.clear()
+            offset = textwidth(DiskScreen.DISK_SEEK_TEXT) + 2
+            spin_index = 0
+            num_shown = 0
+            self.center_win.window.timeout(250)
+
+            while not self._target_discovery_completed:
+                input_key = self.main_win.getch()
+                if input_key == curses.KEY_F9:
+                    if self.confirm_quit():
+                        raise QuitException
+                self.center_win.add_text(DiskScreen.SPINNER[spin_index], 5,
+                                         offset)
+                num_shown = self._show_found_disks(num_shown)
+                self.center_win.no_ut_refresh()
+                self.main_win.do_update()
+                spin_index = (spin_index + 1) % len(DiskScreen.SPINNER)
+
+            self.center_win.window.timeout(-1)
+            self.center_win.clear()
 
         # check the result of target discovery
         if self._target_discovery_status is not InstallEngine.EXEC_SUCCESS:
@@ -233,6 +240,40 @@ class DiskScreen(BaseScreen):
             raise TargetDiscoveryError(("Unexpected error (%s) during target "
                 "discovery. See log for details.") % err)
 
+    def _show_found_disks(self, num_shown):
+        '''List the disks target discovery has found so far, below the
+        spinner, if more were found since last shown. Only as many of the
+        most recently found disks as fit on the screen are listed.
+
+        Returns the number of disks found.
+
+        '''
+        discovered_target = self.doc.persistent.get_first_child( \
+            name=Target.DISCOVERED)
+        if discovered_target is None:
+            return num_shown
+
+        disks = discovered_target.get_children(class_type=Disk)
+        if len(disks) == num_shown:
+            return num_shown
+
+        y_loc = 7
+        self.center_win.add_text(DiskScreen.DISKS_FOUND_TEXT % len(disks),
+                                 y_loc, 1, self.win_size_x - 3)
+        max_lines = self.win_size_y - y_loc - 3
+        if max_lines > 0:
+            for disk in disks[-max_lines:]:
+                y_loc += 1
+                disk_text = "  " + disk.ctd
+                if disk.disk_prop is not None and \
+                    disk.disk_prop.dev_size is not None:
+                    disk_text += "  " + locale.format("%.1f",
+                        disk.disk_prop.dev_size.get(Size.gb_units)) + \
+                        LOCALIZED_GB
+                self.center_win.add_text(disk_text, y_loc, 1,
+                                         self.win_size_x - 3)
+        return len(disks)
+
     def _td_callback(self, status, errsvc):
         '''Callback function for Target Discovery checkpoint execution.
            The status value is saved to be interpreted later.
@@ -412,7 +453,10 @@ class DiskScreen(BaseScreen):
         LOGGER.debug(self.doc.persistent)
     
     def start_discovery(self):
+        '''Start target discovery in the background. It runs once; the
+        results stay in the DOC for every later visit to this screen.
 
+        '''
         # start target discovery
         if not self._target_discovery_completed:
             errsvc.clear_error_list()
@@ -48,6 +48,8 @@ import terminalui
 from terminalui.base_screen import BaseScreen
 from solaris_install.engine.test.engine_test_utils import \
     get_new_engine_instance
+from solaris_install.target import Target
+from solaris_install.target.physical import Disk, DiskProp
 from solaris_install.target.size import Size
 
 terminalui.init_logging("test")
@@ -61,6 +63,18 @@ class MockCenterWin(object):
         pass
 
 
+class MockTextWin(object):
+    '''Records the text added to a window'''
+
+    border_size = (0, 0)
+
+    def __init__(self):
+        self.text = []
+
+    def add_text(self, text, *args, **kwargs):
+        self.text.append(text)
+
+
 class MockAll(object):
     '''Generic Mock object that 'never' raises an AttributeError'''
     
@@ -111,6 +125,39 @@ class DiskSelectTest(unittest.TestCase):
         self.assertTrue(isinstance(self.screen.minimum_size, Size))
         self.assertTrue(isinstance(self.screen.recommended_size, Size))
 
+    def test_show_found_disks(self):
+        '''Ensure that _show_found_disks() lists the disks target discovery
+        has inserted into the DOC so far, and only redraws when more were
+        found'''
+
+        self.screen.center_win = MockTextWin()
+        self.screen._win_size = (20, 80)
+
+        # nothing is listed before discovery inserts its root node
+        self.assertEqual(self.screen._show_found_disks(0), 0)
+        self.assertEqual(self.screen.center_win.text, [])
+
+        discovered = Target(Target.DISCOVERED)
+        self.screen.doc.persistent.insert_children(discovered)
+        self.assertEqual(self.screen._show_found_disks(0), 0)
+        self.assertEqual(self.screen.center_win.text, [])
+
+        for num in range(2):
+            disk = Disk("disk")
+            disk.ctd = "c0t%dd0" % num
+            disk.disk_prop = DiskProp()
+            disk.disk_prop.dev_size = Size("10gb")
+            discovered.insert_children(disk)
+        self.assertEqual(self.screen._show_found_disks(0), 2)
+        self.assertEqual(len(self.screen.center_win.text), 3)
+        self.assertTrue(self.screen.center_win.text[1].strip().startswith(
+            "c0t0d0"))
+
+        # no redraw until more disks are found
+        self.screen.center_win = MockTextWin()
+        self.assertEqual(self.screen._show_found_disks(2), 2)
+        self.assertEqual(self.screen.center_win.text, [])
+
 
 if __name__ == '__main__':
     unittest.main()
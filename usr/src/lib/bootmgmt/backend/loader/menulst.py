@@ -19,7 +19,7 @@
 #
 # CDDL HEADER END
 #
-# Copyright (c) 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2011, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 """
@@ -34,11 +34,18 @@ import re
 import shutil
 import stat
 import tempfile
+from StringIO import StringIO
 from bootmgmt import BootmgmtConfigWriteError, BootmgmtArgumentError
 from bootmgmt.bootloader import BootLoaderInstallError
 from bootmgmt.bootconfig import BootConfig
 
 
+# Splits a command's arguments, keeping quoted strings together
+_ARGS_RE = re.compile(r'([^ \t"]+"([^\\"]|\\.)*"[^ \t]*|'
+                      r'([^ \t\\"]|\\.)*"[^"]*(?![^"]*")|'
+                      r'[^ "\t]+)')
+
+
 class MenuLstError(Exception):
     def __init__(self, msg):
         super(MenuLstError, self).__init__()
@@ -51,9 +58,15 @@ class MenuLstError(Exception):
 class MenuLstComment(object):
     def __init__(self, comment):
         self._comment = comment
+        self.dirty = False
 
     def update_comment(self, comment):
-        self._comment = comment
+        if comment != self._comment:
+            self._comment = comment
+            self.dirty = True
+
+    def _mark_clean(self):
+        self.dirty = False
 
     def __str__(self):
         return self._comment.rstrip('\n')
@@ -62,9 +75,22 @@ class MenuLstComment(object):
 class MenuLstCommand(object):
     """A menu.lst command and its arguments from the menu.lst file"""
 
-    def __init__(self, command, args=None):
+    def __init__(self, command, args=None, source=None):
         self._command = command
+        self._args = None
         self.set_args(args)
+        # The text this command was parsed from.  It is written back
+        # verbatim, preserving layout and escaped newlines, until the
+        # command is changed.
+        self._source = source
+
+    @property
+    def dirty(self):
+        "True if this command was created or changed since it was parsed"
+        return self._source is None
+
+    def _mark_clean(self):
+        self._source = str(self)
 
     def get_command(self):
         return self._command
@@ -74,21 +100,21 @@ class MenuLstCommand(object):
 
     def set_args(self, args):
         if args is None:
-            self._args = []
+            args = []
         else:
             # Args can either be a string or a list-like object
             if isinstance(args, basestring):
                 # If a plain string is supplied, turn it into a
                 # list of arguments:
-                pattern = (r'([^ \t"]+"([^\\"]|\\.)*"[^ \t]*|'
-                           r'([^ \t\\"]|\\.)*"[^"]*(?![^"]*")|'
-                           r'[^ "\t]+)')
-                argv = [v[0] for v in re.compile(pattern).findall(args)]
-                self._args = argv
-            else:
-                self._args = args
+                args = [v[0] for v in _ARGS_RE.findall(args)]
+        # Setting the same arguments again leaves the command unchanged
+        if args != self._args:
+            self._args = args
+            self._source = None
 
     def __str__(self):
+        if self._source is not None:
+            return self._source.rstrip('\n')
         if not self._command is None and not self._args is None:
             return self._command + ' ' + ' '.join(self._args)
         elif not self._command is None:
@@ -114,11 +140,25 @@ class MenuLstMenuEntry(object):
             self._cmdlist = []
         else:
             self._cmdlist = list(args) # make a copy
+        self._modified = True
+
+    @property
+    def dirty(self):
+        """True if commands were added to or deleted from this entry, or
+        any of its commands changed, since it was parsed"""
+        return self._modified or any(cmd.dirty for cmd in self._cmdlist)
+
+    def _mark_clean(self):
+        self._modified = False
+        for cmd in self._cmdlist:
+            cmd._mark_clean()
 
     def add_comment(self, comment):
         self._cmdlist.append(MenuLstComment(comment))
+        self._modified = True
 
     def add_command(self, mlcmd):
+        self._modified = True
         # Some commands require specific ordering
         # findroot should be the first command after title.
         # bootfs should follow findroot (if it exists)
@@ -143,6 +183,7 @@ class MenuLstMenuEntry(object):
                 continue
             if cmd == _cmd.get_command():
                 del self._cmdlist[idx]
+                self._modified = True
                 return
 
     def find_command(self, name):
@@ -168,10 +209,7 @@ class MenuLstMenuEntry(object):
         return [cmd for cmd in self._cmdlist if type(cmd) == MenuLstCommand]
 
     def __str__(self):
-        ostr = ''
-        for cmd in self._cmdlist:
-            ostr += str(cmd).rstrip('\n') + '\n'
-        return ostr.rstrip('\n')
+        return '\n'.join(str(cmd).rstrip('\n') for cmd in self._cmdlist)
 
     def __repr__(self):
         ostr = 'MenuLstMenuEntry = ['
@@ -191,10 +229,23 @@ class MenuDotLst(object):
         self.target = self
         self._line = 0
         self._last = ''
+        self._last_source = ''       # unprocessed text of self._last
         self._entitylist = []        # per-instance list of entities
+        self._modified = False
         self._filename = filename
         self._parse()
 
+    @property
+    def dirty(self):
+        """True if this menu changed since it was parsed"""
+        return self._modified or any(entity.dirty
+                                     for entity in self._entitylist)
+
+    def _mark_clean(self):
+        self._modified = False
+        for entity in self._entitylist:
+            entity._mark_clean()
+
     def entities(self):
         """Return a list of entities encapsulated by this MenuDotLst. A new
         list is returned so that deletions can occur in for-loop.
@@ -206,14 +257,17 @@ class MenuDotLst(object):
             # Yes, I really mean "is" here:
             if cur is entity:
                 del self._entitylist[idx]
+                self._modified = True
                 return
 
     def add_comment(self, comment):
         self._entitylist.append(MenuLstComment(comment))
+        self._modified = True
 
     def add_command(self, cmd):
         "Add a MenuLstCommand or MenuLstMenuEntry to the entitylist"
         self._entitylist.append(cmd)
+        self._modified = True
 
     def add_global(self, cmd_plus_args):
         "Add a command & args to the end of the global command section"
@@ -228,12 +282,10 @@ class MenuDotLst(object):
         else:
             args = None
         self._entitylist.insert(idx, MenuLstCommand(argv[0], args))
+        self._modified = True
 
     def __str__(self):
-        ostr = ''
-        for entity in self._entitylist:
-            ostr += str(entity) + '\n'
-        return ostr
+        return ''.join(str(entity) + '\n' for entity in self._entitylist)
 
     def __repr__(self):
         return (repr(self._entitylist))
@@ -249,6 +301,7 @@ class MenuDotLst(object):
             fileobj.close()
 
         self._analyze_syntax()
+        self._mark_clean()
 
     def _analyze_syntax(self):
         "This can be overridden in child classes, if needed"
@@ -256,19 +309,16 @@ class MenuDotLst(object):
 
     @staticmethod
     def _process_escapes(istr):
-        res = ''
-        newline_escaped = False
-        for idx in range(len(istr)):
-            #
-            # Legacy GRUB allows escaping the newline
-            #
-            # We're guaranteed to always have a character
-            # after the backslash, so no try is needed here.
-            if istr[idx] == '\\' and istr[idx + 1] == '\n':
-                newline_escaped = True
-                res += ' '
-            elif istr[idx] != '\n':
-                res += istr[idx]
+        # A backslash must be followed by another character.  Only the
+        # last line of a file can end with one instead of a newline.
+        if istr.endswith('\\'):
+            raise IndexError('dangling backslash')
+        #
+        # Legacy GRUB allows escaping the newline, which is replaced
+        # by a space.  Other newlines are removed.
+        #
+        newline_escaped = '\\\n' in istr
+        res = istr.replace('\\\n', ' ').replace('\n', '')
         return res, newline_escaped
 
     def _parse_line(self, nextline):
@@ -327,6 +377,7 @@ class MenuDotLst(object):
             return
 
         # Remove escape sequences from the line:
+        rawline = nextline
         try:
             nextline, newline_escaped = (
                 self._process_escapes(nextline))
@@ -337,16 +388,15 @@ class MenuDotLst(object):
         # If the newline was escaped, save the string for later
         if newline_escaped:
             self._last += nextline
+            self._last_source += rawline
             return        # Wait for the next line
         else:
             nextline = self._last + nextline
+            source = self._last_source + rawline
             self._last = ''
+            self._last_source = ''
 
-        pattern = (r'([^ \t"]+"([^\\"]|\\.)*"[^ \t]*|'
-              r'([^ \t\\"]|\\.)*"[^"]*(?![^"]*")|'
-              # r'"([^ \t\\"]|\\.)*(?![^"]*[^\\]")|'
-               r'[^ "\t]+)')
-        argv = [v[0] for v in re.compile(pattern).findall(nextline)]
+        argv = [v[0] for v in _ARGS_RE.findall(nextline)]
 
         if (len(argv) > 0):
             if argv[0] == 'title':
@@ -356,7 +406,8 @@ class MenuDotLst(object):
             # that's a valid way to set certain variables
             argv = argv[0].split('=', 1) + argv[1:]
 
-            self.target.add_command(MenuLstCommand(argv[0], argv[1:]))
+            self.target.add_command(MenuLstCommand(argv[0], argv[1:],
+                                                   source))
 
 
 #
@@ -386,12 +437,26 @@ class MenuLstBootLoaderMixIn(object):
                     self._debug('Error while making dirs for menu.lst: ' +
                                 str(ose))
 
+            # Render the menu.lst first, so that an unchanged menu.lst is
+            # neither rewritten nor has its mode and owner reset.
+            newmenu = StringIO()
+            self._write_menu_lst(newmenu)
+            newmenu = newmenu.getvalue()
+            try:
+                with open(realmenu) as oldmenu:
+                    unchanged = (oldmenu.read() == newmenu)
+            except IOError:
+                unchanged = False
+            if unchanged:
+                self._debug('menu.lst at %s is unchanged' % realmenu)
+                return None
+
             try:
                 # Don't open the new menu.lst over the old -- create a
                 # temporary file, then, if the write is successful, move the
                 # temporary file over the old one.
                 outfile = open(tempmenu, 'w')
-                self._write_menu_lst(outfile)
+                outfile.write(newmenu)
                 self._debug('menu.lst written to %s' % tempmenu)
                 outfile.close()
             except IOError as err:
@@ -0,0 +1,154 @@
+#! /usr/bin/python2.7
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+"""
+Cache of the device tree.
+
+pysol.di_find_prop() takes a devinfo snapshot for each property it looks
+up.  Inside a DevinfoSnapshot context, di_find_prop() looks the property up
+in a single snapshot of the device tree instead, and remembers the value of
+each property of each node.  Snapshots only apply to the lookups of the
+thread which opened them.
+
+The snapshot goes through a layer object for libdevinfo, which defaults to
+PysolLayer, so that it can be used with a fake layer on systems without
+libdevinfo.
+"""
+
+import errno
+import os
+import threading
+
+
+class PysolLayer(object):
+    "Layer of the cache over libdevinfo, through pysol"
+
+    def di_init(self, path, flags):
+        # pysol loads libdevinfo when imported
+        from bootmgmt import pysol
+        return pysol.di_init(path, flags)
+
+    def di_fini(self, hdl):
+        from bootmgmt import pysol
+        pysol.di_fini(hdl)
+
+    def di_lookup_node(self, hdl, path):
+        from bootmgmt import pysol
+        return pysol.di_lookup_node(hdl, path)
+
+    def di_prop_strings(self, node, propname):
+        from bootmgmt import pysol
+        return pysol.di_prop_strings(node, propname)
+
+
+# the DevinfoSnapshots open in each thread, innermost last
+_local = threading.local()
+
+
+def _snapshots():
+    "Returns the stack of the DevinfoSnapshots open in this thread"
+    if not hasattr(_local, 'snapshots'):
+        _local.snapshots = []
+    return _local.snapshots
+
+
+def current_snapshot():
+    "Returns the innermost DevinfoSnapshot open in this thread, or None"
+    snapshots = _snapshots()
+    if snapshots:
+        return snapshots[-1]
+    return None
+
+
+class DevinfoSnapshot(object):
+    """A snapshot of the device tree and of the properties of its nodes,
+    for the duration of the context:
+
+        with DevinfoSnapshot():
+            for ctrl in controllers:
+                compatible = pysol.di_find_prop('compatible', ctrl)
+
+    The snapshot is taken by the first lookup and released when the context
+    is left, and the value of each property of each node is looked up once.
+    """
+
+    # libdevinfo flags of the snapshot, from <sys/devinfo_impl.h> as in pysol
+    DINFOSUBTREE = (0xdf << 8) | 0x01
+    DINFOPROP = (0xdf << 8) | 0x04
+
+    def __init__(self, layer=None):
+        self.layer = layer if layer is not None else PysolLayer()
+        self._hdl = None
+        self._nodes = {}
+        self._props = {}
+
+    def __enter__(self):
+        _snapshots().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _snapshots().remove(self)
+        self.release()
+        return False
+
+    def release(self):
+        "Releases the snapshot and forgets the properties looked up"
+        if self._hdl is not None:
+            self.layer.di_fini(self._hdl)
+            self._hdl = None
+        self._nodes = {}
+        self._props = {}
+
+    def _node(self, path):
+        if self._hdl is None:
+            self._hdl = self.layer.di_init('/', self.DINFOSUBTREE |
+                                           self.DINFOPROP)
+        if path not in self._nodes:
+            if path == '/':
+                self._nodes[path] = self._hdl
+            else:
+                self._nodes[path] = self.layer.di_lookup_node(self._hdl,
+                                                              path)
+        node = self._nodes[path]
+        if node is None:
+            raise IOError(errno.ENXIO, path + ': ' +
+                          os.strerror(errno.ENXIO))
+        return node
+
+    def find_prop(self, propname, path='/'):
+        """Returns the value of the string property propname of the node
+        path, as pysol.di_find_prop() does: a string, a list of strings if
+        the property has several values, or None if the node has no such
+        property.  Raises IOError if there is no node path.
+        """
+        key = (path, propname)
+        if key not in self._props:
+            self._props[key] = self.layer.di_prop_strings(self._node(path),
+                                                          propname)
+        return self._props[key]
+
+
+__all__ = ['PysolLayer',
+           'DevinfoSnapshot',
+           'current_snapshot']
@@ -19,7 +19,7 @@
 #
 # CDDL HEADER END
 #
-# Copyright (c) 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2011, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 "Solaris-specific library wrappers and functions"
@@ -30,6 +30,8 @@ import errno
 import sys
 import os
 
+from bootmgmt import devcache
+
 try:
     _ = gettext.translation("SUNW_OST_OSLIB", "/usr/lib/locale",
         fallback=True).gettext
@@ -334,6 +336,8 @@ _libdi.di_minor_next.restype = c_void_p
 _libdi.di_minor_next.argtypes = [c_void_p, c_void_p]
 _libdi.di_walk_minor.argtypes = [c_void_p, c_char_p, c_int, c_void_p,
                                         _minor_walkfunc_type]
+_libdi.di_lookup_node.restype = c_void_p
+_libdi.di_lookup_node.argtypes = [c_void_p, c_char_p]
 _libdi.di_prop_lookup_strings.argtypes = [c_ulong, c_void_p,
                                           c_char_p, c_void_p]
 
@@ -469,12 +473,21 @@ def di_prop_lookup_strings(dev, node, prop_name, prop_data):
     return rv
 
 
-def di_find_root_prop(propname):
-    return di_find_prop(propname, '/')
+def di_lookup_node(root, path):
+    """Returns the node of the device path specified in the snapshot whose
+    root node is passed in, or None if there is no such node
+    """
+    node = c_void_p(_libdi.di_lookup_node(root, path))
+    if node.value is None:
+        return None
+    return node
 
 
-def di_find_prop(propname, root):
-    hdl = di_init(root, DINFOPROP)
+def di_prop_strings(node, propname):
+    """Returns the value of the string property propname of the node passed
+    in: a string, a list of strings if the property has several values, or
+    None if the node has no such property
+    """
     propval = None
     try:
         # This is a bit tricky, sicne di_prop_lookup_strings returns ONE
@@ -488,7 +501,7 @@ def di_find_prop(propname, root):
         # the NUL and one to get us past it).
 
         value = pointer(c_void_p())
-        rv = di_prop_lookup_strings(DDI_DEV_T_ANY, hdl, propname,
+        rv = di_prop_lookup_strings(DDI_DEV_T_ANY, node, propname,
                                     value)
         stringvalue = cast(value.contents, c_char_p)
         if rv == 1:
@@ -508,9 +521,28 @@ def di_find_prop(propname, root):
             propval = None
         else:
             raise
+    return propval
+
+
+def di_find_root_prop(propname):
+    return di_find_prop(propname, '/')
+
+
+def di_find_prop(propname, root):
+    """Returns the value of the string property propname of the device node
+    root.  Inside a devcache.DevinfoSnapshot context, the property is looked
+    up in the snapshot of the context, once; otherwise a snapshot of the node
+    is taken for the lookup.
+    """
+    snapshot = devcache.current_snapshot()
+    if snapshot is not None:
+        return snapshot.find_prop(propname, root)
+
+    hdl = di_init(root, DINFOPROP)
+    try:
+        return di_prop_strings(hdl, propname)
     finally:
         di_fini(hdl)
-    return propval
 
 
 # ==============================[ libfstyp ]==================================
@@ -848,6 +880,10 @@ __all__ = ["statvfs",
            "di_minor_next",
            "di_walk_minor",
            "di_fini",
+           "di_lookup_node",
+           "di_prop_strings",
+           "di_find_prop",
+           "di_find_root_prop",
            "devfs_bootdev_get_list",
            "fstyp_init",
            "fstyp_ident",
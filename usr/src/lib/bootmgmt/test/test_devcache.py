@@ -0,0 +1,156 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+"""
+test_devcache.py - unittests for the devinfo snapshot, run against a fake
+device tree
+"""
+
+import errno
+import threading
+import unittest
+
+from bootmgmt import devcache
+from bootmgmt.devcache import DevinfoSnapshot
+
+# string properties of each node of the fake device tree
+DEVICE_TREE = {
+    '/': {'efi-systype': '64'},
+    '/pci@0,0/pci1af4,1100@1,2': {'compatible': ['pciclass,0c0310',
+                                                 'pciclass,0c03']},
+    '/pci@0,0/pci8086,2829@1f,2': {'compatible': 'pciclass,010601'},
+}
+
+class FakeLayer(object):
+    "Layer over a fake device tree, counting the calls made to it"
+
+    def __init__(self, tree=DEVICE_TREE):
+        self.tree = tree
+        self.calls = []
+        self.open = 0
+
+    def di_init(self, path, flags):
+        self.calls.append(('di_init', path))
+        self.open += 1
+        return ('node', path)
+
+    def di_fini(self, hdl):
+        self.calls.append(('di_fini', hdl[1]))
+        self.open -= 1
+
+    def di_lookup_node(self, hdl, path):
+        self.calls.append(('di_lookup_node', path))
+        if path in self.tree:
+            return ('node', path)
+        return None
+
+    def di_prop_strings(self, node, propname):
+        self.calls.append(('di_prop_strings', node[1], propname))
+        return self.tree[node[1]].get(propname)
+
+
+class TestDevinfoSnapshot(unittest.TestCase):
+
+    def test_lookups(self):
+        layer = FakeLayer()
+        usb = '/pci@0,0/pci1af4,1100@1,2'
+        with DevinfoSnapshot(layer) as snapshot:
+            self.assertTrue(devcache.current_snapshot() is snapshot)
+            for drive in range(3):
+                self.assertEqual(snapshot.find_prop('compatible', usb),
+                                 ['pciclass,0c0310', 'pciclass,0c03'])
+            self.assertEqual(snapshot.find_prop('efi-systype'), '64')
+            self.assertEqual(snapshot.find_prop('no-such-prop', usb), None)
+            self.assertEqual(snapshot.find_prop('no-such-prop', usb), None)
+            self.assertEqual(layer.open, 1)
+
+        # one snapshot, one lookup of each node and of each property
+        self.assertEqual(layer.calls,
+                         [('di_init', '/'),
+                          ('di_lookup_node', usb),
+                          ('di_prop_strings', usb, 'compatible'),
+                          ('di_prop_strings', '/', 'efi-systype'),
+                          ('di_prop_strings', usb, 'no-such-prop'),
+                          ('di_fini', '/')])
+        self.assertEqual(layer.open, 0)
+        self.assertEqual(devcache.current_snapshot(), None)
+
+    def test_no_lookup(self):
+        """no snapshot is taken unless a property is looked up"""
+        layer = FakeLayer()
+        with DevinfoSnapshot(layer):
+            pass
+        self.assertEqual(layer.calls, [])
+
+    def test_no_node(self):
+        layer = FakeLayer()
+        with DevinfoSnapshot(layer) as snapshot:
+            for attempt in range(2):
+                try:
+                    snapshot.find_prop('compatible', '/pci@0,0/none@0')
+                except IOError as err:
+                    self.assertEqual(err.errno, errno.ENXIO)
+                else:
+                    self.fail('IOError not raised')
+        self.assertEqual(layer.calls.count(('di_lookup_node',
+                                            '/pci@0,0/none@0')), 1)
+        self.assertEqual(layer.open, 0)
+
+    def test_nested(self):
+        outer_layer = FakeLayer()
+        inner_layer = FakeLayer()
+        with DevinfoSnapshot(outer_layer) as outer:
+            with DevinfoSnapshot(inner_layer) as inner:
+                self.assertTrue(devcache.current_snapshot() is inner)
+            self.assertTrue(devcache.current_snapshot() is outer)
+        self.assertEqual(devcache.current_snapshot(), None)
+
+    def test_released_on_error(self):
+        layer = FakeLayer()
+        try:
+            with DevinfoSnapshot(layer) as snapshot:
+                snapshot.find_prop('efi-systype')
+                raise RuntimeError('failed')
+        except RuntimeError:
+            pass
+        self.assertEqual(layer.open, 0)
+        self.assertEqual(devcache.current_snapshot(), None)
+
+    def test_other_threads(self):
+        """a snapshot is not used by the lookups of other threads"""
+        seen = []
+
+        def lookup():
+            seen.append(devcache.current_snapshot())
+
+        with DevinfoSnapshot(FakeLayer()) as snapshot:
+            thread = threading.Thread(target=lookup)
+            thread.start()
+            thread.join()
+            self.assertTrue(devcache.current_snapshot() is snapshot)
+        self.assertEqual(seen, [None])
+
+
+if __name__ == '__main__':
+    unittest.main()
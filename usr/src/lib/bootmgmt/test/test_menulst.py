@@ -0,0 +1,115 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+
+"""
+test_menulst.py - unittests for rendering parsed menu.lst files: an
+unchanged menu renders as it was parsed, and a changed one renders as it
+was parsed except for the commands changed
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from bootmgmt.backend.loader.menulst import MenuDotLst, MenuLstMenuEntry
+
+# a menu.lst with the layout of a hand edited file: tabs, extra spaces,
+# comments inside entries, trailing whitespace and an escaped newline
+MENU = ('# menu.lst written by hand\n'
+        'default 0\n'
+        'timeout\t10\n'
+        '\n'
+        '#---------- ADDED BY BOOTADM - DO NOT EDIT ----------\n'
+        'title Oracle Solaris 11\n'
+        'findroot (pool_rpool,0,a)\n'
+        'bootfs rpool/ROOT/solaris\n'
+        'kernel$ /platform/i86pc/kernel/amd64/unix -B $ZFS-BOOTFS\n'
+        'module$ /platform/i86pc/amd64/boot_archive\n'
+        '#---------------------END BOOTADM--------------------\n'
+        'title   Oracle Solaris 11 (console)\n'
+        'findroot (pool_rpool,0,a)\n'
+        'kernel$   /platform/i86pc/kernel/amd64/unix -B $ZFS-BOOTFS,\\\n'
+        'console=ttya\n'
+        'module$ /platform/i86pc/amd64/boot_archive   \n')
+
+KERNEL = 'kernel$ /platform/i86pc/kernel/amd64/unix -B $ZFS-BOOTFS\n'
+CONSOLE_KERNEL = ('kernel$ /platform/i86pc/kernel/amd64/unix '
+                  '-B $ZFS-BOOTFS,console=ttyb\n')
+
+
+def set_console(menu):
+    "Boots the first entry of menu with the console on ttyb"
+    entry = [entity for entity in menu.entities()
+             if isinstance(entity, MenuLstMenuEntry)][0]
+    entry.update_command('kernel$', CONSOLE_KERNEL.split(' ', 1)[1].strip())
+
+
+class TestMenuDotLstRender(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.menu_lst = os.path.join(self.tmpdir, 'menu.lst')
+        with open(self.menu_lst, 'w') as mfile:
+            mfile.write(MENU)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_clean(self):
+        """a menu which is not changed renders as it was parsed"""
+        menu = MenuDotLst(self.menu_lst)
+        self.assertFalse(menu.dirty)
+        self.assertEqual(str(menu), MENU)
+
+        # setting the same arguments again does not change the menu
+        entry = menu.entities()[5]
+        entry.update_command('bootfs', 'rpool/ROOT/solaris')
+        self.assertFalse(menu.dirty)
+        self.assertEqual(str(menu), MENU)
+
+    def test_edit_one_entry(self):
+        """a changed menu renders byte for byte as it was parsed, except
+        for the line changed"""
+        menu = MenuDotLst(self.menu_lst)
+        set_console(menu)
+        self.assertTrue(menu.dirty)
+        self.assertEqual(str(menu), MENU.replace(KERNEL, CONSOLE_KERNEL, 1))
+
+    def test_edited_file(self):
+        """a menu parsed from an edited file is clean"""
+        with open(self.menu_lst, 'w') as mfile:
+            mfile.write(MENU.replace(KERNEL, CONSOLE_KERNEL, 1))
+        menu = MenuDotLst(self.menu_lst)
+        self.assertFalse(menu.dirty)
+
+        # applying the same edit again changes nothing
+        set_console(menu)
+        self.assertFalse(menu.dirty)
+        self.assertEqual(str(menu), MENU.replace(KERNEL, CONSOLE_KERNEL, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2010, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 '''Provides definition of base classes for storage in Data Object Cache.
 '''
@@ -36,7 +36,6 @@ from urllib import quote, unquote
 
 from abc import ABCMeta, abstractmethod
 
-from lxml import etree
 from solaris_install.logger import INSTALL_LOGGER_NAME
 
 # Define various Data Object specific exceptions
@@ -97,6 +96,10 @@ class DataObjectBase(object):
     # Reference for Install Logger
     __logger = None
 
+    # Number of changes to the children of the object and of its
+    # descendants, see the generation property.
+    _generation = 0
+
     def __init__(self, name):
         self._name = name
         self._parent = None
@@ -242,6 +245,23 @@ class DataObjectBase(object):
         '''Returns the parent class, set on insertion into tree'''
         return self._parent
 
+    @property
+    def generation(self):
+        '''Returns a counter incremented each time children are inserted
+        into, or deleted from, this object or any of its descendants.
+
+        Consumers caching information about a sub-tree can compare it to the
+        value they saw to tell whether the sub-tree changed since.
+        '''
+        return self._generation
+
+    def _changed(self):
+        '''Increments the generation of this object and of its ancestors'''
+        obj = self
+        while obj is not None:
+            obj._generation += 1
+            obj = obj._parent
+
     @property
     def has_children(self):
         '''Returns True if the class has any children, False otherwise.'''
@@ -542,7 +562,10 @@ class DataObjectBase(object):
         if ancestor is None:
             # should only be True when called initially
             if element is None:
-                # create a dummy XML element
+                # create a dummy XML element.  lxml is only loaded once
+                # XML is produced, as every importer of solaris_install
+                # imports this module.
+                from lxml import etree
                 element = etree.Element("root")
                 using_dummy = True
 
@@ -586,6 +609,7 @@ class DataObjectBase(object):
         '''Returns an string representing the cache contents in XML format.'''
         xml = self.get_xml_tree()
         if xml is not None:
+            from lxml import etree
             return etree.tostring(xml, pretty_print=True)
         else:
             return None
@@ -965,6 +989,7 @@ class DataObject(DataObjectBase):
             self._children.insert(insert_at + offset, child)
             child._parent = self
             offset += 1
+            self._changed()
 
     def __delete_child(self, child, not_found_is_err=False):
         '''THIS IS A PRIVATE CLASS METHOD
@@ -979,6 +1004,7 @@ class DataObject(DataObjectBase):
         try:
             self._children.remove(child)
             child._parent = None
+            self._changed()
         except ValueError:
             if not_found_is_err:
                 raise ObjectNotFoundError(
@@ -1074,3 +1100,4 @@ class DataObject(DataObjectBase):
 
         if self._parent is not None:
             self._parent._children.remove(self)
+            self._parent._changed()
@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2010, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 '''Tests for various DataObject deletion methods'''
 
@@ -106,6 +106,21 @@ class TestDataObjectDeletion(unittest.TestCase):
         self.assertFalse(self.child_2.has_children,
             "child_2 shouldn't have children anymore.")
 
+    def test_data_object_delete_generation(self):
+        '''Validate deletions increment the generation of the ancestors'''
+        generation = self.data_obj.generation
+        self.child_2.delete_children(self.child_2_1)
+        self.assertTrue(self.data_obj.generation > generation)
+
+        generation = self.data_obj.generation
+        self.child_4.delete()
+        self.assertTrue(self.data_obj.generation > generation)
+
+        # nothing deleted, nothing changed
+        generation = self.data_obj.generation
+        self.data_obj.delete_children(self.child_4)
+        self.assertEqual(self.data_obj.generation, generation)
+
     def test_data_object_delete_all(self):
         '''Validate delete_children() deletes all children nodes'''
 
@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 '''Tests for DataObject insertion methods'''
 
@@ -360,5 +360,22 @@ class TestDataObjectInsertion(unittest.TestCase):
                 "child = %s ; compared_to = %s" %
                 (children[offset + i], to_insert[i]))
 
+    def test_insert_children_generation(self):
+        '''Validate insertion increments the generation of the ancestors'''
+        child = SimpleDataObject("child_1")
+        self.data_obj.insert_children(child)
+        root_generation = self.data_obj.generation
+        child_generation = child.generation
+
+        grandchild = SimpleDataObject("grandchild_1")
+        child.insert_children(grandchild)
+        self.assertTrue(self.data_obj.generation > root_generation)
+        self.assertTrue(child.generation > child_generation)
+        self.assertEqual(grandchild.generation, 0)
+
+        root_generation = self.data_obj.generation
+        self.assertRaises(TypeError, child.insert_children, None)
+        self.assertEqual(self.data_obj.generation, root_generation)
+
 if __name__ == '__main__':
     unittest.main()
@@ -22,7 +22,7 @@
 #
 
 #
-# Copyright (c) 2010, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 """init module for ManifestParser and ManifestWriter"""
@@ -31,6 +31,8 @@ import sys
 
 from lxml import etree
 
+from solaris_install.manifest import schema_registry
+
 
 class ManifestError(Exception):
     '''
@@ -84,22 +86,23 @@ def validate_manifest(tree, dtd_file, logger):
     '''
 
     try:
-        dtd = etree.DTD(dtd_file)
-    except etree.DTDParseError, error:
+        dtd = schema_registry.get_dtd(dtd_file)
+    except (IOError, etree.DTDParseError), error:
         msg = "Unable to parse DTD file [%s]:" % (dtd_file)
         logger.exception(msg)
         logger.exception(str(error))
         raise ManifestError(msg, orig_exception=error)
 
-    if not dtd.validate(tree.getroot()):
+    valid, error_log = dtd.validate(tree.getroot())
+    if not valid:
         msg = "Validation against DTD [%s] failed" % (dtd_file)
         logger.error(msg)
 
-        for error in dtd.error_log.filter_from_errors():
+        for error in error_log.filter_from_errors():
             logger.error(str(error))
             msg = msg + " : " + str(error)
 
         raise ManifestError(msg)
 
 
-__all__ = ["parser", "writer"]
+__all__ = ["parser", "schema_registry", "writer"]
@@ -0,0 +1,199 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+'''
+Process-wide registry of compiled DTDs, RelaxNG schemas and XSLT
+stylesheets.
+
+Compiling a schema or stylesheet costs far more than using it.  The
+registry compiles each file once per (path, mtime) and hands out the same
+CompiledSchema to every caller in the process, recompiling only when the
+file changes.  lxml validators and transforms keep per-object error state,
+so CompiledSchema serializes their use with a lock and returns a copy of
+the error log from each call.
+
+    from solaris_install.manifest import schema_registry
+
+    dtd = schema_registry.get_dtd("/usr/share/install/ai.dtd.1")
+    valid, error_log = dtd.validate(tree)
+'''
+
+import os
+import threading
+import time
+
+from lxml import etree
+
+DTD = "dtd"
+RELAXNG = "relaxng"
+XSLT = "xslt"
+
+
+class CompiledSchema(object):
+    '''
+    A compiled DTD, RelaxNG schema or XSLT stylesheet, safe to share
+    between threads.
+
+    Instances have the following attributes:
+    - kind, one of DTD, RELAXNG or XSLT
+    - path, the absolute path of the file compiled
+    - mtime, the modification time of the file when compiled
+    - compiled, the underlying lxml object.  Use validate() or transform()
+      rather than using this directly from more than one thread.
+    '''
+
+    def __init__(self, kind, path, mtime, compiled):
+        self.kind = kind
+        self.path = path
+        self.mtime = mtime
+        self.compiled = compiled
+        self._lock = threading.Lock()
+
+    def validate(self, tree):
+        '''
+        Validate tree, an etree.ElementTree or element.
+
+        Returns a (valid, error_log) tuple.  error_log is a copy of the
+        validator's error log, which may be filtered as usual (eg with
+        filter_from_errors()).
+        '''
+        with self._lock:
+            valid = self.compiled.validate(tree)
+            return (valid, self.compiled.error_log.copy())
+
+    def transform(self, tree, **params):
+        '''
+        Apply the XSLT stylesheet to tree, returning the resulting tree.
+        '''
+        with self._lock:
+            return self.compiled(tree, **params)
+
+    def __repr__(self):
+        return "CompiledSchema(%s, %s)" % (self.kind, self.path)
+
+
+class SchemaRegistry(object):
+    '''
+    Cache of CompiledSchema objects, keyed on kind and absolute path and
+    invalidated when the file's mtime changes.
+
+    Errors from compiling are raised as by lxml (eg etree.DTDParseError,
+    etree.XMLSyntaxError).  IOError is raised if the file cannot be
+    accessed.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = dict()
+        self._stats = dict()
+
+    def get(self, kind, path):
+        '''
+        Return the CompiledSchema of the given kind for the file at path,
+        compiling it if not yet compiled or if it changed since.
+        '''
+        path = os.path.abspath(path)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError as err:
+            raise IOError(err.errno, err.strerror, path)
+
+        with self._lock:
+            stats = self._stats.setdefault(kind,
+                {"compiles": 0, "hits": 0, "seconds": 0.0})
+            entry = self._entries.get((kind, path))
+            if entry is not None and entry.mtime == mtime:
+                stats["hits"] += 1
+                return entry
+
+            start = time.time()
+            entry = CompiledSchema(kind, path, mtime,
+                                   _COMPILERS[kind](path))
+            stats["compiles"] += 1
+            stats["seconds"] += time.time() - start
+            self._entries[(kind, path)] = entry
+            return entry
+
+    def statistics(self):
+        '''
+        Return a dictionary, keyed by kind, of dictionaries holding the
+        number of "compiles" and cache "hits", and the "seconds" spent
+        compiling.
+        '''
+        with self._lock:
+            return dict((kind, dict(stats))
+                        for (kind, stats) in self._stats.iteritems())
+
+    def clear(self):
+        '''
+        Forget all compiled files and statistics.
+        '''
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+
+
+def _compile_dtd(path):
+    '''Compile the DTD at path.'''
+    return etree.DTD(path)
+
+
+def _compile_relaxng(path):
+    '''Compile the RelaxNG schema at path.'''
+    return etree.RelaxNG(file=path)
+
+
+def _compile_xslt(path):
+    '''Compile the XSLT stylesheet at path.'''
+    return etree.XSLT(etree.parse(path))
+
+
+_COMPILERS = {DTD: _compile_dtd,
+              RELAXNG: _compile_relaxng,
+              XSLT: _compile_xslt}
+
+# The process-wide registry.
+REGISTRY = SchemaRegistry()
+
+
+def get_dtd(path):
+    '''Return the CompiledSchema of the DTD at path.'''
+    return REGISTRY.get(DTD, path)
+
+
+def get_relaxng(path):
+    '''Return the CompiledSchema of the RelaxNG schema at path.'''
+    return REGISTRY.get(RELAXNG, path)
+
+
+def get_xslt(path):
+    '''Return the CompiledSchema of the XSLT stylesheet at path.'''
+    return REGISTRY.get(XSLT, path)
+
+
+def statistics():
+    '''Return the statistics of the process-wide registry.'''
+    return REGISTRY.statistics()
@@ -0,0 +1,123 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+'''schema_registry tests'''
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from lxml import etree
+
+import common
+from solaris_install.manifest import schema_registry
+
+
+class SchemaRegistryTest(unittest.TestCase):
+    '''Tests for the compiled schema registry'''
+
+    def setUp(self):
+        '''Use a registry of our own, so counts start at zero.'''
+        self.registry = schema_registry.SchemaRegistry()
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_compiled_once(self):
+        '''Repeated lookups of an unchanged DTD compile it once'''
+        first = self.registry.get(schema_registry.DTD, common.DTD_DC)
+        second = self.registry.get(schema_registry.DTD, common.DTD_DC)
+        self.assertTrue(first is second)
+        stats = self.registry.statistics()[schema_registry.DTD]
+        self.assertEqual(stats["compiles"], 1)
+        self.assertEqual(stats["hits"], 1)
+
+    def test_recompiled_on_change(self):
+        '''A DTD is recompiled when its mtime changes'''
+        dtd_file = os.path.join(self.tmp_dir, "manifest.dtd")
+        shutil.copy(common.DTD_DC, dtd_file)
+        first = self.registry.get(schema_registry.DTD, dtd_file)
+        os.utime(dtd_file, (first.mtime + 10, first.mtime + 10))
+        second = self.registry.get(schema_registry.DTD, dtd_file)
+        self.assertFalse(first is second)
+        stats = self.registry.statistics()[schema_registry.DTD]
+        self.assertEqual(stats["compiles"], 2)
+
+    def test_validate(self):
+        '''validate() returns the result and a copy of the error log'''
+        dtd = self.registry.get(schema_registry.DTD, common.DTD_DC)
+        tree = etree.parse(common.MANIFEST_DC)
+        valid, error_log = dtd.validate(tree)
+        self.assertTrue(valid)
+
+        valid, error_log = dtd.validate(etree.ElementTree(
+            etree.Element("no_such_element")))
+        self.assertFalse(valid)
+        self.assertTrue(len(error_log.filter_from_errors()) > 0)
+
+    def test_threads(self):
+        '''One compiled DTD validates from several threads at once'''
+        dtd = self.registry.get(schema_registry.DTD, common.DTD_DC)
+        tree = etree.parse(common.MANIFEST_DC)
+        results = list()
+
+        def run():
+            for _count in range(20):
+                results.append(dtd.validate(tree)[0])
+
+        threads = [threading.Thread(target=run) for _count in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [True] * 80)
+
+    def test_xslt(self):
+        '''An XSLT stylesheet is compiled once and applied'''
+        xslt = self.registry.get(schema_registry.XSLT, common.XSLT_DOC_TO_DC)
+        self.assertTrue(xslt is
+            self.registry.get(schema_registry.XSLT, common.XSLT_DOC_TO_DC))
+        self.assertEqual(
+            self.registry.statistics()[schema_registry.XSLT]["compiles"], 1)
+
+    def test_non_existent(self):
+        '''IOError is raised for a missing file'''
+        self.assertRaises(IOError, self.registry.get, schema_registry.DTD,
+                          common.DTD_NON_EXISTENT)
+
+    def test_invalid(self):
+        '''lxml errors are raised for an invalid DTD, and not cached'''
+        self.assertRaises(etree.DTDParseError, self.registry.get,
+                          schema_registry.DTD, common.DTD_INVALID)
+        self.assertEqual(
+            self.registry.statistics()[schema_registry.DTD]["compiles"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -22,7 +22,7 @@
 #
 
 #
-# Copyright (c) 2010, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 '''ManifestWriter Checkpoint'''
@@ -34,7 +34,8 @@ import tempfile
 
 from solaris_install.engine import InstallEngine
 from solaris_install.engine.checkpoint import AbstractCheckpoint
-from solaris_install.manifest import ManifestError, validate_manifest
+from solaris_install.manifest import ManifestError, schema_registry, \
+    validate_manifest
 
 
 class ManifestWriter(AbstractCheckpoint):
@@ -197,7 +198,7 @@ class ManifestWriter(AbstractCheckpoint):
         if self._xslt_file is not None:
             # Perform the requested XSL Transform on the XML data
             try:
-                xslt_doc = etree.parse(self._xslt_file)
+                transform = schema_registry.get_xslt(self._xslt_file)
             except IOError, error:
                 msg = "Cannot access XSLT file [%s]" % (self._xslt_file)
                 self.logger.exception(msg)
@@ -210,9 +211,7 @@ class ManifestWriter(AbstractCheckpoint):
                 self.logger.exception(error)
                 raise ManifestError(msg, orig_exception=error)
 
-            transform = etree.XSLT(xslt_doc)
-
-            tree = transform(tree)
+            tree = transform.transform(tree)
 
         if self._cancel_requested.is_set():
             self.logger.debug("Cancel requested, returning.")
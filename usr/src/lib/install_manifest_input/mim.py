@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2011, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 '''
@@ -58,6 +58,8 @@ from lxml import etree
 import solaris_install.manifest_input as milib
 import solaris_install.manifest_input.process_dtd as pdtd
 
+from solaris_install.manifest import schema_registry
+
 GET_ALL = etree.ErrorLevels.NONE
 
 STRIP_FINAL_UNBKT_VALUE = True
@@ -210,7 +212,8 @@ class ManifestInput(object):
 
         # Open schema for validator, and build table of children order.
         try:
-            self.schema = etree.DTD(schema_file)  # For lxml validator
+            # For lxml validator
+            self.schema = schema_registry.get_dtd(schema_file)
         except IOError as err:
             raise IOError(err.args[0], milib.IOERR_DTD_ACCESS %
                           {"mserr": err.strerror, "mfile": schema_file})
@@ -338,13 +341,12 @@ class ManifestInput(object):
             raise milib.MimDTDInvalid([milib.ERR_NO_SCHEMA])
         if not self.tree:
             raise milib.MimEmptyTreeError(milib.ERR_EMPTY_TREE)
-        try:
-            self.schema.assertValid(self.tree)
-        except etree.DocumentInvalid:
+        valid, error_log = self.schema.validate(self.tree)
+        if not valid:
             # Assume these messages are already localized.
             raise milib.MimDTDInvalid(
                 [msg.__repr__() for msg in
-                 self.schema.error_log.filter_from_level(GET_ALL)])
+                 error_log.filter_from_level(GET_ALL)])
 
     def commit(self, validate=True):
         '''
@@ -0,0 +1,175 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+'''
+Module to test the aimanifest batch and session subcommands.
+'''
+
+import os
+import unittest
+
+from subprocess import PIPE, Popen
+
+from solaris_install import SYS_AI_MANIFEST_DTD
+
+# Eventually bring names into convention.
+#pylint: disable-msg=C0103
+
+
+class TestAimanifestBatchCommon(unittest.TestCase):
+    '''
+    Common setup for aimanifest batch and session tests.
+    '''
+
+    # Must run gate init file (i.e. usr/src/tools/env/developer.sh)
+    # to define ROOT first.  ROOT is the root of the gate's proto area.
+    ROOT = os.environ.get("ROOT")
+
+    AIMANIFEST = ROOT + "/usr/bin/aimanifest"
+    SCHEMA = ROOT + SYS_AI_MANIFEST_DTD
+
+    AIM_MANIFEST_FILE = "/tmp/aim_batch_test.xml"
+    IN_XML_FILE = "/tmp/aim_batch_test_in.xml"
+
+    COMMANDS = [
+        ["load", IN_XML_FILE],
+        ["set", "/auto_install/ai_instance@name", "batch test"],
+        ["add", "/auto_install/ai_instance/software/software_data/name",
+         "pkg:/system/utils"],
+        ["add", "/auto_install/ai_instance/software/software_data/name",
+         "pkg:/editor/vim"]]
+
+    def setUp(self):
+        self.saved_env = dict(os.environ)
+        os.environ["AIM_MANIFEST"] = self.AIM_MANIFEST_FILE
+        os.environ["AIM_DTD"] = self.SCHEMA
+        os.environ.pop("AIM_SESSION", None)
+        with open(self.IN_XML_FILE, "w") as in_xml:
+            in_xml.write('<auto_install><ai_instance/></auto_install>\n')
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.saved_env)
+        for filename in [self.AIM_MANIFEST_FILE, self.IN_XML_FILE]:
+            if os.path.exists(filename):
+                os.unlink(filename)
+
+    def aimanifest(self, args, stdin=None):
+        '''
+        Run aimanifest with the given args, returning (status, stdout).
+        '''
+        proc = Popen([self.AIMANIFEST] + args, stdin=PIPE, stdout=PIPE,
+                     stderr=PIPE)
+        (out, err) = proc.communicate(stdin)
+        return (proc.returncode, out)
+
+    def one_shot_result(self):
+        '''
+        Run COMMANDS one aimanifest invocation at a time.
+
+        Returns the resulting manifest, removing it afterwards.
+        '''
+        for cmd in self.COMMANDS:
+            self.assertEqual(self.aimanifest(cmd)[0], 0)
+        with open(self.AIM_MANIFEST_FILE) as manifest:
+            result = manifest.read()
+        os.unlink(self.AIM_MANIFEST_FILE)
+        return result
+
+
+class TestBatch(TestAimanifestBatchCommon):
+    '''
+    Verify batches give the same manifest as one-shot commands.
+    '''
+
+    def test_batch(self):
+        '''
+        Verify a batch read from stdin matches one-shot commands.
+        '''
+        expected = self.one_shot_result()
+        lines = "# A comment\n\n" + "".join(
+            "%s \"%s\"\n" % (" ".join(cmd[:-1]), cmd[-1])
+            for cmd in self.COMMANDS)
+        (rval, out) = self.aimanifest(["batch"], lines)
+        self.assertEqual(rval, 0)
+        with open(self.AIM_MANIFEST_FILE) as manifest:
+            self.assertEqual(manifest.read(), expected)
+
+    def test_batch_stops_on_error(self):
+        '''
+        Verify a batch stops at a failing command, keeping earlier changes.
+        '''
+        lines = ("load %s\n"
+                 "set /auto_install/ai_instance@name first\n"
+                 "get /auto_install/no_such_element\n"
+                 "set /auto_install/ai_instance@name second\n" %
+                 self.IN_XML_FILE)
+        (rval, out) = self.aimanifest(["batch"], lines)
+        self.assertNotEqual(rval, 0)
+        (rval, out) = self.aimanifest(["get", "/auto_install/ai_instance@name"])
+        self.assertEqual(rval, 0)
+        self.assertEqual(out.split()[0], "first")
+
+    def test_nested_batch(self):
+        '''
+        Verify batch and session subcommands are refused within a batch.
+        '''
+        (rval, out) = self.aimanifest(["batch"], "batch\n")
+        self.assertNotEqual(rval, 0)
+        (rval, out) = self.aimanifest(["batch"], "session start\n")
+        self.assertNotEqual(rval, 0)
+
+
+class TestSession(TestAimanifestBatchCommon):
+    '''
+    Verify sessions give the same manifest as one-shot commands.
+    '''
+
+    def test_session(self):
+        '''
+        Verify the manifest is written when a session ends.
+        '''
+        expected = self.one_shot_result()
+        (rval, out) = self.aimanifest(["session", "start"])
+        self.assertEqual(rval, 0)
+        os.environ["AIM_SESSION"] = out.strip()
+        try:
+            for cmd in self.COMMANDS:
+                self.assertEqual(self.aimanifest(cmd)[0], 0)
+        finally:
+            self.assertEqual(self.aimanifest(["session", "end"])[0], 0)
+        with open(self.AIM_MANIFEST_FILE) as manifest:
+            self.assertEqual(manifest.read(), expected)
+
+    def test_session_end_without_session(self):
+        '''
+        Verify ending a session fails when none is in use.
+        '''
+        (rval, out) = self.aimanifest(["session", "end"])
+        self.assertNotEqual(rval, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
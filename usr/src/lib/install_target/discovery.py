@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2011, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 """ discovery.py - target discovery checkpoint.  Attempts to find all target
@@ -37,6 +37,7 @@ import sys
 
 import solaris_install.target.vdevs as vdevs
 
+from bootmgmt.devcache import DevinfoSnapshot
 from bootmgmt.pysol import di_find_prop
 
 from solaris_install import CalledProcessError, Popen, run
@@ -332,9 +333,8 @@ class TargetDiscovery(Checkpoint):
         # If the disk has a GPT label (or no label), ncylinders will be
         # None
         if dma.ncylinders is None:
-            new_disk.disk_prop.dev_size = Size(str(dma.naccessible) +
-                                               Size.sector_units,
-                                               dma.blocksize)
+            new_disk.disk_prop.dev_size = Size.from_sectors(dma.naccessible,
+                                                            dma.blocksize)
 
             # set only the blocksize (not the cylinder size)
             new_geometry = DiskGeometry(dma.blocksize, None)
@@ -353,9 +353,8 @@ class TargetDiscovery(Checkpoint):
             nhead = dma.nheads
             nsect = dma.nsectors
 
-            new_disk.disk_prop.dev_size = Size(str(ncyl * nhead * nsect) +
-                                               Size.sector_units,
-                                               dma.blocksize)
+            new_disk.disk_prop.dev_size = Size.from_sectors(
+                ncyl * nhead * nsect, dma.blocksize)
             new_geometry = DiskGeometry(dma.blocksize, nhead * nsect)
             new_geometry.ncyl = ncyl
             new_geometry.nheads = nhead
@@ -420,8 +419,8 @@ class TargetDiscovery(Checkpoint):
                 # consequences in terms of data loss.
                 new_partition.is_linux_swap = True
 
-        new_partition.size = Size(str(partition_attributes.nsectors) + \
-                             Size.sector_units, blocksize=blocksize)
+        new_partition.size = Size.from_sectors(partition_attributes.nsectors,
+                                               blocksize)
         new_partition.start_sector = long(partition_attributes.relsect)
         new_partition.size_in_sectors = partition_attributes.nsectors
 
@@ -442,8 +441,7 @@ class TargetDiscovery(Checkpoint):
         new_slice.action = "preserve"
         new_slice.tag = slc_attributes.tag
         new_slice.flag = slc_attributes.flag
-        new_slice.size = Size(str(slc_attributes.size) + Size.sector_units,
-                              blocksize=blocksize)
+        new_slice.size = Size.from_sectors(slc_attributes.size, blocksize)
         new_slice.start_sector = long(slc_attributes.start)
         new_slice.size_in_sectors = slc_attributes.size
 
@@ -633,35 +631,37 @@ class TargetDiscovery(Checkpoint):
         added to the DOC.
         """
         # to find all the drives on the system, first start with the
-        # controllers
-        for controller in diskmgt.descriptors_by_type(const.CONTROLLER):
-            # trap on the "/pseudo" controller (zvol swap and dump)
-            if controller.name == "/pseudo" and add_physical:
-                self.discover_pseudo(controller)
-            else:
-                # extract every drive on the given controller
-                for drive in controller.drives:
-                    # skip USB floppy drives
-                    if controller.attributes is not None and \
-                       controller.attributes.type == const.CTYPE_USB:
-                        try:
-                            di_props = di_find_prop("compatible",
-                                                    controller.name)
-                        except Exception:
-                            di_props = list()
-
-                        if const.DI_FLOPPY in di_props:
-                            continue
+        # controllers.  The USB controllers are looked up in one devinfo
+        # snapshot
+        with DevinfoSnapshot():
+            for controller in diskmgt.descriptors_by_type(const.CONTROLLER):
+                # trap on the "/pseudo" controller (zvol swap and dump)
+                if controller.name == "/pseudo" and add_physical:
+                    self.discover_pseudo(controller)
+                else:
+                    # extract every drive on the given controller
+                    for drive in controller.drives:
+                        # skip USB floppy drives
+                        if controller.attributes is not None and \
+                           controller.attributes.type == const.CTYPE_USB:
+                            try:
+                                di_props = di_find_prop("compatible",
+                                                        controller.name)
+                            except Exception:
+                                di_props = list()
 
-                    # query libdiskmgt for the drive's information
-                    new_disk = self.discover_disk(drive)
+                            if const.DI_FLOPPY in di_props:
+                                continue
 
-                    # skip invalid drives and CDROM drives
-                    if new_disk is None or new_disk.iscdrom:
-                        continue
+                        # query libdiskmgt for the drive's information
+                        new_disk = self.discover_disk(drive)
 
-                    if add_physical:
-                        self.root.insert_children(new_disk)
+                        # skip invalid drives and CDROM drives
+                        if new_disk is None or new_disk.iscdrom:
+                            continue
+
+                        if add_physical:
+                            self.root.insert_children(new_disk)
 
         # extract all of the devpaths from all of the drives already inserted
         devpath_list = [disk.devpath for disk in
@@ -913,6 +913,21 @@ class TargetDiscovery(Checkpoint):
         if self.arch == "sparc":
             self.sparc_label_check()
 
+        # Add the root node to the DOC before searching, so that consumers
+        # watching the DOC from another thread (eg the text installer's
+        # disk screen) see each disk as soon as it is discovered.
+        self.doc.persistent.insert_children(self.root)
+        try:
+            self._discover()
+        except:
+            # don't leave partial results behind
+            self.doc.persistent.delete_children(children=self.root)
+            raise
+
+    def _discover(self):
+        """ search for the targets selected by search_type and search_name,
+        inserting them into the root node
+        """
         # check to see if the user specified a search_type
         if self.search_type == DISK_SEARCH_NAME:
             try:
@@ -952,9 +967,6 @@ class TargetDiscovery(Checkpoint):
             # Add all Boot Environments
             self.discover_BEs()
 
-        # Add the root node to the DOC
-        self.doc.persistent.insert_children(self.root)
-
 
 if __name__ == "__main__":
     # if discovery.py is run from the command line, rather than imported as a
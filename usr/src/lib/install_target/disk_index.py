@@ -0,0 +1,147 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+""" disk_index.py - lookup of the discovered disks by their identifiers.
+
+Target selection looks up the discovered disk matching each disk of the
+manifest, and each device of the existing zpools.  Comparing each of them
+with every discovered disk in turn costs manifest disks x discovered disks
+calls of Disk.name_matches(), which adds up on systems with a few thousand
+disks.  DiskIndex maps each identifier of the discovered disks to the
+first disk having it, and is built again whenever disks are inserted into
+or deleted from the discovered tree.
+"""
+from solaris_install.target.physical import Disk
+
+# identifiers compared by Disk.name_matches(), in its order
+NAME_FIELDS = ("ctd", "volid", "devpath", "devid", "opath", "wwn")
+
+# identifiers which, when all unset in a manifest disk, let it be matched by
+# the boot_disk keyword or by its disk properties
+ID_FIELDS = ("ctd", "volid", "devpath", "devid", "wwn")
+
+
+class DiskIndex(object):
+    """ DiskIndex - index of the disks of a discovered tree by identifier.
+
+    root - the discovered tree.  The index is built again when the
+    generation of root changes.  The identifiers of the disks are read when
+    the index is built.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._generation = None
+        self._disks = list()
+
+        # identifier -> {value: position of the first disk with that value}
+        self._positions = dict()
+        # position of the first disk with each active ctd alias
+        self._active_ctds = dict()
+        # position of the first disk with the boot_disk keyword
+        self._boot_disk = None
+
+    def _build(self):
+        """ build the index again if the discovered tree changed
+        """
+        generation = self.root.generation
+        if generation == self._generation:
+            return
+
+        self._disks = self.root.get_descendants(class_type=Disk)
+        self._positions = dict((field, dict()) for field in NAME_FIELDS)
+        self._active_ctds = dict()
+        self._boot_disk = None
+        for (position, disk) in enumerate(self._disks):
+            for field in NAME_FIELDS:
+                value = getattr(disk, field)
+                if value is not None:
+                    self._positions[field].setdefault(value, position)
+            for ctd in disk.active_ctds:
+                self._active_ctds.setdefault(ctd, position)
+            if self._boot_disk is None and disk.is_boot_disk():
+                self._boot_disk = position
+        self._generation = generation
+
+    @property
+    def disks(self):
+        """ disks - the list of the discovered disks
+        """
+        self._build()
+        return self._disks
+
+    def lookup(self, field, value):
+        """ lookup() - return the first discovered disk whose identifier
+        field is value, or None.
+        """
+        self._build()
+        position = self._positions[field].get(value)
+        if position is None:
+            return None
+        return self._disks[position]
+
+    def find(self, disk):
+        """ find() - return the first discovered disk matching disk, or None.
+
+        A discovered disk matches if its name_matches() disk, or, when none
+        of the identifiers in ID_FIELDS of disk are set, if both are boot
+        disks or its disk properties match those of disk.
+        """
+        self._build()
+
+        # the first disk whose name matches
+        first = None
+        for field in NAME_FIELDS:
+            value = getattr(disk, field)
+            if value is not None:
+                position = self._positions[field].get(value)
+                if position is not None and (first is None or
+                                             position < first):
+                    first = position
+        if disk.ctd is not None:
+            position = self._active_ctds.get(disk.ctd)
+            if position is not None and (first is None or position < first):
+                first = position
+
+        if all(getattr(disk, field) is None for field in ID_FIELDS):
+            if disk.is_boot_disk() and self._boot_disk is not None and \
+               (first is None or self._boot_disk < first):
+                first = self._boot_disk
+
+            # disk properties can not be indexed: look at the disks before
+            # the first match only
+            if disk.disk_prop is not None:
+                end = len(self._disks) if first is None else first
+                for position in xrange(end):
+                    disk_prop = self._disks[position].disk_prop
+                    if disk_prop is not None and \
+                       disk_prop.prop_matches(disk.disk_prop):
+                        first = position
+                        break
+
+        if first is None:
+            return None
+        return self._disks[first]
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+""" disk_sched.py - concurrent setup of the physical targets.
+
+Setting up a disk (enabling its write cache, writing its fdisk partition
+table, labeling it, writing its VTOC and adding its swap slices) runs one
+command after another, each waiting on the disk.  Disks are independent
+of each other, so DiskScheduler runs the steps of each disk in order, on
+up to jobs disks at once.
+
+The steps are run through a command layer object, one method per step,
+so that the scheduling can be tested with a fake command layer.
+"""
+import sys
+import threading
+
+
+class DiskSetupError(Exception):
+    """ Raised once every disk has been set up, if any step failed.  errors
+    is the list of (disk, step, exc_info) of each failed disk, in the order
+    the disks were given.
+    """
+
+    def __init__(self, errors):
+        Exception.__init__(self)
+        self.errors = errors
+
+    def __str__(self):
+        return "; ".join("%s failed on disk %s: %s" %
+                         (step, disk_name(disk), exc_info[1])
+                         for (disk, step, exc_info) in self.errors)
+
+
+def disk_name(disk):
+    """ disk_name() - return the name to report disk by
+    """
+    return getattr(disk, "ctd", None) or disk.name
+
+
+class DiskScheduler(object):
+    """ DiskScheduler - run the steps of each disk in order, on up to jobs
+    disks at once.
+
+    plans - list of (disk, steps) tuples.  steps is the list of the (name,
+            args) tuples of the steps of disk, each run as
+            getattr(commands, name)(disk, *args)
+    commands - the command layer
+    logger - logger for the progress of each disk
+    jobs - the number of disks set up at once
+
+    Disks are started in the order of plans.  The first step to fail on a
+    disk ends the setup of that disk only.
+    """
+
+    def __init__(self, plans, commands, logger, jobs=4):
+        self.plans = list(plans)
+        self.commands = commands
+        self.logger = logger
+        self.jobs = max(1, jobs)
+
+        self._lock = threading.Lock()
+        self._next = 0
+        self._errors = dict()
+
+    def _worker(self):
+        """ set up disks until there are none left to start
+        """
+        while True:
+            with self._lock:
+                if self._next >= len(self.plans):
+                    return
+                index = self._next
+                self._next += 1
+
+            (disk, steps) = self.plans[index]
+            for (step, args) in steps:
+                self.logger.debug("%s on disk %s" % (step, disk_name(disk)))
+                try:
+                    getattr(self.commands, step)(disk, *args)
+                except Exception:
+                    with self._lock:
+                        self._errors[index] = (disk, step, sys.exc_info())
+                    break
+
+    def run(self):
+        """ run() - set up all disks.  Returns the list of (disk, step,
+        exc_info) of each failed disk, in the order of plans.
+        """
+        if self.jobs == 1 or len(self.plans) <= 1:
+            self._worker()
+        else:
+            threads = [threading.Thread(target=self._worker)
+                       for worker in xrange(min(self.jobs, len(self.plans)))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return [self._errors[index] for index in sorted(self._errors)]
@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2011, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 """ instantiation.py - target instantiation checkpoint.  Parses the Data Object
@@ -30,22 +30,156 @@ Cache for physical and logical targets.
 import ctypes as C
 import fcntl
 import os
+import threading
 
 from copy import copy
 
+from solaris_install import Popen
 from solaris_install.engine import InstallEngine
 from solaris_install.engine.checkpoint import AbstractCheckpoint as Checkpoint
+from solaris_install.logger import INSTALL_LOGGER_NAME as ILN
 from solaris_install.target import Target
+from solaris_install.target.disk_sched import DiskScheduler, DiskSetupError, \
+    disk_name
 from solaris_install.target.libdiskmgt.diskmgt import DKIOCSETWCE
 from solaris_install.target.logical import BE, DatasetOptions, Filesystem, \
-    Options, PoolOptions, Vdev, Zvol, Zpool
+    Options, PoolOptions, Vdev, Zvol, Zpool, ZFS
+from solaris_install.target.logical_sched import LogicalScheduler, \
+    LogicalSetupError, common_parent, mountpoint_of, nested, \
+    nested_mountpoint
 from solaris_install.target.physical import Disk, Partition, Slice
 
 
+class DiskCommands(object):
+    """ class running the steps setting up a Disk, for DiskScheduler
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def enable_write_cache(self, disk):
+        """ enable the write cache of the disk
+        """
+        fd = os.open(disk.opath, os.O_RDWR | os.O_NDELAY)
+        try:
+            self.logger.debug("enabling write-cache on %s" % disk.ctd)
+            number = C.c_int(1)
+            fcntl.ioctl(fd, DKIOCSETWCE, C.addressof(number))
+        except Exception as err:
+            # ignore any errors generated by the ioctl
+            self.logger.debug("unable to enable write-cache:")
+            self.logger.debug(str(err))
+        finally:
+            os.close(fd)
+
+    def update_partition_table(self, disk, partition_list, dry_run):
+        disk._update_partition_table(partition_list, dry_run)
+
+    def label_disk(self, disk, dry_run):
+        disk._label_disk(dry_run)
+
+    def update_slices(self, disk, slice_list, dry_run):
+        disk._update_slices(slice_list, dry_run)
+
+    def create_ufs_swap(self, disk, swap_slice_list, dry_run):
+        disk._create_ufs_swap(swap_slice_list, dry_run)
+
+
+class LogicalCommands(object):
+    """ class running the steps setting up the zpools, datasets and BEs of
+    the target, for LogicalScheduler
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+
+        # names of the datasets known to exist, by zpool name
+        self._datasets = dict()
+        self._lock = threading.Lock()
+
+        # BEs are initialized one at a time
+        self._be_lock = threading.Lock()
+
+    def run(self, cmd, dry_run, env=None):
+        """ run a zpool or zfs command
+        """
+        if not dry_run:
+            Popen.check_call(cmd, stdout=Popen.STORE, stderr=Popen.STORE,
+                             logger=ILN, env=env)
+
+    def zpool_exists(self, zpool):
+        return zpool.exists
+
+    def list_datasets(self, zpool):
+        """ return the set of the names of the datasets of the zpool, listed
+        by a single zfs command
+        """
+        cmd = [ZFS, "list", "-H", "-o", "name", "-t", "filesystem,volume",
+               "-r", zpool.name]
+        p = Popen.check_call(cmd, stdout=Popen.STORE, stderr=Popen.STORE,
+                             check_result=Popen.ANY)
+        if p.returncode != 0:
+            return set()
+        return set(p.stdout.split())
+
+    def create_zpool(self, zpool, options, dry_run):
+        """ create the zpool if its action calls for it, and record the
+        datasets it holds
+        """
+        if zpool.action == "create" or \
+           (zpool.action == "preserve" and not self.zpool_exists(zpool)):
+            # a pool marked 'preserve' that does not exist needs to be
+            # created
+            self.run(zpool.create_cmd(options), dry_run)
+            datasets = set([zpool.name])
+        else:
+            datasets = self.list_datasets(zpool)
+
+        with self._lock:
+            self._datasets[zpool.name] = datasets
+
+    def create_dataset(self, dataset, dry_run):
+        """ create the Filesystem or Zvol with a single zfs command, setting
+        all of its properties, unless it already exists
+        """
+        name = dataset.full_name
+        with self._lock:
+            datasets = self._datasets.setdefault(dataset.parent.name, set())
+            exists = name in datasets
+
+        if exists:
+            # an existing filesystem marked 'create' still gets its
+            # mountpoint
+            if isinstance(dataset, Filesystem) and \
+               dataset.action == "create" and dataset.mountpoint is not None:
+                self.run([ZFS, "set", "mountpoint=%s" % dataset.mountpoint,
+                          name], dry_run)
+            return
+
+        self.run(dataset.create_cmd(), dry_run, env={"LC_ALL": "C"})
+
+        # zfs create -p creates any missing parent as well
+        with self._lock:
+            while name and name not in datasets:
+                datasets.add(name)
+                name = os.path.dirname(name)
+
+    def init_be(self, be, dry_run, pool_name, fs_list, fs_zfs_properties):
+        with self._be_lock:
+            be.init(dry_run, pool_name=pool_name, fs_list=fs_list,
+                    fs_zfs_properties=fs_zfs_properties)
+
+
 class TargetInstantiation(Checkpoint):
     """ class to instantiate targets
     """
 
+    # number of disks set up at once
+    DISK_JOBS = 4
+
+    # number of zpools, datasets and BEs set up at once
+    LOGICAL_JOBS = 4
+
     def __init__(self, name):
         super(TargetInstantiation, self).__init__(name)
 
@@ -55,6 +189,17 @@ class TargetInstantiation(Checkpoint):
         self.swap_list = list()
         self.dump_list = list()
 
+        self.disk_jobs = TargetInstantiation.DISK_JOBS
+
+        # the command layer setting up disks.  Defaults to DiskCommands
+        self.disk_commands = None
+
+        self.logical_jobs = TargetInstantiation.LOGICAL_JOBS
+
+        # the command layer setting up zpools, datasets and BEs.  Defaults
+        # to LogicalCommands
+        self.logical_commands = None
+
     def get_progress_estimate(self):
         """ Returns an estimate of the time this checkpoint will take
             in seconds
@@ -86,95 +231,109 @@ class TargetInstantiation(Checkpoint):
                 if zvol.use == "dump":
                     self.dump_list.append(zvol)
 
+    def plan_disk(self, disk):
+        """ method used to return the list of (step, args) tuples of the
+        steps creating the desired physical configuration of a disk, for
+        DiskScheduler.
+        """
+        steps = list()
+
+        # check the write_cache attribute and, if set, enable it
+        if disk.write_cache:
+            steps.append(("enable_write_cache", ()))
+
+        # get the list of fdisk partitions and slices on the disk
+        partition_list = disk.get_descendants(class_type=Partition)
+        slice_list = disk.get_descendants(class_type=Slice)
+
+        update_partition_table = False
+        label_disk = True
+
+        if partition_list:
+            dup_partition_list = copy(partition_list)
+            for partition in dup_partition_list:
+                # look for a partition name of None.  If it exists, raise
+                # an exception
+                if partition.name is None:
+                    raise RuntimeError("Invalid name for Partition: " +
+                                       str(partition))
+
+                # update the partition table and label the disk
+                # only if a partition is being created or destroyed.
+                #
+                # don't update the partition table or label the disk
+                # if 'preserve' or 'use_existing' is set on the partition
+                if partition.action == "create":
+                    update_partition_table = True
+                elif partition.action == "delete":
+                    partition_list.pop(partition_list.index(partition))
+                    update_partition_table = True
+                elif partition.action in \
+                    ["preserve", "use_existing_solaris2"]:
+                    label_disk = False
+
+        update_vtoc = False
+        swap_slice_list = list()
+        if slice_list:
+            dup_slice_list = copy(slice_list)
+            for slc in dup_slice_list:
+                # write out the vtoc if a slice is being created or
+                # destroyed.
+                #
+                # don't write out the vtoc or label the disk if all
+                # the slices are being 'preserved'
+                if slc.action == "create":
+                    update_vtoc = True
+                elif slc.action == "delete":
+                    slice_list.pop(slice_list.index(slc))
+                    update_vtoc = True
+                elif slc.action == "preserve":
+                    label_disk = False
+
+                # if 'is_swap' is set to True, add this
+                # slice to the swap_slice_list
+                if slc.is_swap:
+                    swap_slice_list.append(slc)
+
+        if update_partition_table:
+            steps.append(("update_partition_table",
+                          (partition_list, self.dry_run)))
+        if label_disk:
+            # if no slices or partitions are marked 'preserve'
+            # label the disk
+            steps.append(("label_disk", (self.dry_run,)))
+        if update_vtoc:
+            steps.append(("update_slices", (slice_list, self.dry_run)))
+        if swap_slice_list:
+            # one or more slices need to be added as ufs swap
+            steps.append(("create_ufs_swap", (swap_slice_list, self.dry_run)))
+
+        return steps
+
     def setup_physical(self):
         """ method used to parse the list of disks and create the desired
-        physical configuration.
+        physical configuration.  Disks are set up disk_jobs at a time.
         """
+        plans = list()
         for disk in self.physical_list:
             # if the 'whole_disk' attribute is set to True don't even bother
             # initializing the Disk. it will be processed appropriately at
             # zpool instantiation time.
             if disk.whole_disk:
                 continue
+            plans.append((disk, self.plan_disk(disk)))
 
-            # check the write_cache attribute and, if set, enable it
-            if disk.write_cache:
-                fd = os.open(disk.opath, os.O_RDWR | os.O_NDELAY)
-                try:
-                    self.logger.debug("enabling write-cache on %s" % disk.ctd)
-                    number = C.c_int(1)
-                    fcntl.ioctl(fd, DKIOCSETWCE, C.addressof(number))
-                except Exception as err:
-                    # ignore any errors generated by the ioctl
-                    self.logger.debug("unable to enable write-cache:")
-                    self.logger.debug(str(err))
-                finally:
-                    os.close(fd)
-
-            # get the list of fdisk partitions and slices on the disk
-            partition_list = disk.get_descendants(class_type=Partition)
-            slice_list = disk.get_descendants(class_type=Slice)
-
-            update_partition_table = False
-            label_disk = True
-
-            if partition_list:
-                dup_partition_list = copy(partition_list)
-                for partition in dup_partition_list:
-                    # look for a partition name of None.  If it exists, raise
-                    # an exception
-                    if partition.name is None:
-                        raise RuntimeError("Invalid name for Partition: " +
-                                           str(partition))
-
-                    # update the partition table and label the disk
-                    # only if a partition is being created or destroyed.
-                    #
-                    # don't update the partition table or label the disk
-                    # if 'preserve' or 'use_existing' is set on the partition
-                    if partition.action == "create":
-                        update_partition_table = True
-                    elif partition.action == "delete":
-                        partition_list.pop(partition_list.index(partition))
-                        update_partition_table = True
-                    elif partition.action in \
-                        ["preserve", "use_existing_solaris2"]:
-                        label_disk = False
-
-            update_vtoc = False
-            swap_slice_list = list()
-            if slice_list:
-                dup_slice_list = copy(slice_list)
-                for slc in dup_slice_list:
-                    # write out the vtoc if a slice is being created or
-                    # destroyed.
-                    #
-                    # don't write out the vtoc or label the disk if all
-                    # the slices are being 'preserved'
-                    if slc.action == "create":
-                        update_vtoc = True
-                    elif slc.action == "delete":
-                        slice_list.pop(slice_list.index(slc))
-                        update_vtoc = True
-                    elif slc.action == "preserve":
-                        label_disk = False
-
-                    # if 'is_swap' is set to True, add this
-                    # slice to the swap_slice_list
-                    if slc.is_swap:
-                        swap_slice_list.append(slc)
-
-            if update_partition_table:
-                disk._update_partition_table(partition_list, self.dry_run)
-            if label_disk:
-                # if no slices or partitions are marked 'preserve'
-                # label the disk
-                disk._label_disk(self.dry_run)
-            if update_vtoc:
-                disk._update_slices(slice_list, self.dry_run)
-            if swap_slice_list:
-                # one or more slices need to be added as ufs swap
-                disk._create_ufs_swap(swap_slice_list, self.dry_run)
+        commands = self.disk_commands
+        if commands is None:
+            commands = DiskCommands(self.logger)
+
+        errors = DiskScheduler(plans, commands, self.logger,
+                               self.disk_jobs).run()
+        if errors:
+            for (disk, step, exc_info) in errors:
+                self.logger.error("%s failed on disk %s: %s" %
+                                  (step, disk_name(disk), exc_info[1]))
+            raise DiskSetupError(errors)
 
     def create_dump(self):
         """ method used to parse the dump (zvol) targets and create the
@@ -276,8 +435,15 @@ class TargetInstantiation(Checkpoint):
 
     def create_logicals(self):
         """ method used to parse the logical targets and create the objects
-        with action of "create"
+        with action of "create".  Each zpool is created, then the datasets
+        in it, then its BEs, but independent zpools and datasets are set up
+        logical_jobs at a time.
         """
+        commands = self.logical_commands
+        if commands is None:
+            commands = LogicalCommands(self.logger)
+        scheduler = LogicalScheduler(commands, self.logger, self.logical_jobs)
+
         for zpool in self.logical_list:
             # get the pool and/or dataset options
             pool_options_list = zpool.get_children(class_type=PoolOptions)
@@ -324,39 +490,48 @@ class TargetInstantiation(Checkpoint):
 
             # set up the pool
             zpool.vdev_list = vdev_list
-            if zpool.action == "create":
-                zpool.create(self.dry_run, zpool_options)
-            elif zpool.action == "preserve":
-                if not zpool.exists:
-                    # a pool marked 'preserve' that does not exist
-                    # needs to be created
-                    zpool.create(self.dry_run, zpool_options)
+            pool_task = scheduler.add(zpool.name, "create_zpool",
+                                      (zpool, zpool_options, self.dry_run))
 
             # set up the filesystems in that pool, but only if the in_be
-            # attribute is False
+            # attribute is False, then the zvols in that pool but only on
+            # zvols whose use attribute is "none".  "swap" and "dump" are
+            # handled later
             fs_list = zpool.get_children(class_type=Filesystem)
-            for fs in [fs for fs in fs_list if not fs.in_be]:
-                if fs.action == "create":
-                    fs.create(self.dry_run)
-                    if fs.mountpoint is not None:
-                        fs.set("mountpoint", fs.mountpoint, self.dry_run)
-                elif fs.action == "preserve":
-                    # if the filesystem doesn't exist, create it
-                    if not fs.exists:
-                        fs.create(self.dry_run)
-                        if fs.mountpoint is not None:
-                            fs.set("mountpoint", fs.mountpoint, self.dry_run)
-
-            # set up the zvols in that pool but only on zvols whose use
-            # attribute is "none".  "swap" and "dump" are handled later
             zvol_list = zpool.get_children(class_type=Zvol)
-            for zvol in [z for z in zvol_list if z.use.lower() == "none"]:
-                if zvol.action == "create":
-                    zvol.create(self.dry_run)
-                elif zvol.action == "preserve":
-                    # if the zvol doesn't exist, create it
-                    if not zvol.exists:
-                        zvol.create(self.dry_run)
+            dataset_list = [fs for fs in fs_list if not fs.in_be] + \
+                [z for z in zvol_list if z.use.lower() == "none"]
+
+            # a dataset waits for the datasets listed before it which are
+            # above or below it, or which share a parent with it that is
+            # neither the pool nor listed before it: zfs create -p of both
+            # would create that parent at the same time.  It also waits for
+            # those mounted on, above or below its own mountpoint, as zfs
+            # create fails to mount a filesystem on a directory which is
+            # not empty
+            fs_mountpoints = dict((fs.full_name, fs.mountpoint)
+                                  for fs in fs_list
+                                  if fs.mountpoint is not None)
+            mountpoints = dict()
+            dataset_tasks = list()
+            for dataset in dataset_list:
+                if dataset.action not in ["create", "preserve"]:
+                    continue
+                if isinstance(dataset, Filesystem):
+                    mountpoints[dataset.full_name] = mountpoint_of(
+                        dataset.full_name, fs_mountpoints, zpool.mountpoint)
+                listed = set(name for (name, task) in dataset_tasks)
+                deps = [pool_task]
+                for (name, task) in dataset_tasks:
+                    parent = common_parent(name, dataset.full_name)
+                    if nested(name, dataset.full_name) or \
+                       (parent != zpool.name and parent not in listed) or \
+                       nested_mountpoint(mountpoints.get(name),
+                           mountpoints.get(dataset.full_name)):
+                        deps.append(task)
+                dataset_tasks.append((dataset.full_name, scheduler.add(
+                    dataset.full_name, "create_dataset",
+                    (dataset, self.dry_run), deps)))
 
             # Set up the Boot Environment
             be_list = zpool.get_children(class_type=BE)
@@ -374,14 +549,21 @@ class TargetInstantiation(Checkpoint):
                         be_fs_zfs_properties_list.append(zfs_options)
 
             for be in be_list:
-                # Initialize the new BE.  If filesystems were specified with
-                # "in_be" set to True, add those filesystems to the init call
-                if be_fs_list:
-                    be.init(self.dry_run, pool_name=zpool.name,
-                            fs_list=be_fs_list,
-                            fs_zfs_properties=be_fs_zfs_properties_list)
-                else:
-                    be.init(self.dry_run, pool_name=zpool.name)
+                # Initialize the new BE once the rest of the pool is set up.
+                # If filesystems were specified with "in_be" set to True, add
+                # those filesystems to the init call
+                scheduler.add("BE %s" % be.name, "init_be",
+                              (be, self.dry_run, zpool.name,
+                               be_fs_list or None,
+                               be_fs_zfs_properties_list or None),
+                              [pool_task] + [t for (n, t) in dataset_tasks])
+
+        errors = scheduler.run()
+        if errors:
+            for (name, step, exc_info) in errors:
+                self.logger.error("%s failed on %s: %s" %
+                                  (step, name, exc_info[1]))
+            raise LogicalSetupError(errors)
 
     def execute(self, dry_run=False):
         """ Primary execution method use by the Checkpoint parent class
@@ -0,0 +1,341 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+""" intervals.py -- balanced interval tree of sector ranges, used by
+ShadowPhysical to answer the gap and overlap queries of a disk layout
+without re-sorting and re-walking every child.
+
+Intervals are half-open, [start, end), and carry an arbitrary item.  Each
+node of the (AVL) tree also records, for its subtree, the smallest start,
+the largest end, the largest gap between consecutive intervals and whether
+any two intervals overlap, so that:
+
+    - overlapping() is O(log n + k)
+    - gaps() is O(log n + k) when no intervals overlap
+    - largest_gap() is O(log n)
+
+for k intervals or gaps returned.
+"""
+
+
+# max_gap of a subtree holding no two intervals to leave a gap between
+_NO_GAP = float("-inf")
+
+
+class _Node(object):
+    """ _Node - a node of IntervalTree, ordered by (start, seq)
+    """
+    __slots__ = ("start", "end", "seq", "item", "left", "right", "height",
+                 "min_start", "max_end", "max_gap", "overlapped")
+
+    def __init__(self, start, end, seq, item):
+        self.start = start
+        self.end = end
+        self.seq = seq
+        self.item = item
+        self.left = None
+        self.right = None
+        self.height = 1
+        self.min_start = start
+        self.max_end = end
+        self.max_gap = _NO_GAP
+        self.overlapped = False
+
+    def key(self):
+        return (self.start, self.seq)
+
+
+def _height(node):
+    if node is None:
+        return 0
+    return node.height
+
+
+def _update(node):
+    """ _update() - recompute the augmented fields of node from its
+    children
+    """
+    left = node.left
+    right = node.right
+    node.height = 1 + max(_height(left), _height(right))
+
+    max_gap = _NO_GAP
+    overlapped = False
+    if left is not None:
+        node.min_start = left.min_start
+        overlapped = left.overlapped or left.max_end > node.start
+        max_gap = max(left.max_gap, node.start - left.max_end)
+        end = max(left.max_end, node.end)
+    else:
+        node.min_start = node.start
+        end = node.end
+
+    if right is not None:
+        overlapped = overlapped or right.overlapped or right.min_start < end
+        max_gap = max(max_gap, right.max_gap, right.min_start - end)
+        end = max(end, right.max_end)
+
+    node.max_end = end
+    node.max_gap = max_gap
+    node.overlapped = overlapped
+
+
+def _rotate_right(node):
+    pivot = node.left
+    node.left = pivot.right
+    pivot.right = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+def _rotate_left(node):
+    pivot = node.right
+    node.right = pivot.left
+    pivot.left = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+def _rebalance(node):
+    _update(node)
+    balance = _height(node.left) - _height(node.right)
+    if balance > 1:
+        if _height(node.left.left) < _height(node.left.right):
+            node.left = _rotate_left(node.left)
+        return _rotate_right(node)
+    if balance < -1:
+        if _height(node.right.right) < _height(node.right.left):
+            node.right = _rotate_right(node.right)
+        return _rotate_left(node)
+    return node
+
+
+def _insert(node, new):
+    if node is None:
+        return new
+    if new.key() < node.key():
+        node.left = _insert(node.left, new)
+    else:
+        node.right = _insert(node.right, new)
+    return _rebalance(node)
+
+
+def _pop_min(node):
+    """ _pop_min() - detach the leftmost node of the subtree node.  Returns
+    the new subtree and the detached node.
+    """
+    if node.left is None:
+        return (node.right, node)
+    (node.left, smallest) = _pop_min(node.left)
+    return (_rebalance(node), smallest)
+
+
+def _delete(node, key):
+    if node is None:
+        raise KeyError(key)
+    node_key = node.key()
+    if key < node_key:
+        node.left = _delete(node.left, key)
+    elif key > node_key:
+        node.right = _delete(node.right, key)
+    else:
+        if node.left is None:
+            return node.right
+        if node.right is None:
+            return node.left
+        (right, successor) = _pop_min(node.right)
+        successor.left = node.left
+        successor.right = right
+        node = successor
+    return _rebalance(node)
+
+
+class IntervalTree(object):
+    """ IntervalTree - set of items, each covering the half-open interval
+    [start, end)
+
+    An item is held at most once; inserting it again replaces its interval.
+    Items are tracked by identity, not equality.
+    """
+
+    def __init__(self, intervals=None):
+        self._root = None
+        self._nodes = dict()
+        self._seq = 0
+        if intervals is not None:
+            for (start, end, item) in intervals:
+                self.insert(start, end, item)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, item):
+        node = self._nodes.get(id(item))
+        return node is not None and node.item is item
+
+    def __iter__(self):
+        """ iterate over (start, end, item) in order of start, then of
+        insertion
+        """
+        stack = list()
+        node = self._root
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                yield (node.start, node.end, node.item)
+                node = node.right
+
+    def insert(self, start, end, item):
+        """ insert() - add item, covering [start, end), to the tree.  An
+        item inserted again keeps its place in insertion order.
+        """
+        if item in self:
+            seq = self._nodes[id(item)].seq
+            self.remove(item)
+        else:
+            seq = self._seq
+            self._seq += 1
+        node = _Node(start, end, seq, item)
+        self._root = _insert(self._root, node)
+        self._nodes[id(item)] = node
+
+    def remove(self, item):
+        """ remove() - remove item from the tree.  Raises KeyError if item
+        is not in the tree.
+        """
+        if item not in self:
+            raise KeyError(item)
+        node = self._nodes.pop(id(item))
+        self._root = _delete(self._root, node.key())
+
+    def discard(self, item):
+        """ discard() - remove item from the tree, if present
+        """
+        if item in self:
+            self.remove(item)
+
+    def span(self, item):
+        """ span() - return the (start, end) interval of item
+        """
+        if item not in self:
+            raise KeyError(item)
+        node = self._nodes[id(item)]
+        return (node.start, node.end)
+
+    @property
+    def has_overlaps(self):
+        """ True if any two intervals of the tree overlap
+        """
+        return self._root is not None and self._root.overlapped
+
+    def overlapping(self, start, end):
+        """ overlapping() - return the items whose interval intersects
+        [start, end), in insertion order
+        """
+        found = list()
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None or node.max_end <= start or \
+               node.min_start >= end:
+                continue
+            if node.start < end and node.end > start:
+                found.append(node)
+            stack.append(node.left)
+            if node.start < end:
+                stack.append(node.right)
+        found.sort(key=lambda node: node.seq)
+        return [node.item for node in found]
+
+    def _legacy_gaps(self, lo, hi, min_size):
+        """ _legacy_gaps() - gaps() of overlapping intervals: every start
+        and end is sorted and paired up in turn
+        """
+        usage = list()
+        for (start, end, item) in self:
+            usage.append(start)
+            usage.append(end)
+        usage.sort()
+        usage.insert(0, lo)
+        usage.append(hi)
+        return [(usage[i], usage[i + 1]) for i in xrange(0, len(usage), 2)
+                if usage[i + 1] - usage[i] >= min_size]
+
+    def gaps(self, lo, hi, min_size=0):
+        """ gaps() - return the (start, end) pairs of free space of the range
+        [lo, hi) that are at least min_size long.
+
+        The pairs are those of the sorted list [lo, start, end, start, end,
+        ..., hi], taken two by two, the way Disk.get_gaps() has always
+        computed them.  They are only disjoint free space if no intervals
+        overlap.
+        """
+        if self.has_overlaps:
+            return self._legacy_gaps(lo, hi, min_size)
+
+        found = list()
+
+        def walk(node, prev):
+            """ append the gaps of the subtree node, preceded by an interval
+            ending at prev, and return the end of its last interval
+            """
+            if node is None:
+                return prev
+            if node.max_gap < min_size:
+                # only the gap before the subtree can be large enough
+                if node.min_start - prev >= min_size:
+                    found.append((prev, node.min_start))
+                return node.max_end
+            prev = walk(node.left, prev)
+            if node.start - prev >= min_size:
+                found.append((prev, node.start))
+            return walk(node.right, node.end)
+
+        prev = walk(self._root, lo)
+        if hi - prev >= min_size:
+            found.append((prev, hi))
+        return found
+
+    def largest_gap(self, lo, hi):
+        """ largest_gap() - return the first of the largest gaps() of the
+        range [lo, hi), as a (start, end) pair, or None if there are none
+        """
+        if self._root is None or self.has_overlaps:
+            gaps = self.gaps(lo, hi)
+            if not gaps:
+                return None
+            return max(gaps, key=lambda gap: gap[1] - gap[0])
+
+        largest = max(self._root.min_start - lo, self._root.max_gap,
+                      hi - self._root.max_end)
+        if largest < 0:
+            return None
+        return self.gaps(lo, hi, largest)[0]
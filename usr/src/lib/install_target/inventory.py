@@ -0,0 +1,291 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+""" inventory.py - snapshot of the hardware facts of the system.
+
+The AI client looks at the same hardware several times: ai_get_manifest for
+the criteria sent to the AI server, the Derived Manifest Module for the
+environment of its script, and TargetDiscovery.  Inventory gathers the
+platform, CPU, memory, network and disk facts once, and get_inventory()
+saves them to a versioned JSON file which later callers load instead of
+gathering them again.
+
+Each section of the inventory is gathered by a collector, a function
+taking the function used to run commands.  Both are pluggable, so that the
+collectors can be run against recorded command outputs.
+"""
+import json
+import logging
+import os
+import tempfile
+
+from solaris_install import Popen, system_temp_path
+from solaris_install.logger import INSTALL_LOGGER_NAME as ILN
+
+IFCONFIG = "/usr/sbin/ifconfig"
+ISAINFO = "/usr/bin/isainfo"
+PRTCONF = "/usr/sbin/prtconf"
+UNAME = "/usr/bin/uname"
+
+# version of the inventory file.  Files of any other version are gathered
+# again
+INVENTORY_VERSION = 1
+INVENTORY_FILE = system_temp_path("hw_inventory.json")
+
+# memory size units reported by prtconf(1M), in MB
+MEM_UNITS = {"Kilobytes": 1.0 / 1024, "Megabytes": 1, "Gigabytes": 1024,
+             "Terabytes": 1024 * 1024}
+
+
+class InventoryError(Exception):
+    """ Raised when an inventory file can not be used
+    """
+    pass
+
+
+def run_cmd(cmd):
+    """ run_cmd() - run cmd and return its output, or None if it failed
+    """
+    try:
+        p = Popen.check_call(cmd, stdout=Popen.STORE, stderr=Popen.STORE,
+                             check_result=Popen.ANY)
+    except OSError as err:
+        logging.getLogger(ILN).debug("unable to run %s: %s" % (cmd, err))
+        return None
+    if p.returncode != 0:
+        logging.getLogger(ILN).debug("%s failed: %s" % (cmd, p.stderr))
+        return None
+    return p.stdout
+
+
+def first_line(output):
+    """ first_line() - return the first line of a command output, or None
+    """
+    if not output or not output.strip():
+        return None
+    return output.strip().splitlines()[0].strip()
+
+
+def parse_prtconf(output):
+    """ parse_prtconf() - return the memory size in MB from prtconf -vp
+    output, or None
+    """
+    for line in (output or "").splitlines():
+        if line.startswith("Memory size: "):
+            (size, unit) = line.split()[2:4]
+            if unit not in MEM_UNITS:
+                logging.getLogger(ILN).warning("Unknown mem size units %s"
+                                               % unit)
+                return 0L
+            return long(long(size) * MEM_UNITS[unit]) or None
+    return None
+
+
+def parse_ifconfig(output):
+    """ parse_ifconfig() - return the facts of the first interface up in
+    ifconfig -au output, other than the loopback interfaces, or None
+    """
+    network = None
+    for line in (output or "").splitlines():
+        if not line.strip():
+            continue
+        if not line[0].isspace():
+            # the first line of an interface
+            if network is not None:
+                break
+            if "LOOPBACK" not in line:
+                network = {"interface": line.split(":")[0], "ipv4": None,
+                           "netmask": None, "mac": None}
+        elif network is not None:
+            words = line.split()
+            for (word, key) in [("inet", "ipv4"), ("netmask", "netmask"),
+                                ("ether", "mac")]:
+                if word in words[:-1] and network[key] is None:
+                    network[key] = words[words.index(word) + 1]
+    return network
+
+
+def collect_platform(run):
+    return {"machine": first_line(run([UNAME, "-m"])),
+            "platform": first_line(run([UNAME, "-i"]))}
+
+
+def collect_cpu(run):
+    return {"processor": first_line(run([UNAME, "-p"])),
+            "isa": first_line(run([ISAINFO, "-n"]))}
+
+
+def collect_memory(run):
+    return {"size_mb": parse_prtconf(run([PRTCONF, "-vp"]))}
+
+
+def collect_network(run):
+    return parse_ifconfig(run([IFCONFIG, "-au"]))
+
+
+def collect_disks(run):
+    """ collect_disks() - return the facts of each drive libdiskmgt reports
+    """
+    # libdiskmgt is only loaded when the disks are gathered
+    from solaris_install.target.libdiskmgt import const, diskmgt
+
+    disks = list()
+    for drive in diskmgt.descriptors_by_type(const.DRIVE):
+        aliases = drive.aliases
+        disk = {"name": aliases[0].name if aliases else drive.name,
+                "type": drive.attributes.type,
+                "status": drive.attributes.status,
+                "blocksize": None,
+                "blocks": None}
+        media = drive.media
+        if media is not None:
+            disk["blocksize"] = media.attributes.blocksize
+            disk["blocks"] = media.attributes.size
+        disks.append(disk)
+    return disks
+
+
+# collector of each section of the inventory
+COLLECTORS = {
+    "platform": collect_platform,
+    "cpu": collect_cpu,
+    "memory": collect_memory,
+    "network": collect_network,
+    "disks": collect_disks
+}
+
+
+class Inventory(object):
+    """ Inventory - the hardware facts of the system, by section.  A section
+    whose collector failed, or found nothing, is left out, so that it is
+    gathered again by the next collect().
+    """
+
+    def __init__(self, facts=None):
+        self.facts = dict(facts or {})
+
+    def get(self, section, key=None):
+        """ get() - return a section of the inventory, or the fact key of a
+        section.  Returns None for facts which are unknown.
+        """
+        value = self.facts.get(section)
+        if key is None or value is None:
+            return value
+        return value.get(key)
+
+    def collect(self, sections=None, collectors=None, run=run_cmd):
+        """ collect() - gather the sections not in the inventory yet.
+        Returns the list of the sections gathered.  Sections which could not
+        be gathered are logged and left out.
+
+        sections - names of the sections to gather.  Defaults to all
+        collectors - dictionary of the collector of each section.  Defaults
+        to COLLECTORS
+        run - function running a command for the collectors
+        """
+        if collectors is None:
+            collectors = COLLECTORS
+        if sections is None:
+            sections = sorted(collectors)
+
+        collected = list()
+        for section in sections:
+            if section in self.facts:
+                continue
+            try:
+                facts = collectors[section](run)
+            except Exception as err:
+                logging.getLogger(ILN).warning("Unable to gather the %s "
+                                               "facts: %s" % (section, err))
+                continue
+            if facts is None:
+                logging.getLogger(ILN).debug("No %s facts found" % section)
+                continue
+            self.facts[section] = facts
+            collected.append(section)
+        return collected
+
+    def save(self, path=INVENTORY_FILE):
+        """ save() - write the inventory to path, replacing it at once
+        """
+        (fd, tmp_path) = tempfile.mkstemp(dir=os.path.dirname(path),
+                                          prefix=".inventory")
+        try:
+            with os.fdopen(fd, "w") as fh:
+                json.dump({"version": INVENTORY_VERSION,
+                           "facts": self.facts}, fh, sort_keys=True,
+                          indent=1)
+            os.chmod(tmp_path, 0644)
+            os.rename(tmp_path, path)
+        except:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path=INVENTORY_FILE):
+        """ load() - read the inventory saved to path.  Raises IOError or
+        InventoryError if it can not be read.
+        """
+        with open(path) as fh:
+            try:
+                data = json.load(fh)
+            except ValueError as err:
+                raise InventoryError("%s is not an inventory: %s" %
+                                     (path, err))
+        if not isinstance(data, dict) or \
+           data.get("version") != INVENTORY_VERSION:
+            raise InventoryError("%s is not a version %d inventory" %
+                                 (path, INVENTORY_VERSION))
+        return cls(data.get("facts"))
+
+
+def get_inventory(sections=None, path=INVENTORY_FILE, collectors=None,
+                  run=run_cmd):
+    """ get_inventory() - return the inventory saved to path, gathering and
+    saving the sections it is missing first.
+
+    sections - names of the sections needed.  Defaults to all
+    path - the inventory file
+    collectors - dictionary of the collector of each section.  Defaults to
+    COLLECTORS
+    run - function running a command for the collectors
+    """
+    logger = logging.getLogger(ILN)
+    try:
+        inventory = Inventory.load(path)
+    except IOError:
+        inventory = Inventory()
+    except InventoryError as err:
+        logger.debug(str(err))
+        inventory = Inventory()
+
+    if inventory.collect(sections, collectors, run):
+        try:
+            inventory.save(path)
+        except (IOError, OSError) as err:
+            logger.debug("Unable to save the inventory to %s: %s" %
+                         (path, err))
+    return inventory
@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2011, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 """ logical.py -- library containing class definitions for logical DOC objects,
 including Zpool, Filesystem, and Zvol
@@ -253,8 +253,8 @@ class Zpool(DataObject):
             prop_dict[prop] = value
         return prop_dict
 
-    def create(self, dry_run, options=[]):
-        """ method to create the zpool from the vdevs
+    def create_cmd(self, options=[]):
+        """ return the zpool command creating the zpool from the vdevs
 
         options - optional list of pool and/or dataset options to pass to the
         create flag
@@ -275,7 +275,15 @@ class Zpool(DataObject):
 
         # add the vdev_list to the cmd to preserve the format Popen needs
         cmd += self.vdev_list
+        return cmd
+
+    def create(self, dry_run, options=[]):
+        """ method to create the zpool from the vdevs
 
+        options - optional list of pool and/or dataset options to pass to the
+        create flag
+        """
+        cmd = self.create_cmd(options)
         if not dry_run:
             Popen.check_call(cmd, stdout=Popen.STORE, stderr=Popen.STORE,
                              logger=ILN)
@@ -576,18 +584,25 @@ class Filesystem(DataObject):
                              stderr_loglevel=logging.DEBUG, logger=ILN)
         return p.stdout.strip()
 
+    def create_cmd(self):
+        """ return the zfs command creating the filesystem, with its options
+        and mountpoint set by the same command
+        """
+        cmd = [ZFS, "create", "-p"]
+        zfs_options = self.get_first_child(class_type=Options)
+        if zfs_options is not None:
+            cmd.extend(zfs_options.get_arg_list())
+        if self.mountpoint is not None:
+            cmd.extend(["-o", "mountpoint=%s" % self.mountpoint])
+
+        cmd.append(self.full_name)
+        return cmd
+
     def create(self, dry_run):
         """ create the filesystem
         """
         if not self.exists:
-            cmd = [ZFS, "create", "-p"]
-            zfs_options = self.get_first_child(class_type=Options)
-            if zfs_options is not None:
-                cmd.extend(zfs_options.get_arg_list())
-            if self.mountpoint is not None:
-                cmd.extend(["-o", "mountpoint=%s" % self.mountpoint])
-
-            cmd.append(self.full_name)
+            cmd = self.create_cmd()
 
             if not dry_run:
                 Popen.check_call(cmd, stdout=Popen.STORE, stderr=Popen.STORE,
@@ -699,24 +714,34 @@ class Zvol(DataObject):
                              check_result=Popen.ANY)
         return p.returncode == 0
 
-    def create(self, dry_run):
-        """ method to create a zvol.
+    @property
+    def zfs_size(self):
+        """ the size of the zvol, as a string ZFS expects
         """
-        if not self.exists:
-            # check self.size.  If it's a Size() object, convert it to a string
-            # ZFS expects
-            if isinstance(self.size, Size):
-                zvol_size = str(int(self.size.get(Size.mb_units))) + "M"
-            else:
-                zvol_size = self.size
+        # check self.size.  If it's a Size() object, convert it to a string
+        # ZFS expects
+        if isinstance(self.size, Size):
+            return str(int(self.size.get(Size.mb_units))) + "M"
+        return self.size
+
+    def create_cmd(self):
+        """ return the zfs command creating the zvol, with its options set by
+        the same command
+        """
+        cmd = [ZFS, "create", "-p", "-V", self.zfs_size]
 
-            cmd = [ZFS, "create", "-p", "-V", zvol_size]
+        zfs_options = self.get_first_child(class_type=Options)
+        if zfs_options is not None:
+            cmd.extend(zfs_options.get_arg_list())
 
-            zfs_options = self.get_first_child(class_type=Options)
-            if zfs_options is not None:
-                cmd.extend(zfs_options.get_arg_list())
+        cmd.append(self.full_name)
+        return cmd
 
-            cmd.append(self.full_name)
+    def create(self, dry_run):
+        """ method to create a zvol.
+        """
+        if not self.exists:
+            cmd = self.create_cmd()
 
             if not dry_run:
                 Popen.check_call(cmd, stdout=Popen.STORE, stderr=Popen.STORE,
@@ -743,7 +768,7 @@ class Zvol(DataObject):
                     if p.returncode == 1:
                         logger = logging.getLogger(ILN)
                         logger.warning("Unable to create dump Zvol "
-                                       "with size %s." % zvol_size)
+                                       "with size %s." % self.zfs_size)
 
     def destroy(self, dry_run):
         """ method to destroy a zvol.
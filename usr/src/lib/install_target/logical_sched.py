@@ -0,0 +1,236 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+""" logical_sched.py - concurrent setup of the logical targets.
+
+The zpools, datasets and BEs of a target form a dependency graph: a dataset
+can only be created once its pool exists and once the datasets above it,
+or below it when listed first, have been created, and a BE is initialized
+once the rest of its pool is in place.  Datasets are created with
+"zfs create -p", so two datasets sharing a missing parent which is not
+created by a task of its own would both create it, and the one losing the
+race would fail: such datasets are created one after the other.  Anything
+else is independent, so LogicalScheduler runs each task as soon as the
+tasks it depends on are done, on up to jobs threads at once.
+
+As with DiskScheduler, the tasks are run through a command layer object,
+one method per step, so that the scheduling can be tested with a fake
+command layer.
+"""
+import heapq
+import os
+import sys
+import threading
+
+
+class LogicalSetupError(Exception):
+    """ Raised once every task has run, if any task failed.  errors is the
+    list of (name, step, exc_info) of each failed task, in the order the
+    tasks were added.
+    """
+
+    def __init__(self, errors):
+        Exception.__init__(self)
+        self.errors = errors
+
+    def __str__(self):
+        return "; ".join("%s failed on %s: %s" % (step, name, exc_info[1])
+                         for (name, step, exc_info) in self.errors)
+
+
+def nested(name, other):
+    """ nested() - return True if the dataset name is the dataset other, or
+    is above or below it
+    """
+    return name == other or other.startswith(name + "/") or \
+        name.startswith(other + "/")
+
+
+def common_parent(name, other):
+    """ common_parent() - return the deepest dataset above both the datasets
+    name and other, or "" if they are in different pools
+    """
+    parent = list()
+    for (component, other_component) in zip(name.split("/")[:-1],
+                                             other.split("/")[:-1]):
+        if component != other_component:
+            break
+        parent.append(component)
+    return "/".join(parent)
+
+
+def mountpoint_of(name, mountpoints, pool_mountpoint=None):
+    """ mountpoint_of() - return the directory the filesystem name is mounted
+    on, or None if it is not mounted, or mounted as legacy
+
+    mountpoints - dictionary of the mountpoints set on filesystems, which
+    their descendants inherit
+    pool_mountpoint - mountpoint of the pool, if not the default /<pool>
+    """
+    components = name.split("/")
+    for index in xrange(len(components), 0, -1):
+        dataset = "/".join(components[:index])
+        mountpoint = mountpoints.get(dataset)
+        if mountpoint is None and index == 1:
+            mountpoint = pool_mountpoint or "/" + dataset
+        if mountpoint is not None:
+            if not mountpoint.startswith("/"):
+                return None
+            return os.path.join(mountpoint, *components[index:])
+    return None
+
+
+def nested_mountpoint(mountpoint, other):
+    """ nested_mountpoint() - return True if the directories mountpoint and
+    other are the same, or if one is below the other.  None is nested in
+    nothing.
+    """
+    if mountpoint is None or other is None:
+        return False
+    mountpoint = os.path.normpath(mountpoint)
+    other = os.path.normpath(other)
+    return mountpoint == other or \
+        other.startswith(mountpoint.rstrip("/") + "/") or \
+        mountpoint.startswith(other.rstrip("/") + "/")
+
+
+class LogicalScheduler(object):
+    """ LogicalScheduler - run a graph of tasks, each once the tasks it
+    depends on are done, on up to jobs threads at once.
+
+    commands - the command layer
+    logger - logger for the progress of each task
+    jobs - the number of tasks run at once
+
+    Each task is run as getattr(commands, step)(*args).  Tasks which are
+    ready are started in the order they were added.  A failed task skips
+    the tasks depending on it, but not the others.
+    """
+
+    def __init__(self, commands, logger, jobs=4):
+        self.commands = commands
+        self.logger = logger
+        self.jobs = max(1, jobs)
+
+        # (name, step, args) of each task, and the indexes of the tasks
+        # depending on it
+        self.tasks = list()
+        self._dependents = list()
+        self._waiting = list()
+
+        self._cond = threading.Condition()
+        self._ready = list()
+        self._left = 0
+        self._skipped = set()
+        self._errors = dict()
+
+    def add(self, name, step, args=(), deps=()):
+        """ add() - add a task and return its index, to pass in the deps of
+        the tasks depending on it.
+
+        name - name to report the task by
+        step - name of the command layer method run
+        args - arguments of the step
+        deps - indexes of the tasks this task depends on
+        """
+        index = len(self.tasks)
+        deps = set(deps)
+        for dep in deps:
+            if not 0 <= dep < index:
+                raise ValueError("unknown task %r" % dep)
+            self._dependents[dep].append(index)
+        self.tasks.append((name, step, tuple(args)))
+        self._dependents.append(list())
+        self._waiting.append(len(deps))
+        return index
+
+    def _skip(self, index):
+        """ skip the tasks depending on index, and theirs
+        """
+        for dependent in self._dependents[index]:
+            if dependent not in self._skipped:
+                self._skipped.add(dependent)
+                self._left -= 1
+                (name, step, args) = self.tasks[dependent]
+                self.logger.debug("skipping %s of %s" % (step, name))
+                self._skip(dependent)
+
+    def _done(self, index, exc_info):
+        """ record the end of the task index, starting or skipping the
+        tasks depending on it
+        """
+        with self._cond:
+            self._left -= 1
+            if exc_info is not None:
+                self._errors[index] = self.tasks[index][:2] + (exc_info,)
+                self._skip(index)
+            else:
+                for dependent in self._dependents[index]:
+                    self._waiting[dependent] -= 1
+                    if not self._waiting[dependent] and \
+                       dependent not in self._skipped:
+                        heapq.heappush(self._ready, dependent)
+            self._cond.notify_all()
+
+    def _worker(self):
+        """ run tasks until there are none left
+        """
+        while True:
+            with self._cond:
+                while not self._ready and self._left:
+                    self._cond.wait()
+                if not self._ready:
+                    return
+                index = heapq.heappop(self._ready)
+
+            (name, step, args) = self.tasks[index]
+            self.logger.debug("%s of %s" % (step, name))
+            try:
+                getattr(self.commands, step)(*args)
+            except Exception:
+                self._done(index, sys.exc_info())
+            else:
+                self._done(index, None)
+
+    def run(self):
+        """ run() - run all tasks.  Returns the list of (name, step,
+        exc_info) of each failed task, in the order the tasks were added.
+        """
+        self._ready = [index for (index, waiting) in enumerate(self._waiting)
+                       if not waiting]
+        heapq.heapify(self._ready)
+        self._left = len(self.tasks)
+
+        if self.jobs == 1 or len(self.tasks) <= 1:
+            self._worker()
+        else:
+            threads = [threading.Thread(target=self._worker)
+                       for worker in xrange(min(self.jobs, len(self.tasks)))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return [self._errors[index] for index in sorted(self._errors)]
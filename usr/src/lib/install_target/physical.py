@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2011, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 """ physical.py -- library containing class definitions for physical DOC
@@ -43,8 +43,8 @@ from solaris_install.data_object import DataObject, ParsingError
 from solaris_install.target.libadm import const, cstruct, extvtoc
 from solaris_install.target.libdiskmgt import const as ldm_const
 from solaris_install.target.libdiskmgt import diskmgt
-from solaris_install.target.shadow.physical import LOGICAL_ADJUSTMENT, \
-    ShadowPhysical
+from solaris_install.target.shadow.physical import GAPS, LAYOUT_ATTRS, \
+    LOGICAL_ADJUSTMENT, LOGICAL_GAPS, PRIMARY_OVERLAP, ShadowPhysical
 from solaris_install.target.size import Size
 
 FDISK = "/usr/sbin/fdisk"
@@ -97,6 +97,24 @@ def fill_left(obj, desired_size, left_gap):
         return desired_size - left_gap.size.sectors
 
 
+def relayout(obj, name):
+    """ relayout() - function to keep the sector layouts of the parent of a
+    Slice or Partition in step with a change to its attribute name
+    """
+    if name in LAYOUT_ATTRS:
+        parent = obj.__dict__.get("_parent")
+        if parent is not None and \
+           isinstance(parent._children, ShadowPhysical):
+            parent._children.relayout(obj)
+
+
+def min_gap_size(cylsize):
+    """ min_gap_size() - function to return the size of the smallest gap
+    get_gaps() reports:  more than 1 sector and more than a cylinder
+    """
+    return max(2, cylsize + 1)
+
+
 class InsufficientSpaceError(Exception):
     """ User-defined Exception raised when attempting to change the size of a
     Slice or Partition object
@@ -346,42 +364,24 @@ class Partition(DataObject):
             # return a list of the size of the partition
             return[HoleyObject(0, self.size)]
 
-        # create a list of sector usage by this partition.
-        usage = list()
-        for child in self._children:
-            # skip slices marked for deletion
-            if child.action == "delete":
-                continue
-            # skip the child if it has a tag of V_BACKUP (5)
-            if getattr(child, "tag") == const.V_BACKUP:
-                continue
-            usage.append(child.start_sector)
-            usage.append(child.start_sector + child.size.sectors)
-
-        # sort the usage list and add bookends
-        usage.sort()
-        usage.insert(0, 0L)
-        usage.append(self.size.sectors)
+        # pair up the sectors used by the slices of this partition, skipping
+        # slices marked for deletion or with a tag of V_BACKUP (5).  If the
+        # size of a pair is 0 (for a starting sector of 0) or 1 (for adjacent
+        # children), there's no gap, so skip it
+        usage = self._children.layout(GAPS).gaps(0L, self.size.sectors,
+            min_gap_size(self.parent.geometry.cylsize))
 
         holes = list()
-        i = 0
-        while i < len(usage) - 1:
-            # subtract i+1 to get the size of this hole.
-            size = usage[i + 1] - usage[i]
-
-            # if the size is 0 (for a starting sector of 0) or 1 (for adjacent
-            # children), there's no gap, so skip it
-            if size not in [0, 1] and size > self.parent.geometry.cylsize:
-                # do not correct for holes that start at 0
-                if usage[i] == 0:
-                    holes.append(HoleyObject(
-                        usage[i], Size(str(size - 1) + Size.sector_units)))
-                else:
-                    holes.append(HoleyObject(
-                        usage[i] + 1, Size(str(size - 1) + Size.sector_units)))
+        for (start_sector, end_sector) in usage:
+            size = end_sector - start_sector
 
-            # step across the size of the child
-            i += 2
+            # do not correct for holes that start at 0
+            if start_sector == 0:
+                holes.append(HoleyObject(
+                    start_sector, Size.from_sectors(size - 1)))
+            else:
+                holes.append(HoleyObject(
+                    start_sector + 1, Size.from_sectors(size - 1)))
 
         return holes
 
@@ -431,8 +431,8 @@ class Partition(DataObject):
         """ remaining_space() - instance property to return a Size object of
         the remaining overall space available on the Partition
         """
-        return Size(str(self.size.sectors - \
-            sum([c.size.sectors for c in self._children])) + Size.sector_units)
+        return Size.from_sectors(self.size.sectors - \
+            sum([c.size.sectors for c in self._children]))
 
     @property
     def is_primary(self):
@@ -471,6 +471,13 @@ class Partition(DataObject):
             return True
         return False
 
+    def __setattr__(self, name, value):
+        """ method to keep the parent's sector layouts in step with changes
+        to the Partition
+        """
+        super(Partition, self).__setattr__(name, value)
+        relayout(self, name)
+
     def __setstate__(self, state):
         """ method to override the parent's version of __setstate__.  We do
         this so deepcopy() sets validate_children to True
@@ -664,6 +671,13 @@ class Slice(DataObject):
 
         return resized_slice
 
+    def __setattr__(self, name, value):
+        """ method to keep the parent's sector layouts in step with changes
+        to the Slice
+        """
+        super(Slice, self).__setattr__(name, value)
+        relayout(self, name)
+
     def __repr__(self):
         s = "Slice: name=%s; action=%s, force=%s, is_swap=%s" \
             % (self.name, self.action, self.force, self.is_swap)
@@ -1172,51 +1186,26 @@ class Disk(DataObject):
             # return a list of the size of the disk
             return[HoleyObject(0, self.disk_prop.dev_size)]
 
-        # create a list of sector usage by this disk.
-        usage = list()
-        for child in self._children:
-            # skip partitions or slices marked for deletion
-            if child.action == "delete":
-                continue
-            # skip the child if it's a slice and has a tag of V_BACKUP (5)
-            if isinstance(child, Slice):
-                if getattr(child, "tag") == const.V_BACKUP:
-                    continue
-            # skip the child if it's a logical partition
-            if isinstance(child, Partition):
-                if child.is_logical:
-                    continue
-
-            usage.append(child.start_sector)
-            usage.append(child.start_sector + child.size.sectors)
-
-        # sort the usage list and add bookends
-        usage.sort()
-        usage.insert(0, 0L)
-        usage.append(self.disk_prop.dev_size.sectors)
+        # pair up the sectors used by this disk, skipping partitions or
+        # slices marked for deletion, slices with a tag of V_BACKUP (5) and
+        # logical partitions.  If the size of a pair is 0 (for a starting
+        # sector of 0) or 1 (for adjacent children), there's no gap, so skip
+        # it.  Also skip any hole which is smaller than the cylinder boundary
+        usage = self._children.layout(GAPS).gaps(0L,
+            self.disk_prop.dev_size.sectors,
+            min_gap_size(self.geometry.cylsize))
 
         holes = list()
-        i = 0
-        while i < len(usage) - 1:
-            start_sector = usage[i]
-
-            # subtract i+1 to get the size of this hole.
-            size = usage[i + 1] - usage[i]
-
-            # if the size is 0 (for a starting sector of 0) or 1 (for adjacent
-            # children), there's no gap, so skip it.  Also skip any hole which
-            # is smaller than the cylinder boundary
-            if size not in [0, 1] and size > self.geometry.cylsize:
-                # do not correct for holes that start at 0
-                if start_sector == 0:
-                    holes.append(HoleyObject(start_sector,
-                        Size(str(size - 1) + Size.sector_units)))
-                else:
-                    holes.append(HoleyObject(start_sector + 1,
-                        Size(str(size - 1) + Size.sector_units)))
+        for (start_sector, end_sector) in usage:
+            size = end_sector - start_sector
 
-            # step across the size of the child
-            i += 2
+            # do not correct for holes that start at 0
+            if start_sector == 0:
+                holes.append(HoleyObject(start_sector,
+                    Size.from_sectors(size - 1)))
+            else:
+                holes.append(HoleyObject(start_sector + 1,
+                    Size.from_sectors(size - 1)))
 
         # now that the holes are calculated, adjust any holes whose start
         # sector does not fall on a cylinder boundary.
@@ -1233,22 +1222,21 @@ class Disk(DataObject):
 
                 # reset the attributes of the hole
                 hole.start_sector = new_start_sector
-                hole.size = Size(str(hole.size.sectors - difference) + \
-                                 Size.sector_units)
+                hole.size = Size.from_sectors(hole.size.sectors - difference)
 
             # check the start_sector of the gap.  If it starts at zero, adjust
             # it to start at the first cylinder boundary instead
             if hole.start_sector == 0:
                 hole.start_sector = self.geometry.cylsize
                 hole.size = \
-                    Size(str(hole.size.sectors - self.geometry.cylsize) + \
-                         Size.sector_units)
+                    Size.from_sectors(hole.size.sectors -
+                                      self.geometry.cylsize)
 
             # adjust the size down to the nearest end cylinder
             if hole.size.sectors % self.geometry.cylsize != 0:
                 new_size = (hole.size.sectors / self.geometry.cylsize) * \
                            self.geometry.cylsize
-                hole.size = Size(str(new_size) + Size.sector_units)
+                hole.size = Size.from_sectors(new_size)
 
             # finally, re-check the size of the hole.  If it's smaller than a
             # cylinder, do not add it to the list
@@ -1262,50 +1250,39 @@ class Disk(DataObject):
         Objects available within the extended partition of the disk
         """
         # check for an extended partition
-        part_list = self.get_children(class_type=Partition)
-
-        for part in part_list:
-            if part.is_extended and part.action != "delete":
-                extended_part = part
-                break
-        else:
+        extended_list = [part for (start, end, part) in
+                         self._children.layout(PRIMARY_OVERLAP)
+                         if part.is_extended and part.action != "delete"]
+        if not extended_list:
             return list()
 
-        # extract all logicial partitions
-        logical_list = [p for p in part_list if p.is_logical]
-        if not logical_list:
+        # if more than one was inserted, use the first one
+        extended_part = extended_list[0]
+        if len(extended_list) > 1:
+            extended_part = min(extended_list, key=self._children.index)
+
+        # the sectors used by all logicial partitions
+        logical_layout = self._children.layout(LOGICAL_GAPS)
+        if not logical_layout:
             # return a single Holey Object the size of the extended partition
             return [HoleyObject(extended_part.start_sector,
                                 extended_part.size)]
 
-        # create a list of sector usage by the logical partitions
-        usage = list()
-        for logical_part in logical_list:
-            usage.append(logical_part.start_sector)
-            usage.append(logical_part.start_sector + logical_part.size.sectors)
-
-        # sort the usage list and add bookends
-        usage.sort()
-        usage.insert(0, extended_part.start_sector)
-        usage.append(extended_part.start_sector + extended_part.size.sectors)
+        # pair up the sectors used by the logical partitions.  If the size of
+        # a pair is equal to the logical partition offset, or the gap is
+        # smaller than the offset there's no gap, so skip it.
+        usage = logical_layout.gaps(extended_part.start_sector,
+            extended_part.start_sector + extended_part.size.sectors,
+            LOGICAL_ADJUSTMENT + 1)
 
         holes = list()
-        i = 0
-        while i < len(usage) - 1:
-            # subtract i+1 to get the size of this hole.
-            size = usage[i + 1] - usage[i]
-
-            # if the size is equal to the logical partition offset, or the gap
-            # is smaller than the offset there's no gap, so skip it.
-            if size > LOGICAL_ADJUSTMENT:
-                # set the start_sector of the hole to include the offset.
-                start_sector = usage[i] + LOGICAL_ADJUSTMENT
-                size_obj = Size(str(size - 1 - LOGICAL_ADJUSTMENT) + \
-                                Size.sector_units)
-                holes.append(HoleyObject(start_sector, size_obj))
-
-            # step across the size of the child
-            i += 2
+        for (start_sector, end_sector) in usage:
+            size = end_sector - start_sector
+
+            # set the start_sector of the hole to include the offset.
+            size_obj = Size.from_sectors(size - 1 - LOGICAL_ADJUSTMENT)
+            holes.append(HoleyObject(start_sector + LOGICAL_ADJUSTMENT,
+                                     size_obj))
 
         return holes
 
@@ -1583,8 +1560,7 @@ class Disk(DataObject):
             new_geometry.nheads = nhead
             new_geometry.nsectors = nsect
             self.geometry = new_geometry
-            self.disk_prop.dev_size = Size(str(ncyl * nhead * nsect) +
-                                           Size.sector_units)
+            self.disk_prop.dev_size = Size.from_sectors(ncyl * nhead * nsect)
 
             # update the label
             self.label = "VTOC"
@@ -1642,8 +1618,8 @@ class Disk(DataObject):
         """ remaining_space() - instance property to return a Size object of
         the remaining overall space available on the Disk
         """
-        return Size(str(self.disk_prop.dev_size.sectors - \
-            sum([c.size.sectors for c in self._children])) + Size.sector_units)
+        return Size.from_sectors(self.disk_prop.dev_size.sectors - \
+            sum([c.size.sectors for c in self._children]))
 
 
 class DiskGeometry(object):
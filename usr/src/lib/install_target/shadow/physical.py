@@ -21,10 +21,11 @@
 #
 
 #
-# Copyright (c) 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2011, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 import osol_install.errsvc as errsvc
 
+from solaris_install.target.intervals import IntervalTree
 from solaris_install.target.libadm.const import FD_NUMPART, MAX_EXT_PARTS, \
     V_BACKUP, V_BOOT, V_NUMPAR
 from solaris_install.target.libdiskmgt import const as ldm_const
@@ -34,6 +35,75 @@ from solaris_install.target.size import Size
 
 LOGICAL_ADJUSTMENT = 63
 
+# sector layouts ShadowPhysical keeps of its children, as IntervalTrees:
+#
+# GAPS - the sectors used by the children get_gaps() accounts for: slices
+#        and partitions not marked for deletion, other than V_BACKUP slices
+#        and logical partitions
+# LOGICAL_GAPS - the sectors used by logical partitions
+# SLICE_OVERLAP - the sectors of slices, for overlap checks
+# PRIMARY_OVERLAP - the sectors of partitions checked for overlap with
+#                   primary partitions:  all but logical partitions
+# LOGICAL_OVERLAP - the sectors of partitions checked for overlap with
+#                   logical partitions:  all but primary partitions
+GAPS = "gaps"
+LOGICAL_GAPS = "logical gaps"
+SLICE_OVERLAP = "slice overlap"
+PRIMARY_OVERLAP = "primary overlap"
+LOGICAL_OVERLAP = "logical overlap"
+LAYOUTS = (GAPS, LOGICAL_GAPS, SLICE_OVERLAP, PRIMARY_OVERLAP, LOGICAL_OVERLAP)
+
+# attributes of Slice and Partition objects the layouts depend on
+LAYOUT_ATTRS = frozenset(["_name", "action", "start_sector", "size", "tag"])
+
+
+def overlap_range(value):
+    """ overlap_range() - return the first and last sectors of a Slice or
+    Partition, as checked for overlap.  Logical partitions need a buffer of
+    LOGICAL_ADJUSTMENT sectors before them.
+    """
+    start = value.start_sector
+    end = start + value.size.sectors - 1
+    if hasattr(value, "part_type") and not value.is_primary:
+        start -= LOGICAL_ADJUSTMENT
+    return (start, end)
+
+
+def overlap_span(start, end):
+    """ overlap_span() - return the [start, end) interval of the sectors
+    [start, end] which intersects the same sector ranges.  An empty range,
+    [start, start - 1], overlaps the ranges holding either of its ends.
+    """
+    if end < start:
+        return (end, start + 1)
+    return (start, end + 1)
+
+
+def layout_entries(value):
+    """ layout_entries() - return the (layout, start, end) intervals a Slice
+    or Partition has in the layouts of its parent
+    """
+    start = value.start_sector
+    end = start + value.size.sectors
+    entries = list()
+    if hasattr(value, "force"):
+        if value.action != "delete" and value.tag != V_BACKUP:
+            entries.append((GAPS, start, end))
+        entries.append((SLICE_OVERLAP,) + overlap_span(*overlap_range(value)))
+    elif hasattr(value, "part_type"):
+        span = overlap_span(*overlap_range(value))
+        if value.is_logical:
+            entries.append((LOGICAL_GAPS, start, end))
+        else:
+            if value.action != "delete":
+                entries.append((GAPS, start, end))
+            entries.append((PRIMARY_OVERLAP,) + span)
+        if not value.is_primary:
+            entries.append((LOGICAL_OVERLAP,) + span)
+    elif value.action != "delete":
+        entries.append((GAPS, start, end))
+    return entries
+
 
 class ShadowPhysical(ShadowList):
     """ ShadowPhysical - class to hold and validate Physical objects (Partition
@@ -151,6 +221,54 @@ class ShadowPhysical(ShadowList):
             self.value = "Invalid name:  '%s' for partition " % name + \
                          "on disk:  %s" % ctd
 
+    # the layouts of the children, built on first use
+    _layout = None
+
+    def layout(self, name):
+        """ layout() - return the IntervalTree of the sectors used by the
+        children, for the layout name
+        """
+        if self._layout is None:
+            layout = dict((tree, IntervalTree()) for tree in LAYOUTS)
+            for child in self._shadow:
+                for (tree, start, end) in layout_entries(child):
+                    layout[tree].insert(start, end, child)
+            self._layout = layout
+        return self._layout[name]
+
+    def _index(self, value):
+        """ _index() - update the layouts of value, once built
+        """
+        if self._layout is None:
+            return
+        try:
+            entries = dict((tree, (start, end))
+                           for (tree, start, end) in layout_entries(value))
+        except (AttributeError, TypeError, ValueError):
+            # the layouts are rebuilt, raising the error, when next used
+            self._layout = None
+            return
+        for (tree, intervals) in self._layout.iteritems():
+            if tree in entries:
+                intervals.insert(entries[tree][0], entries[tree][1], value)
+            else:
+                intervals.discard(value)
+
+    def _unindex(self, value):
+        """ _unindex() - remove value from the layouts, once built
+        """
+        if self._layout is not None:
+            for intervals in self._layout.itervalues():
+                intervals.discard(value)
+
+    def relayout(self, value):
+        """ relayout() - update the layouts after a change of the sectors,
+        action or tag of the child value
+        """
+        if self._layout is not None and \
+           any(value in tree for tree in self._layout.itervalues()):
+            self._index(value)
+
     def in_use_check(self, ctds):
         """ in_use_check() - method to query libdiskmgt to check for in_use
         confilcts.
@@ -223,28 +341,22 @@ class ShadowPhysical(ShadowList):
         cb_start = value.start_sector
         cb_end = value.start_sector + value.size.sectors - 1
 
-        # verify each slice does not overlap with any other slice
-        for slc in self._shadow:
-            # if slice 2 is being inserted into a VTOC labeled disk, do not
-            # check for overlap
-            if label == "VTOC" and int(value.name) == 2:
-                break
-
-            # skip VTOC overlap slice if it is already inserted into the
-            # shadow list
-            if label == "VTOC" and int(slc.name) == 2:
-                continue
-
-            # calculate the range of each slice already inserted
-            start = slc.start_sector
-            end = slc.start_sector + slc.size.sectors - 1
-
-            # check that the start sector is not within another slice and
-            # the existing slice isn't inside the new slice but only for slices
-            # not marked for deletion
-            if value.action != "delete" and slc.action != "delete":
-                if (start <= cb_start <= end or start <= cb_end <= end) or \
-                   (cb_start <= start <= cb_end or cb_start <= end <= cb_end):
+        # verify each slice does not overlap with any other slice.  If slice 2
+        # is being inserted into a VTOC labeled disk, do not check for overlap
+        if self._shadow and not (label == "VTOC" and int(value.name) == 2):
+            (start, end) = overlap_span(cb_start, cb_end)
+            for slc in self.layout(SLICE_OVERLAP).overlapping(start, end):
+                # skip VTOC overlap slice if it is already inserted into the
+                # shadow list
+                if label == "VTOC" and int(slc.name) == 2:
+                    continue
+
+                # check that the start sector is not within another slice and
+                # the existing slice isn't inside the new slice but only for
+                # slices not marked for deletion.  Two empty slices never
+                # overlap.
+                if value.action != "delete" and slc.action != "delete" and \
+                   not (cb_end < cb_start and slc.size.sectors == 0):
                     self.set_error(
                         self.OverlappingSliceError(value.name, slc.name))
 
@@ -395,7 +507,7 @@ class ShadowPhysical(ShadowList):
                         value.start_sector = extended_part.start_sector + \
                                              LOGICAL_ADJUSTMENT
                         new_size = value.size.sectors - LOGICAL_ADJUSTMENT
-                        value.size = Size(str(new_size) + Size.sector_units)
+                        value.size = Size.from_sectors(new_size)
                 else:
                     diff = value.start_sector - closest_endpoint
                     # make sure there's at least 63 sectors between logical
@@ -404,7 +516,7 @@ class ShadowPhysical(ShadowList):
                         value.start_sector += LOGICAL_ADJUSTMENT - diff
 
                         new_size = value.size.sectors - LOGICAL_ADJUSTMENT
-                        value.size = Size(str(new_size) + Size.sector_units)
+                        value.size = Size.from_sectors(new_size)
 
         # check the bootid attibute on primary partitions for multiple active
         # partitions
@@ -422,47 +534,40 @@ class ShadowPhysical(ShadowList):
         p_start = value.start_sector
         p_end = p_start + value.size.sectors - 1
 
-        # walk each inserted partition already in the shadow list to ensure the
-        # partition we're trying to insert doesn't cross boundaries.
-        for partition in self._shadow:
-            # start and end points of the partition to check
-            if partition.is_primary:
-                start = partition.start_sector
-                end = start + partition.size.sectors - 1
-            else:
-                # for logical partitions, there needs to be a buffer of
-                # LOGICAL_ADJUSTMENT on each end
-                start = partition.start_sector - LOGICAL_ADJUSTMENT
-                end = start + partition.size.sectors - 1 + LOGICAL_ADJUSTMENT
-
-            if value.is_primary:
-                # do not test logical partition boundaries for primary
-                # partitions
-                if partition.is_logical:
-                    continue
-            else:
-                # verify the logical partition we're trying to insert fits
-                # within the extended partition "parent"
+        if value.is_primary:
+            # do not test logical partition boundaries for primary partitions
+            intervals = self.layout(PRIMARY_OVERLAP)
+        else:
+            # verify the logical partition we're trying to insert fits within
+            # the extended partition "parent"
+            for (start, end, partition) in self.layout(PRIMARY_OVERLAP):
                 if partition.is_extended and partition.action != "delete":
+                    (start, end) = overlap_range(partition)
                     if p_start < start or p_end > end:
                         self.set_error(self.LogicalPartitionOverlapError())
 
-                # do not test primary partition boundaries for logical
-                # partitions
-                if partition.is_primary:
+            # do not test primary partition boundaries for logical partitions.
+            # For logical partitions, there needs to be a buffer of
+            # LOGICAL_ADJUSTMENT on each end
+            intervals = self.layout(LOGICAL_OVERLAP)
+
+        # check that the start sector of the partition we're trying to insert
+        # is not within another partition and the existing partition isn't
+        # inside the partition we're inserting.  Primary partitions are only
+        # checked against other primary partitions and logical partitions are
+        # only checked aginst other logical partitions.  Partitions marked for
+        # deletion should not be checked at all
+        if value.action != "delete":
+            (start, end) = overlap_span(p_start, p_end)
+            for partition in intervals.overlapping(start, end):
+                if partition.action == "delete":
                     continue
-
-            # check that the start sector of the partition we're trying to
-            # insert is not within another partition and the existing partition
-            # isn't inside the partition we're inserting.  Primary partitions
-            # are only checked against other primary partitions and logical
-            # partitions are only checked aginst other logical partitions.
-            # Partitions marked for deletion should not be checked at all
-            if value.action != "delete" and partition.action != "delete":
-                if ((start <= p_start <= end) or (start <= p_end <= end)) or \
-                   ((p_start <= start <= p_end) or (p_start <= end <= p_end)):
-                    self.set_error(self.OverlappingPartitionError(
-                        partition.name, value.name))
+                # two empty partitions never overlap
+                (start, end) = overlap_range(partition)
+                if p_end < p_start and end < start:
+                    continue
+                self.set_error(self.OverlappingPartitionError(
+                    partition.name, value.name))
 
         # check that a primary partition doesn't exceed the size of the Disk,
         # if the dev_size is specified
@@ -516,6 +621,7 @@ class ShadowPhysical(ShadowList):
         if hasattr(self.container, "validate_children") and \
            not self.container.validate_children:
             ShadowList.insert(self, index, value)
+            self._index(value)
         else:
             # reset the errsvc for Physical errors
             errsvc.clear_error_list_by_mod_id(self.mod_id)
@@ -525,9 +631,30 @@ class ShadowPhysical(ShadowList):
             if hasattr(value, "force"):
                 # this is a Slice object, so call insert_slice
                 self.insert_slice(index, value)
+                self._index(value)
             elif hasattr(value, "part_type"):
                 # this is a Partition object, so call insert_partition
                 self.insert_partition(index, value)
+                self._index(value)
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            ShadowList.__setitem__(self, index, value)
+            self._layout = None
+        else:
+            old_value = self._shadow[index]
+            ShadowList.__setitem__(self, index, value)
+            self._unindex(old_value)
+            self._index(value)
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            ShadowList.__delitem__(self, index)
+            self._layout = None
+        else:
+            value = self._shadow[index]
+            ShadowList.__delitem__(self, index)
+            self._unindex(value)
 
     def remove(self, value):
         # reset the errsvc for Physical errors
@@ -583,21 +710,19 @@ class ShadowPhysical(ShadowList):
             # adjust the size down by the same amount
             difference = new_start_sector - value.start_sector
             value.start_sector = new_start_sector
-            value.size = Size(str(value.size.sectors - difference) + \
-                              Size.sector_units)
+            value.size = Size.from_sectors(value.size.sectors - difference)
 
         # check the start_sector of the object.  If it starts at zero, adjust
         # it to start at the first cylinder boundary instead so as not to
         # clobber the disk label
         if value.start_sector == 0:
             value.start_sector = cyl_boundary
-            value.size = Size(str(value.size.sectors - cyl_boundary) + \
-                              Size.sector_units)
+            value.size = Size.from_sectors(value.size.sectors - cyl_boundary)
 
         # adjust the size down to the nearest end cylinder
         if value.size.sectors % cyl_boundary != 0:
             new_size = (value.size.sectors / cyl_boundary) * cyl_boundary
-            value.size = Size(str(new_size) + Size.sector_units)
+            value.size = Size.from_sectors(new_size)
 
         # x86 specific check for slices and partitions
         if arch == "x86":
@@ -615,10 +740,17 @@ class ShadowPhysical(ShadowList):
             if (disk_size - value.size.sectors) / cyl_boundary < max_cyl:
                 end_cylinder = ((disk_size / cyl_boundary) - max_cyl) * \
                                cyl_boundary
-                value.size = Size(str(end_cylinder) + Size.sector_units)
+                value.size = Size.from_sectors(end_cylinder)
 
         return value
 
+    def __getstate__(self):
+        """ the layouts are rebuilt from the copied children when next used
+        """
+        state = dict(self.__dict__)
+        state["_layout"] = None
+        return state
+
     def __init__(self, container, *args):
         ShadowList.__init__(self, *args)
 
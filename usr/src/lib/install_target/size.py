@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2011, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 """
 Size library for install applications and libraries
@@ -82,12 +82,22 @@ class Size(object):
     valid_units = filter(lambda x: isinstance(x, str), units)
     valid_units.extend([byte_units, sector_units, s_units])
 
+    # display units, largest first
+    display_units = [zb_units, eb_units, pb_units, tb_units, gb_units,
+                     mb_units, kb_units]
+
+    # a Size is just a byte count and a block size.  Sizes are created and
+    # compared in large numbers during discovery and target selection, so
+    # they carry no instance dictionary and never go through strings once
+    # created.
+    __slots__ = ("byte_value", "blocksize", "_humanreadable")
+
     def __init__(self, humanreadable, blocksize=512):
-        self.humanreadable = humanreadable
+        self._humanreadable = humanreadable
         self.blocksize = blocksize
 
         # attempt to split the humanreadable string into a value and suffix
-        size_test = size_re.match(self.humanreadable)
+        size_test = size_re.match(humanreadable)
         if size_test is not None:
             # First try to cast the string to an int.  If the int cast fails,
             # switch to casting to a float.  If the cast to a float fails,
@@ -101,16 +111,16 @@ class Size(object):
             # exception
             if size_test.group(2) is None:
                 raise ValueError("no units specified for a size value " \
-                                  "of '%s'" % self.humanreadable)
+                                  "of '%s'" % humanreadable)
             else:
                 suffix = size_test.group(2)
         else:
             raise ValueError("unable to process a size value of '%s'" % \
-                             self.humanreadable)
+                             humanreadable)
 
         if suffix.lower() not in Size.valid_units:
             raise ValueError("invalid suffix for a size value of '%s'" % \
-                             self.humanreadable)
+                             humanreadable)
 
         if suffix == Size.byte_units:
             self.byte_value = long(value)
@@ -119,11 +129,43 @@ class Size(object):
         else:
             self.byte_value = long(value * Size.units[suffix.lower()])
 
+    @classmethod
+    def from_bytes(cls, byte_value, blocksize=512):
+        """ from_bytes() - return a Size of byte_value bytes, without
+        parsing a string
+
+        byte_value - number of bytes, which can't be negative
+        blocksize - size of a sector, in bytes
+        """
+        if byte_value < 0:
+            raise ValueError("unable to process a size value of '%sb'" % \
+                             byte_value)
+        size = cls.__new__(cls)
+        size.byte_value = long(byte_value)
+        size.blocksize = blocksize
+        size._humanreadable = None
+        return size
+
+    @classmethod
+    def from_sectors(cls, sectors, blocksize=512):
+        """ from_sectors() - return a Size of sectors blocks of blocksize
+        bytes, without parsing a string
+        """
+        return cls.from_bytes(sectors * blocksize, blocksize)
+
+    @property
+    def humanreadable(self):
+        """ the string the Size was created from, or its size in bytes
+        """
+        if self._humanreadable is None:
+            return str(self.byte_value) + Size.byte_units
+        return self._humanreadable
+
     @property
     def sectors(self):
         """ class property to allow fast conversion to sector units
         """
-        return self.get(self.sector_units)
+        return self.byte_value / self.blocksize
 
     def get(self, units=byte_units):
         """ get() - method to return the size in a unit specified
@@ -140,52 +182,71 @@ class Size(object):
         else:
             return self.byte_value / float(Size.units[units])
 
+    def __getstate__(self):
+        """ classes with __slots__ must provide their state to be pickled
+        """
+        return (self.byte_value, self.blocksize, self._humanreadable)
+
+    def __setstate__(self, state):
+        """ restore a pickled Size.  Sizes pickled before __slots__ were
+        introduced are restored from their instance dictionary.
+        """
+        if isinstance(state, dict):
+            state = (state["byte_value"], state["blocksize"],
+                     state.get("humanreadable"))
+        (self.byte_value, self.blocksize, self._humanreadable) = state
+
     def __repr__(self):
         """ return a humanreadable value which can be used to recreate the
         object.
         """
-        return "Size(" + str(self.get(Size.byte_units)) + "b" + ")"
+        return "Size(" + str(self.byte_value) + "b" + ")"
 
     def __str__(self):
-        if self.byte_value >= Size.units[Size.zb_units]:
-            s = '%.2fzb' % self.get(Size.zb_units)
-        elif self.byte_value >= Size.units[Size.eb_units]:
-            s = '%.2feb' % self.get(Size.eb_units)
-        elif self.byte_value >= Size.units[Size.pb_units]:
-            s = '%.2fpb' % self.get(Size.pb_units)
-        elif self.byte_value >= Size.units[Size.tb_units]:
-            s = '%.2ftb' % self.get(Size.tb_units)
-        elif self.byte_value >= Size.units[Size.gb_units]:
-            s = '%.2fgb' % self.get(Size.gb_units)
-        elif self.byte_value >= Size.units[Size.mb_units]:
-            s = '%.2fmb' % self.get(Size.mb_units)
-        elif self.byte_value >= Size.units[Size.kb_units]:
-            s = '%.2fkb' % self.get(Size.kb_units)
-        else:
-            s = '%.2fb' % float(self.byte_value)
-        return s
+        for units in Size.display_units:
+            if self.byte_value >= Size.units[units]:
+                return '%.2f%s' % (self.get(units), units)
+        return '%.2fb' % float(self.byte_value)
+
+    def _other_bytes(self, other):
+        """ return the byte count of other, which must be a Size
+        """
+        try:
+            return other.byte_value
+        except AttributeError:
+            raise TypeError("Size value is being compared to non-Size value")
+
+    def __eq__(self, other):
+        if not isinstance(other, Size):
+            return NotImplemented
+        return self.byte_value == other.byte_value
+
+    def __ne__(self, other):
+        if not isinstance(other, Size):
+            return NotImplemented
+        return self.byte_value != other.byte_value
+
+    def __lt__(self, other):
+        return self.byte_value < self._other_bytes(other)
+
+    def __le__(self, other):
+        return self.byte_value <= self._other_bytes(other)
 
-    def __cmp__(self, other):
-        if self.get(units=Size.byte_units) < other.get(units=Size.byte_units):
-            return -1
-        elif self.get(units=Size.byte_units) > \
-             other.get(units=Size.byte_units):
-            return 1
-        elif self.get(units=Size.byte_units) == \
-             other.get(units=Size.byte_units):
-            return 0
+    def __gt__(self, other):
+        return self.byte_value > self._other_bytes(other)
 
-        raise TypeError("Size value is being compared to non-Size value")
+    def __ge__(self, other):
+        return self.byte_value >= self._other_bytes(other)
 
     def __add__(self, other):
         """ eumulated method for adding two Size objects
         """
-        return Size(str(self.byte_value + other.byte_value) + Size.byte_units)
+        return Size.from_bytes(self.byte_value + other.byte_value)
 
     def __sub__(self, other):
         """ eumulated method for subtracting two Size objects
         """
-        return Size(str(self.byte_value - other.byte_value) + Size.byte_units)
+        return Size.from_bytes(self.byte_value - other.byte_value)
 
     def __iadd__(self, other):
         """ eumulated method for the augmented assignment for +=
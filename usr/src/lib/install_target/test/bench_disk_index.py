@@ -0,0 +1,72 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+""" bench_disk_index.py - times the lookups of the disks of a large
+manifest in thousands of synthetic discovered disks, once comparing every
+discovered disk in turn and once through the index.  Not part of the
+test suite; run it by hand:
+
+    python bench_disk_index.py [num_disks [num_manifest_disks]]
+"""
+import sys
+import time
+
+from solaris_install.target.disk_index import DiskIndex
+from solaris_install.target.physical import Disk
+
+from test_disk_index import NUM_DISKS, NUM_MANIFEST_DISKS, \
+    discovered_tree, linear_find, manifest_disks
+
+
+def main(args):
+    num_disks = int(args[0]) if len(args) > 0 else NUM_DISKS
+    num_manifest_disks = int(args[1]) if len(args) > 1 else \
+        NUM_MANIFEST_DISKS
+
+    discovered = discovered_tree(num_disks)
+    disks = discovered.get_children(class_type=Disk)
+    manifest = manifest_disks(disks, num_manifest_disks)
+
+    start = time.time()
+    linear = [linear_find(disks, disk) for disk in manifest]
+    linear_time = time.time() - start
+
+    start = time.time()
+    index = DiskIndex(discovered)
+    indexed = [index.find(disk) for disk in manifest]
+    index_time = time.time() - start
+
+    if linear != indexed:
+        print >> sys.stderr, "indexed lookups differ from linear lookups"
+        return 1
+    print "%d disks, %d manifest disks: linear %.3fs, indexed %.3fs " \
+        "(%.1fx)" % (num_disks, num_manifest_disks, linear_time, index_time,
+                     linear_time / max(index_time, 1e-6))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,209 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+""" test_disk_index.py - unittests for the index of the discovered disks,
+including manifest disk lookups over thousands of synthetic disks.
+bench_disk_index.py times the same lookups.
+"""
+import unittest
+
+from solaris_install.target import Target
+from solaris_install.target.disk_index import DiskIndex
+from solaris_install.target.physical import Disk, DiskKeyword, DiskProp
+from solaris_install.target.size import Size
+
+# synthetic system: disks on controllers, and a manifest naming some of them
+NUM_DISKS = 3000
+NUM_MANIFEST_DISKS = 500
+
+
+def linear_find(disks, disk):
+    """ the lookup of a manifest disk done by TargetSelection before the
+    index: every discovered disk compared in turn
+    """
+    for discovered_disk in disks:
+        if discovered_disk.name_matches(disk):
+            return discovered_disk
+
+        if disk.ctd is None and disk.volid is None and \
+           disk.devpath is None and disk.devid is None and \
+           disk.wwn is None:
+            if disk.is_boot_disk() and discovered_disk.is_boot_disk():
+                return discovered_disk
+            if discovered_disk.disk_prop is not None and \
+                disk.disk_prop is not None:
+                if discovered_disk.disk_prop.prop_matches(disk.disk_prop):
+                    return discovered_disk
+    return None
+
+
+def discovered_disk(number):
+    """ a discovered disk with all its identifiers set """
+    disk = Disk("disk")
+    disk.ctd = "c%dt%dd0" % (number / 16 + 1, number % 16)
+    disk.active_ctds = [disk.ctd, "c0t%016Xd0" % (0x5000C50000000000 + number)]
+    disk.devpath = "/pci@0,0/pci15ad,1976@%x/sd@%x,0" % (number / 16,
+                                                         number % 16)
+    disk.devid = "id1,sd@n5000c5%010x" % number
+    disk.wwn = "5000c5%010x" % number
+    disk.opath = "/dev/rdsk/%ss2" % disk.ctd
+    disk.disk_prop = DiskProp()
+    disk.disk_prop.dev_type = "FIXED"
+    disk.disk_prop.dev_vendor = "HITACHI" if number % 7 == 3 else "SEAGATE"
+    disk.disk_prop.dev_size = Size.from_sectors(2 ** 26 + number * 2048)
+    return disk
+
+
+def discovered_tree(num_disks):
+    discovered = Target(Target.DISCOVERED)
+    discovered.insert_children([discovered_disk(number)
+                                for number in xrange(num_disks)])
+    return discovered
+
+
+def manifest_disk(**attrs):
+    disk = Disk("disk")
+    for (attr, value) in attrs.items():
+        setattr(disk, attr, value)
+    return disk
+
+
+def manifest_disks(disks, count):
+    """ manifest disks naming discovered disks spread over the system, by
+    each kind of identifier in turn, plus names matching no disk
+    """
+    manifest = list()
+    for number in xrange(count):
+        disk = disks[(number * 7919) % len(disks)]
+        kind = number % 6
+        if kind == 0:
+            manifest.append(manifest_disk(ctd=disk.ctd))
+        elif kind == 1:
+            manifest.append(manifest_disk(ctd=disk.active_ctds[1]))
+        elif kind == 2:
+            manifest.append(manifest_disk(devpath=disk.devpath))
+        elif kind == 3:
+            manifest.append(manifest_disk(devid=disk.devid))
+        elif kind == 4:
+            manifest.append(manifest_disk(wwn=disk.wwn))
+        else:
+            manifest.append(manifest_disk(ctd="c999t%dd0" % number))
+    return manifest
+
+
+class TestDiskIndex(unittest.TestCase):
+    def setUp(self):
+        self.discovered = discovered_tree(64)
+        self.disks = self.discovered.get_children(class_type=Disk)
+        self.index = DiskIndex(self.discovered)
+
+    def assertFinds(self, disk, expected):
+        self.assertTrue(linear_find(self.disks, disk) is expected)
+        self.assertTrue(self.index.find(disk) is expected)
+
+    def test_identifiers(self):
+        disk = self.disks[20]
+        self.assertFinds(manifest_disk(ctd=disk.ctd), disk)
+        self.assertFinds(manifest_disk(ctd=disk.active_ctds[1]), disk)
+        self.assertFinds(manifest_disk(volid=None, devpath=disk.devpath),
+                         disk)
+        self.assertFinds(manifest_disk(devid=disk.devid), disk)
+        self.assertFinds(manifest_disk(wwn=disk.wwn), disk)
+        self.assertFinds(manifest_disk(opath=disk.opath), disk)
+        self.assertFinds(manifest_disk(ctd="c999t0d0"), None)
+        self.assertTrue(self.index.lookup("wwn", disk.wwn) is disk)
+        self.assertEqual(self.index.lookup("volid", "vol0"), None)
+
+    def test_first_match(self):
+        """ the first discovered disk matching any identifier is found """
+        self.disks[40].volid = self.disks[30].volid = "vol0"
+        self.assertFinds(manifest_disk(volid="vol0"), self.disks[30])
+        self.assertFinds(manifest_disk(ctd=self.disks[50].ctd,
+                                       devid=self.disks[10].devid),
+                         self.disks[10])
+        self.assertFinds(manifest_disk(ctd=self.disks[10].ctd,
+                                       devid=self.disks[50].devid),
+                         self.disks[10])
+
+    def test_properties(self):
+        self.disks[9].disk_keyword = DiskKeyword()
+
+        boot_disk = manifest_disk(disk_keyword=DiskKeyword())
+        self.assertFinds(boot_disk, self.disks[9])
+
+        # the first disk that is the boot disk or matches the properties
+        boot_disk.disk_prop = DiskProp()
+        boot_disk.disk_prop.dev_vendor = "hitachi"
+        self.assertFinds(boot_disk, self.disks[3])
+
+        by_size = manifest_disk(disk_prop=DiskProp())
+        by_size.disk_prop.dev_size = self.disks[60].disk_prop.dev_size
+        self.assertFinds(by_size, self.disks[60])
+        by_size.disk_prop.dev_size = Size.from_sectors(2 ** 27)
+        self.assertFinds(by_size, None)
+
+        # properties only count when no identifier is given
+        self.assertFinds(manifest_disk(ctd="c999t0d0",
+                                       disk_keyword=DiskKeyword()), None)
+
+    def test_discovered_tree_changes(self):
+        new_disk = discovered_disk(100)
+        self.assertEqual(self.index.find(manifest_disk(wwn=new_disk.wwn)),
+                         None)
+
+        self.discovered.insert_children(new_disk, before=self.disks[0])
+        self.assertTrue(self.index.disks[0] is new_disk)
+        self.assertTrue(self.index.find(manifest_disk(wwn=new_disk.wwn)) is
+                        new_disk)
+
+        self.discovered.delete_children(new_disk)
+        self.assertEqual(self.index.find(manifest_disk(wwn=new_disk.wwn)),
+                         None)
+        self.assertEqual(len(self.index.disks), len(self.disks))
+
+
+class TestDiskIndexLarge(unittest.TestCase):
+    """ Looks up the disks of a large manifest in thousands of discovered
+    disks, once comparing every discovered disk in turn and once through
+    the index.
+    """
+
+    def test_large(self):
+        discovered = discovered_tree(NUM_DISKS)
+        disks = discovered.get_children(class_type=Disk)
+        manifest = manifest_disks(disks, NUM_MANIFEST_DISKS)
+
+        linear = [linear_find(disks, disk) for disk in manifest]
+        index = DiskIndex(discovered)
+        indexed = [index.find(disk) for disk in manifest]
+
+        self.assertEqual(linear, indexed)
+        self.assertEqual(len([disk for disk in indexed if disk is None]),
+                         NUM_MANIFEST_DISKS / 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
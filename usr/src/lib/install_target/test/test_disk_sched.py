@@ -0,0 +1,157 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+""" test_disk_sched.py - unittests for the concurrent setup of disks, with
+a command layer recording the steps run
+"""
+import logging
+import threading
+import time
+import unittest
+
+from solaris_install.target.disk_sched import DiskScheduler, DiskSetupError
+
+STEPS = ["enable_write_cache", "update_partition_table", "label_disk",
+         "update_slices", "create_ufs_swap"]
+
+
+class FakeDisk(object):
+    """ synthetic Disk """
+    def __init__(self, ctd):
+        self.ctd = ctd
+        self.name = ctd
+
+
+class RecordingCommands(object):
+    """ command layer recording the start and end of each step, and failing
+    the steps listed in fail
+    """
+    def __init__(self, delay=0.02, fail=None):
+        self.delay = delay
+        self.fail = fail or dict()
+        self.lock = threading.Lock()
+        self.events = list()
+        self.running = 0
+        self.max_running = 0
+
+    def _step(self, step, disk, *args):
+        with self.lock:
+            self.events.append(("start", disk.ctd, step, args))
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.fail.get((disk.ctd, step), (self.delay,))[0])
+        with self.lock:
+            self.running -= 1
+            self.events.append(("end", disk.ctd, step, args))
+        if (disk.ctd, step) in self.fail:
+            raise RuntimeError("%s failed" % step)
+
+    def __getattr__(self, step):
+        if step not in STEPS:
+            raise AttributeError(step)
+        return lambda disk, *args: self._step(step, disk, *args)
+
+    def steps_of(self, ctd, event="end"):
+        return [step for (kind, disk, step, args) in self.events
+                if kind == event and disk == ctd]
+
+
+def plans(count, steps=STEPS):
+    return [(FakeDisk("c%dt0d0" % i), [(step, (i, True)) for step in steps])
+            for i in xrange(count)]
+
+
+class TestDiskScheduler(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger("test_disk_sched")
+
+    def test_order_within_disk(self):
+        commands = RecordingCommands()
+        disk_plans = plans(6)
+        self.assertEqual(DiskScheduler(disk_plans, commands, self.logger,
+                                       jobs=3).run(), [])
+        for (i, (disk, steps)) in enumerate(disk_plans):
+            self.assertEqual(commands.steps_of(disk.ctd), STEPS)
+            # each step of a disk ends before its next one starts
+            events = [e for e in commands.events if e[1] == disk.ctd]
+            self.assertEqual([e[0] for e in events],
+                             ["start", "end"] * len(STEPS))
+            self.assertTrue(all(e[3] == (i, True) for e in events))
+
+    def test_overlap_across_disks(self):
+        commands = RecordingCommands()
+        start = time.time()
+        DiskScheduler(plans(6), commands, self.logger, jobs=3).run()
+        elapsed = time.time() - start
+        self.assertEqual(commands.max_running, 3)
+        # 6 disks of 5 steps each, 3 at a time
+        self.assertTrue(elapsed < 6 * len(STEPS) * commands.delay)
+
+        # disks are started in order
+        started = list()
+        for (kind, disk, step, args) in commands.events:
+            if kind == "start" and disk not in started:
+                started.append(disk)
+        self.assertEqual(started, ["c%dt0d0" % i for i in xrange(6)])
+
+    def test_one_job(self):
+        commands = RecordingCommands(delay=0)
+        DiskScheduler(plans(3), commands, self.logger, jobs=1).run()
+        self.assertEqual(commands.max_running, 1)
+        self.assertEqual([(e[1], e[2]) for e in commands.events
+                          if e[0] == "end"],
+                         [("c%dt0d0" % i, step) for i in xrange(3)
+                          for step in STEPS])
+
+    def test_errors(self):
+        # c1t0d0 fails well after c3t0d0, which fails right away
+        commands = RecordingCommands(fail={
+            ("c1t0d0", "label_disk"): (0.1,),
+            ("c3t0d0", "update_partition_table"): (0,)})
+        errors = DiskScheduler(plans(5), commands, self.logger,
+                               jobs=5).run()
+
+        # errors are reported in the order of the disks
+        self.assertEqual([(disk.ctd, step) for (disk, step, exc_info)
+                          in errors],
+                         [("c1t0d0", "label_disk"),
+                          ("c3t0d0", "update_partition_table")])
+        self.assertTrue(isinstance(errors[0][2][1], RuntimeError))
+
+        # a failed disk runs no more steps; the others run all of theirs
+        self.assertEqual(commands.steps_of("c1t0d0"), STEPS[:3])
+        self.assertEqual(commands.steps_of("c3t0d0"), STEPS[:2])
+        for ctd in ("c0t0d0", "c2t0d0", "c4t0d0"):
+            self.assertEqual(commands.steps_of(ctd), STEPS)
+
+        self.assertEqual(str(DiskSetupError(errors)),
+                         "label_disk failed on disk c1t0d0: label_disk "
+                         "failed; update_partition_table failed on disk "
+                         "c3t0d0: update_partition_table failed")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+""" test_intervals.py - unittests for the IntervalTree class, checked against
+the sort-and-pair computation of gaps over synthetic disk layouts
+"""
+import random
+import unittest
+
+from solaris_install.target.intervals import IntervalTree
+
+DISK_SECTORS = 100000000
+NUM_CHILDREN = 2000
+CHILD_SECTORS = 10000
+
+
+class Child(object):
+    """ synthetic Slice or Partition """
+    def __init__(self, start_sector, sectors):
+        self.start_sector = start_sector
+        self.sectors = sectors
+
+    def interval(self):
+        return (self.start_sector, self.start_sector + self.sectors, self)
+
+
+def sorted_gaps(children, lo, hi, min_size=0):
+    """ gaps of children, the way get_gaps() used to compute them """
+    usage = list()
+    for child in children:
+        usage.append(child.start_sector)
+        usage.append(child.start_sector + child.sectors)
+    usage.sort()
+    usage.insert(0, lo)
+    usage.append(hi)
+    return [(usage[i], usage[i + 1]) for i in xrange(0, len(usage), 2)
+            if usage[i + 1] - usage[i] >= min_size]
+
+
+def height(node):
+    """ check the AVL invariant of the subtree node and return its height """
+    if node is None:
+        return 0
+    left = height(node.left)
+    right = height(node.right)
+    assert abs(left - right) <= 1
+    assert node.height == 1 + max(left, right)
+    return node.height
+
+
+class TestIntervalTree(unittest.TestCase):
+    def test_empty(self):
+        tree = IntervalTree()
+        self.assertEqual(len(tree), 0)
+        self.assertFalse(tree.has_overlaps)
+        self.assertEqual(tree.gaps(0, 100), [(0, 100)])
+        self.assertEqual(tree.largest_gap(0, 100), (0, 100))
+        self.assertEqual(tree.overlapping(0, 100), [])
+
+    def test_insert_and_remove(self):
+        one, two = Child(10, 10), Child(30, 10)
+        tree = IntervalTree([one.interval(), two.interval()])
+        self.assertEqual(len(tree), 2)
+        self.assertTrue(one in tree and two in tree)
+        self.assertEqual(list(tree), [one.interval(), two.interval()])
+        self.assertEqual(tree.gaps(0, 100), [(0, 10), (20, 30), (40, 100)])
+        self.assertEqual(tree.gaps(0, 100, 15), [(40, 100)])
+        self.assertEqual(tree.largest_gap(0, 50), (0, 10))
+
+        # inserting an item again moves it
+        tree.insert(50, 60, one)
+        self.assertEqual(len(tree), 2)
+        self.assertEqual(tree.span(one), (50, 60))
+        self.assertEqual(tree.gaps(0, 100), [(0, 30), (40, 50), (60, 100)])
+
+        tree.remove(one)
+        self.assertFalse(one in tree)
+        self.assertRaises(KeyError, tree.remove, one)
+        tree.discard(one)
+        self.assertEqual(tree.gaps(0, 100), [(0, 30), (40, 100)])
+
+    def test_identity(self):
+        """ items are tracked by identity, not equality """
+        tree = IntervalTree()
+        tree.insert(0, 10, [])
+        self.assertFalse([] in tree)
+        self.assertRaises(KeyError, tree.remove, [])
+
+    def test_overlaps(self):
+        one, two, three = Child(10, 20), Child(25, 10), Child(40, 0)
+        tree = IntervalTree([three.interval(), two.interval(),
+                             one.interval()])
+        self.assertTrue(tree.has_overlaps)
+        # overlapping intervals fall back to pairing the sorted sectors
+        self.assertEqual(tree.gaps(0, 100),
+                         sorted_gaps([one, two, three], 0, 100))
+        # in order of insertion
+        self.assertEqual(tree.overlapping(0, 100), [three, two, one])
+        self.assertEqual(tree.overlapping(29, 30), [two, one])
+        self.assertEqual(tree.overlapping(30, 40), [two])
+        self.assertEqual(tree.overlapping(35, 40), [])
+
+        tree.remove(two)
+        self.assertFalse(tree.has_overlaps)
+        # adjacent intervals do not overlap
+        tree.insert(30, 40, two)
+        self.assertFalse(tree.has_overlaps)
+        self.assertEqual(tree.gaps(0, 100), [(0, 10), (30, 30), (40, 40),
+                                            (40, 100)])
+
+    def test_random_layouts(self):
+        """ random layouts give the gaps and overlaps of a brute force walk
+        """
+        rand = random.Random(45)
+        for layout in xrange(200):
+            tree = IntervalTree()
+            children = list()
+            for step in xrange(rand.randint(1, 60)):
+                if children and rand.random() < 0.3:
+                    child = children.pop(rand.randrange(len(children)))
+                    tree.remove(child)
+                else:
+                    child = Child(rand.randint(0, 1000), rand.randint(0, 50))
+                    children.append(child)
+                    tree.insert(*child.interval())
+
+                height(tree._root)
+                lo = rand.choice([0, rand.randint(0, 1000)])
+                hi = rand.choice([1000, rand.randint(0, 1050)])
+                min_size = rand.choice([0, 1, 2, 10, 64])
+                self.assertEqual(tree.gaps(lo, hi, min_size),
+                                 sorted_gaps(children, lo, hi, min_size))
+
+                gaps = sorted_gaps(children, lo, hi)
+                if gaps:
+                    self.assertEqual(tree.largest_gap(lo, hi),
+                        max(gaps, key=lambda gap: gap[1] - gap[0]))
+                else:
+                    self.assertEqual(tree.largest_gap(lo, hi), None)
+
+                start = rand.randint(0, 1000)
+                end = start + rand.randint(1, 100)
+                self.assertEqual(tree.overlapping(start, end),
+                    [c for c in children if c.start_sector < end and
+                     c.start_sector + c.sectors > start])
+
+
+class TestIntervalTreeLayout(unittest.TestCase):
+    """ Lays out a disk with many children, one at a time, placing each in
+    the largest gap left, once sorting the children for every gap search
+    and once with an IntervalTree.
+    """
+
+    @staticmethod
+    def layout(find_gap):
+        rand = random.Random(45)
+        children = list()
+        tree = IntervalTree()
+        for i in xrange(NUM_CHILDREN):
+            (gap_start, gap_end) = find_gap(children, tree)
+            child = Child(gap_start + 1, rand.randint(1, CHILD_SECTORS))
+            children.append(child)
+            tree.insert(*child.interval())
+        return [c.start_sector for c in children]
+
+    def test_layout(self):
+        sorted_layout = self.layout(
+            lambda children, tree: max(sorted_gaps(children, 0, DISK_SECTORS),
+                                       key=lambda gap: gap[1] - gap[0]))
+        tree_layout = self.layout(
+            lambda children, tree: tree.largest_gap(0, DISK_SECTORS))
+        self.assertEqual(sorted_layout, tree_layout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,243 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+""" test_inventory.py - unittests for the hardware inventory, run against
+recorded command outputs
+"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from solaris_install.target import inventory
+from solaris_install.target.inventory import COLLECTORS, Inventory, \
+    InventoryError, get_inventory, parse_ifconfig, parse_prtconf
+
+PRTCONF_OUTPUT = """System Configuration:  Oracle Corporation  i86pc
+Memory size: 4096 Megabytes
+System Peripherals (PROM Nodes):
+
+Node 0x000001
+    bios-boot-device:  '80'
+"""
+
+IFCONFIG_OUTPUT = """\
+lo0: flags=2001000849<UP,LOOPBACK,RUNNING,MULTICAST,IPv4,VIRTUAL> mtu 8232 \
+index 1
+        inet 127.0.0.1 netmask ff000000
+e1000g0: flags=1004843<UP,BROADCAST,RUNNING,MULTICAST,DHCP,IPv4> mtu 1500 \
+index 2
+        inet 10.0.2.15 netmask ffffff00 broadcast 10.0.2.255
+        ether 8:0:27:c:ab:1
+e1000g1: flags=1000843<UP,BROADCAST,RUNNING,MULTICAST,IPv4> mtu 1500 index 3
+        inet 192.168.1.4 netmask ffffff00 broadcast 192.168.1.255
+        ether 8:0:27:c:ab:2
+lo0: flags=2002000849<UP,LOOPBACK,RUNNING,MULTICAST,IPv6,VIRTUAL> mtu 8252 \
+index 1
+        inet6 ::1/128
+"""
+
+# recorded outputs of the commands run on an x86 system
+OUTPUTS = {
+    (inventory.UNAME, "-m"): "i86pc\n",
+    (inventory.UNAME, "-i"): "i86pc\n",
+    (inventory.UNAME, "-p"): "i386\n",
+    (inventory.ISAINFO, "-n"): "amd64\n",
+    (inventory.PRTCONF, "-vp"): PRTCONF_OUTPUT,
+    (inventory.IFCONFIG, "-au"): IFCONFIG_OUTPUT
+}
+
+DISKS = [
+    {"name": "c7t0d0", "type": "FIXED", "status": "UP", "blocksize": 512,
+     "blocks": 41943040},
+    {"name": "c7t1d0", "type": "CDROM", "status": "UP", "blocksize": None,
+     "blocks": None}
+]
+
+
+class RecordedCommands(object):
+    """ command runner returning recorded outputs, and None for the
+    commands in fail
+    """
+    def __init__(self, fail=()):
+        self.fail = fail
+        self.cmds = list()
+
+    def __call__(self, cmd):
+        self.cmds.append(tuple(cmd))
+        if tuple(cmd) in self.fail:
+            return None
+        return OUTPUTS[tuple(cmd)]
+
+
+def collectors():
+    """ the collectors, with the disks of a fake libdiskmgt """
+    fake = dict(COLLECTORS)
+    fake["disks"] = lambda run: [dict(disk) for disk in DISKS]
+    return fake
+
+
+class TestCollectors(unittest.TestCase):
+    def test_collect(self):
+        run = RecordedCommands()
+        inv = Inventory()
+        self.assertEqual(inv.collect(collectors=collectors(), run=run),
+                         ["cpu", "disks", "memory", "network", "platform"])
+        self.assertEqual(inv.get("platform"),
+                         {"machine": "i86pc", "platform": "i86pc"})
+        self.assertEqual(inv.get("cpu"),
+                         {"processor": "i386", "isa": "amd64"})
+        self.assertEqual(inv.get("memory", "size_mb"), 4096)
+        self.assertEqual(inv.get("network"),
+                         {"interface": "e1000g0", "ipv4": "10.0.2.15",
+                          "netmask": "ffffff00", "mac": "8:0:27:c:ab:1"})
+        self.assertEqual(inv.get("disks"), DISKS)
+        self.assertEqual(len(run.cmds), len(OUTPUTS))
+
+        # sections already in the inventory are not gathered again
+        self.assertEqual(inv.collect(collectors=collectors(), run=run), [])
+        self.assertEqual(len(run.cmds), len(OUTPUTS))
+
+    def test_failures(self):
+        fake = collectors()
+
+        def fail(run):
+            raise OSError("libdiskmgt not found")
+        fake["disks"] = fail
+
+        inv = Inventory()
+        inv.collect(collectors=fake, run=RecordedCommands(
+            fail=[(inventory.UNAME, "-i"), (inventory.IFCONFIG, "-au")]))
+        self.assertEqual(inv.get("platform"),
+                         {"machine": "i86pc", "platform": None})
+        self.assertEqual(inv.get("network"), None)
+        self.assertEqual(inv.get("network", "ipv4"), None)
+        self.assertEqual(inv.get("disks"), None)
+        self.assertEqual(sorted(inv.facts), ["cpu", "memory", "platform"])
+
+        # the sections which failed are gathered again
+        self.assertEqual(inv.collect(collectors=collectors(),
+                                     run=RecordedCommands()),
+                         ["disks", "network"])
+
+    def test_parse_prtconf(self):
+        self.assertEqual(parse_prtconf(PRTCONF_OUTPUT), 4096)
+        self.assertEqual(parse_prtconf("Memory size: 2097152 Kilobytes"),
+                         2048)
+        self.assertEqual(parse_prtconf("Memory size: 2 Gigabytes"), 2048)
+        self.assertEqual(parse_prtconf("Memory size: 2 Petabytes"), 0)
+        self.assertEqual(parse_prtconf("Memory size: 0 Megabytes"), None)
+        self.assertEqual(parse_prtconf(""), None)
+        self.assertEqual(parse_prtconf(None), None)
+
+    def test_parse_ifconfig(self):
+        self.assertEqual(parse_ifconfig(
+            "e1000g0:1: flags=1000843<UP,BROADCAST,RUNNING> mtu 1500 "
+            "index 2\n\tinet 10.0.0.2 netmask ff000000\n")["interface"],
+            "e1000g0")
+        self.assertEqual(parse_ifconfig(IFCONFIG_OUTPUT.split("e1000g0")[0]),
+                         None)
+        self.assertEqual(parse_ifconfig(None), None)
+
+
+class TestInventoryFile(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "hw_inventory.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_gathered_once(self):
+        """ the facts are gathered by the first caller only """
+        run = RecordedCommands()
+        first = get_inventory(["platform", "network"], self.path,
+                              collectors(), run)
+        self.assertEqual(len(run.cmds), 3)
+        self.assertTrue(os.path.exists(self.path))
+
+        later = get_inventory(["platform", "network"], self.path,
+                              collectors(), run)
+        self.assertEqual(len(run.cmds), 3)
+        self.assertEqual(later.facts, first.facts)
+
+        # a later caller gathers the sections it is missing only
+        last = get_inventory(["cpu", "network"], self.path, collectors(), run)
+        self.assertEqual(run.cmds[3:], [(inventory.UNAME, "-p"),
+                                        (inventory.ISAINFO, "-n")])
+        self.assertEqual(sorted(last.facts), ["cpu", "network", "platform"])
+        self.assertEqual(Inventory.load(self.path).facts, last.facts)
+
+    def test_failures_not_saved(self):
+        """ sections which could not be gathered are not saved """
+        run = RecordedCommands(fail=[(inventory.IFCONFIG, "-au")])
+        first = get_inventory(["cpu", "network"], self.path, collectors(), run)
+        self.assertEqual(first.get("network"), None)
+        self.assertEqual(sorted(Inventory.load(self.path).facts), ["cpu"])
+
+        # a later caller, once the network is up, gathers the network facts
+        run = RecordedCommands()
+        later = get_inventory(["cpu", "network"], self.path, collectors(),
+                              run)
+        self.assertEqual(run.cmds, [(inventory.IFCONFIG, "-au")])
+        self.assertEqual(later.get("network", "ipv4"), "10.0.2.15")
+        self.assertEqual(Inventory.load(self.path).facts, later.facts)
+
+    def test_versions(self):
+        run = RecordedCommands()
+        Inventory({"cpu": {"processor": "sparc"}}).save(self.path)
+        self.assertEqual(get_inventory(["cpu"], self.path, collectors(),
+                                       run).get("cpu", "processor"), "sparc")
+        self.assertEqual(run.cmds, [])
+
+        # inventories of other versions, and broken ones, are gathered again
+        with open(self.path, "w") as fh:
+            json.dump({"version": inventory.INVENTORY_VERSION + 1,
+                       "facts": {"cpu": {"processor": "sparc"}}}, fh)
+        self.assertRaises(InventoryError, Inventory.load, self.path)
+        self.assertEqual(get_inventory(["cpu"], self.path, collectors(),
+                                       run).get("cpu", "processor"), "i386")
+
+        with open(self.path, "w") as fh:
+            fh.write("{")
+        self.assertRaises(InventoryError, Inventory.load, self.path)
+        self.assertEqual(get_inventory(["cpu"], self.path, collectors(),
+                                       run).get("cpu", "processor"), "i386")
+        self.assertEqual(Inventory.load(self.path).get("cpu", "processor"),
+                         "i386")
+
+    def test_unwritable(self):
+        """ an inventory which can not be saved is still returned """
+        path = os.path.join(self.tmpdir, "missing", "hw_inventory.json")
+        inv = get_inventory(["cpu"], path, collectors(), RecordedCommands())
+        self.assertEqual(inv.get("cpu", "isa"), "amd64")
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
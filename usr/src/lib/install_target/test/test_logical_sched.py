@@ -0,0 +1,194 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+""" test_logical_sched.py - unittests for the concurrent setup of zpools,
+datasets and BEs, with a command layer recording the time each task runs
+"""
+import logging
+import threading
+import time
+import unittest
+
+from solaris_install.target.logical_sched import LogicalScheduler, \
+    LogicalSetupError, common_parent, mountpoint_of, nested, \
+    nested_mountpoint
+
+
+class RecordingCommands(object):
+    """ command layer recording the start and end time of each task, and
+    failing the tasks listed in fail
+    """
+    def __init__(self, delay=0.05, fail=()):
+        self.delay = delay
+        self.fail = fail
+        self.lock = threading.Lock()
+        self.times = dict()
+        self.order = list()
+        self.running = 0
+        self.max_running = 0
+
+    def _task(self, step, name):
+        with self.lock:
+            start = time.time()
+            self.order.append(name)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+            self.times[name] = (start, time.time())
+        if name in self.fail:
+            raise RuntimeError("%s failed" % step)
+
+    def __getattr__(self, step):
+        if step not in ("create_zpool", "create_dataset", "init_be"):
+            raise AttributeError(step)
+        return lambda name: self._task(step, name)
+
+    def before(self, first, second):
+        return self.times[first][1] <= self.times[second][0]
+
+
+def target(scheduler):
+    """ add the tasks of two pools, each with a few datasets and a BE """
+    for pool in ("rpool", "data"):
+        pool_task = scheduler.add(pool, "create_zpool", (pool,))
+        dataset_tasks = [pool_task]
+        for dataset in ("export", "export/home", "var", "swap"):
+            name = "%s/%s" % (pool, dataset)
+            deps = [pool_task]
+            if dataset == "export/home":
+                deps.append(dataset_tasks[1])
+            dataset_tasks.append(scheduler.add(name, "create_dataset",
+                                               (name,), deps))
+        name = "%s/ROOT/be" % pool
+        scheduler.add(name, "init_be", (name,), dataset_tasks)
+
+
+class TestLogicalScheduler(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger("test_logical_sched")
+
+    def test_nested(self):
+        self.assertTrue(nested("rpool/export", "rpool/export/home"))
+        self.assertTrue(nested("rpool/export/home", "rpool/export"))
+        self.assertTrue(nested("rpool/export", "rpool/export"))
+        self.assertFalse(nested("rpool/export", "rpool/export2"))
+        self.assertFalse(nested("rpool/var", "rpool/export"))
+
+    def test_common_parent(self):
+        self.assertEqual(common_parent("rpool/a/b", "rpool/a/c"), "rpool/a")
+        self.assertEqual(common_parent("rpool/a/b/c", "rpool/a/b/d/e"),
+                         "rpool/a/b")
+        self.assertEqual(common_parent("rpool/a", "rpool/a/b"), "rpool")
+        self.assertEqual(common_parent("rpool/ab/c", "rpool/a/c"), "rpool")
+        self.assertEqual(common_parent("rpool/a", "tank/a"), "")
+
+    def test_mountpoint_of(self):
+        mountpoints = {"rpool/a": "/data", "rpool/l": "legacy"}
+        self.assertEqual(mountpoint_of("rpool/a", mountpoints), "/data")
+        self.assertEqual(mountpoint_of("rpool/a/b/c", mountpoints),
+                         "/data/b/c")
+        self.assertEqual(mountpoint_of("rpool/b", mountpoints), "/rpool/b")
+        self.assertEqual(mountpoint_of("rpool/b", mountpoints, "/r"), "/r/b")
+        self.assertEqual(mountpoint_of("rpool/l/b", mountpoints), None)
+
+    def test_nested_mountpoint(self):
+        self.assertTrue(nested_mountpoint("/data", "/data/b"))
+        self.assertTrue(nested_mountpoint("/data/b/", "/data"))
+        self.assertTrue(nested_mountpoint("/", "/export"))
+        self.assertTrue(nested_mountpoint("/data", "/data"))
+        self.assertFalse(nested_mountpoint("/data", "/data2"))
+        self.assertFalse(nested_mountpoint("/data", None))
+
+    def test_dependencies(self):
+        commands = RecordingCommands()
+        scheduler = LogicalScheduler(commands, self.logger, jobs=8)
+        target(scheduler)
+        start = time.time()
+        self.assertEqual(scheduler.run(), [])
+        elapsed = time.time() - start
+
+        self.assertEqual(len(commands.times), 12)
+        for pool in ("rpool", "data"):
+            for dataset in ("export", "var", "swap"):
+                self.assertTrue(commands.before(pool,
+                                                "%s/%s" % (pool, dataset)))
+                self.assertTrue(commands.before("%s/%s" % (pool, dataset),
+                                                "%s/ROOT/be" % pool))
+            self.assertTrue(commands.before("%s/export" % pool,
+                                            "%s/export/home" % pool))
+
+        # both pools at once, then their top level datasets at once, then
+        # export/home, then the BEs: 4 rounds instead of 12
+        self.assertTrue(commands.times["rpool"][0] <
+                        commands.times["data"][1])
+        self.assertEqual(commands.max_running, 6)
+        self.assertTrue(elapsed < 8 * commands.delay)
+
+    def test_one_job(self):
+        commands = RecordingCommands(delay=0)
+        scheduler = LogicalScheduler(commands, self.logger, jobs=1)
+        target(scheduler)
+        scheduler.run()
+        self.assertEqual(commands.max_running, 1)
+        # ready tasks run in the order they were added, which one at a time
+        # is the order of the tasks
+        self.assertEqual(commands.order,
+            ["rpool", "rpool/export", "rpool/export/home", "rpool/var",
+             "rpool/swap", "rpool/ROOT/be", "data", "data/export",
+             "data/export/home", "data/var", "data/swap", "data/ROOT/be"])
+
+    def test_errors(self):
+        commands = RecordingCommands(delay=0.01,
+                                     fail=("data", "rpool/export"))
+        scheduler = LogicalScheduler(commands, self.logger, jobs=4)
+        target(scheduler)
+        errors = scheduler.run()
+
+        self.assertEqual([(name, step) for (name, step, exc_info) in errors],
+                         [("rpool/export", "create_dataset"),
+                          ("data", "create_zpool")])
+
+        # a failed task skips the tasks depending on it, only
+        self.assertEqual(sorted(commands.times),
+                         ["data", "rpool", "rpool/export", "rpool/swap",
+                          "rpool/var"])
+
+        self.assertEqual(str(LogicalSetupError(errors)),
+                         "create_dataset failed on rpool/export: "
+                         "create_dataset failed; create_zpool failed on "
+                         "data: create_zpool failed")
+
+    def test_unknown_dependency(self):
+        scheduler = LogicalScheduler(RecordingCommands(), self.logger)
+        task = scheduler.add("rpool", "create_zpool", ("rpool",))
+        self.assertRaises(ValueError, scheduler.add, "rpool/export",
+                          "create_dataset", ("rpool/export",), [task + 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -683,6 +683,42 @@ class TestPartition(unittest.TestCase):
             extended_part.size.sectors - (2 * LOGICAL_ADJUSTMENT) - \
                 logical_part.size.sectors - 1)
 
+    def test_holey_object_follows_changes(self):
+        p1 = self.disk.add_partition(1, CYLSIZE, 10, Size.gb_units)
+        p2 = self.disk.add_partition(2, 20 * GBSECTOR, 10, Size.gb_units)
+        self.assertFalse(errsvc._ERRORS)
+        gaps = [(g.start_sector, g.size) for g in self.disk.get_gaps()]
+        self.assertEqual(len(gaps), 2)
+
+        # moving a partition moves the gaps around it
+        p2.start_sector = 40 * GBSECTOR
+        moved_gaps = [(g.start_sector, g.size) for g in self.disk.get_gaps()]
+        self.assertEqual(moved_gaps[0][0], gaps[0][0])
+        self.assertTrue(moved_gaps[0][1] > gaps[0][1])
+
+        # partitions marked for deletion or deleted leave no gap
+        p2.action = "delete"
+        self.assertEqual(len(self.disk.get_gaps()), 1)
+        p1.delete()
+        gaps = self.disk.get_gaps()
+        self.assertEqual(len(gaps), 1)
+        self.assertEqual(gaps[0].start_sector, CYLSIZE)
+
+        # copies of the disk have the same gaps
+        p3 = self.disk.add_partition(3, 30 * GBSECTOR, 10, Size.gb_units)
+        self.assertEqual(
+            [(g.start_sector, g.size) for g in self.disk.get_gaps()],
+            [(g.start_sector, g.size) for g in
+             copy.deepcopy(self.disk).get_gaps()])
+
+        # a partition overlapping a moved partition is detected
+        p3.start_sector = CYLSIZE
+        self.disk.add_partition(4, CYLSIZE, 1, Size.gb_units)
+        self.assertEqual(len(errsvc._ERRORS), 1)
+        error = errsvc._ERRORS[0]
+        self.assertTrue(isinstance(error.error_data[ES_DATA_EXCEPTION],
+                                   ShadowPhysical.OverlappingPartitionError))
+
     def test_add_two_active_partitions(self):
         self.disk.add_partition(1, 0, 5, Size.gb_units,
                                 bootid=Partition.ACTIVE)
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+""" test_size.py - unittests for the Size class, including Size
+construction and arithmetic over a large synthetic disk layout
+"""
+import copy
+import pickle
+import unittest
+
+from solaris_install.target.size import Size
+
+# synthetic layout: disks of partitions of slices, in sectors
+NUM_DISKS = 200
+NUM_PARTS = 4
+NUM_SLICES = 8
+SLICE_SECTORS = 2 * 1024 * 1024
+
+
+class TestSize(unittest.TestCase):
+    def test_string_constructor(self):
+        self.assertEqual(Size("1024b").byte_value, 1024)
+        self.assertEqual(Size("2mb").byte_value, 2 * 2 ** 20)
+        self.assertEqual(Size("1.5GB").byte_value, 3 * 2 ** 29)
+        self.assertEqual(Size("10secs", 4096).byte_value, 40960)
+        self.assertEqual(Size("10s").sectors, 10)
+        self.assertEqual(Size("10mb").humanreadable, "10mb")
+        self.assertRaises(ValueError, Size, "10")
+        self.assertRaises(ValueError, Size, "10xb")
+        self.assertRaises(ValueError, Size, "-10b")
+
+    def test_from_bytes_and_sectors(self):
+        self.assertEqual(Size.from_bytes(1024), Size("1kb"))
+        self.assertEqual(Size.from_bytes(1024).humanreadable, "1024b")
+        size = Size.from_sectors(100, 4096)
+        self.assertEqual(size, Size("100secs", 4096))
+        self.assertEqual(size.blocksize, 4096)
+        self.assertEqual(size.sectors, 100)
+        self.assertEqual(size.get(Size.gb_units), 409600 / float(2 ** 30))
+        self.assertRaises(ValueError, Size.from_bytes, -1)
+        self.assertRaises(ValueError, Size.from_sectors, -1)
+
+    def test_comparisons(self):
+        small, big = Size("1gb"), Size("2gb")
+        self.assertTrue(small < big <= Size("2048mb") < Size("1tb"))
+        self.assertTrue(big > small and big >= small and small != big)
+        self.assertEqual(sorted([big, small]), [small, big])
+        self.assertEqual(max([small, big]), big)
+        self.assertFalse(small == None)
+        self.assertRaises(TypeError, lambda: small < 1)
+
+    def test_arithmetic(self):
+        size = Size("4096mb") - Size("2048mb")
+        self.assertEqual(size, Size("2gb"))
+        self.assertEqual(Size("1gb") + Size("1gb"), size)
+        self.assertRaises(ValueError, lambda: Size("1mb") - Size("2mb"))
+        alias = size
+        size += Size("1gb")
+        self.assertTrue(alias is size)
+        self.assertEqual(size, Size("3gb"))
+        self.assertEqual(sum([Size("1mb")] * 4, Size("0b")), Size("4mb"))
+
+    def test_str(self):
+        self.assertEqual(str(Size("512b")), "512.00b")
+        self.assertEqual(str(Size("1536kb")), "1.50mb")
+        self.assertEqual(str(Size("2tb")), "2.00tb")
+        self.assertEqual(repr(Size("1kb")), "Size(1024b)")
+
+    def test_copy_and_pickle(self):
+        size = Size("10secs", 4096)
+        for dup in (copy.copy(size), copy.deepcopy(size),
+                    pickle.loads(pickle.dumps(size)),
+                    pickle.loads(pickle.dumps(size, 2))):
+            self.assertEqual(dup, size)
+            self.assertEqual(dup.blocksize, 4096)
+            self.assertEqual(dup.humanreadable, "10secs")
+
+        # Sizes pickled with an instance dictionary are restored too
+        old = Size.__new__(Size)
+        old.__setstate__({"humanreadable": "1kb", "blocksize": 512,
+                          "byte_value": 1024L})
+        self.assertEqual(old, Size("1kb"))
+
+    def test_no_instance_dict(self):
+        self.assertRaises(AttributeError, setattr, Size("1kb"), "foo", 1)
+
+
+class TestSizeLayout(unittest.TestCase):
+    """ Builds the sizes of a large disk/partition/slice layout, then sums
+    and sorts them, as discovery and target selection do, once with sizes
+    created from strings and once with from_sectors().
+    """
+
+    @staticmethod
+    def layout(make_size):
+        disks = []
+        for disk in xrange(NUM_DISKS):
+            parts = []
+            for part in xrange(NUM_PARTS):
+                slices = [make_size(SLICE_SECTORS + disk + part + slc)
+                          for slc in xrange(NUM_SLICES)]
+                total = make_size(0)
+                for slc in slices:
+                    total += slc
+                parts.append((total, sorted(slices)))
+            disk_size = make_size(sum(p[0].sectors for p in parts) + 1)
+            free = disk_size - max(p[0] for p in parts)
+            disks.append((disk_size, free, parts))
+        disks.sort()
+        return disks
+
+    def test_layout(self):
+        str_disks = self.layout(
+            lambda sectors: Size(str(sectors) + Size.sector_units))
+        int_disks = self.layout(Size.from_sectors)
+        self.assertEqual([d[0] for d in str_disks],
+                         [d[0] for d in int_disks])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+""" test_target_discovery.py - unittests for how TargetDiscovery publishes
+its root node in the DOC
+"""
+import unittest
+
+from solaris_install.engine.test import engine_test_utils
+from solaris_install.target import Target
+from solaris_install.target.discovery import TargetDiscovery
+from solaris_install.target.physical import Disk
+
+
+class TestTargetDiscoveryRoot(unittest.TestCase):
+    def setUp(self):
+        self.engine = engine_test_utils.get_new_engine_instance()
+        self.doc = self.engine.data_object_cache
+
+        self.td = TargetDiscovery("test target discovery")
+        # keep execute() away from the sparc disk label check
+        self.td.arch = "i386"
+        # the root nodes in the DOC when _discover() was called
+        self.seen = None
+
+    def tearDown(self):
+        engine_test_utils.reset_engine()
+
+    def _discovered_roots(self):
+        return self.doc.persistent.get_children(name=Target.DISCOVERED,
+                                                class_type=Target)
+
+    def test_root_inserted_before_discovery(self):
+        def discover():
+            self.seen = self._discovered_roots()
+            self.td.root.insert_children(Disk("disk"))
+        self.td._discover = discover
+
+        self.td.execute()
+
+        self.assertEqual(self.seen, [self.td.root])
+        self.assertEqual(self._discovered_roots(), [self.td.root])
+        self.assertEqual(len(self.td.root.get_children(class_type=Disk)), 1)
+
+    def test_root_removed_when_discovery_fails(self):
+        def discover():
+            self.seen = self._discovered_roots()
+            self.td.root.insert_children(Disk("disk"))
+            raise RuntimeError("discovery failed")
+        self.td._discover = discover
+
+        self.assertRaises(RuntimeError, self.td.execute)
+
+        self.assertEqual(self.seen, [self.td.root])
+        self.assertEqual(self._discovered_roots(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -21,12 +21,13 @@
 #
 
 #
-# Copyright (c) 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2011, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 import ctypes as C
 import os
 import os.path
+import time
 import unittest
 from solaris_install.engine.test import engine_test_utils
 from solaris_install.target import instantiation, Target
@@ -123,6 +124,26 @@ class TestDiskPartition(unittest.TestCase):
         except Exception as err:
             self.fail(str(err))
 
+    def test_disk_commands(self):
+        part = Partition(1)
+        part.action = "create"
+        part.start_sector = 0
+        part.size = Size("50" + Size.gb_units)
+        part.part_type = "primary"
+        self.disk.insert_children(part)
+
+        steps = list()
+
+        class RecordingCommands(object):
+            def __getattr__(self, step):
+                return lambda disk, *args: steps.append((disk.ctd, step))
+
+        t = instantiation.TargetInstantiation("test_ti")
+        t.disk_commands = RecordingCommands()
+        t.execute(dry_run=True)
+        self.assertEqual(steps, [("c8t1d0", "update_partition_table"),
+                                 ("c8t1d0", "label_disk")])
+
 
 class TestDiskSlice(unittest.TestCase):
     def setUp(self):
@@ -682,6 +703,73 @@ class TestZpool(unittest.TestCase):
         except Exception as err:
             self.fail(str(err))
 
+    def test_logical_commands(self):
+        class RecordingCommands(instantiation.LogicalCommands):
+            """ zfs and zpool backend recording each command run """
+            def __init__(self, logger):
+                super(RecordingCommands, self).__init__(logger)
+                self.cmds = dict()
+
+            def run(self, cmd, dry_run, env=None):
+                start = time.time()
+                time.sleep(0.05)
+                self.cmds[cmd[-1]] = (cmd, start, time.time())
+
+            def zpool_exists(self, zpool):
+                return False
+
+        for name in ["pool1", "pool2"]:
+            zpool = Zpool(name)
+            zpool.action = "preserve"
+            fs1 = Filesystem("fs1")
+            fs1.mountpoint = "/fs1"
+            fs1.insert_children(Options("fs1", {"compression": "on"}))
+            fs2 = Filesystem("fs1/fs2")
+            zvol = Zvol("vol")
+            zvol.size = "1G"
+            # siblings under a parent not in the manifest
+            fs3 = Filesystem("shared/fs3")
+            fs4 = Filesystem("shared/fs4")
+            # separate subtrees with nested mountpoints
+            outer = Filesystem("outer")
+            outer.mountpoint = "/%s/data" % name
+            inner = Filesystem("inner")
+            inner.mountpoint = "/%s/data/inner" % name
+            zpool.insert_children([fs1, fs2, zvol, fs3, fs4, outer, inner])
+            self.logical.insert_children(zpool)
+        self.target.insert_children(self.logical)
+
+        t = instantiation.TargetInstantiation("test_ti")
+        t.logical_commands = RecordingCommands(t.logger)
+        t.execute(dry_run=True)
+        cmds = t.logical_commands.cmds
+
+        # one zfs command per dataset, setting all of its properties
+        self.assertEqual(len(cmds), 16)
+        self.assertEqual(cmds["pool1/fs1"][0],
+            [ZFS, "create", "-p", "-o", "compression=on", "-o",
+             "mountpoint=/fs1", "pool1/fs1"])
+        self.assertEqual(cmds["pool1/fs1/fs2"][0],
+                         [ZFS, "create", "-p", "pool1/fs1/fs2"])
+        self.assertEqual(cmds["pool1/vol"][0],
+                         [ZFS, "create", "-p", "-V", "1G", "pool1/vol"])
+
+        # the pools, then their datasets, are created at the same time
+        self.assertTrue(cmds["pool1"][1] < cmds["pool2"][2])
+        self.assertTrue(cmds["pool1/fs1"][1] < cmds["pool1/vol"][2])
+        for name in ["pool1/fs1", "pool1/vol"]:
+            self.assertTrue(cmds["pool1"][2] <= cmds[name][1])
+        self.assertTrue(cmds["pool1/fs1"][2] <= cmds["pool1/fs1/fs2"][1])
+
+        # zfs create -p of both would create pool1/shared
+        self.assertTrue(cmds["pool1/shared/fs3"][2] <=
+                        cmds["pool1/shared/fs4"][1])
+        self.assertTrue(cmds["pool1/fs1"][1] < cmds["pool1/shared/fs3"][2])
+
+        # inner must not be mounted before outer is created on its parent
+        self.assertTrue(cmds["pool1/outer"][2] <= cmds["pool1/inner"][1])
+        self.assertTrue(cmds["pool1/fs1"][1] < cmds["pool1/outer"][2])
+
     def test_two_disk_vdev_create(self):
         self.disk1.in_zpool = "test_zpool"
         self.disk1.in_vdev = "test_mirror"
@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2010, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 # Copyright 2015, OmniTI Computer Consulting, Inc. All rights reserved.
 #
 '''Transfer IPS checkpoint. Sub-class of the checkpoint class'''
@@ -62,6 +62,7 @@ from solaris_install.transfer.info import Software
 from solaris_install.transfer.info import Source
 from solaris_install.transfer.info import ACTION, CONTENTS, \
 PURGE_HISTORY, APP_CALLBACK, IPS_ARGS, UPDATE_INDEX
+from solaris_install.transfer.ips_cache import IPSCache, FLUSH_CACHE_PROP
 from solaris_install.transfer.prog import ProgressMon
 
 PKG_CLIENT_NAME = "transfer module"
@@ -259,7 +260,8 @@ class AbstractIPS(Checkpoint):
     EXISTING = "use_existing"
     UPDATE = "update"
 
-    def __init__(self, name, zonename=None, show_stdout=False):
+    def __init__(self, name, zonename=None, show_stdout=False,
+                 cache_dir=None):
         super(AbstractIPS, self).__init__(name)
 
         # attributes per image
@@ -275,6 +277,11 @@ class AbstractIPS(Checkpoint):
         self.facets = {}
         self.properties = {}
 
+        # Cache of downloaded content and catalogs shared by the images
+        # created, if any.
+        self.cache_dir = cache_dir
+        self._cache = None
+
         # To be used for progress reporting
         self.distro_size = 0
         self.give_progress = False
@@ -713,6 +720,9 @@ class AbstractIPS(Checkpoint):
     def _cleanup(self):
         '''Method to perform any necessary cleanup needed.'''
         self.logger.debug("Cleaning up")
+        if self._cache is not None:
+            self._cache.deactivate()
+            self._cache = None
         if self.pmon:
             self.pmon.done = True
             self.pmon.wait()
@@ -786,6 +796,10 @@ class AbstractIPS(Checkpoint):
             if os.path.exists(self.dst):
                 shutil.rmtree(self.dst, ignore_errors=True)
 
+            snapshot = None
+            if self.cache_dir is not None:
+                snapshot = self._use_cache()
+
             try:
                 self.api_inst = api.image_create(
                     pkg_client_name=PKG_CLIENT_NAME,
@@ -826,6 +840,9 @@ class AbstractIPS(Checkpoint):
                     # attached as a linked image.
                     self.api_inst.reset()
 
+                if self.cache_dir is not None and not self.is_zone:
+                    self._update_catalogs(snapshot)
+
             except api_errors.VersionException, ips_err:
                 self.logger.exception("Error creating the IPS image")
                 raise ValueError("The IPS API version specified, "
@@ -834,6 +851,59 @@ class AbstractIPS(Checkpoint):
                                        "the expected version, "
                                        + str(ips_err.expected_version))
 
+    def _cache_key(self):
+        '''Return the name of the catalog snapshot of the primary
+           publisher.
+        '''
+        return IPSCache.snapshot_key(self._publ, self._origin)
+
+    def _use_cache(self):
+        '''Point the image to be created at the shared cache: downloads
+           go to, and are kept in, the shared content cache.  Returns the
+           directory of a fresh catalog snapshot to seed the image with, in
+           which case the catalogs are not retrieved at image creation.
+           Zone images get their catalogs through the system repository,
+           so are not seeded.
+        '''
+        self._cache = IPSCache(self.cache_dir, logger=self.logger)
+        self._cache.activate()
+        self.logger.debug("Using IPS cache %s" % self.cache_dir)
+
+        props = dict(self._image_args.get("props", {}))
+        props[FLUSH_CACHE_PROP] = False
+        self._image_args["props"] = props
+
+        if self.is_zone:
+            return None
+        snapshot = self._cache.fresh_snapshot(self._cache_key())
+        if snapshot is not None:
+            self._image_args["refresh_allowed"] = False
+        return snapshot
+
+    def _update_catalogs(self, snapshot):
+        '''Seed the catalogs of the image just created from snapshot and
+           fetch the updates published since.  If there is no snapshot, or
+           it cannot be used, the image's catalogs become the new snapshot.
+        '''
+        imgdir = self.api_inst.img.imgdir
+        if snapshot is not None:
+            seeded = self._cache.seed(imgdir, snapshot)
+
+            # Reload the image with the catalogs just copied in.
+            self.api_inst = api.ImageInterface(self.dst, PKG5_API_VERSION,
+                self.prog_tracker, None, PKG_CLIENT_NAME)
+            os.chdir("/")
+            self.api_inst.refresh(full_refresh=not seeded, immediate=True)
+            if seeded:
+                return
+
+        try:
+            self._cache.save(imgdir, self._cache_key())
+        except (EnvironmentError, shutil.Error) as err:
+            # The image is fine; only later images will miss the snapshot.
+            self.logger.warning("Unable to save catalog snapshot in %s: %s" %
+                                (self.cache_dir, err))
+
     def print_repository_uris(self):
         '''print_repository_uris() - simple method to print out the
            repository uris used
@@ -855,11 +925,12 @@ class TransferIPS(AbstractIPS):
     VALUE_SEPARATOR = ","
 
     # Default values for arguments
-    DEFAULT_ARG = {'zonename': None, 'show_stdout': False}
+    DEFAULT_ARG = {'zonename': None, 'show_stdout': False, 'cache_dir': None}
 
     def __init__(self, name, arg=DEFAULT_ARG):
         super(TransferIPS, self).__init__(name, zonename=arg.get('zonename'),
-                                          show_stdout=arg.get('show_stdout'))
+                                          show_stdout=arg.get('show_stdout'),
+                                          cache_dir=arg.get('cache_dir'))
 
         # Holds the list of transfer dictionaries
         self._transfer_list = []
@@ -1128,8 +1199,8 @@ class TransferIPS(AbstractIPS):
 
 class TransferIPSAttr(AbstractIPS):
     '''IPS Transfer class to take input from the attributes.'''
-    def __init__(self, name):
-        super(TransferIPSAttr, self).__init__(name)
+    def __init__(self, name, cache_dir=None):
+        super(TransferIPSAttr, self).__init__(name, cache_dir=cache_dir)
         # Attributes per transfer
         self.action = None
         self.contents = None
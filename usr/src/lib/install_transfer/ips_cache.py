@@ -0,0 +1,201 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+'''Cache shared by the IPS images created by the transfer checkpoints
+
+Creating an image normally starts from nothing: every catalog is fetched
+in full and every file is downloaded again, even when the same build host
+or install server created an image from the same repository minutes ago.
+IPSCache keeps, under one directory:
+
+    content/    the pkg(5) download cache, addressed by content hash.
+                Images created with the cache download into it (through
+                PKG_CACHEDIR) and keep its contents once installed.
+    catalog/    a snapshot of the publisher and known catalogs of the
+                last image created for each set of origins.  A new image
+                is seeded from a snapshot younger than max_age, then
+                refreshed incrementally, so only catalog updates published
+                since the snapshot are fetched.
+'''
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+# environment variable naming the pkg(5) download cache
+PKG_CACHEDIR = "PKG_CACHEDIR"
+
+# image property removing downloaded content once installed
+FLUSH_CACHE_PROP = "flush-content-cache-on-success"
+
+# default age, in seconds, after which a catalog snapshot is not used
+CATALOG_MAX_AGE = 24 * 60 * 60
+
+CONTENT_DIR = "content"
+CATALOG_DIR = "catalog"
+SNAPSHOT_INFO = "snapshot.json"
+
+
+class IPSCache(object):
+    '''Shared download cache and catalog snapshots under cache_dir'''
+
+    def __init__(self, cache_dir, max_age=CATALOG_MAX_AGE, logger=None):
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.logger = logger
+        self._saved_env = None
+
+    @property
+    def content_dir(self):
+        '''Directory of the shared download cache'''
+        return os.path.join(self.cache_dir, CONTENT_DIR)
+
+    def _debug(self, msg):
+        '''Log msg if a logger was given'''
+        if self.logger is not None:
+            self.logger.debug(msg)
+
+    def activate(self):
+        '''Point the images subsequently created or loaded by this process
+        at the shared download cache.
+        '''
+        if not os.path.isdir(self.content_dir):
+            os.makedirs(self.content_dir)
+        if self._saved_env is None:
+            self._saved_env = (os.environ.get(PKG_CACHEDIR),)
+        os.environ[PKG_CACHEDIR] = self.content_dir
+
+    def deactivate(self):
+        '''Restore the download cache in use before activate()'''
+        if self._saved_env is None:
+            return
+        (saved,) = self._saved_env
+        if saved is None:
+            os.environ.pop(PKG_CACHEDIR, None)
+        else:
+            os.environ[PKG_CACHEDIR] = saved
+        self._saved_env = None
+
+    @staticmethod
+    def snapshot_key(prefix, origins):
+        '''Return the name of the catalog snapshot of the publisher prefix
+        with the list of origins.
+        '''
+        ident = json.dumps([prefix, sorted(str(origin) for origin in
+                                           origins)])
+        return hashlib.sha1(ident).hexdigest()
+
+    def _snapshot_dir(self, key):
+        '''Return the directory of the catalog snapshot key'''
+        return os.path.join(self.cache_dir, CATALOG_DIR, key)
+
+    def fresh_snapshot(self, key):
+        '''Return the directory of the catalog snapshot key, or None if
+        there is none or it is older than max_age.
+        '''
+        snap_dir = self._snapshot_dir(key)
+        try:
+            with open(os.path.join(snap_dir, SNAPSHOT_INFO)) as info_file:
+                info = json.load(info_file)
+        except (IOError, ValueError):
+            return None
+        age = time.time() - info.get("created", 0)
+        if age < 0 or age > self.max_age:
+            self._debug("Catalog snapshot %s is stale" % key)
+            return None
+        return snap_dir
+
+    @staticmethod
+    def _catalog_dirs(imgdir):
+        '''Return the catalog directories of the image metadata directory
+        imgdir, relative to imgdir: one per publisher, and the known
+        catalog.
+        '''
+        dirs = []
+        pub_root = os.path.join(imgdir, "publisher")
+        if os.path.isdir(pub_root):
+            for prefix in sorted(os.listdir(pub_root)):
+                dirs.append(os.path.join("publisher", prefix, "catalog"))
+        dirs.append(os.path.join("state", "known"))
+        return dirs
+
+    def seed(self, imgdir, snap_dir):
+        '''Replace the catalogs of the image metadata directory imgdir with
+        those of the snapshot in snap_dir.  The image must be reloaded
+        afterwards.  Returns False if the snapshot could not be copied,
+        for instance because it was replaced meanwhile; the image's
+        catalogs must then be refreshed in full.
+        '''
+        try:
+            for rel_dir in self._catalog_dirs(snap_dir):
+                src = os.path.join(snap_dir, rel_dir)
+                if not os.path.isdir(src):
+                    continue
+                dst = os.path.join(imgdir, rel_dir)
+                if os.path.exists(dst):
+                    shutil.rmtree(dst)
+                shutil.copytree(src, dst)
+        except (EnvironmentError, shutil.Error) as err:
+            self._debug("Unable to seed catalogs from %s: %s" %
+                        (snap_dir, err))
+            return False
+        self._debug("Seeded catalogs of %s from %s" % (imgdir, snap_dir))
+        return True
+
+    def save(self, imgdir, key):
+        '''Replace the catalog snapshot key with the catalogs of the image
+        metadata directory imgdir.
+        '''
+        catalog_root = os.path.join(self.cache_dir, CATALOG_DIR)
+        if not os.path.isdir(catalog_root):
+            os.makedirs(catalog_root)
+        tmp_dir = tempfile.mkdtemp(dir=catalog_root, prefix=".new-")
+        try:
+            for rel_dir in self._catalog_dirs(imgdir):
+                src = os.path.join(imgdir, rel_dir)
+                if os.path.isdir(src):
+                    shutil.copytree(src, os.path.join(tmp_dir, rel_dir))
+            with open(os.path.join(tmp_dir, SNAPSHOT_INFO), "w") as info:
+                json.dump({"created": time.time()}, info)
+
+            # Swap the new snapshot in.  An image being seeded from the
+            # old snapshot at the same time fails to and is refreshed in
+            # full instead.
+            snap_dir = self._snapshot_dir(key)
+            old_dir = None
+            if os.path.exists(snap_dir):
+                old_dir = tempfile.mkdtemp(dir=catalog_root, prefix=".old-")
+                os.rename(snap_dir, os.path.join(old_dir, key))
+            os.rename(tmp_dir, snap_dir)
+            if old_dir is not None:
+                shutil.rmtree(old_dir, ignore_errors=True)
+        except:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self._debug("Saved catalogs of %s as snapshot %s" % (imgdir, key))
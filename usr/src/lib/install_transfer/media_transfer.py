@@ -28,9 +28,12 @@
 media transfer checkpoint. Sub-class of the checkpoint class.
 """
 
+import hashlib
+import logging
 import os
 import platform
-import logging
+import re
+import threading
 
 from solaris_install import Popen, run
 from solaris_install.data_object.cache import DataObjectCache
@@ -42,7 +45,7 @@ from solaris_install.target.size import Size
 from solaris_install.transfer.info import Software, Source, Destination, \
     CPIOSpec, Dir
 
-from urllib2 import Request, urlopen
+from urllib2 import HTTPError, Request, URLError, urlopen
 
 TRANSFER_MANIFEST_NAME = ".transfer-manifest.xml"
 
@@ -70,6 +73,20 @@ IMAGE_INFO_FILENAME = ".image_info"
 IMAGE_SIZE_KEYWORD = "IMAGE_SIZE"
 IMAGE_GRUB_TITLE_KEYWORD = "GRUB_TITLE"
 
+# Number of bytes read from the server and written out at a time
+DOWNLOAD_BUFSIZE = 1024 * 1024
+
+# Files at least this large are fetched as several ranged requests in
+# parallel, if the server supports byte ranges
+SEGMENTED_DOWNLOAD_MIN_SIZE = 64 * 1024 * 1024
+DOWNLOAD_SEGMENTS = 4
+
+# Download progress is logged every time this percentage is crossed
+DOWNLOAD_PROGRESS_STEP = 10
+
+# total size in the Content-Range header of a 416 response
+CONTENT_RANGE_TOTAL_RE = re.compile(r"bytes \*/(\d+)$")
+
 
 class InvalidInstallEnvError(Exception):
     '''Invalid install environment error
@@ -77,6 +94,12 @@ class InvalidInstallEnvError(Exception):
     pass
 
 
+class DownloadError(Exception):
+    '''Error downloading a file from the install server
+    '''
+    pass
+
+
 def is_net_booted(logger):
     '''Determine whether the application is running from a media booted
        environment or a net booted environment.
@@ -209,21 +232,299 @@ def get_image_size(logger):
     return (Size(str(img_size) + Size.kb_units).get(Size.mb_units))
 
 
-def download_files(url, dst, logger):
+class _DownloadProgress(object):
+    '''Thread-safe byte counter which logs the progress of a download
+       each time another DOWNLOAD_PROGRESS_STEP percent has completed.
+    '''
+
+    def __init__(self, logger, name, total, done=0):
+        self.logger = logger
+        self.name = name
+        self.total = total
+        self.done = done
+        self._next_pct = DOWNLOAD_PROGRESS_STEP
+        self._lock = threading.Lock()
+
+    def update(self, nbytes):
+        '''Account for nbytes more bytes having been written'''
+        with self._lock:
+            self.done += nbytes
+            if not self.total:
+                return
+            pct = self.done * 100 / self.total
+            if pct >= self._next_pct:
+                self.logger.info("Downloaded %d of %d bytes (%d%%) of %s" %
+                                 (self.done, self.total, pct, self.name))
+                self._next_pct = \
+                    (pct / DOWNLOAD_PROGRESS_STEP + 1) * DOWNLOAD_PROGRESS_STEP
+
+
+def _copy_stream(src, dst_file, bufsize, progress, hasher=None, limit=None):
+    '''Copy src, a file-like object, into dst_file bufsize bytes at a time,
+       stopping after limit bytes if limit is given.  Every chunk is fed
+       to hasher, if given, and accounted for in progress.
+
+       Returns: the number of bytes copied
+    '''
+    copied = 0
+    while limit is None or copied < limit:
+        if limit is None:
+            chunk = src.read(bufsize)
+        else:
+            chunk = src.read(min(bufsize, limit - copied))
+        if not chunk:
+            break
+        dst_file.write(chunk)
+        if hasher is not None:
+            hasher.update(chunk)
+        copied += len(chunk)
+        progress.update(len(chunk))
+    return copied
+
+
+def _hash_file(path, hasher, bufsize):
+    '''Feed the content of the file at path into hasher'''
+    with open(path, "rb") as fh:
+        while True:
+            chunk = fh.read(bufsize)
+            if not chunk:
+                break
+            hasher.update(chunk)
+
+
+def _download_segment(url, dst, start, end, bufsize, progress, errors):
+    '''Fetch bytes start through end (inclusive) of url into the same
+       offsets of the pre-sized file dst.  Any exception is appended to
+       errors, as this runs in a separate thread.
+    '''
+    try:
+        request = Request(url)
+        request.add_header("Range", "bytes=%d-%d" % (start, end))
+        url_request = urlopen(request)
+        try:
+            if url_request.getcode() != 206:
+                raise DownloadError("Server ignored range request for %s" %
+                                    url)
+            with open(dst, "r+b") as dst_file:
+                dst_file.seek(start)
+                length = end - start + 1
+                copied = _copy_stream(url_request, dst_file, bufsize,
+                                      progress, limit=length)
+            if copied != length:
+                raise DownloadError("Short read for bytes %d-%d of %s: "
+                                    "got %d of %d bytes" %
+                                    (start, end, url, copied, length))
+        finally:
+            url_request.close()
+    except Exception as err:
+        errors.append(err)
+
+
+def _download_segmented(url, dst, total, segments, bufsize, progress):
+    '''Download url into dst as "segments" ranged requests running in
+       parallel.  The file is first created at its full size so each
+       segment can be written in place.
+    '''
+    with open(dst, "wb") as dst_file:
+        dst_file.truncate(total)
+
+    seg_size = (total + segments - 1) / segments
+    errors = list()
+    threads = list()
+    for start in xrange(0, total, seg_size):
+        end = min(start + seg_size, total) - 1
+        thread = threading.Thread(target=_download_segment,
+                                  args=(url, dst, start, end, bufsize,
+                                        progress, errors))
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise DownloadError("Segmented download of %s failed: %s" %
+                            (url, errors[0]))
+
+
+def _head(url):
+    '''Send a HEAD request for url.
+
+       Returns: a tuple of the length of url, or None if the server did
+       not report it, and whether the server accepts byte ranges
+    '''
+    request = Request(url)
+    request.get_method = lambda: "HEAD"
+    url_request = urlopen(request)
+    try:
+        info = url_request.info()
+        length = info.getheader("Content-Length")
+        accept_ranges = info.getheader("Accept-Ranges")
+    finally:
+        url_request.close()
+    if length is not None:
+        length = int(length)
+    return (length, accept_ranges == "bytes")
+
+
+def _unsatisfiable_size(url, err):
+    '''Return the size of url, as reported by err, the 416 response to
+       a range request starting at or past its end.  The size is taken
+       from the Content-Range header, if present, or else from a HEAD
+       request.  Returns None if the size could not be determined.
+    '''
+    content_range = None
+    if err.info() is not None:
+        content_range = err.info().getheader("Content-Range")
+    match = CONTENT_RANGE_TOTAL_RE.match(content_range or "")
+    if match is not None:
+        return int(match.group(1))
+    try:
+        return _head(url)[0]
+    except URLError:
+        return None
+
+
+def download_files(url, dst, logger, bufsize=DOWNLOAD_BUFSIZE, resume=False,
+                   checksum=None, hash_algorithm="sha1",
+                   segments=DOWNLOAD_SEGMENTS,
+                   segment_min_size=SEGMENTED_DOWNLOAD_MIN_SIZE):
     '''Download the file specified in the URL to a
        specified local location.
+
+       The file is streamed to disk bufsize bytes at a time, so memory
+       use does not depend on the size of the file, and progress is
+       logged through logger as it arrives.
+
+       Inputs:
+           url: URL of the file to download
+           dst: local path to write the file to
+           logger: Instance of Logger to use for logging
+           bufsize: number of bytes to read and write at a time
+           resume: if True and dst already exists, treat it as the first
+               part of the file and request only the remainder.  The
+               whole file is downloaded again if the server does not
+               honor the range request, or if dst is not shorter than
+               the file but differs from it in size.
+           checksum: if given, the expected hex digest of the file.
+               DownloadError is raised, and dst removed, on mismatch.
+           hash_algorithm: hashlib algorithm name used for checksum
+           segments: maximum number of parallel ranged requests used
+               for large files.  1 disables segmented downloads.
+           segment_min_size: files of at least this many bytes are
+               downloaded in segments, if a HEAD request shows the
+               server supports ranges.  If any segment fails the file
+               is downloaded again in a single stream.
+
+       Raises:
+           DownloadError: the file could not be completely downloaded,
+               or the checksum did not match
     '''
 
     logger.debug("Planning to download: " + url)
 
-    request = Request(url)
-
-    url_request = urlopen(request)
     dst_dir = os.path.dirname(dst)
-    if not os.path.exists(dst_dir):
+    if dst_dir and not os.path.exists(dst_dir):
         os.makedirs(dst_dir)
-    with open(dst, "w") as dst_file:
-        dst_file.write(url_request.read())
+
+    offset = 0
+    if resume and os.path.exists(dst):
+        offset = os.path.getsize(dst)
+
+    hasher = None
+    if checksum is not None:
+        hasher = hashlib.new(hash_algorithm)
+
+    complete = False
+    url_request = None
+    if offset:
+        request = Request(url)
+        request.add_header("Range", "bytes=%d-" % offset)
+        try:
+            url_request = urlopen(request)
+        except HTTPError as err:
+            if err.code != 416:
+                raise
+            # The requested range starts at or past the end of the file.
+            # It is only complete if it is exactly as long as the file.
+            size = _unsatisfiable_size(url, err)
+            if size == offset:
+                logger.debug("%s is already fully downloaded" % dst)
+                if hasher is not None:
+                    _hash_file(dst, hasher, bufsize)
+                complete = True
+            else:
+                logger.debug("%s has %d bytes but %s has %s, downloading "
+                             "it again" % (dst, offset, url, size))
+                offset = 0
+
+    if not complete and url_request is None:
+        length, accept_ranges = None, False
+        if segments > 1:
+            try:
+                length, accept_ranges = _head(url)
+            except URLError as err:
+                logger.debug("HEAD request for %s failed: %s" % (url, err))
+
+        if accept_ranges and length is not None and \
+            length >= segment_min_size:
+            logger.debug("Downloading %s in %d segments" % (url, segments))
+            progress = _DownloadProgress(logger, os.path.basename(dst),
+                                         length)
+            try:
+                _download_segmented(url, dst, length, segments, bufsize,
+                                    progress)
+            except DownloadError as err:
+                logger.warning("%s, downloading it in a single stream" %
+                               err)
+            else:
+                if hasher is not None:
+                    _hash_file(dst, hasher, bufsize)
+                complete = True
+
+        if not complete:
+            url_request = urlopen(Request(url))
+
+    if url_request is not None:
+        try:
+            length = url_request.info().getheader("Content-Length")
+            if length is not None:
+                length = int(length)
+
+            if offset and url_request.getcode() == 206:
+                logger.debug("Resuming download of %s at byte %d" %
+                             (url, offset))
+                mode = "ab"
+                if hasher is not None:
+                    _hash_file(dst, hasher, bufsize)
+            else:
+                offset = 0
+                mode = "wb"
+
+            total = None
+            if length is not None:
+                total = offset + length
+
+            progress = _DownloadProgress(logger, os.path.basename(dst),
+                                         total, offset)
+            with open(dst, mode) as dst_file:
+                _copy_stream(url_request, dst_file, bufsize, progress,
+                             hasher)
+        finally:
+            url_request.close()
+
+        # A short file is left in place so a later call can resume it
+        if total is not None and os.path.getsize(dst) != total:
+            raise DownloadError("Incomplete download of %s: got %d of %d "
+                                "bytes" % (url, os.path.getsize(dst), total))
+
+    if hasher is not None and hasher.hexdigest() != checksum.lower():
+        os.unlink(dst)
+        raise DownloadError("Checksum mismatch for %s: expected %s, got %s" %
+                            (url, checksum, hasher.hexdigest()))
+
+    logger.debug("Downloaded %s to %s (%d bytes)" %
+                 (url, dst, os.path.getsize(dst)))
 
 
 def init_prepare_media_transfer(name):
@@ -490,6 +791,6 @@ class NetPrepareMediaTransfer(AbstractCheckpoint):
                         file)
                     self.logger.debug("Downloading " + file)
                     download_files(server_url + "/" + file, dst_name,
-                                   self.logger)
+                                   self.logger, resume=True)
 
         unmount_libc_overlay(self.logger)
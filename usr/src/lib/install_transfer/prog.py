@@ -21,7 +21,7 @@
 #
 
 #
-# Copyright (c) 2010, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 '''Progress monitor for the transfer checkpoint'''
@@ -44,6 +44,8 @@ class ProgressMon(object):
         self.sleep_for = sleep_for
         self.thread1 = None
         self.prog_init_completed = False
+        self.completed_size = 0
+        self._lock = threading.Lock()
 
     def startmonitor(self, filesys, distrosize, initpct=0, endpct=100):
         '''Start a thread to monitor the progress populating a file system.
@@ -63,6 +65,16 @@ class ProgressMon(object):
         while not self.prog_init_completed:
             time.sleep(0.5)
 
+    def item_done(self, size):
+        '''Record that an item, such as a package, of the given size in
+           kilobytes has been transferred.  Progress is reported from the
+           larger of the total size of the items done and the growth of the
+           file system, so items completing while others are still being
+           transferred are accounted for.
+        '''
+        with self._lock:
+            self.completed_size += size
+
     def wait(self, timeout=120):
         '''Wait until the thread whose join() method is called terminates.
 
@@ -121,7 +133,7 @@ class ProgressMon(object):
             fssz = self.__fssize(filesystem)
             if fssz is None:
                 continue
-            fsgain = fssz - initsize
+            fsgain = max(fssz - initsize, self.completed_size)
 
             # in case there's a negative change in file system size, because
             # files are deleted, skip over so we don't report negative
@@ -20,15 +20,13 @@
 # CDDL HEADER END
 #
 #
-# Copyright (c) 2010, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 '''Transfer SVR4 checkpoint. Sub-class of the checkpoint class'''
 
 import abc
-import errno
-import httplib
 import os
-import re
+import shutil
 import urllib2
 
 from osol_install.install_utils import dir_size
@@ -45,6 +43,9 @@ from solaris_install.transfer.info import Source
 from solaris_install.transfer.info import SVR4Spec
 from solaris_install.transfer.info import ACTION, CONTENTS, SVR4_ARGS
 from solaris_install.transfer.prog import ProgressMon
+from solaris_install.transfer.svr4_index import DatastreamIndex
+from solaris_install.transfer.svr4_sched import CpioError, \
+    PkgaddScheduler, dir_depends
 
 
 class AbstractSVR4(AbstractCheckpoint):
@@ -69,18 +70,18 @@ class AbstractSVR4(AbstractCheckpoint):
     TMPDIR = "/system/volatile/"
     ADMIN_FILE_DIR = ROOT + TMPDIR
     ADMIN_FILE = ADMIN_FILE_DIR + "/svr4_admin"
+    # Index of the datastreams installed from, kept across installs
+    INDEX_FILE = ROOT + "/var/tmp/install/svr4_index.json"
     BYTES_PER_KB = 1024
     DEFAULT_PKGADD_ARGS = "-n -a %s -d %s -R %s"
     DEFAULT_PKGRM_ARGS = "-n -a %s -R %s"
     DEFAULT_PROG_EST = 10
     DEFAULT_SIZE = 1024
     PKGADD = "/usr/sbin/pkgadd"
+    # Number of pkgadd processes run at once when installing packages
+    # from a local directory or datastream with the default args
+    PKGADD_JOBS = 4
     PKGRM = "/usr/sbin/pkgrm"
-    SVR4_DS_HDR_START = "# PaCkAgE DaTaStReAm"
-    SVR4_DS_HDR_END = "# end of header"
-
-    # Used to split a URL into its components.
-    URL_RE = re.compile("(\w*)://([^/]*)((/.*)*)")
 
     # Constants related to types of package sources.
     LOCAL_DIR_TYPE = "Local Directory"
@@ -125,6 +126,15 @@ class AbstractSVR4(AbstractCheckpoint):
         self._transfer_list = []
         self.input_parsed = False
 
+        # Parallel installation of packages.  runner starts each pkgadd;
+        # it can be replaced to run the scheduler against another command.
+        self.src_type = None
+        self.pkg_sizes = dict()
+        self.pkgadd_jobs = AbstractSVR4.PKGADD_JOBS
+        self.runner = Popen
+        self.scheduler = None
+        self.ds_index = DatastreamIndex(AbstractSVR4.INDEX_FILE)
+
     def get_src_type(self, in_file_name):
         '''Returns type of package source
 
@@ -178,33 +188,12 @@ class AbstractSVR4(AbstractCheckpoint):
 
     def get_size_via_http(self, url):
         ''' Returns the size of an http or https URL file in Kb'''
-
-        # Split out the host from the rest of the url
-        re_match = AbstractSVR4.URL_RE.match(url)
-        if re_match is None:
-            raise IOError(errno.EINVAL, "Malformed URL specified: %s" % url)
-        protocol = re_match.group(1).lower()
-
-        # Make the query.
-        if protocol == "http":
-            conn = httplib.HTTPConnection(re_match.group(2))
-        elif protocol == "https":
-            conn = httplib.HTTPSConnection(re_match.group(2))
-        else:
-            raise IOError(errno.EINVAL, "Non-http/https URL specified: %s" %
-                          url)
         try:
-            conn.request("HEAD", re_match.group(3))
-            response = conn.getresponse()
-            size = response.getheader("content-length")
-            try:
-                isize = int(size) / AbstractSVR4.BYTES_PER_KB
-            except ValueError:
-                self.logger.error("Invalid size returned for %s" % url)
-                raise
-        finally:
-            conn.close()
-        return isize
+            length = self.ds_index.remote_length(url)
+        except ValueError:
+            self.logger.error("Invalid size returned for %s" % url)
+            raise
+        return length / AbstractSVR4.BYTES_PER_KB
 
     def ds_pkg_size_and_verify(self, ds_name, pkg_list):
         '''Verifies datastream URL and contents, returns size of desired pkgs.
@@ -216,27 +205,21 @@ class AbstractSVR4(AbstractCheckpoint):
         '''
         total_size = 0
 
-        ds_fd = open(ds_name, "r")
+        # The header is read once per version of the datastream, and kept
+        # in the index.
+        try:
+            entry = self.ds_index.local(ds_name)
+        except ValueError:
+            self.logger.error("Invalid header found in datastream %s" %
+                             ds_name)
+            raise
 
-        # Check the header.  Read package sizes.  Create dict of pkgs and sizes
-        line = ds_fd.readline().strip()
-        if line != AbstractSVR4.SVR4_DS_HDR_START:
-            raise ValueError("%s is not an SVR4 datastream file" % ds_name)
-        # Read the header, getting the size of the packages contained.
         # Create a dict of packages and sizes.
-        line = ds_fd.readline().strip()
         pkg_dict = dict()
-        while line != AbstractSVR4.SVR4_DS_HDR_END:
-            try:
-                (pkg_name, parts, size) = line.split(" ", 2)
-                # Size in datastream is in 512b blocks.  Divide by 2 to get Kb.
-                pkg_dict[pkg_name] = ((int(size) * int(parts)) + 1) / 2
-            except ValueError:
-                self.logger.error("Invalid header found in datastream %s" %
-                                 ds_name)
-                ds_fd.close()
-                raise
-            line = ds_fd.readline().strip()
+        for (pkg_name, parts, size) in entry["packages"]:
+            # Size in datastream is in 512b blocks.  Divide by 2 to get Kb.
+            pkg_dict[pkg_name] = ((size * parts) + 1) / 2
+            self.pkg_sizes[pkg_name] = pkg_dict[pkg_name]
 
         # Check that all desired pkgs are in the datastream.
         # Check all before failing, so can dump them all out.
@@ -251,7 +234,6 @@ class AbstractSVR4(AbstractCheckpoint):
                     self.logger.debug("Found SVR4 pkg to "
                                      "install: %s, size: %sKb" %
                                      (pkg_name, pkg_dict[pkg_name]))
-        ds_fd.close()
 
         # Dump the wad of missing package names.
         if bad_pkg_names:
@@ -290,6 +272,7 @@ class AbstractSVR4(AbstractCheckpoint):
             # Add size to cumulative total.
             elif not bad_pkg_names:
                 pkg_size = dir_size(pkgroot) / AbstractSVR4.BYTES_PER_KB
+                self.pkg_sizes[pkg] = pkg_size
                 self.logger.debug("Found SVR4 pkg to install: %s, size: %sKb" %
                                  (pkgroot, pkg_size))
                 total_size += pkg_size
@@ -366,6 +349,8 @@ class AbstractSVR4(AbstractCheckpoint):
         self._cancel_event = True
         if self.svr4_process:
             self.svr4_process.kill()
+        if self.scheduler:
+            self.scheduler.cancel()
 
     def check_cancel_event(self):
         '''Check the _cancel_event attribute to see if a cancel event  has been
@@ -383,6 +368,86 @@ class AbstractSVR4(AbstractCheckpoint):
 
         if os.path.exists(AbstractSVR4.ADMIN_FILE):
             os.unlink(AbstractSVR4.ADMIN_FILE)
+        for worker in range(self.pkgadd_jobs):
+            admin_file = "%s.%d" % (AbstractSVR4.ADMIN_FILE, worker)
+            if os.path.exists(admin_file):
+                os.unlink(admin_file)
+
+    def _can_parallelize(self, trans_val):
+        '''Returns True if the packages of trans_val can be installed by
+        several pkgadd processes at once: packages are being installed from
+        a local source with the default args.
+        '''
+        return (trans_val.get(ACTION) == "install" and
+                self.pkgadd_jobs > 1 and
+                len(trans_val.get(CONTENTS)) > 1 and
+                self.src_type in (AbstractSVR4.LOCAL_DIR_TYPE,
+                                  AbstractSVR4.LOCAL_DSTR_TYPE) and
+                trans_val.get(SVR4_ARGS) == AbstractSVR4.DEFAULT_PKGADD_ARGS %
+                (self.ADMIN_FILE, self.src, self.dst))
+
+    def _parallel_pkgadd(self, pkgs):
+        '''Install pkgs with several pkgadd processes at once, each
+        package only once the packages it depends on are installed.
+        '''
+        if self.src_type == AbstractSVR4.LOCAL_DSTR_TYPE:
+            try:
+                depends = self.ds_index.depends(self.src, pkgs)
+            except CpioError as err:
+                self.logger.error("Invalid cpio archive found in "
+                                  "datastream %s: %s" % (self.src, err))
+                raise
+        else:
+            depends = dir_depends(self.src, pkgs)
+
+        def build_cmd(pkg, worker):
+            '''Each worker gets its own copy of the admin file'''
+            admin_file = "%s.%d" % (AbstractSVR4.ADMIN_FILE, worker)
+            if not os.path.exists(admin_file):
+                shutil.copyfile(AbstractSVR4.ADMIN_FILE, admin_file)
+            arglist = (AbstractSVR4.DEFAULT_PKGADD_ARGS %
+                       (admin_file, self.src, self.dst)).split(' ')
+            return [AbstractSVR4.PKGADD] + arglist + [pkg]
+
+        installed = []
+
+        def on_done(pkg, returncode):
+            '''Report progress of each package installed'''
+            if returncode == 0:
+                installed.append(pkg)
+                self.logger.info("Installed SVR4 package %s (%d of %d)" %
+                                 (pkg, len(installed), len(pkgs)))
+                if self.pmon:
+                    self.pmon.item_done(self.pkg_sizes.get(pkg, 0))
+            else:
+                self.logger.error("SVR4 package %s failed to install" % pkg)
+
+        if self.dry_run:
+            for pkg in pkgs:
+                self.logger.debug("Would execute the following transfer "
+                                  "command: %s (after %s)" %
+                                  (build_cmd(pkg, 0),
+                                   ", ".join(depends[pkg]) or "none"))
+            return
+
+        self.scheduler = PkgaddScheduler(pkgs, depends, build_cmd,
+            self.runner, AbstractSVR4.ADMIN_FILE_DIR, self.logger,
+            jobs=self.pkgadd_jobs, on_done=on_done)
+        try:
+            self.scheduler.run()
+        finally:
+            scheduler = self.scheduler
+            self.scheduler = None
+        self.check_cancel_event()
+
+        failed = scheduler.failed
+        not_run = scheduler.not_run
+        if failed or not_run:
+            retcode = scheduler.results[failed[0]] if failed else 1
+            raise OSError(retcode, "SVR4 transfer error while adding "
+                          "packages: failed: %s, not installed: %s" %
+                          (", ".join(failed) or "none",
+                           ", ".join(not_run) or "none"))
 
     def _transfer(self):
         '''Method to transfer from the source to the destination'''
@@ -405,6 +470,13 @@ class AbstractSVR4(AbstractCheckpoint):
                 arglist = trans_val.get(SVR4_ARGS).split(' ')
 
                 # Parse the components to determine the transfer action
+                if self._can_parallelize(trans_val):
+                    self.check_cancel_event()
+                    self.logger.info("Installing SVR4 packages, %d at a "
+                                     "time" % self.pkgadd_jobs)
+                    self._parallel_pkgadd(trans_val.get(CONTENTS))
+                    continue
+
                 if trans_val.get(ACTION) == 'install':
                     self.check_cancel_event()
                     self.logger.info("Installing SVR4 packages")
@@ -563,6 +635,7 @@ class TransferSVR4(AbstractSVR4):
 
         # Find out if URL is/isn't a datastream, and whether local/remote.
         src_type = self.get_src_type(self.src)
+        self.src_type = src_type
 
         # Get the list of transfers from this specific node in the DOC
         # and parse the information into a list of transfers that will
@@ -667,6 +740,7 @@ class TransferSVR4Attr(AbstractSVR4):
 
         # Analyze the source.
         src_type = self.get_src_type(self.src)
+        self.src_type = src_type
 
         # Apply appropriate args for pkgadd or pkgrm
         if trans_attr.get(ACTION) == "install":
@@ -0,0 +1,246 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+'''Persistent index of SVR4 datastreams
+
+Sizing and verifying the packages of a datastream means reading and
+parsing its header, and ordering their installation means scanning the
+datastream for their depend files.  DatastreamIndex keeps what was learnt
+about each local datastream in a file, keyed by its path, together with a
+validator: the mtime, inode number and size of the file.  An entry is used
+as long as the validator matches, so repeated installs and size estimates
+do not re-read the datastream.  The datastream is only scanned for the
+prerequisites of packages once they are asked for.
+
+Remote datastreams are sized with a HEAD request, reusing one keep-alive
+connection per server.
+'''
+
+import errno
+import httplib
+import json
+import os
+import re
+import socket
+import tempfile
+import threading
+
+from solaris_install.transfer.svr4_sched import ds_scan, read_ds_header
+
+# Used to split a URL into its components.
+URL_RE = re.compile("(\w*)://([^/]*)((/.*)*)")
+
+# Version of the index file format
+INDEX_VERSION = 1
+
+
+class HTTPConnectionPool(object):
+    '''Keep one HTTP(S) connection open per server'''
+
+    def __init__(self, timeout=60):
+        self.timeout = timeout
+        self._conns = dict()
+        self._lock = threading.Lock()
+
+    def request(self, method, url):
+        '''Make a request for url, without a body, and return the
+        response, read in full.  A failed request on a reused connection is
+        retried once on a new one, as the server may have closed it.
+        '''
+        re_match = URL_RE.match(url)
+        if re_match is None:
+            raise IOError(errno.EINVAL, "Malformed URL specified: %s" % url)
+        protocol = re_match.group(1).lower()
+        if protocol not in ("http", "https"):
+            raise IOError(errno.EINVAL, "Non-http/https URL specified: %s" %
+                          url)
+        key = (protocol, re_match.group(2))
+        path = re_match.group(3) or "/"
+
+        for attempt in range(2):
+            # the connection is taken out of the pool while in use, so the
+            # lock is not held during the request
+            with self._lock:
+                conn = self._conns.pop(key, None)
+            reused = conn is not None
+            if conn is None:
+                if protocol == "http":
+                    conn = httplib.HTTPConnection(key[1],
+                                                  timeout=self.timeout)
+                else:
+                    conn = httplib.HTTPSConnection(key[1],
+                                                   timeout=self.timeout)
+            try:
+                conn.request(method, path)
+                response = conn.getresponse()
+                response.read()
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                if reused:
+                    continue
+                raise
+            if response.getheader("connection", "").lower() == "close":
+                # don't reuse a connection the server is closing
+                conn.close()
+            else:
+                with self._lock:
+                    if key in self._conns:
+                        conn.close()
+                    else:
+                        self._conns[key] = conn
+            return response
+
+    def close(self):
+        '''Close all connections'''
+        with self._lock:
+            for conn in self._conns.values():
+                conn.close()
+            self._conns.clear()
+
+
+class DatastreamIndex(object):
+    '''Index of local datastreams stored in the file index_file.
+
+    Each entry is a dictionary holding:
+    - validator, which identifies the version of the datastream indexed
+    - length, the size in bytes of the datastream
+    - packages, a list of [package, parts, blocks] lists from the header
+    - depends, the prerequisites of the packages scanned for so far
+    '''
+
+    def __init__(self, index_file, pool=None):
+        self.index_file = index_file
+        if pool is None:
+            pool = HTTPConnectionPool()
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._entries = None
+        # number of datastream headers read and of datastreams scanned,
+        # for testing
+        self.reads = 0
+        self.scans = 0
+
+    def _load(self):
+        '''Read the index file, once.  A missing or unreadable index is
+        treated as empty.  Called with self._lock held.
+        '''
+        if self._entries is not None:
+            return
+        self._entries = dict()
+        try:
+            with open(self.index_file) as index:
+                data = json.load(index)
+        except (IOError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == INDEX_VERSION:
+            self._entries = data.get("entries", dict())
+
+    def _save(self):
+        '''Write the index file atomically.  Failing to write the index is
+        not an error.  Called with self._lock held.
+        '''
+        dirname = os.path.dirname(self.index_file) or "."
+        try:
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            (tfd, tmppath) = tempfile.mkstemp(dir=dirname)
+            with os.fdopen(tfd, "w") as index:
+                json.dump({"version": INDEX_VERSION,
+                           "entries": self._entries}, index)
+            os.rename(tmppath, self.index_file)
+        except (IOError, OSError):
+            pass
+
+    def _lookup(self, key, validator):
+        '''Return the entry for key if its validator matches'''
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is not None and entry.get("validator") == validator:
+                return entry
+            return None
+
+    def _store(self, key, entry):
+        '''Add or replace the entry for key and save the index'''
+        with self._lock:
+            self._load()
+            self._entries[key] = entry
+            self._save()
+
+    def local(self, ds_name):
+        '''Return the entry of the local datastream file ds_name, reading
+        the header of the datastream if it is not indexed or has changed
+        since.  Raises ValueError if the header is invalid.
+        '''
+        key = os.path.abspath(ds_name)
+        stat = os.stat(key)
+        # the mtime is kept to the fraction of a second, so that a
+        # datastream rewritten within the same second is read again
+        validator = "%r:%d:%d" % (stat.st_mtime, stat.st_ino, stat.st_size)
+        entry = self._lookup(key, validator)
+        if entry is None:
+            with open(key, "rb") as stream:
+                packages = read_ds_header(stream)
+            self.reads += 1
+            entry = {"validator": validator,
+                     "length": stat.st_size,
+                     "packages": [list(pkg) for pkg in packages],
+                     "depends": dict()}
+            self._store(key, entry)
+        return entry
+
+    def depends(self, ds_name, pkg_list):
+        '''Return a dictionary of the prerequisites of the packages in
+        pkg_list, read from the local datastream file ds_name.  The
+        datastream is scanned for the packages whose prerequisites are not
+        indexed yet.  Raises CpioError if an archive of the datastream is
+        invalid.
+        '''
+        key = os.path.abspath(ds_name)
+        entry = self.local(ds_name)
+        missing = [pkg for pkg in pkg_list if pkg not in entry["depends"]]
+        if missing:
+            depends = dict((pkg, []) for pkg in missing)
+            depends.update(ds_scan(key, missing)[1])
+            self.scans += 1
+            entry = dict(entry)
+            entry["depends"] = dict(entry["depends"])
+            entry["depends"].update(depends)
+            self._store(key, entry)
+        return dict((pkg, entry["depends"][pkg]) for pkg in pkg_list)
+
+    def remote_length(self, url):
+        '''Return the size in bytes of the remote datastream at url, from a
+        HEAD request on a kept-alive connection.
+        '''
+        response = self.pool.request("HEAD", url)
+        if response.status != httplib.OK:
+            raise IOError(errno.ENOENT, "HEAD %s failed: %d %s" %
+                          (url, response.status, response.reason))
+        try:
+            return int(response.getheader("content-length"))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid size returned for %s" % url)
@@ -0,0 +1,355 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+'''Dependency ordered, concurrent installation of SVR4 packages
+
+The prerequisites of each package are read from its install/depend file,
+either in a package directory or in the first part of the package in a
+datastream.  PkgaddScheduler then runs one command per package on
+several workers, starting a package only once all of its prerequisites
+that are being installed with it have been installed.
+'''
+
+import os
+import threading
+
+# size of the blocks datastream archives are padded to
+DS_BLOCK_SIZE = 512
+
+# cpio header formats: magic, header length, field widths, base, and
+# the indexes of the name size and file size fields, and alignment
+_CPIO_ODC = ("070707", 76, (6, 6, 6, 6, 6, 6, 6, 11, 6, 11), 8, 8, 9, 1)
+_CPIO_NEWC = ("070701", 110, (8,) * 13, 16, 11, 6, 4)
+_CPIO_FORMATS = {"070707": _CPIO_ODC,
+                 "070701": _CPIO_NEWC,
+                 "070702": _CPIO_NEWC}
+_CPIO_TRAILER = "TRAILER!!!"
+
+DEPEND_FILE = "install/depend"
+
+# first and last lines of the text header of a datastream
+DS_HDR_START = "# PaCkAgE DaTaStReAm"
+DS_HDR_END = "# end of header"
+
+
+class CpioError(Exception):
+    '''Error reading a cpio archive of a datastream
+    '''
+    pass
+
+
+def parse_depend(depend_file):
+    '''Return the names of the prerequisite ("P") packages listed in
+    depend_file, a file object of a depend(4) file.
+    '''
+    prereqs = []
+    for line in depend_file:
+        # Continuation lines (versions, architectures) start with
+        # whitespace.
+        if not line or line[0].isspace() or line.startswith("#"):
+            continue
+        fields = line.split()
+        if len(fields) >= 2 and fields[0] == "P":
+            prereqs.append(fields[1])
+    return prereqs
+
+
+def _pad(offset, alignment):
+    '''Return the number of bytes padding offset to alignment'''
+    return (alignment - offset % alignment) % alignment
+
+
+def _cpio_entries(stream):
+    '''Yield (name, size) of each entry of the cpio archive at the current
+    offset of stream.  On return from each yield, stream is positioned at
+    the start of the entry's data; the data is skipped if it has not been
+    read when the next entry is requested.  When done, stream is positioned
+    at the end of the archive's last block.
+    '''
+    start = stream.tell()
+    while True:
+        magic = stream.read(6)
+        fmt = _CPIO_FORMATS.get(magic)
+        if fmt is None:
+            raise CpioError("Invalid cpio header at offset %d of %s" %
+                            (stream.tell() - len(magic), stream.name))
+        (magic, hdr_len, widths, base, name_idx, size_idx, align) = fmt
+        header = stream.read(hdr_len - 6)
+        fields = []
+        pos = 0
+        for width in widths:
+            fields.append(int(header[pos:pos + width], base))
+            pos += width
+        name_size = fields[name_idx]
+        file_size = fields[size_idx]
+        name = stream.read(name_size).rstrip("\0")
+        stream.seek(_pad(hdr_len + name_size, align), os.SEEK_CUR)
+        data_start = stream.tell()
+
+        if name == _CPIO_TRAILER:
+            break
+        yield (name, file_size)
+
+        stream.seek(data_start + file_size + _pad(file_size, align))
+
+    # Archives are padded to whole blocks
+    stream.seek(_pad(stream.tell() - start, DS_BLOCK_SIZE), os.SEEK_CUR)
+
+
+def read_ds_header(stream):
+    '''Read the text header of the datastream open as stream.  Returns a
+    list of (package, parts, blocks) tuples, in datastream order; blocks
+    is the size of each part in 512 byte blocks.  On return, stream is
+    positioned at the first archive after the header.
+    '''
+    if stream.readline().strip() != DS_HDR_START:
+        raise ValueError("%s is not an SVR4 datastream file" % stream.name)
+    packages = []
+    for line in iter(stream.readline, ""):
+        if line.strip() == DS_HDR_END:
+            break
+        (pkg, parts, blocks) = line.split(" ", 2)
+        packages.append((pkg, int(parts), int(blocks)))
+    else:
+        raise ValueError("Invalid header found in datastream %s" %
+                         stream.name)
+    # The header is padded to a block.
+    stream.seek(_pad(stream.tell(), DS_BLOCK_SIZE), os.SEEK_CUR)
+    return packages
+
+
+def ds_scan(ds_name, pkg_list=None):
+    '''Scan the datastream file ds_name.  Returns a tuple of:
+    - the list of (package, parts, blocks) tuples of its header
+    - a dictionary of the prerequisites of each package
+
+    A datastream is made of a text header listing each package with its
+    number of parts, a cpio archive holding the pkginfo and pkgmap files of
+    all packages, then one cpio archive per part of each package, in header
+    order.  install/depend is in the first part.  Only the archive headers
+    are read; file contents other than the depend files are skipped.
+
+    If pkg_list is given, the scan stops after the last package in
+    pkg_list, and only the prerequisites of those packages are returned.
+    Raises ValueError if the header is invalid, CpioError if an archive
+    is.
+    '''
+    depends = dict()
+
+    with open(ds_name, "rb") as stream:
+        packages = read_ds_header(stream)
+        if pkg_list is None:
+            wanted = set(pkg for (pkg, parts, blocks) in packages)
+        else:
+            wanted = set(pkg_list)
+
+        # pkginfo and pkgmap files of all packages
+        for entry in _cpio_entries(stream):
+            pass
+
+        for (pkg, nparts, blocks) in packages:
+            if not wanted:
+                break
+            if pkg in wanted:
+                depends[pkg] = []
+            for part in range(nparts):
+                for (name, size) in _cpio_entries(stream):
+                    if pkg in wanted and part == 0 and \
+                       name.lstrip("./").endswith(DEPEND_FILE):
+                        depends[pkg] = \
+                            parse_depend(stream.read(size).splitlines())
+            wanted.discard(pkg)
+    return (packages, depends)
+
+
+def ds_depends(ds_name, pkg_list):
+    '''Return a dictionary of the prerequisites of the packages in pkg_list,
+    read from the datastream file ds_name.
+    '''
+    depends = dict((pkg, []) for pkg in pkg_list)
+    depends.update(ds_scan(ds_name, pkg_list)[1])
+    return depends
+
+
+def dir_depends(parentdir, pkg_list):
+    '''Return a dictionary of the prerequisites of the packages in pkg_list,
+    read from the package directories under parentdir.
+    '''
+    depends = dict()
+    for pkg in pkg_list:
+        try:
+            with open(os.path.join(parentdir, pkg, DEPEND_FILE)) as dfile:
+                depends[pkg] = parse_depend(dfile)
+        except IOError:
+            depends[pkg] = []
+    return depends
+
+
+class PkgaddScheduler(object):
+    '''Run one command per package, on up to jobs workers at once, in an
+    order respecting the prerequisites among the packages.
+
+    packages - package names, in their preferred order of installation
+    depends - dictionary of the prerequisites of each package.  Packages
+              not in packages are ignored.
+    build_cmd - build_cmd(pkg, worker) returns the command installing pkg.
+                worker, from 0 to jobs - 1, identifies the worker running it
+                among those running at the same time.
+    runner - runner(cmd, stdout=..., stderr=...) starts cmd, returning an
+             object with wait() and kill() methods, such as a Popen
+    log_dir - directory for the output of each command
+    logger - where the output of each command is logged once it completes
+    on_done - optional on_done(pkg, returncode), called as each command
+              completes
+
+    If the prerequisites form a cycle, the first package of the cycle in
+    packages is started as if it had none.
+    '''
+
+    def __init__(self, packages, depends, build_cmd, runner, log_dir,
+                 logger, jobs=4, on_done=None):
+        self.packages = list(packages)
+        in_list = set(self.packages)
+        self.prereqs = dict((pkg, set(dep for dep in depends.get(pkg, [])
+                                      if dep in in_list and dep != pkg))
+                            for pkg in self.packages)
+        self.build_cmd = build_cmd
+        self.runner = runner
+        self.log_dir = log_dir
+        self.logger = logger
+        self.jobs = max(1, jobs)
+        self.on_done = on_done
+
+        self.results = dict()
+        self._cond = threading.Condition()
+        self._pending = list(self.packages)
+        self._running = dict()
+        self._free_workers = range(self.jobs)
+        self._failed = False
+        self._cancelled = False
+
+    def _next_package(self):
+        '''Return the next package that can be started, or None.
+        Called with self._cond held.
+        '''
+        for pkg in self._pending:
+            if not self.prereqs[pkg] - set(self.results):
+                return pkg
+        if self._pending and not self._running:
+            pkg = self._pending[0]
+            self.logger.warning("Circular SVR4 package dependencies; "
+                                "installing %s before %s" %
+                                (pkg, ", ".join(sorted(self.prereqs[pkg] -
+                                                       set(self.results)))))
+            return pkg
+        return None
+
+    def _worker(self):
+        '''Install packages until there are none left to start'''
+        while True:
+            with self._cond:
+                while True:
+                    if self._failed or self._cancelled or not self._pending:
+                        return
+                    pkg = self._next_package()
+                    if pkg is not None:
+                        break
+                    self._cond.wait()
+                self._pending.remove(pkg)
+                worker = self._free_workers.pop(0)
+                cmd = self.build_cmd(pkg, worker)
+                log_path = os.path.join(self.log_dir, "pkgadd.%s.log" % pkg)
+                log_file = open(log_path, "w")
+                try:
+                    proc = self.runner(cmd, stdout=log_file,
+                                       stderr=log_file)
+                except:
+                    log_file.close()
+                    self._failed = True
+                    self._cond.notify_all()
+                    raise
+                self._running[pkg] = proc
+                self.logger.debug("Executing the following transfer "
+                                  "command: %s" % cmd)
+
+            returncode = proc.wait()
+            log_file.close()
+            self._log_output(pkg, log_path)
+
+            with self._cond:
+                del self._running[pkg]
+                self._free_workers.append(worker)
+                self.results[pkg] = returncode
+                if returncode != 0:
+                    self._failed = True
+                self._cond.notify_all()
+            if self.on_done is not None:
+                self.on_done(pkg, returncode)
+
+    def _log_output(self, pkg, log_path):
+        '''Log the output of the command installing pkg and remove it'''
+        try:
+            with open(log_path) as log_file:
+                for line in log_file:
+                    if line.strip():
+                        self.logger.debug("%s: %s", pkg, line.rstrip("\n"))
+            os.unlink(log_path)
+        except (IOError, OSError) as err:
+            self.logger.debug("Unable to read output of %s: %s" % (pkg, err))
+
+    def run(self):
+        '''Install all packages.  Returns a dictionary of the return code of
+        each command run.  Stops starting commands once one fails or the
+        scheduler is cancelled, and returns once the running ones complete.
+        '''
+        threads = [threading.Thread(target=self._worker)
+                   for worker in range(min(self.jobs, len(self.packages)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.results
+
+    @property
+    def failed(self):
+        '''Packages whose command failed'''
+        return [pkg for pkg in self.packages if self.results.get(pkg)]
+
+    @property
+    def not_run(self):
+        '''Packages whose command was not run'''
+        return [pkg for pkg in self.packages if pkg not in self.results]
+
+    def cancel(self):
+        '''Start no more commands and kill the running ones'''
+        with self._cond:
+            self._cancelled = True
+            for proc in self._running.values():
+                try:
+                    proc.kill()
+                except OSError:
+                    pass
+            self._cond.notify_all()
@@ -0,0 +1,55 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+'''Build SVR4 datastreams and their cpio archives for testing.'''
+
+from solaris_install.transfer import svr4_sched
+
+
+def newc_entry(name, data):
+    '''Return a cpio newc archive entry'''
+    name += "\0"
+    header = "070701" + "".join("%08X" % value for value in
+        (1, 0100644, 0, 0, 1, 0, len(data), 0, 0, 0, 0, len(name), 0))
+    entry = header + name
+    entry += "\0" * (-len(entry) % 4)
+    return entry + data + "\0" * (-len(data) % 4)
+
+
+def cpio_archive(files):
+    '''Return a cpio archive of files, a list of (name, data) padded to
+    the datastream block size'''
+    archive = "".join(newc_entry(name, data) for (name, data) in files)
+    archive += newc_entry("TRAILER!!!", "")
+    return archive + "\0" * (-len(archive) % svr4_sched.DS_BLOCK_SIZE)
+
+
+def ds_header(packages):
+    '''Return the text header of a datastream of packages, a list of
+    (package, parts, blocks), padded to the datastream block size'''
+    header = svr4_sched.DS_HDR_START + "\n"
+    header += "".join("%s %d %d\n" % pkg for pkg in packages)
+    header += svr4_sched.DS_HDR_END + "\n"
+    return header + "\0" * (-len(header) % svr4_sched.DS_BLOCK_SIZE)
@@ -0,0 +1,232 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+'''Tests for the IPS cache shared by created images'''
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+
+from solaris_install.transfer import ips_cache
+from solaris_install.transfer.ips import TransferIPSAttr
+
+PUBLISHER = "cachetest"
+
+PKG_MANIFEST = \
+'''set name=pkg.fmri value=pkg://%(pub)s/cachetest@%(version)s,5.11-0
+set name=pkg.summary value="IPS cache test package"
+file cachetest path=etc/cachetest mode=0444 owner=root group=bin
+'''
+
+
+class TestIPSCacheSnapshots(unittest.TestCase):
+    '''Tests for catalog snapshots'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="test_ips_cache_")
+        self.cache = ips_cache.IPSCache(os.path.join(self.tmpdir, "cache"))
+        self.imgdir = os.path.join(self.tmpdir, "img")
+        self.make_catalogs(self.imgdir, "1")
+
+    def tearDown(self):
+        self.cache.deactivate()
+        shutil.rmtree(self.tmpdir)
+
+    @staticmethod
+    def make_catalogs(imgdir, content):
+        '''Create catalogs of two publishers and a known catalog'''
+        for rel_dir in ("publisher/pub1/catalog", "publisher/pub2/catalog",
+                        "state/known"):
+            os.makedirs(os.path.join(imgdir, rel_dir))
+            with open(os.path.join(imgdir, rel_dir, "catalog.attrs"),
+                      "w") as attrs:
+                attrs.write(content)
+
+    def test_save_and_seed(self):
+        '''a saved snapshot seeds the catalogs of another image'''
+        key = ips_cache.IPSCache.snapshot_key("pub1", ["file:///repo"])
+        self.assertEqual(self.cache.fresh_snapshot(key), None)
+        self.cache.save(self.imgdir, key)
+        snapshot = self.cache.fresh_snapshot(key)
+        self.assertNotEqual(snapshot, None)
+
+        newdir = os.path.join(self.tmpdir, "newimg")
+        self.make_catalogs(newdir, "2")
+        self.assertTrue(self.cache.seed(newdir, snapshot))
+        for rel_dir in ("publisher/pub1/catalog", "publisher/pub2/catalog",
+                        "state/known"):
+            with open(os.path.join(newdir, rel_dir, "catalog.attrs")) as f:
+                self.assertEqual(f.read(), "1")
+
+        # saving again replaces the snapshot
+        self.cache.save(newdir, key)
+        self.assertEqual(os.listdir(os.path.dirname(snapshot)), [key])
+
+    def test_stale(self):
+        '''snapshots older than max_age or of other origins are not used'''
+        key = ips_cache.IPSCache.snapshot_key("pub1", ["file:///repo"])
+        self.cache.save(self.imgdir, key)
+        self.assertEqual(self.cache.fresh_snapshot(
+            ips_cache.IPSCache.snapshot_key("pub1", ["file:///other"])), None)
+        self.cache.max_age = 0
+        time.sleep(0.01)
+        self.assertEqual(self.cache.fresh_snapshot(key), None)
+
+    def test_activate(self):
+        '''activate() points pkg(5) at the content cache until
+        deactivate()'''
+        saved = os.environ.get(ips_cache.PKG_CACHEDIR)
+        self.cache.activate()
+        self.assertEqual(os.environ[ips_cache.PKG_CACHEDIR],
+                         self.cache.content_dir)
+        self.assertTrue(os.path.isdir(self.cache.content_dir))
+        self.cache.deactivate()
+        self.assertEqual(os.environ.get(ips_cache.PKG_CACHEDIR), saved)
+
+
+class TestTransferIPSAttrCache(unittest.TestCase):
+    '''Tests for the cache of a TransferIPSAttr checkpoint'''
+
+    class FakeImage(object):
+        '''Image with only a metadata directory'''
+        def __init__(self, imgdir):
+            self.imgdir = imgdir
+
+    class FakeApi(object):
+        '''api.ImageInterface of a FakeImage'''
+        def __init__(self, imgdir):
+            self.img = TestTransferIPSAttrCache.FakeImage(imgdir)
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="test_ips_cache_")
+        self.cache_dir = os.path.join(self.tmpdir, "cache")
+        self.tr_ips = TransferIPSAttr("IPS cache attr transfer",
+                                      cache_dir=self.cache_dir)
+        self.tr_ips.dst = os.path.join(self.tmpdir, "img")
+        self.tr_ips.src = [("pub1", ["file:///repo"], None)]
+        self.tr_ips._parse_input()
+
+    def tearDown(self):
+        if self.tr_ips._cache is not None:
+            self.tr_ips._cache.deactivate()
+        shutil.rmtree(self.tmpdir)
+
+    def test_cache_dir(self):
+        '''an image created with cache_dir set keeps its downloads and
+        saves its catalogs as a snapshot'''
+        key = ips_cache.IPSCache.snapshot_key("pub1", ["file:///repo"])
+        self.assertEqual(self.tr_ips._cache_key(), key)
+
+        # no snapshot yet: the catalogs are retrieved at image creation
+        self.assertEqual(self.tr_ips._use_cache(), None)
+        self.assertEqual(os.environ[ips_cache.PKG_CACHEDIR],
+                         os.path.join(self.cache_dir, ips_cache.CONTENT_DIR))
+        self.assertEqual(self.tr_ips._image_args["props"],
+                         {ips_cache.FLUSH_CACHE_PROP: False})
+        self.assertFalse("refresh_allowed" in self.tr_ips._image_args)
+
+        imgdir = os.path.join(self.tr_ips.dst, "var", "pkg")
+        TestIPSCacheSnapshots.make_catalogs(imgdir, "1")
+        self.tr_ips.api_inst = self.FakeApi(imgdir)
+        self.tr_ips._update_catalogs(None)
+        snapshot = self.tr_ips._cache.fresh_snapshot(key)
+        self.assertNotEqual(snapshot, None)
+
+        # the next image is seeded from the snapshot
+        self.tr_ips._cache.deactivate()
+        self.tr_ips._image_args = {}
+        self.assertEqual(self.tr_ips._use_cache(), snapshot)
+        self.assertEqual(self.tr_ips._image_args["refresh_allowed"], False)
+
+
+class TestTransferIPSCache(unittest.TestCase):
+    '''Tests creating images with a cache, from a file:// repository'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="test_ips_cache_",
+                                       dir="/var/tmp")
+        self.repo = os.path.join(self.tmpdir, "repo")
+        self.cache_dir = os.path.join(self.tmpdir, "cache")
+        subprocess.check_call(["/usr/bin/pkgrepo", "create", self.repo])
+        subprocess.check_call(["/usr/bin/pkgrepo", "set", "-s", self.repo,
+                               "publisher/prefix=%s" % PUBLISHER])
+        self.publish("1.0")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def publish(self, version):
+        '''Publish cachetest@version, delivering /etc/cachetest'''
+        proto = os.path.join(self.tmpdir, "proto")
+        if not os.path.isdir(proto):
+            os.makedirs(proto)
+        with open(os.path.join(proto, "cachetest"), "w") as data:
+            data.write(version)
+        manifest = os.path.join(self.tmpdir, "cachetest.p5m")
+        with open(manifest, "w") as mf:
+            mf.write(PKG_MANIFEST % {"pub": PUBLISHER, "version": version})
+        subprocess.check_call(["/usr/bin/pkgsend", "-s",
+                               "file://" + self.repo, "publish", "-d", proto,
+                               manifest])
+
+    def create_image(self, name):
+        '''Create an image holding cachetest, using the cache'''
+        tr_ips = TransferIPSAttr("IPS cache transfer",
+                                 cache_dir=self.cache_dir)
+        tr_ips.dst = os.path.join(self.tmpdir, name)
+        tr_ips.src = [(PUBLISHER, ["file://" + self.repo], None)]
+        tr_ips.action = "install"
+        tr_ips.contents = ["cachetest"]
+        tr_ips.execute()
+        with open(os.path.join(tr_ips.dst, "etc", "cachetest")) as data:
+            return data.read()
+
+    def test_reuse(self):
+        '''images reuse the catalogs and content of earlier images, and get
+        packages published since'''
+        saved = os.environ.get(ips_cache.PKG_CACHEDIR)
+        cache = ips_cache.IPSCache(self.cache_dir)
+        key = cache.snapshot_key(PUBLISHER, ["file://" + self.repo])
+
+        self.assertEqual(self.create_image("img1"), "1.0")
+        snapshot = cache.fresh_snapshot(key)
+        self.assertNotEqual(snapshot, None)
+        self.assertTrue(os.listdir(cache.content_dir))
+        created = os.stat(snapshot).st_mtime
+
+        # a seeded image is refreshed, and does not replace the snapshot
+        self.publish("2.0")
+        self.assertEqual(self.create_image("img2"), "2.0")
+        self.assertEqual(os.stat(cache.fresh_snapshot(key)).st_mtime,
+                         created)
+        self.assertEqual(os.environ.get(ips_cache.PKG_CACHEDIR), saved)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,230 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+'''Tests for media_transfer.download_files against a local HTTP server'''
+
+import BaseHTTPServer
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+
+from solaris_install.transfer.media_transfer import download_files, \
+    DownloadError
+
+# 1MB of non-repeating-looking data
+CONTENT = "".join(chr((i * 7 + i / 251) % 256) for i in xrange(1024 * 1024))
+RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+class RangeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''Serves CONTENT at any path, honoring single byte ranges'''
+
+    # set by tests to count requests, disable range support, leave the
+    # size out of 416 responses and fail the requests for a segment
+    requests = list()
+    heads = 0
+    ranges = True
+    unsatisfiable_size = True
+    fail_segments = False
+
+    def do_HEAD(self):
+        RangeHandler.heads += 1
+        self.send_response(200)
+        if RangeHandler.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(CONTENT)))
+        self.end_headers()
+
+    def do_GET(self):
+        RangeHandler.requests.append(self.headers.getheader("Range"))
+        start, end = 0, len(CONTENT) - 1
+        match = RANGE_RE.match(self.headers.getheader("Range") or "")
+        if match is not None and RangeHandler.ranges:
+            if match.group(2) and RangeHandler.fail_segments:
+                self.send_response(503)
+                self.end_headers()
+                return
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(int(match.group(2)), end)
+            if start >= len(CONTENT):
+                self.send_response(416)
+                if RangeHandler.unsatisfiable_size:
+                    self.send_header("Content-Range",
+                                     "bytes */%d" % len(CONTENT))
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" %
+                             (start, end, len(CONTENT)))
+        else:
+            self.send_response(200)
+        if RangeHandler.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(CONTENT[start:end + 1])
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDownloadFiles(unittest.TestCase):
+    '''Tests for streaming, resumable and segmented downloads'''
+
+    def setUp(self):
+        RangeHandler.requests = list()
+        RangeHandler.heads = 0
+        RangeHandler.ranges = True
+        RangeHandler.unsatisfiable_size = True
+        RangeHandler.fail_segments = False
+        self.server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0),
+                                                RangeHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = "http://127.0.0.1:%d/solaris.zlib" % \
+            self.server.server_address[1]
+        self.tmpdir = tempfile.mkdtemp(dir="/tmp")
+        self.dst = os.path.join(self.tmpdir, "sub", "solaris.zlib")
+        self.logger = logging.getLogger("test_media_transfer")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def read_dst(self):
+        '''Return the content of the downloaded file'''
+        with open(self.dst, "rb") as fh:
+            return fh.read()
+
+    def test_streamed_download(self):
+        '''Test file is streamed in small chunks and matches the source'''
+        download_files(self.url, self.dst, self.logger, bufsize=4096)
+        self.assertEqual(self.read_dst(), CONTENT)
+        self.assertEqual(RangeHandler.requests, [None])
+
+    def test_resume(self):
+        '''Test a partial file is completed with a ranged request'''
+        os.makedirs(os.path.dirname(self.dst))
+        with open(self.dst, "wb") as fh:
+            fh.write(CONTENT[:1000])
+        download_files(self.url, self.dst, self.logger, resume=True)
+        self.assertEqual(self.read_dst(), CONTENT)
+        self.assertEqual(RangeHandler.requests, ["bytes=1000-"])
+
+    def test_resume_complete_file(self):
+        '''Test resuming an already complete file leaves it alone'''
+        os.makedirs(os.path.dirname(self.dst))
+        with open(self.dst, "wb") as fh:
+            fh.write(CONTENT)
+        download_files(self.url, self.dst, self.logger, resume=True,
+                       checksum=hashlib.sha1(CONTENT).hexdigest())
+        self.assertEqual(self.read_dst(), CONTENT)
+        self.assertEqual(RangeHandler.requests, ["bytes=%d-" % len(CONTENT)])
+
+    def test_resume_complete_file_head(self):
+        '''Test the size is checked with HEAD if a 416 does not give it'''
+        RangeHandler.unsatisfiable_size = False
+        os.makedirs(os.path.dirname(self.dst))
+        with open(self.dst, "wb") as fh:
+            fh.write(CONTENT)
+        download_files(self.url, self.dst, self.logger, resume=True,
+                       segments=1)
+        self.assertEqual(self.read_dst(), CONTENT)
+        self.assertEqual(RangeHandler.heads, 1)
+        self.assertEqual(len(RangeHandler.requests), 1)
+
+    def test_resume_oversized_file(self):
+        '''Test a partial file longer than the source is downloaded again
+        '''
+        os.makedirs(os.path.dirname(self.dst))
+        with open(self.dst, "wb") as fh:
+            fh.write(CONTENT + "garbage")
+        download_files(self.url, self.dst, self.logger, resume=True,
+                       segments=1)
+        self.assertEqual(self.read_dst(), CONTENT)
+        self.assertEqual(RangeHandler.requests,
+                         ["bytes=%d-" % (len(CONTENT) + 7), None])
+
+    def test_resume_without_range_support(self):
+        '''Test the whole file is refetched if ranges are not supported'''
+        RangeHandler.ranges = False
+        os.makedirs(os.path.dirname(self.dst))
+        with open(self.dst, "wb") as fh:
+            fh.write("garbage")
+        download_files(self.url, self.dst, self.logger, resume=True)
+        self.assertEqual(self.read_dst(), CONTENT)
+
+    def test_segmented_download(self):
+        '''Test large files are fetched as parallel ranged requests'''
+        download_files(self.url, self.dst, self.logger, segments=3,
+                       segment_min_size=1024,
+                       checksum=hashlib.sha1(CONTENT).hexdigest())
+        self.assertEqual(self.read_dst(), CONTENT)
+        # HEAD probe plus one request per segment
+        self.assertEqual(RangeHandler.heads, 1)
+        self.assertEqual(len(RangeHandler.requests), 3)
+
+    def test_segmented_download_fallback(self):
+        '''Test a failed segment falls back to a single streamed request'''
+        RangeHandler.fail_segments = True
+        download_files(self.url, self.dst, self.logger, segments=3,
+                       segment_min_size=1024,
+                       checksum=hashlib.sha1(CONTENT).hexdigest())
+        self.assertEqual(self.read_dst(), CONTENT)
+        self.assertEqual(RangeHandler.requests[-1], None)
+
+    def test_segmented_download_without_range_support(self):
+        '''Test large files are streamed if ranges are not supported'''
+        RangeHandler.ranges = False
+        download_files(self.url, self.dst, self.logger, segments=3,
+                       segment_min_size=1024)
+        self.assertEqual(self.read_dst(), CONTENT)
+        self.assertEqual(len(RangeHandler.requests), 1)
+
+    def test_checksum(self):
+        '''Test a matching checksum is accepted'''
+        download_files(self.url, self.dst, self.logger,
+                       checksum=hashlib.md5(CONTENT).hexdigest(),
+                       hash_algorithm="md5")
+        self.assertEqual(self.read_dst(), CONTENT)
+
+    def test_checksum_mismatch(self):
+        '''Test a bad checksum raises DownloadError and removes the file'''
+        self.assertRaises(DownloadError, download_files, self.url,
+                          self.dst, self.logger, checksum="0" * 40)
+        self.assertFalse(os.path.exists(self.dst))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+'''Tests for the persistent SVR4 datastream index'''
+
+import BaseHTTPServer
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from solaris_install.transfer import svr4_index
+from solaris_install.transfer import svr4_sched
+from svr4_datastream import cpio_archive, ds_header
+
+
+def datastream():
+    '''Return a datastream of SUNWa, in one part, and SUNWb, in two parts
+    and depending on SUNWa'''
+    stream = ds_header([("SUNWa", 1, 10), ("SUNWb", 2, 20)])
+    stream += cpio_archive([("SUNWa/pkginfo", "PKG=SUNWa\n"),
+                            ("SUNWb/pkginfo", "PKG=SUNWb\n")])
+    stream += cpio_archive([("reloc/usr/bin/a", "a" * 1000)])
+    stream += cpio_archive([("install/depend", "P SUNWa\ta\n")])
+    stream += cpio_archive([("reloc/usr/bin/b", "b" * 3)])
+    return stream
+
+
+class DatastreamHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''Answers HEAD requests for the server's datastream, keeping the
+    connection open'''
+
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        '''Send the headers of the datastream'''
+        self.server.requests += 1
+        if self.path != "/test.d":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.server.data)))
+        self.end_headers()
+
+    def setup(self):
+        '''Count connections'''
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        '''Don't log requests'''
+        pass
+
+
+class TestDatastreamIndex(unittest.TestCase):
+    '''Tests for DatastreamIndex'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="test_svr4_index_")
+        self.index_file = os.path.join(self.tmpdir, "index", "svr4.json")
+        self.ds_name = os.path.join(self.tmpdir, "test.d")
+        with open(self.ds_name, "wb") as ds_file:
+            ds_file.write(datastream())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_local(self):
+        '''the headers of local datastreams are read once per version'''
+        index = svr4_index.DatastreamIndex(self.index_file)
+        entry = index.local(self.ds_name)
+        self.assertEqual((index.reads, index.scans), (1, 0))
+        self.assertEqual(entry["packages"], [["SUNWa", 1, 10],
+                                             ["SUNWb", 2, 20]])
+        self.assertEqual(entry["depends"], {})
+
+        # a new index reads the entry from the index file
+        index = svr4_index.DatastreamIndex(self.index_file)
+        self.assertEqual(index.local(self.ds_name)["packages"],
+                         entry["packages"])
+        self.assertEqual(index.reads, 0)
+
+        # a changed datastream is read again
+        with open(self.ds_name, "ab") as ds_file:
+            ds_file.write("\0" * svr4_sched.DS_BLOCK_SIZE)
+        os.utime(self.ds_name, (time.time() + 10, time.time() + 10))
+        index.local(self.ds_name)
+        self.assertEqual(index.reads, 1)
+
+    def rewrite(self, packages, mtime):
+        '''Rewrite the datastream in place, with the same size, and set its
+        mtime'''
+        with open(self.ds_name, "r+b") as ds_file:
+            ds_file.write(ds_header(packages))
+        os.utime(self.ds_name, (mtime, mtime))
+
+    def test_local_same_second(self):
+        '''a datastream rewritten within the same second is read again'''
+        mtime = int(time.time()) - 60
+        self.rewrite([("SUNWa", 1, 10), ("SUNWb", 2, 20)], mtime + 0.25)
+        index = svr4_index.DatastreamIndex(self.index_file)
+        index.local(self.ds_name)
+        self.rewrite([("SUNWc", 1, 10), ("SUNWd", 2, 20)], mtime + 0.75)
+        self.assertEqual(index.local(self.ds_name)["packages"],
+                         [["SUNWc", 1, 10], ["SUNWd", 2, 20]])
+        self.assertEqual(index.reads, 2)
+
+    def test_local_replaced(self):
+        '''a datastream replaced by another file is read again, even with
+        the same size and mtime'''
+        index = svr4_index.DatastreamIndex(self.index_file)
+        index.local(self.ds_name)
+        stat = os.stat(self.ds_name)
+
+        new_name = self.ds_name + ".new"
+        with open(self.ds_name, "rb") as ds_file:
+            data = ds_file.read()
+        with open(new_name, "wb") as ds_file:
+            ds_file.write(data)
+        os.utime(new_name, (stat.st_atime, stat.st_mtime))
+        os.rename(new_name, self.ds_name)
+        index.local(self.ds_name)
+        self.assertEqual(index.reads, 2)
+
+    def test_depends(self):
+        '''datastreams are scanned for the prerequisites not indexed'''
+        index = svr4_index.DatastreamIndex(self.index_file)
+        self.assertEqual(index.depends(self.ds_name, ["SUNWa"]),
+                         {"SUNWa": []})
+        self.assertEqual(index.depends(self.ds_name, ["SUNWb", "SUNWa"]),
+                         {"SUNWa": [], "SUNWb": ["SUNWa"]})
+        self.assertEqual(index.depends(self.ds_name, ["SUNWb"]),
+                         {"SUNWb": ["SUNWa"]})
+        self.assertEqual((index.reads, index.scans), (1, 2))
+
+        index = svr4_index.DatastreamIndex(self.index_file)
+        self.assertEqual(index.depends(self.ds_name, ["SUNWa", "SUNWb"]),
+                         {"SUNWa": [], "SUNWb": ["SUNWa"]})
+        self.assertEqual((index.reads, index.scans), (0, 0))
+
+    def test_invalid(self):
+        '''files which are not datastreams are rejected'''
+        with open(self.ds_name, "w") as ds_file:
+            ds_file.write("not a datastream\n")
+        index = svr4_index.DatastreamIndex(self.index_file)
+        self.assertRaises(ValueError, index.local, self.ds_name)
+
+    def test_invalid_cpio(self):
+        '''invalid archives are reported when scanning only'''
+        with open(self.ds_name, "wb") as ds_file:
+            ds_file.write(ds_header([("SUNWa", 1, 10)]))
+            ds_file.write("070709" + "\0" * svr4_sched.DS_BLOCK_SIZE)
+        index = svr4_index.DatastreamIndex(self.index_file)
+        self.assertEqual(index.local(self.ds_name)["packages"],
+                         [["SUNWa", 1, 10]])
+        self.assertRaises(svr4_sched.CpioError, index.depends, self.ds_name,
+                          ["SUNWa"])
+
+    def test_remote(self):
+        '''remote datastreams are sized on a kept-alive connection'''
+        server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0),
+                                           DatastreamHandler)
+        server.data = datastream()
+        server.requests = 0
+        server.connections = 0
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        url = "http://127.0.0.1:%d/test.d" % server.server_address[1]
+        try:
+            index = svr4_index.DatastreamIndex(self.index_file)
+            for i in range(3):
+                self.assertEqual(index.remote_length(url), len(server.data))
+            self.assertRaises(IOError, index.remote_length,
+                              url + ".missing")
+            self.assertEqual(server.requests, 4)
+            self.assertEqual(server.connections, 1)
+            index.pool.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # nothing is stored for remote datastreams
+        self.assertFalse(os.path.exists(self.index_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
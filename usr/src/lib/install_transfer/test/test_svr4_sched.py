@@ -0,0 +1,215 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+'''Tests for the dependency ordered SVR4 package scheduler'''
+
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+
+from solaris_install.transfer import svr4_sched
+from svr4_datastream import cpio_archive, ds_header
+
+# Stands in for pkgadd -n -a admin -d src -R root pkg.  Fails unless the
+# admin file exists and the prerequisites of pkg are installed, then
+# sleeps and marks pkg installed.  Packages named FAIL* fail.
+FAKE_PKGADD = '''#!/bin/sh
+while getopts na:d:R: opt; do
+    case $opt in
+    a) admin=$OPTARG;;
+    d) src=$OPTARG;;
+    R) root=$OPTARG;;
+    esac
+done
+shift `expr $OPTIND - 1`
+pkg=$1
+[ -f "$admin" ] || exit 2
+for dep in `awk '$1 == "P" { print $2 }' $src/$pkg/install/depend \\
+    2>/dev/null`; do
+    if [ -d $src/$dep -a ! -f $root/$dep ]; then
+        echo "$dep not installed before $pkg"
+        exit 3
+    fi
+done
+case $pkg in
+FAIL*) exit 1;;
+esac
+sleep 0.3
+echo "Installation of <$pkg> was successful."
+echo installed > $root/$pkg
+'''
+
+
+def make_pkg(parentdir, pkg, prereqs):
+    '''Create a package directory holding just a depend file'''
+    os.makedirs(os.path.join(parentdir, pkg, "install"))
+    with open(os.path.join(parentdir, pkg, "install", "depend"), "w") as dep:
+        dep.write("# dependencies of %s\n" % pkg)
+        for prereq in prereqs:
+            dep.write("P %s\tpackage %s\n\t(i386) 11.11\n" %
+                      (prereq, prereq))
+        dep.write("I SUNWold\tincompatible package\n")
+
+
+class TestDepends(unittest.TestCase):
+    '''Tests for reading package prerequisites'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="test_svr4_sched_")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_dir_depends(self):
+        '''dir_depends() reads prerequisites from package directories'''
+        make_pkg(self.tmpdir, "SUNWa", [])
+        make_pkg(self.tmpdir, "SUNWb", ["SUNWa", "SUNWcsr"])
+        os.makedirs(os.path.join(self.tmpdir, "SUNWc"))
+        self.assertEqual(svr4_sched.dir_depends(self.tmpdir,
+                                                ["SUNWa", "SUNWb", "SUNWc"]),
+                         {"SUNWa": [], "SUNWb": ["SUNWa", "SUNWcsr"],
+                          "SUNWc": []})
+
+    def test_ds_depends(self):
+        '''ds_depends() finds depend files in datastream package parts'''
+        stream = ds_header([("SUNWa", 1, 10), ("SUNWb", 2, 20),
+                            ("SUNWc", 1, 5)])
+        stream += cpio_archive([("SUNWa/pkginfo", "PKG=SUNWa\n"),
+                                ("SUNWa/pkgmap", ": 1 10\n")])
+        stream += cpio_archive([("install/copyright", "x" * 700),
+                                ("reloc/usr/bin/a", "a" * 1000)])
+        stream += cpio_archive([("install/depend", "P SUNWc\tc\n")])
+        stream += cpio_archive([("reloc/usr/bin/b", "b" * 3)])
+        stream += cpio_archive([("install/depend",
+                                 "P SUNWa\ta\nP SUNWb\tb\n")])
+        ds_name = os.path.join(self.tmpdir, "test.d")
+        with open(ds_name, "wb") as ds_file:
+            ds_file.write(stream)
+
+        self.assertEqual(svr4_sched.ds_depends(ds_name, ["SUNWa", "SUNWb",
+                                                         "SUNWc"]),
+                         {"SUNWa": [], "SUNWb": ["SUNWc"],
+                          "SUNWc": ["SUNWa", "SUNWb"]})
+
+
+class TestPkgaddScheduler(unittest.TestCase):
+    '''Tests for PkgaddScheduler, running a fake pkgadd'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="test_svr4_sched_")
+        self.src = os.path.join(self.tmpdir, "pkgs")
+        self.root = os.path.join(self.tmpdir, "root")
+        os.makedirs(self.src)
+        os.makedirs(self.root)
+        self.pkgadd = os.path.join(self.tmpdir, "pkgadd")
+        with open(self.pkgadd, "w") as pkgadd:
+            pkgadd.write(FAKE_PKGADD)
+        os.chmod(self.pkgadd, 0755)
+        self.logger = logging.getLogger("test_svr4_sched")
+        self.logger.addHandler(logging.NullHandler())
+        self.done = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def build_cmd(self, pkg, worker):
+        '''Return a fake pkgadd command with an admin file per worker'''
+        admin = os.path.join(self.tmpdir, "admin.%d" % worker)
+        if not os.path.exists(admin):
+            open(admin, "w").close()
+        return [self.pkgadd, "-n", "-a", admin, "-d", self.src, "-R",
+                self.root, pkg]
+
+    def on_done(self, pkg, returncode):
+        '''Record completed packages'''
+        self.done.append((pkg, returncode))
+
+    def schedule(self, pkgs, jobs=4):
+        '''Return a scheduler of pkgs'''
+        return svr4_sched.PkgaddScheduler(pkgs,
+            svr4_sched.dir_depends(self.src, pkgs), self.build_cmd,
+            subprocess.Popen, self.tmpdir, self.logger, jobs=jobs,
+            on_done=self.on_done)
+
+    def test_independent_packages(self):
+        '''independent packages are installed concurrently'''
+        pkgs = ["SUNWpkg%d" % i for i in range(8)]
+        for pkg in pkgs:
+            make_pkg(self.src, pkg, [])
+        start = time.time()
+        results = self.schedule(pkgs).run()
+        self.assertTrue(time.time() - start < 8 * 0.3 * 0.75)
+        self.assertEqual(results, dict((pkg, 0) for pkg in pkgs))
+        self.assertEqual(sorted(os.listdir(self.root)), pkgs)
+        self.assertEqual(sorted(self.done), [(pkg, 0) for pkg in pkgs])
+
+    def test_dependency_order(self):
+        '''packages are installed after their prerequisites'''
+        make_pkg(self.src, "SUNWd", ["SUNWb", "SUNWc"])
+        make_pkg(self.src, "SUNWb", ["SUNWa"])
+        make_pkg(self.src, "SUNWc", ["SUNWa", "SUNWcsr"])
+        make_pkg(self.src, "SUNWa", [])
+        make_pkg(self.src, "SUNWe", [])
+        scheduler = self.schedule(["SUNWd", "SUNWb", "SUNWc", "SUNWa",
+                                   "SUNWe"])
+        results = scheduler.run()
+        self.assertFalse(scheduler.failed)
+        self.assertFalse(scheduler.not_run)
+        self.assertTrue(all(code == 0 for code in results.values()))
+        order = [pkg for (pkg, code) in self.done]
+        self.assertTrue(order.index("SUNWa") < order.index("SUNWb"))
+        self.assertTrue(order.index("SUNWc") < order.index("SUNWd"))
+
+    def test_cycle(self):
+        '''circular prerequisites do not stop installation'''
+        make_pkg(self.src, "SUNWa", ["SUNWb"])
+        make_pkg(self.src, "SUNWb", ["SUNWa"])
+        # the fake pkgadd refuses to install a package before its
+        # prerequisites, so break the cycle there too
+        os.unlink(os.path.join(self.src, "SUNWa", "install", "depend"))
+        depends = {"SUNWa": ["SUNWb"], "SUNWb": ["SUNWa"]}
+        scheduler = svr4_sched.PkgaddScheduler(["SUNWa", "SUNWb"], depends,
+            self.build_cmd, subprocess.Popen, self.tmpdir, self.logger)
+        self.assertEqual(scheduler.run(), {"SUNWa": 0, "SUNWb": 0})
+
+    def test_failure(self):
+        '''no more packages are started once one fails'''
+        make_pkg(self.src, "FAILpkg", [])
+        make_pkg(self.src, "SUNWa", ["FAILpkg"])
+        scheduler = self.schedule(["FAILpkg", "SUNWa"])
+        results = scheduler.run()
+        self.assertEqual(results, {"FAILpkg": 1})
+        self.assertEqual(scheduler.failed, ["FAILpkg"])
+        self.assertEqual(scheduler.not_run, ["SUNWa"])
+        self.assertEqual(os.listdir(self.root), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,7 +19,7 @@
 #
 # CDDL HEADER END
 #
-# Copyright (c) 2008, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2008, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 import ctypes as C
@@ -31,6 +31,8 @@ import inspect
 import select
 import string
 import crypt
+import threading
+import Queue
 
 # =============================================================================
 # =============================================================================
@@ -449,12 +451,152 @@ def file_size(filename):
     # here because that call follows symlinks, which is not
     # what we want to do. Use os.lstat() so symlinks are not
     # followed
-    stat = os.lstat(filename)
+    return _rounded_size(os.lstat(filename))
 
-    if (stat.st_size % 1024 == 0):
-        return stat.st_size
+
+def _rounded_size(stat_info):
+    """ Returns the st_size of stat_info rounded up to a multiple of
+    1024, as file_size() does.
+    """
+    if (stat_info.st_size % 1024 == 0):
+        return stat_info.st_size
     else:
-        return (((stat.st_size / 1024) + 1) * 1024)
+        return (((stat_info.st_size / 1024) + 1) * 1024)
+
+
+# Number of threads dir_scan() uses by default
+DIR_SCAN_THREADS = 8
+
+# Results of scanning each directory, keyed by path.  See dir_scan().
+_dir_scan_cache = dict()
+_dir_scan_cache_lock = threading.Lock()
+
+
+def _scan_one_dir(path, use_cache):
+    """ Returns a (size, count, subdirs) tuple for the entries directly
+    within directory path: their total file_size(), their number, and the
+    paths of those which are directories.  Symlinks are not followed.
+    """
+    dir_stat = os.lstat(path)
+    key = (dir_stat.st_dev, dir_stat.st_ino, dir_stat.st_mtime)
+    if use_cache:
+        with _dir_scan_cache_lock:
+            cached = _dir_scan_cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+    size = 0
+    count = 0
+    subdirs = []
+    for filename in os.listdir(path):
+        abs_filename = os.path.join(path, filename)
+        count += 1
+        try:
+            stat_info = os.lstat(abs_filename)
+        except OSError:
+            # No need to exit because can't get size of
+            # a file/dir, just print an error and continue
+            print >> sys.stderr, \
+                ("Error getting information about " + abs_filename)
+            continue
+        size += _rounded_size(stat_info)
+        if stat.S_ISDIR(stat_info.st_mode):
+            subdirs.append(abs_filename)
+
+    result = (size, count, tuple(subdirs))
+    with _dir_scan_cache_lock:
+        _dir_scan_cache[path] = (key, result)
+    return result
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def dir_scan(rootpath, use_cache=True, threads=DIR_SCAN_THREADS):
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    """ Estimates the size of the given directory and counts its entries.
+
+    The size is calculated as by dir_size().  The count is the number of
+    files and directories below rootpath, not including rootpath itself,
+    which is the number of inodes needed to hold a copy of the tree.
+
+    Subdirectories are scanned in parallel by the given number of threads.
+
+    The result for the entries directly within each directory is cached,
+    keyed on the directory's path, device, inode number and modification
+    time, so scanning an unchanged tree again only needs one lstat() per
+    directory.  A directory's modification time changes when entries are
+    created, removed or renamed in it, but not when an existing file is
+    rewritten in place, so a file that grows in place without being
+    replaced is not noticed.  Pass use_cache=False to scan every entry.
+
+    Args:
+      rootpath: root of the directory to scan
+      use_cache: whether to use and update the cache of directory results
+      threads: number of threads to scan with
+
+    Returns:
+      A (size, count) tuple.  Size is in bytes.
+
+    Raises:
+      OSError as returned from file_size
+      Exception: rootpath is not valid
+
+    """
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    # Get the size of the root directory
+    root_size = file_size(rootpath)
+    if (root_size == 0):
+        # This indicates the root directory is not valid
+        raise Exception((rootpath + "is not valid"))
+
+    totals = [root_size, 0]
+    errors = []
+    lock = threading.Lock()
+    pending = Queue.Queue()
+
+    def worker():
+        """ scan directories from pending, queueing their subdirectories """
+        while True:
+            path = pending.get()
+            if path is None:
+                return
+            try:
+                try:
+                    (size, count, subdirs) = _scan_one_dir(path, use_cache)
+                except OSError:
+                    # unreadable directories are skipped, as by os.walk()
+                    continue
+                with lock:
+                    totals[0] += size
+                    totals[1] += count
+                for subdir in subdirs:
+                    pending.put(subdir)
+            except BaseException as err:
+                errors.append(err)
+            finally:
+                pending.task_done()
+
+    pending.put(rootpath)
+    workers = [threading.Thread(target=worker, name="dir_scan")
+               for _none in range(max(1, threads))]
+    for thread in workers:
+        thread.daemon = True
+        thread.start()
+    pending.join()
+    for thread in workers:
+        pending.put(None)
+    for thread in workers:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return tuple(totals)
+
+
+def clear_dir_scan_cache():
+    """ Forgets the directory results cached by dir_scan() """
+    with _dir_scan_cache_lock:
+        _dir_scan_cache.clear()
 
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -463,7 +605,7 @@ def dir_size(rootpath):
     """ Estimates the size of the given directory.
 
     This function is similar in functionality to the "du" command,
-    but this function works for both ufs and zfs.  
+    but this function works for both ufs and zfs.
     On UFS, du(1) reports the size of the data blocks within the file.
     On ZFS, du(1) reports the actual size of the file as stored on disk.
     This size includes metadata as well as compression.  So, given
@@ -472,8 +614,9 @@ def dir_size(rootpath):
 
     This function will traverse all the directories/files under a
     given directory, and add up the sizes for all the directories and files,
-    and return the value in bytes.  
-    
+    and return the value in bytes.  The traversal is done by dir_scan(),
+    which caches its results.
+
     Args:
       rootpath: root of the directory to calculate the size for
 
@@ -487,31 +630,7 @@ def dir_size(rootpath):
     """
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    size = 0
-
-    # Get the size of the root directory
-    size += file_size(rootpath)
-    if (size == 0):
-        # This indicates the root directory is not valid
-        raise Exception((rootpath + "is not valid"))
-
-    for root, subdirs, files in os.walk(rootpath):
-        # There's no need to distinguish between directories and
-        # files in the size calculation, merge the subdirs list
-        # and files list to make rest of the code simpler.
-        for filename in (files + subdirs):
-            abs_filename = root + "/" + filename
-            try:
-                size += file_size(abs_filename)
-            except OSError:
-                # No need to exit because can't get size of
-                # a file/dir, just print an error and continue
-                print >> sys.stderr, \
-                    ("Error getting information about "
-                     + abs_filename)
-                continue
-
-    return (size)
+    return dir_scan(rootpath)[0]
 
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
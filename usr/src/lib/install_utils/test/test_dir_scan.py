@@ -0,0 +1,96 @@
+#!/usr/bin/python
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright (c) 2012, Oracle and/or its affiliates. All rights reserved.
+#
+
+'''Unit tests for dir_scan() and dir_size()'''
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from osol_install import install_utils
+from osol_install.install_utils import dir_scan, dir_size, file_size
+
+
+def walk_size_and_count(rootpath):
+    ''' size and count of rootpath, calculated as dir_size() used to '''
+    size = file_size(rootpath)
+    count = 0
+    for root, subdirs, files in os.walk(rootpath):
+        for filename in (files + subdirs):
+            size += file_size(os.path.join(root, filename))
+            count += 1
+    return (size, count)
+
+
+class DirScanTest(unittest.TestCase):
+
+    ''' Tests for dir_scan() '''
+
+    def setUp(self):
+        install_utils.clear_dir_scan_cache()
+        self.root = tempfile.mkdtemp(prefix="test_dir_scan_")
+        for top in range(4):
+            for sub in range(3):
+                path = os.path.join(self.root, "d%d" % top, "s%d" % sub)
+                os.makedirs(path)
+                for num in range(5):
+                    with open(os.path.join(path, "f%d" % num), "w") as fh:
+                        fh.write("x" * (num * 700))
+        os.symlink(os.path.join(self.root, "d0"),
+                   os.path.join(self.root, "link"))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        install_utils.clear_dir_scan_cache()
+
+    def test_matches_walk(self):
+        '''Tests dir_scan matches a walk of the tree, not following links'''
+        expected = walk_size_and_count(self.root)
+        self.assertEqual(dir_scan(self.root, threads=4), expected)
+        self.assertEqual(dir_scan(self.root, use_cache=False, threads=1),
+                         expected)
+        self.assertEqual(dir_size(self.root), expected[0])
+
+    def test_cached_scan(self):
+        '''Tests a repeated scan notices entries added to a subdirectory'''
+        (size, count) = dir_scan(self.root)
+        self.assertEqual(dir_scan(self.root), (size, count))
+
+        with open(os.path.join(self.root, "d2", "s1", "new"), "w") as fh:
+            fh.write("x" * 5000)
+        os.unlink(os.path.join(self.root, "d3", "s2", "f4"))
+        self.assertEqual(dir_scan(self.root),
+                         walk_size_and_count(self.root))
+
+    def test_invalid_root(self):
+        '''Tests dir_scan raises OSError for a missing root'''
+        self.assertRaises(OSError, dir_scan,
+                          os.path.join(self.root, "missing"))
+
+
+if __name__ == '__main__':
+    unittest.main()
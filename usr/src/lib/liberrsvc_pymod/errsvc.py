@@ -21,11 +21,16 @@
 #
 
 #
-# Copyright (c) 2010, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 #
 
 ''' CUD Error Handler Library and Object Types '''
 
+import itertools
+import threading
+
+from collections import OrderedDict
+
 import liberrsvc
 
 VALID_ERROR_TYPES = [liberrsvc.ES_ERR, \
@@ -41,9 +46,104 @@ STRING_DATA_TYPES = [liberrsvc.ES_DATA_OP_STR, \
 
 EXCEPTION_DATA_TYPES = [liberrsvc.ES_DATA_EXCEPTION]
 
-# Declare the list to store the errors.
-# @type _ERRORS list
-_ERRORS = []
+
+class _ErrorStore(object):
+    """
+    Store of ErrorInfo objects, kept in the order they were created and
+    indexed by module id and by error type.
+
+    Looking up or clearing the errors of one module id or error type costs
+    only as much as the number of errors it has, so modules which clear
+    their errors on every operation (eg the target shadow lists) don't pay
+    for the errors of every other module.  The store may be used from
+    several threads.
+
+    The store reads like a list of ErrorInfo objects: it supports len(),
+    truth testing, iteration and indexing.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._seq = itertools.count()
+        # ErrorInfo objects keyed by sequence number, in creation order
+        self._all = OrderedDict()
+        # mod_id -> OrderedDict of sequence number -> ErrorInfo
+        self._by_mod_id = {}
+        # error_type -> OrderedDict of sequence number -> ErrorInfo
+        self._by_type = {}
+
+    def append(self, error):
+        """ Add an ErrorInfo object to the store """
+        with self._lock:
+            seq = self._seq.next()
+            self._all[seq] = error
+            self._by_mod_id.setdefault(error.mod_id, OrderedDict())[seq] = \
+                error
+            self._by_type.setdefault(error.error_type, OrderedDict())[seq] = \
+                error
+
+    def clear(self):
+        """ Remove all errors """
+        with self._lock:
+            self._all.clear()
+            self._by_mod_id.clear()
+            self._by_type.clear()
+
+    def clear_mod_id(self, mod_id):
+        """ Remove all errors with the given module id """
+        with self._lock:
+            try:
+                errors = self._by_mod_id.pop(mod_id, None)
+            except TypeError:
+                # unhashable, so can't match any error
+                return
+            if not errors:
+                return
+            for (seq, error) in errors.iteritems():
+                del self._all[seq]
+                by_type = self._by_type[error.error_type]
+                del by_type[seq]
+                if not by_type:
+                    del self._by_type[error.error_type]
+
+    def get_by_mod_id(self, mod_id):
+        """ Return a list of the errors with the given module id """
+        with self._lock:
+            try:
+                return self._by_mod_id.get(mod_id, {}).values()
+            except TypeError:
+                # unhashable, so can't match any error
+                return []
+
+    def get_by_type(self, error_type):
+        """ Return a list of the errors with the given error type """
+        with self._lock:
+            try:
+                return self._by_type.get(error_type, {}).values()
+            except TypeError:
+                # unhashable, so can't match any error
+                return []
+
+    def get_all(self):
+        """ Return a list of all errors """
+        with self._lock:
+            return self._all.values()
+
+    def __len__(self):
+        return len(self._all)
+
+    def __nonzero__(self):
+        return bool(self._all)
+
+    def __iter__(self):
+        return iter(self.get_all())
+
+    def __getitem__(self, index):
+        return self.get_all()[index]
+
+
+# Declare the store for the errors.
+# @type _ERRORS _ErrorStore
+_ERRORS = _ErrorStore()
 
 
 class ErrorInfo(object):
@@ -67,7 +167,7 @@ class ErrorInfo(object):
         self._error_type = error_type
         # use a simple dictionary for the data
         self.error_data = {}
-        # append this object to the internal list of errors
+        # add this object to the internal store of errors
         _ERRORS.append(self)
 
     def get_mod_id(self):
@@ -144,46 +244,35 @@ def get_all_errors():
     """
     Get a list of all the ErrorInfo objs currently known to the error service.
     """
-    return _ERRORS
+    return _ERRORS.get_all()
 
 
 def clear_error_list():
     """
     Clear the current list of errors in the error service.
     """
-    # pylint: disable-msg=W0603
-    global _ERRORS
-    _ERRORS = []
+    _ERRORS.clear()
 
 
 def clear_error_list_by_mod_id(mod_id):
     """
     Clear the current list of errors that have the given module id.
     """
-    global _ERRORS
-    _ERRORS = filter(lambda x: x.mod_id != mod_id, _ERRORS)
+    _ERRORS.clear_mod_id(mod_id)
 
 
 def get_errors_by_type(error_type):
     """
     Returns a list of ErrorInfo objects that have the given error_type
     """
-    new_list = []
-    for elem in _ERRORS:
-        if (elem.error_type == error_type):
-            new_list.append(elem)
-    return new_list
+    return _ERRORS.get_by_type(error_type)
 
 
 def get_errors_by_mod_id(mod_id):
     """
     Returns a list of ErrorInfo objects that have the given module id.
     """
-    new_list = []
-    for elem in _ERRORS:
-        if (elem.mod_id == mod_id):
-            new_list.append(elem)
-    return new_list
+    return _ERRORS.get_by_mod_id(mod_id)
 
 
 def __dump_all_errors__():
@@ -20,12 +20,13 @@
 # CDDL HEADER END
 #
 
-# Copyright (c) 2010, 2011, Oracle and/or its affiliates. All rights reserved.
+# Copyright (c) 2010, 2012, Oracle and/or its affiliates. All rights reserved.
 
 ''' Test code for unit testing of the errsvc module.  '''
 
 import sys
 import platform
+import threading
 import unittest
 
 import osol_install.errsvc as errsvc
@@ -100,6 +101,59 @@ class error_service(unittest.TestCase):
         self.assertEqual(len(errors), 1)
         self.assertEqual(errors[0].mod_id, "mod2")
 
+        # verify the error type index no longer holds the cleared error
+        self.assertEqual(errsvc.get_errors_by_type(self.error_types[0]),
+                         [error2])
+
+        # an unhashable mod_id matches no error
+        errsvc.clear_error_list_by_mod_id([self.mod_id])
+        self.assertEqual(errsvc.get_all_errors(), [error2])
+
+    def test_error_order(self):
+        '''Testing: errors are returned in the order created.'''
+
+        errsvc.clear_error_list()
+        created = []
+        for n in range(10):
+            created.append(errsvc.ErrorInfo("mod%d" % (n % 3),
+                self.error_types[n % self.num_err_types]))
+        errsvc.clear_error_list_by_mod_id("mod1")
+
+        expected = [error for error in created if error.mod_id != "mod1"]
+        self.assertEqual(errsvc.get_all_errors(), expected)
+        self.assertEqual(list(errsvc._ERRORS), expected)
+        self.assertEqual(errsvc._ERRORS[0], expected[0])
+        self.assertEqual(len(errsvc._ERRORS), len(expected))
+        self.assertEqual(errsvc.get_errors_by_mod_id("mod2"),
+            [error for error in created if error.mod_id == "mod2"])
+        self.assertEqual(errsvc.get_errors_by_type(self.error_types[0]),
+            [error for error in expected
+             if error.error_type == self.error_types[0]])
+
+    def test_threads(self):
+        '''Testing: errors created and cleared from several threads.'''
+
+        errsvc.clear_error_list()
+
+        def create(mod_id):
+            for _n in range(200):
+                errsvc.ErrorInfo(mod_id, self.error_types[0])
+                errsvc.clear_error_list_by_mod_id("other")
+
+        threads = [threading.Thread(target=create, args=("mod%d" % n,))
+                   for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(errsvc.get_all_errors()), 800)
+        for n in range(4):
+            self.assertEqual(len(errsvc.get_errors_by_mod_id("mod%d" % n)),
+                             200)
+        errsvc.clear_error_list()
+        self.assertFalse(errsvc._ERRORS)
+
     def test_get_errors_by_type(self):
         '''Testing: get_errors_by_type(error_type).'''
 
@@ -26,9 +26,16 @@
 counts "columns" in applicable cases, rather than assuming
 columns are same as characters or bytes.
 
+Column widths are computed by a small width engine: the encoding of
+the current locale is resolved once per LC_CTYPE setting, pure ASCII
+strings take a fast path, per-codepoint widths are kept in a table and
+the widths of whole strings and wrapped paragraphs are kept in bounded
+LRU caches, since the same strings are measured on every redraw.
+
 '''
 
 import locale
+from collections import OrderedDict
 from unicodedata import east_asian_width
 
 
@@ -37,44 +44,149 @@ LEFT = "left"
 RIGHT = "right"
 CENTER = "center"
 
+# maximum number of entries kept in each of the LRU caches below
+CACHE_SIZE = 1024
+
+
+class _LRUCache(object):
+    ''' Minimal bounded mapping which discards the least recently
+    used entry once more than maxsize entries are stored.
+    '''
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        ''' Return the value cached for key, or None '''
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._data[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        ''' Store value for key, evicting the oldest entry if needed '''
+        self._data.pop(key, None)
+        self._data[key] = value
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        ''' Drop all entries and reset statistics '''
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+# (LC_CTYPE setting, encoding) of the last get_encoding() lookup
+_ENCODING_CACHE = (None, None)
+
+# column width of each non-ASCII codepoint seen so far
+_CHAR_WIDTHS = dict()
+
+# textwidth() results, keyed by unicode text
+_TEXTWIDTH_CACHE = _LRUCache()
+
+# convert_paragraph() results, keyed by (text, max_chars, wrap flag)
+_PARAGRAPH_CACHE = _LRUCache()
+
+
+def clear_caches():
+    ''' Discard all cached widths and wrapped paragraphs, and force the
+    encoding of the current locale to be looked up again.
+    '''
+    global _ENCODING_CACHE
+    _ENCODING_CACHE = (None, None)
+    _CHAR_WIDTHS.clear()
+    _TEXTWIDTH_CACHE.clear()
+    _PARAGRAPH_CACHE.clear()
+
 
 def get_encoding():
     ''' Get encoding of current locale
     '''
+    global _ENCODING_CACHE
+    # querying the raw LC_CTYPE setting is cheap; parsing it (and
+    # possibly calling getpreferredencoding()) is not, so only do the
+    # latter when the locale has actually changed
+    ctype = locale.setlocale(locale.LC_CTYPE)
+    if _ENCODING_CACHE[0] == ctype and ctype is not None:
+        return _ENCODING_CACHE[1]
+
     enc = locale.getlocale(locale.LC_CTYPE)[1]
     if enc is None:
         enc = locale.getpreferredencoding()
 
+    _ENCODING_CACHE = (ctype, enc)
     return enc
 
 
+def _to_unicode(text):
+    ''' Decode text using the current locale encoding if it is a str '''
+    if isinstance(text, str):
+        text = text.decode(get_encoding())
+    return text
+
+
+def _is_ascii(text):
+    ''' Return True if the unicode string text holds only ASCII '''
+    try:
+        text.encode("ascii")
+    except UnicodeError:
+        return False
+    return True
+
+
+def _ucharwidth(c):
+    ''' Column width of the single unicode character c '''
+    if c < u"\x80":
+        return 1
+    width = _CHAR_WIDTHS.get(c)
+    if width is None:
+        width_class = east_asian_width(c)
+        if width_class == "F" or width_class == "W":
+            width = 2
+        else:
+            width = 1
+        _CHAR_WIDTHS[c] = width
+    return width
+
+
 def charwidth(c):
     ''' Count column width needed for given Unicode character
     '''
-    if isinstance(c, str):
-        c = c.decode(get_encoding())
-    width_class = east_asian_width(c)
+    return _ucharwidth(_to_unicode(c))
 
-    if width_class == "F" or width_class == "W":
-        return 2
-    else:
-        return 1
+
+def _utextwidth(text):
+    ''' Column width of unicode text with tabs already expanded '''
+    if _is_ascii(text):
+        return len(text)
+
+    width_total = _TEXTWIDTH_CACHE.get(text)
+    if width_total is None:
+        width_total = 0
+        for char in text:
+            width_total += _ucharwidth(char)
+        _TEXTWIDTH_CACHE.put(text, width_total)
+
+    return width_total
 
 
 def textwidth(text):
     ''' Count column width needed for given string.
         text passed in should be a str or unicode object.
      '''
-    if isinstance(text, str):
-        text = text.decode(get_encoding())
-    text = text.expandtabs(4)
-
-    width_total = 0
-
-    for char in text:
-        width_total += charwidth(char)
-
-    return width_total
+    return _utextwidth(_to_unicode(text).expandtabs(4))
 
 
 _WHITESPACE_WRAP = True
@@ -114,28 +226,28 @@ def fit_text_truncate(text, max_width, just="", fillchar=u" "):
     If just is one of LEFT, RIGHT, or CENTER, justify text
     and fill unused room with fillchar.
     '''
-    if isinstance(text, str):
-        text = text.decode(get_encoding())
-
-    text = text.expandtabs(4)
+    text = _to_unicode(text).expandtabs(4)
 
     if fillchar is None:
         fillchar = u" "
-    if isinstance(fillchar, str):
-        fillchar = fillchar.decode(get_encoding())
+    fillchar = _to_unicode(fillchar)
     if charwidth(fillchar) != 1:
         raise ValueError('Cannot use multi-column character "%c" as '
                          'fillchar.' % fillchar)
 
-    fitted_text = u""
-    width_total = 0
-
-    for char in text:
-        width = charwidth(char)
-        if width_total + width > max_width:
-            break
-        fitted_text += char
-        width_total += width
+    if _is_ascii(text):
+        fitted_text = text[:max(max_width, 0)]
+        width_total = len(fitted_text)
+    else:
+        width_total = 0
+        end_pt = len(text)
+        for i, char in enumerate(text):
+            width = _ucharwidth(char)
+            if width_total + width > max_width:
+                end_pt = i
+                break
+            width_total += width
+        fitted_text = text[:end_pt]
 
     npad = max_width - width_total
 
@@ -182,19 +294,28 @@ def convert_paragraph(text, max_chars):
     '''
     wrap_on_whitespace = if_wrap_on_whitespace()
 
-    if isinstance(text, str):
-        text = text.decode(get_encoding())
+    text = _to_unicode(text)
+
+    key = (text, max_chars, wrap_on_whitespace)
+    cached = _PARAGRAPH_CACHE.get(key)
+    if cached is not None:
+        # callers are free to modify the returned list
+        return list(cached)
 
     text_lines = text.expandtabs(4).splitlines()
     paragraphed_lines = []
 
     for line in text_lines:
+        if _is_ascii(line) and len(line) <= max_chars:
+            # fits as is; no need to look at each character
+            paragraphed_lines.append(line.lstrip())
+            continue
         width_total = 0
         last_whitespace = None
         width_upto_last_whitespace = None
         start_pt = 0
         for i, c in enumerate(line):
-            width = charwidth(c)
+            width = _ucharwidth(c)
             if width_total + width > max_chars:
                 if wrap_on_whitespace and last_whitespace is not None:
                     # put up to last white space
@@ -223,4 +344,6 @@ def convert_paragraph(text, max_chars):
                     width_upto_last_whitespace = width_total
         # flush last part of "line" (each item of text_lines)
         paragraphed_lines.append(line[start_pt:].lstrip())
+
+    _PARAGRAPH_CACHE.put(key, tuple(paragraphed_lines))
     return paragraphed_lines
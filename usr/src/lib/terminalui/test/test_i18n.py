@@ -26,12 +26,14 @@ import unittest
 import locale
 
 import terminalui
+import terminalui.i18n
 from terminalui.i18n import get_encoding, \
                             if_wrap_on_whitespace, \
                             charwidth, \
                             textwidth, \
                             fit_text_truncate, \
                             convert_paragraph, \
+                            clear_caches, \
                             LEFT, \
                             RIGHT, \
                             CENTER
@@ -181,5 +183,66 @@ class I18nTestCase(unittest.TestCase):
             self.assertEqual(convert_paragraph(s, 5), [s[:3], s[3:].lstrip()])
             self.assertEqual(convert_paragraph(s, 4), [s[:2], s[2:].lstrip()])
 
+    def test_ascii_fast_path(self):
+        ''' test ASCII text gets the same widths as the general path '''
+        s = u'Install Solaris\tnow'
+        self.assertEqual(textwidth(s), len(s.expandtabs(4)))
+        self.assertEqual(textwidth(str(s)), len(s.expandtabs(4)))
+        self.assertEqual(fit_text_truncate(s, 7), s[:7])
+        self.assertEqual(fit_text_truncate(s, -1), u'')
+        self.assertEqual(fit_text_truncate(u'ab', 4, just=CENTER), u' ab ')
+        self.assertEqual(convert_paragraph(u'  abc', 10), [u'abc'])
+
+    def test_caches_consistent(self):
+        ''' test cached widths and paragraphs match fresh computation '''
+        s = u'\u3042\u3044 \u3046\u3048 \u00c0A' * 20
+        clear_caches()
+        width = textwidth(s)
+        lines = convert_paragraph(s, 13)
+        # served from cache the second time around
+        self.assertEqual(textwidth(s), width)
+        self.assertEqual(convert_paragraph(s, 13), lines)
+        # a different width must not reuse the cached paragraph
+        self.assertNotEqual(convert_paragraph(s, 21), lines)
+        clear_caches()
+        self.assertEqual(textwidth(s), width)
+        self.assertEqual(convert_paragraph(s, 13), lines)
+
+    def test_convert_paragraph_returns_copy(self):
+        ''' test modifying a returned paragraph does not alter the cache '''
+        s = u'\u3042\u3044 \u3046\u3048'
+        lines = convert_paragraph(s, 5)
+        expected = list(lines)
+        lines.append(u'junk')
+        self.assertEqual(convert_paragraph(s, 5), expected)
+
+    def test_cjk_help_text_cached(self):
+        ''' test rewrapping CJK help-screen text is served from cache '''
+        # a help screen is re-wrapped on every redraw
+        text = (u'\u30a4\u30f3\u30b9\u30c8\u30fc\u30eb\u3059\u308b'
+                u'\u30c7\u30a3\u30b9\u30af\u3092\u9078\u629e\u3057'
+                u'\u3066\u304f\u3060\u3055\u3044\u3002 ' * 40 +
+                u'\n') * 10
+        calls = []
+        ucharwidth = terminalui.i18n._ucharwidth
+
+        def counted(c):
+            calls.append(c)
+            return ucharwidth(c)
+
+        clear_caches()
+        terminalui.i18n._ucharwidth = counted
+        try:
+            expected = convert_paragraph(text, 72)
+            self.assertTrue(calls)
+            del calls[:]
+            for i in xrange(10):
+                self.assertEqual(convert_paragraph(text, 72), expected)
+        finally:
+            terminalui.i18n._ucharwidth = ucharwidth
+        self.assertEqual(calls, [])
+        self.assertEqual(terminalui.i18n._PARAGRAPH_CACHE.hits, 10)
+
+
 if __name__ == '__main__':
     unittest.main()